@@ -0,0 +1,294 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A snapshot of what is shown on the main page, shared by all users.
+It has the repositories with their branches, badges and open PRs and the
+most recent events. Each user just gets the parts for the repositories
+they can see.
+The snapshot has the version of the change counter when it was built. The
+counter is bumped whenever an event, PR, branch, badge or repository is
+saved, so the snapshot is rebuilt once after changes instead of for every
+user on every update of the main page. Running jobs change their events
+all the time so it is rebuilt at most once every
+DASHBOARD_MIN_REFRESH_INTERVAL seconds.
+Both are kept in the cache so they are only used when the cache is shared
+by all the server processes. Otherwise a process would never see the
+changes made by the others and the main page is loaded directly instead.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from ci import checks, models, EventsStatus, RepositoryStatus
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger("ci")
+
+VERSION_KEY = "dashboard:version"
+SNAPSHOT_KEY = "dashboard:snapshot"
+REFRESH_LOCK_KEY = "dashboard:refresh"
+
+# The last snapshot seen by this process, so that it isn't
+# loaded from the cache again until there is a new one
+_local = {}
+
+
+def _bump():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        version()
+
+
+def enabled():
+    """
+    Return:
+      bool: Whether the snapshot is used
+    """
+    return checks.shared_cache()
+
+
+def changed():
+    """
+    Records that something shown on the main page changed.
+    The version is bumped once the transaction commits, since a snapshot
+    built before then can't see the change.
+    """
+    if not enabled():
+        return
+    if connection.in_atomic_block:
+        transaction.on_commit(_bump)
+    else:
+        _bump()
+
+
+def version():
+    """
+    Return:
+      int: The current value of the change counter, None if the snapshot isn't used
+    """
+    if not enabled():
+        return None
+    current = cache.get(VERSION_KEY)
+    if current is None:
+        # Start from the time so that a version from before the cache
+        # was cleared doesn't look current
+        cache.add(VERSION_KEY, int(time.time() * 1000), None)
+        current = cache.get(VERSION_KEY)
+    return current
+
+
+def clear():
+    """
+    Forgets the snapshot that this process has.
+    """
+    _local.clear()
+
+
+def _timestamps(q):
+    return dict((pk, ts.timestamp()) for pk, ts in q.values_list("pk", "last_modified"))
+
+
+def build_snapshot():
+    """
+    Builds the snapshot from the database.
+    Return:
+      dict: The snapshot
+    """
+    # Anything that changes after this isn't in the snapshot
+    built = time.time()
+    current = version()
+    repos = []
+    active = set(
+        models.Repository.objects.filter(active=True).values_list("pk", flat=True)
+    )
+    for repo in RepositoryStatus.get_repos_status(models.Repository.objects.all()):
+        repos.append({"id": repo["id"], "active": repo["id"] in active, "info": repo})
+
+    branches = _timestamps(
+        models.Branch.objects.exclude(status=models.JobStatus.NOT_STARTED)
+    )
+    badges = _timestamps(
+        models.RepositoryBadge.objects.exclude(status=models.JobStatus.NOT_STARTED)
+    )
+    prs = _timestamps(models.PullRequest.objects.filter(closed=False))
+
+    num_events = settings.DASHBOARD_SNAPSHOT_EVENTS
+    event_q = EventsStatus.get_default_events_query()[:num_events]
+    events = {}
+    for pk, repo_id, last_modified in event_q.values_list(
+        "pk", "base__branch__repository_id", "last_modified"
+    ):
+        events[pk] = (repo_id, last_modified.timestamp())
+    snapshot_events = []
+    for info in EventsStatus.events_info(event_q):
+        if info["id"] in events:
+            repo_id, last_modified = events[info["id"]]
+            snapshot_events.append(
+                {
+                    "repo_id": repo_id,
+                    "last_modified": last_modified,
+                    "lines": EventsStatus.event_lines(info),
+                }
+            )
+    return {
+        "version": current,
+        "built": built,
+        "repos": repos,
+        "branches": branches,
+        "badges": badges,
+        "prs": prs,
+        "events": snapshot_events,
+        "all_events": len(snapshot_events) < num_events,
+    }
+
+
+def refresh():
+    """
+    Builds a new snapshot and stores it in the cache.
+    Only one process builds it at a time.
+    Return:
+      dict: The new snapshot, None if another process is building it
+    """
+    if not cache.add(REFRESH_LOCK_KEY, True, 60):
+        return None
+    try:
+        snapshot = build_snapshot()
+        cache.set(SNAPSHOT_KEY, snapshot, settings.DASHBOARD_SNAPSHOT_TIMEOUT)
+        _local["snapshot"] = snapshot
+        return snapshot
+    finally:
+        cache.delete(REFRESH_LOCK_KEY)
+
+
+def _refresh_in_background():
+    try:
+        refresh()
+    except Exception:
+        logger.exception("Failed to refresh the dashboard snapshot")
+    finally:
+        connection.close()
+
+
+def _current(snapshot, current):
+    """
+    Whether the snapshot can be used for the current version.
+    """
+    if snapshot["version"] == current:
+        return True
+    return time.time() - snapshot["built"] < settings.DASHBOARD_MIN_REFRESH_INTERVAL
+
+
+def get_snapshot():
+    """
+    Gets a snapshot for the current version. A snapshot that was built in
+    the last DASHBOARD_MIN_REFRESH_INTERVAL seconds is used even if it is
+    out of date.
+    If DASHBOARD_BACKGROUND_REFRESH is set then an out of date snapshot
+    is returned while a new one is built in another thread.
+    Return:
+      dict: The snapshot, None if there isn't one and another process is building it
+    """
+    current = version()
+    snapshot = _local.get("snapshot")
+    if snapshot is not None and _current(snapshot, current):
+        return snapshot
+    snapshot = cache.get(SNAPSHOT_KEY)
+    if snapshot is not None:
+        _local["snapshot"] = snapshot
+        if _current(snapshot, current):
+            return snapshot
+        if settings.DASHBOARD_BACKGROUND_REFRESH:
+            thread = threading.Thread(target=_refresh_in_background)
+            thread.daemon = True
+            thread.start()
+            return snapshot
+    new_snapshot = refresh()
+    if new_snapshot is None:
+        # Another process is building it
+        return snapshot
+    return new_snapshot
+
+
+def served():
+    """
+    The snapshot that the main page is shown from can be older than the
+    current version, so pages need to ask for what changed since it was built.
+    Return:
+      tuple(int, int): The version of the snapshot and the timestamp of when
+        it was built. None if the snapshot isn't used or there isn't one.
+    """
+    if not enabled():
+        return None
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return None
+    return snapshot["version"], math.floor(snapshot["built"])
+
+
+def _since(timestamps, pk, last_modified):
+    return last_modified is None or timestamps.get(pk, 0) >= last_modified
+
+
+def user_dashboard(repo_ids, limit, last_modified=None, active_only=True):
+    """
+    The parts of the snapshot for some repositories.
+    Input:
+      repo_ids[list[int]]: Repositories to include
+      limit[int]: Number of events to include
+      last_modified[datetime]: If not None, only get what changed after this time
+      active_only[bool]: Whether to only include active repositories
+    Return:
+      tuple(list, list, int): The repository info like RepositoryStatus.get_repos_status(),
+        the event info like EventsStatus.multiline_events_info(), and the version.
+        None if the snapshot isn't used, isn't built yet or doesn't have enough events.
+    """
+    if not enabled():
+        return None
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return None
+    repo_ids = set(repo_ids)
+    since = last_modified.timestamp() if last_modified is not None else None
+
+    repos = []
+    for repo in snapshot["repos"]:
+        if repo["id"] not in repo_ids or (active_only and not repo["active"]):
+            continue
+        info = repo["info"]
+        if since is not None:
+            info = dict(info)
+            for name in ["branches", "badges", "prs"]:
+                info[name] = [
+                    entry
+                    for entry in info[name]
+                    if _since(snapshot[name], entry["id"], since)
+                ]
+            if not (info["prs"] or info["branches"] or repo["active"]):
+                continue
+        repos.append(info)
+
+    events = [ev for ev in snapshot["events"] if ev["repo_id"] in repo_ids]
+    if len(events) < limit and not snapshot["all_events"] and repo_ids:
+        return None
+    lines = []
+    for ev in events[:limit]:
+        if since is None or ev["last_modified"] > since:
+            lines.extend(ev["lines"])
+    return repos, lines, snapshot["version"]
@@ -0,0 +1,156 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+The dependencies between the jobs of an event.
+A job depends on the other jobs in its event whose recipe has the same
+filename as one of the recipes that its recipe depends on.
+Use models.Event.graph() to get one. It is kept on the event until
+a job is saved, so the methods of an event can share it.
+Jobs and recipe dependencies already prefetched on the event are used
+instead of loading them again.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from ci import models
+from collections import deque
+
+
+def _has_prefetched_depends(recipe):
+    return "depends_on" in getattr(recipe, "_prefetched_objects_cache", {})
+
+
+class EventGraph(object):
+    def __init__(self, event):
+        """
+        Loads the jobs of an event and their dependencies.
+        Input:
+          event[models.Event]: The event
+        """
+        self.version = models.job_state_version()
+        self.event = event
+        if "jobs" in getattr(event, "_prefetched_objects_cache", {}):
+            self.jobs = list(event.jobs.all())
+        else:
+            self.jobs = list(event.jobs.select_related("recipe", "config"))
+        self.jobs_by_pk = {job.pk: job for job in self.jobs}
+
+        by_filename = {}
+        for job in self.jobs:
+            by_filename.setdefault(job.recipe.filename, []).append(job)
+
+        recipe_deps = {}
+        if all(_has_prefetched_depends(job.recipe) for job in self.jobs):
+            for job in self.jobs:
+                recipe_deps[job.recipe_id] = [
+                    r.filename for r in job.recipe.depends_on.all()
+                ]
+        else:
+            rows = models.Recipe.depends_on.through.objects.filter(
+                from_recipe_id__in={job.recipe_id for job in self.jobs}
+            ).values_list("from_recipe_id", "to_recipe__filename")
+            for recipe_id, filename in rows:
+                recipe_deps.setdefault(recipe_id, []).append(filename)
+
+        # job pk => jobs that it depends on
+        self.depends_on = {}
+        # job pk => jobs that depend on it
+        self.dependents = {job.pk: [] for job in self.jobs}
+        for job in self.jobs:
+            deps = []
+            seen = set()
+            for filename in recipe_deps.get(job.recipe_id, []):
+                for dep in by_filename.get(filename, []):
+                    if dep.pk != job.pk and dep.pk not in seen:
+                        seen.add(dep.pk)
+                        deps.append(dep)
+                        self.dependents[dep.pk].append(job)
+            self.depends_on[job.pk] = deps
+
+        self._levels = None
+        self._unrunnable = None
+
+    def is_current(self):
+        """
+        Return:
+          bool: Whether no jobs have been saved since the graph was built
+        """
+        return self.version == models.job_state_version()
+
+    def job_depends_on(self):
+        """
+        Return:
+          dict: jobs are keys with a list of jobs that they depend on as values
+        """
+        return {job: self.depends_on[job.pk] for job in self.jobs}
+
+    def levels(self):
+        """
+        Groups the jobs so that each job only depends on jobs in earlier groups.
+        If there is a cycle then the jobs in it, and the jobs that depend
+        on them, are put in one last group.
+        Return:
+          list[list[models.Job]]: The groups
+        """
+        if self._levels is None:
+            remaining = {job.pk: len(self.depends_on[job.pk]) for job in self.jobs}
+            level = [job for job in self.jobs if remaining[job.pk] == 0]
+            levels = []
+            placed = 0
+            while level:
+                levels.append(level)
+                placed += len(level)
+                next_level = []
+                for job in level:
+                    for dependent in self.dependents[job.pk]:
+                        remaining[dependent.pk] -= 1
+                        if remaining[dependent.pk] == 0:
+                            next_level.append(dependent)
+                level = next_level
+            if placed < len(self.jobs):
+                levels.append([job for job in self.jobs if remaining[job.pk] > 0])
+            self._levels = levels
+        return self._levels
+
+    def unrunnable(self):
+        """
+        The jobs that won't run because a job that they depend on,
+        directly or through other jobs, failed or was canceled.
+        Return:
+          list[models.Job]: The jobs
+        """
+        if self._unrunnable is None:
+            queue = deque(
+                job
+                for job in self.jobs
+                if job.complete
+                and job.status in [models.JobStatus.FAILED, models.JobStatus.CANCELED]
+            )
+            wont_run = set()
+            while queue:
+                job = queue.popleft()
+                for dependent in self.dependents[job.pk]:
+                    if dependent.pk not in wont_run:
+                        wont_run.add(dependent.pk)
+                        queue.append(dependent)
+            self._unrunnable = [job for job in self.jobs if job.pk in wont_run]
+        return self._unrunnable
+
+    def is_done(self):
+        """
+        Return:
+          bool: Whether all the jobs have completed or won't run
+        """
+        wont_run = {job.pk for job in self.unrunnable()}
+        return all(job.complete or job.pk in wont_run for job in self.jobs)
@@ -14,12 +14,16 @@
 
 from __future__ import unicode_literals, absolute_import
 from ci import TimeUtils, models
+from django.conf import settings
+from django.core.cache import cache
 from django.urls import reverse
 from django.utils.html import format_html, mark_safe
-from django.db.models import Prefetch
-import copy
+from django.db.models import Prefetch, QuerySet, prefetch_related_objects
 from django.utils.encoding import force_str
 
+# Version of the cached event info. Bump this when the info changes.
+EVENT_INFO_CACHE_VERSION = 1
+
 
 def get_default_events_query(event_q=None, filter_repo_ids=None):
     """
@@ -137,146 +141,200 @@ def multiline_events_info(
     Return:
       list of event info dicts
     """
-    ev_info = events_info(events, last_modified, events_url)
     lines = []
-    for ev in ev_info:
-        new_ev = copy.deepcopy(ev)
-        new_ev["job_groups"] = []
-        # first flatten out the jobs
-        flat_jobs = []
-        for group_idx, group in enumerate(ev["job_groups"]):
-            for job in group:
-                flat_jobs.append(job)
-            if group_idx != (len(ev["job_groups"]) - 1):
-                flat_jobs.append({"id": 0})
-
-        # now break it up into max_jobs_per_line
-        multi = list(chunks(flat_jobs, max_jobs_per_line))
-        line_count = 1000
-        for idx, line in enumerate(multi):
-            new_line = copy.deepcopy(ev)
-            if idx != 0:
-                new_line["description"] = ""
-                new_line["id"] = "%s_%s" % (ev["id"], line_count - idx)
-                new_line["sort_time"] = "{}{:04}".format(
-                    ev["sort_time"], line_count - idx
-                )
-                new_line["status"] = "ContinueLine"
-            new_line["jobs"] = line
-            new_line["job_groups"] = []
-            lines.append(new_line)
+    for ev in events_info(events, last_modified, events_url):
+        lines.extend(event_lines(ev, max_jobs_per_line))
+    return lines
+
+
+def event_lines(ev, max_jobs_per_line=11):
+    """
+    Breaks up the info for an event into lines of at most max_jobs_per_line jobs.
+    Input:
+      ev: dict: Info for an event as returned by events_info()
+      max_jobs_per_line: int: Number of jobs to break the line on
+    Return:
+      list of event info dicts, one for each line
+    """
+    # first flatten out the jobs
+    flat_jobs = []
+    for group_idx, group in enumerate(ev["job_groups"]):
+        for job in group:
+            flat_jobs.append(job)
+        if group_idx != (len(ev["job_groups"]) - 1):
+            flat_jobs.append({"id": 0})
 
+    # now break it up into max_jobs_per_line
+    lines = []
+    multi = list(chunks(flat_jobs, max_jobs_per_line))
+    line_count = 1000
+    for idx, line in enumerate(multi):
+        # The values are strings and numbers so a shallow copy is enough
+        new_line = dict(ev)
+        if idx != 0:
+            new_line["description"] = ""
+            new_line["id"] = "%s_%s" % (ev["id"], line_count - idx)
+            new_line["sort_time"] = "{}{:04}".format(ev["sort_time"], line_count - idx)
+            new_line["status"] = "ContinueLine"
+        new_line["jobs"] = line
+        new_line["job_groups"] = []
+        lines.append(new_line)
     return lines
 
 
+def event_info_cache_key(ev, events_url):
+    """
+    Key for the cached info of an event.
+    Anything that changes what is shown for the event, including its jobs,
+    also bumps the last_modified of the event.
+    The pull request title and status can change on their own.
+    """
+    pr_modified = ""
+    if ev.pull_request_id:
+        pr_modified = ev.pull_request.last_modified.timestamp()
+    return "event_info:%s:%s:%s:%s:%s" % (
+        EVENT_INFO_CACHE_VERSION,
+        ev.pk,
+        ev.last_modified.timestamp(),
+        pr_modified,
+        int(events_url),
+    )
+
+
 def events_info(events, last_modified=None, events_url=False):
     """
     Creates the information required for displaying events.
+    The info for each event is cached until the event changes. If events is
+    a query then its prefetches, like the jobs, are only done for the events
+    that aren't cached.
     Input:
       events: An iterable of models.Event. Usually a query or just a list.
       last_modified: DateTime: If model.Event.last_modified is before this it won't be included
     Return:
       list of event info dicts
     """
-    event_info = []
-    for ev in events:
-        if last_modified and ev.last_modified <= last_modified:
-            continue
-
-        repo_url = reverse("ci:view_repo", args=[ev.base.branch.repository.pk])
-        event_url = reverse("ci:view_event", args=[ev.pk])
-        repo_link = format_html(
-            '<a href="{}">{}</a>', repo_url, ev.base.branch.repository.name
+    prefetch = []
+    if isinstance(events, QuerySet) and events._result_cache is None:
+        prefetch = events._prefetch_related_lookups
+        events = events.prefetch_related(None)
+    events = [
+        ev for ev in events if not last_modified or ev.last_modified > last_modified
+    ]
+    keys = [event_info_cache_key(ev, events_url) for ev in events]
+    cached = cache.get_many(keys)
+    missing = [ev for ev, key in zip(events, keys) if key not in cached]
+    if prefetch and missing:
+        prefetch_related_objects(missing, *prefetch)
+
+    new_info = {}
+    for ev, key in zip(events, keys):
+        if key not in cached:
+            new_info[key] = event_info(ev, events_url)
+    if new_info:
+        cache.set_many(new_info, settings.EVENT_INFO_CACHE_TIMEOUT)
+    cached.update(new_info)
+    return [cached[key] for key in keys]
+
+
+def event_info(ev, events_url=False):
+    """
+    Creates the information required for displaying an event.
+    Input:
+      ev[models.Event]: The event
+    Return:
+      dict: The event info
+    """
+    repo_url = reverse("ci:view_repo", args=[ev.base.branch.repository.pk])
+    event_url = reverse("ci:view_event", args=[ev.pk])
+    repo_link = format_html(
+        '<a href="{}">{}</a>', repo_url, ev.base.branch.repository.name
+    )
+    pr_url = ""
+    pr_desc = ""
+    if ev.pull_request:
+        pr_url = reverse("ci:view_pr", args=[ev.pull_request.pk])
+        pr_desc = clean_str_for_format(str(ev.pull_request))
+        icon_link = format_html(
+            '<a href="{}"><i class="{}"></i></a>',
+            ev.pull_request.url,
+            ev.base.server().icon_class(),
         )
-        pr_url = ""
-        pr_desc = ""
-        if ev.pull_request:
-            pr_url = reverse("ci:view_pr", args=[ev.pull_request.pk])
-            pr_desc = clean_str_for_format(str(ev.pull_request))
-            icon_link = format_html(
-                '<a href="{}"><i class="{}"></i></a>',
-                ev.pull_request.url,
-                ev.base.server().icon_class(),
+        if events_url:
+            event_desc = format_html(
+                '{} {} <a href="{}">{}</a>',
+                icon_link,
+                repo_link,
+                event_url,
+                pr_desc,
             )
-            if events_url:
-                event_desc = format_html(
-                    '{} {} <a href="{}">{}</a>',
-                    icon_link,
-                    repo_link,
-                    event_url,
-                    pr_desc,
-                )
-            else:
-                event_desc = format_html(
-                    '{} {} <a href="{}">{}</a>', icon_link, repo_link, pr_url, pr_desc
-                )
         else:
             event_desc = format_html(
-                '{} <a href="{}">{}', repo_link, event_url, ev.base.branch.name
+                '{} {} <a href="{}">{}</a>', icon_link, repo_link, pr_url, pr_desc
+            )
+    else:
+        event_desc = format_html(
+            '{} <a href="{}">{}', repo_link, event_url, ev.base.branch.name
+        )
+        if ev.description:
+            event_desc = format_html(
+                "{} : {}",
+                mark_safe(event_desc),
+                clean_str_for_format(ev.description),
+            )
+        event_desc += "</a>"
+
+    info = {
+        "id": ev.pk,
+        "status": ev.status_slug(),
+        "sort_time": TimeUtils.sortable_time_str(ev.created),
+        "description": format_html(event_desc),
+        "pr_id": 0,
+        "pr_title": "",
+        "pr_status": "",
+        "pr_number": 0,
+        "pr_url": "",
+        "git_pr_url": "",
+        "pr_username": "",
+        "pr_name": "",
+    }
+    if ev.pull_request:
+        info["pr_id"] = ev.pull_request.pk
+        info["pr_title"] = ev.pull_request.title
+        info["pr_status"] = ev.pull_request.status_slug()
+        info["pr_number"] = ev.pull_request.number
+        info["git_pr_url"] = ev.pull_request.url
+        info["pr_url"] = pr_url
+        info["pr_username"] = ev.pull_request.username
+        info["pr_name"] = pr_desc
+
+    job_info = []
+    for job_group in ev.get_sorted_jobs():
+        job_group_info = []
+        for job in job_group:
+            if int(job.seconds.total_seconds()) == 0:
+                job_seconds = ""
+            else:
+                job_seconds = str(job.seconds)
+
+            jurl = reverse("ci:view_job", args=[job.pk])
+
+            jinfo = {
+                "id": job.pk,
+                "status": job.status_slug(),
+            }
+            job_desc = format_html(
+                '<a href="{}">{}</a>', jurl, format_html(job.unique_name())
             )
-            if ev.description:
-                event_desc = format_html(
-                    "{} : {}",
-                    mark_safe(event_desc),
-                    clean_str_for_format(ev.description),
-                )
-            event_desc += "</a>"
-
-        info = {
-            "id": ev.pk,
-            "status": ev.status_slug(),
-            "sort_time": TimeUtils.sortable_time_str(ev.created),
-            "description": format_html(event_desc),
-            "pr_id": 0,
-            "pr_title": "",
-            "pr_status": "",
-            "pr_number": 0,
-            "pr_url": "",
-            "git_pr_url": "",
-            "pr_username": "",
-            "pr_name": "",
-        }
-        if ev.pull_request:
-            info["pr_id"] = ev.pull_request.pk
-            info["pr_title"] = ev.pull_request.title
-            info["pr_status"] = ev.pull_request.status_slug()
-            info["pr_number"] = ev.pull_request.number
-            info["git_pr_url"] = ev.pull_request.url
-            info["pr_url"] = pr_url
-            info["pr_username"] = ev.pull_request.username
-            info["pr_name"] = pr_desc
-
-        job_info = []
-        for job_group in ev.get_sorted_jobs():
-            job_group_info = []
-            for job in job_group:
-                if int(job.seconds.total_seconds()) == 0:
-                    job_seconds = ""
-                else:
-                    job_seconds = str(job.seconds)
-
-                jurl = reverse("ci:view_job", args=[job.pk])
-
-                jinfo = {
-                    "id": job.pk,
-                    "status": job.status_slug(),
-                }
-                job_desc = format_html(
-                    '<a href="{}">{}</a>', jurl, format_html(job.unique_name())
-                )
-                if job_seconds:
-                    job_desc += format_html("<br />{}", job_seconds)
-                if job.failed_step:
-                    job_desc += format_html("<br />{}", job.failed_step)
-                if job.running_step:
-                    job_desc += format_html("<br />{}", job.running_step)
-                if job.invalidated:
-                    job_desc += "<br />(Invalidated)"
-                jinfo["description"] = job_desc
-                job_group_info.append(jinfo)
-            job_info.append(job_group_info)
-        info["job_groups"] = job_info
-
-        event_info.append(info)
-
-    return event_info
+            if job_seconds:
+                job_desc += format_html("<br />{}", job_seconds)
+            if job.failed_step:
+                job_desc += format_html("<br />{}", job.failed_step)
+            if job.running_step:
+                job_desc += format_html("<br />{}", job.running_step)
+            if job.invalidated:
+                job_desc += "<br />(Invalidated)"
+            jinfo["description"] = job_desc
+            job_group_info.append(jinfo)
+        job_info.append(job_group_info)
+    info["job_groups"] = job_info
+    return info
@@ -0,0 +1,410 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Pushes step output and status changes to the job and event pages
+with Server-Sent Events as the client endpoints receive them.
+Messages are published to a channel per job ("job:<pk>") and per
+event ("event:<pk>"). Each server process hands the messages to the
+streams that it has open. When there is more than one server process
+LIVE_UPDATES_BACKEND needs to pass the messages between them.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils.module_loading import import_string
+from collections import deque
+import json
+import logging
+import threading
+import time
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger("ci")
+
+# Sent instead of the messages that were dropped because a stream fell behind.
+# The page gets the current state from the server when it sees this.
+RESET_MESSAGE = "event: reset\ndata: {}\n\n"
+
+# Instances of the backends, by their dotted path
+_backends = {}
+
+
+def enabled():
+    return settings.LIVE_UPDATES_ENABLED
+
+
+def get_backend():
+    """
+    Return:
+      LocalBackend: The backend set by LIVE_UPDATES_BACKEND
+    """
+    path = settings.LIVE_UPDATES_BACKEND
+    backend = _backends.get(path)
+    if backend is None:
+        backend = import_string(path)()
+        _backends[path] = backend
+    return backend
+
+
+def job_channel(job_id):
+    return "job:%s" % job_id
+
+
+def event_channel(event_id):
+    return "event:%s" % event_id
+
+
+def format_message(event, data):
+    """
+    Input:
+      event[str]: Name of the event
+      data[dict]: Data of the event
+    Return:
+      str: The message in the event stream format
+    """
+    # json.dumps doesn't put newlines in its output so it fits on one data line
+    return "event: %s\ndata: %s\n\n" % (event, json.dumps(data))
+
+
+class Subscription(object):
+    """
+    Messages waiting to be sent on one stream.
+    Only max_messages are kept so that a page that can't keep up
+    doesn't use up memory. If messages are dropped then the stream
+    sends RESET_MESSAGE next.
+    """
+
+    def __init__(self, broker, channels, max_messages):
+        self.broker = broker
+        self.channels = channels
+        self.max_messages = max_messages
+        self.messages = deque()
+        self.dropped = False
+        self.condition = threading.Condition()
+
+    def put(self, message):
+        with self.condition:
+            if len(self.messages) >= self.max_messages:
+                self.messages.clear()
+                self.dropped = True
+            self.messages.append(message)
+            self.condition.notify()
+
+    def get(self, timeout):
+        """
+        Waits for messages.
+        Input:
+          timeout[float]: Maximum number of seconds to wait
+        Return:
+          list[str]: The messages, empty if there were none before the timeout
+        """
+        with self.condition:
+            if not self.messages and not self.dropped:
+                self.condition.wait(timeout)
+            messages = list(self.messages)
+            self.messages.clear()
+            if self.dropped:
+                messages.insert(0, RESET_MESSAGE)
+                self.dropped = False
+            return messages
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class Broker(object):
+    """
+    Hands messages to the subscriptions in this process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+
+    def subscribe(self, channels, max_messages):
+        subscription = Subscription(self, channels, max_messages)
+        with self._lock:
+            for channel in channels:
+                self._subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscriptions = self._subscriptions.get(channel)
+                if subscriptions is None:
+                    continue
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[channel]
+
+    def has_subscribers(self, channel):
+        with self._lock:
+            return channel in self._subscriptions
+
+    def channels(self):
+        """
+        Return:
+          set[str]: The channels that have subscribers
+        """
+        with self._lock:
+            return set(self._subscriptions)
+
+    def dispatch(self, channel, message):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, []))
+        for subscription in subscriptions:
+            subscription.put(message)
+
+
+class LocalBackend(object):
+    """
+    Only passes messages to the streams of the same process.
+    Fine for a single server process, like when developing or testing.
+    """
+
+    def __init__(self):
+        self.broker = Broker()
+
+    def subscribe(self, channels):
+        """
+        Input:
+          channels[list[str]]: The channels to get messages from
+        Return:
+          Subscription: Must be closed when the stream is done
+        """
+        return self.broker.subscribe(channels, settings.LIVE_UPDATES_BUFFER_SIZE)
+
+    def has_listeners(self, channel):
+        """
+        Whether a message published to the channel could reach a stream.
+        Used to avoid building messages that nobody will see.
+        """
+        return self.broker.has_subscribers(channel)
+
+    def publish(self, channel, message):
+        self.broker.dispatch(channel, message)
+
+
+class RedisBackend(LocalBackend):
+    """
+    Passes messages between server processes with Redis pub/sub.
+    Each process has a thread that subscribes to the channels of the
+    streams that it has open and hands the messages to them.
+    Since only those channels are subscribed to, redis knows whether
+    anybody is listening to a channel.
+    Needs the redis package.
+    """
+
+    # How long the listener waits for a message before checking
+    # for streams that were opened or closed
+    poll_seconds = 0.1
+
+    def __init__(self, connection=None):
+        super(RedisBackend, self).__init__()
+        if connection is None:
+            if redis is None:
+                raise ImproperlyConfigured(
+                    "The redis package is required for ci.LiveUpdates.RedisBackend"
+                )
+            connection = redis.Redis.from_url(settings.LIVE_UPDATES_REDIS_URL)
+        self.connection = connection
+        self.prefix = settings.LIVE_UPDATES_REDIS_PREFIX
+        self._listener = None
+        self._listener_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def subscribe(self, channels):
+        self._start_listener()
+        return super(RedisBackend, self).subscribe(channels)
+
+    def has_listeners(self, channel):
+        if self.broker.has_subscribers(channel):
+            return True
+        # Streams could be open in other processes
+        try:
+            counts = self.connection.pubsub_numsub(self.prefix + channel)
+        except Exception as e:
+            logger.warning(
+                "Failed to get live update listeners of %s: %s" % (channel, e)
+            )
+            return False
+        return any(count for _, count in counts)
+
+    def publish(self, channel, message):
+        try:
+            self.connection.publish(self.prefix + channel, message)
+        except Exception as e:
+            logger.warning("Failed to publish live update to %s: %s" % (channel, e))
+
+    def stop(self):
+        self._stop.set()
+        with self._listener_lock:
+            listener = self._listener
+        if listener is not None:
+            listener.join()
+
+    def _start_listener(self):
+        with self._listener_lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._stop.clear()
+                self._listener = threading.Thread(
+                    target=self._listen, name="LiveUpdates", daemon=True
+                )
+                self._listener.start()
+
+    @staticmethod
+    def _decode(value):
+        if isinstance(value, bytes):
+            return value.decode("utf-8")
+        return value
+
+    def _listen(self):
+        while not self._stop.is_set():
+            pubsub = None
+            try:
+                pubsub = self.connection.pubsub(ignore_subscribe_messages=True)
+                subscribed = set()
+                while not self._stop.is_set():
+                    channels = self.broker.channels()
+                    added = channels - subscribed
+                    if added:
+                        pubsub.subscribe(*[self.prefix + c for c in added])
+                    removed = subscribed - channels
+                    if removed:
+                        pubsub.unsubscribe(*[self.prefix + c for c in removed])
+                    subscribed = channels
+                    message = pubsub.get_message(timeout=self.poll_seconds)
+                    if message is None or message["type"] != "message":
+                        continue
+                    channel = self._decode(message["channel"])[len(self.prefix) :]
+                    self.broker.dispatch(channel, self._decode(message["data"]))
+            except Exception as e:
+                logger.warning("Lost connection for live updates: %s" % e)
+                self._stop.wait(1)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+
+def _publish(channels, event, data):
+    try:
+        backend = get_backend()
+        channels = [channel for channel in channels if backend.has_listeners(channel)]
+        if not channels:
+            return
+        if callable(data):
+            data = data()
+            if data is None:
+                return
+        message = format_message(event, data)
+        for channel in channels:
+            backend.publish(channel, message)
+    except Exception as e:
+        # Live updates are only a convenience, they shouldn't break the client endpoints
+        logger.warning("Failed to publish live update: %s" % e)
+
+
+def publish(channels, event, data):
+    """
+    Sends a message to the streams on the channels once the
+    current transaction is committed, so that pages that then
+    ask the server for the current state will see it.
+    Input:
+      channels[list[str]]: The channels to send to
+      event[str]: Name of the event
+      data[dict or callable]: Data of the event. If it is callable then it is
+        only called if the message might be seen. It can return None to
+        not send anything.
+    """
+    if enabled():
+        transaction.on_commit(lambda: _publish(channels, event, data))
+
+
+def publish_output(step_result, offset):
+    """
+    Sends the output that was added to a running step.
+    Input:
+      step_result[models.StepResult]: The step that got output
+      offset[int]: The output tail offset before the output was added
+    """
+
+    def data():
+        output, end = step_result.clean_output_since(offset)
+        if output is None or end == offset:
+            return None
+        if len(output) > settings.LIVE_UPDATES_MAX_OUTPUT:
+            # Too much to push. The page gets it like it does when polling.
+            output = None
+        return {"id": step_result.pk, "start": offset, "offset": end, "output": output}
+
+    publish([job_channel(step_result.job_id)], "output", data)
+
+
+def publish_status(job, step_result=None):
+    """
+    Sends the status of a job, and optionally one of its steps,
+    to the job and event pages.
+    """
+    data = {
+        "job_id": job.pk,
+        "status": job.status_slug(),
+        "complete": job.complete,
+    }
+    if step_result is not None:
+        data["step"] = {
+            "id": step_result.pk,
+            "status": step_result.status_slug(),
+            "complete": step_result.complete,
+        }
+    publish([job_channel(job.pk), event_channel(job.event_id)], "status", data)
+
+
+def stream(channels):
+    """
+    Generates an event stream of the messages published to channels.
+    A comment is sent when there haven't been any messages for a while
+    so that proxies keep the connection open and closed connections
+    are noticed. The stream ends after LIVE_UPDATES_MAX_STREAM_SECONDS
+    and the browser reconnects.
+    Input:
+      channels[list[str]]: The channels to get messages from
+    Return:
+      generator of str
+    """
+    subscription = get_backend().subscribe(channels)
+    try:
+        yield "retry: %d\n\n" % settings.LIVE_UPDATES_RETRY
+        end = time.time() + settings.LIVE_UPDATES_MAX_STREAM_SECONDS
+        while True:
+            remaining = end - time.time()
+            if remaining <= 0:
+                break
+            messages = subscription.get(min(remaining, settings.LIVE_UPDATES_KEEPALIVE))
+            if messages:
+                yield "".join(messages)
+            else:
+                yield ": keepalive\n\n"
+    finally:
+        subscription.close()
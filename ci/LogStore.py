@@ -0,0 +1,108 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Content addressed file store for the output of completed steps.
+Files are stored under STEP_OUTPUT_STORE_DIR by the SHA256 of their
+contents so the database only needs to keep the digest. Output is
+read with seeks so that only the requested part of a log is loaded.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from django.conf import settings
+import hashlib
+import os
+import tempfile
+
+
+def enabled():
+    return bool(settings.STEP_OUTPUT_STORE_DIR)
+
+
+def path(digest):
+    """
+    Input:
+      digest[str]: SHA256 hex digest of the contents
+    Return:
+      str: Path to the file. The first 4 characters are used as
+        subdirectories so that directories don't get too big.
+    """
+    return os.path.join(settings.STEP_OUTPUT_STORE_DIR, digest[:2], digest[2:4], digest)
+
+
+def store(output):
+    """
+    Writes output to the store. If the same output is already
+    stored then nothing is written.
+    Input:
+      output[str]: The output
+    Return:
+      tuple(str, int): The digest and the size of the file in bytes
+    """
+    data = output.encode("utf-8", "replace")
+    digest = hashlib.sha256(data).hexdigest()
+    fname = path(digest)
+    if not os.path.exists(fname):
+        dirname = os.path.dirname(fname)
+        os.makedirs(dirname, exist_ok=True)
+        # Write to a temporary file first so that readers never see a partial file
+        fd, tmp_name = tempfile.mkstemp(dir=dirname, prefix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_name, fname)
+        except Exception:
+            os.unlink(tmp_name)
+            raise
+    return digest, len(data)
+
+
+def size(digest):
+    """
+    Return:
+      int: Size of the stored file in bytes
+    """
+    return os.path.getsize(path(digest))
+
+
+def read_range(digest, offset=0, length=None):
+    """
+    Reads part of a stored file.
+    Input:
+      digest[str]: Digest returned by store()
+      offset[int]: Byte offset to start reading at. Negative offsets are from the end.
+      length[int]: Maximum number of bytes to read. None reads to the end.
+    Return:
+      bytes: The data read
+    """
+    with open(path(digest), "rb") as f:
+        if offset < 0:
+            f.seek(0, os.SEEK_END)
+            offset = max(f.tell() + offset, 0)
+        f.seek(offset)
+        if length is None:
+            return f.read()
+        return f.read(length)
+
+
+def iter_lines(digest):
+    """
+    Generator over the lines in a stored file, without
+    loading the whole file.
+    Yields:
+      str: Each line, including the line ending
+    """
+    with open(path(digest), "rb") as f:
+        for line in f:
+            yield line.decode("utf-8", "replace")
@@ -0,0 +1,162 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Converts step output with terminal color codes to HTML.
+Converted output is kept in an LRU cache in each server process so
+that the same output isn't converted again for every page view.
+The output of a running step can be converted a piece at a time,
+carrying the terminal state over from one piece to the next.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from django.conf import settings
+from collections import OrderedDict
+import ansi2html
+import re
+import threading
+
+# Codes that change the colors and styles
+SGR_RE = re.compile("\033\\[([\\d;:]*)m")
+# Codes at the start of a piece of output
+LEADING_SGR_RE = re.compile("(\033\\[[\\d;:]*m)+")
+# A code that was split at the end of a piece of output
+PARTIAL_CODE_RE = re.compile("\033(\\[[\\d;:]*)?$")
+# Number of codes carried over to the next piece of output.
+# Codes before a reset don't matter so this is rarely reached.
+MAX_STATE_CODES = 32
+
+
+def _next_codes(codes, text):
+    """
+    The codes that need to be applied to get the terminal state at the end of text.
+    Input:
+      codes[tuple(str)]: The parameters of the codes for the state at the start of text
+      text[str]: The output
+    Return:
+      tuple(str): The parameters of the codes since the last reset
+    """
+    codes = list(codes)
+    for match in SGR_RE.finditer(text):
+        params = match.group(1)
+        if params in ("", "0"):
+            codes = []
+        elif params.startswith("0;"):
+            codes = [params]
+        else:
+            codes.append(params)
+    return tuple(codes[-MAX_STATE_CODES:])
+
+
+def render(text, state=None):
+    """
+    Converts output to HTML.
+    Input:
+      text[str]: The output
+      state[tuple]: State returned by converting the output that came before text.
+        None if text is the start of the output.
+    Return:
+      tuple(str, tuple): The HTML and the state at the end of text
+    """
+    codes, pending = state if state is not None else ((), "")
+    text = pending + text
+    match = PARTIAL_CODE_RE.search(text)
+    if match:
+        # Wait for the rest of the code
+        pending = match.group(0)
+        text = text[: match.start()]
+    else:
+        pending = ""
+    new_state = (_next_codes(codes, text), pending)
+    if not text:
+        return "", new_state
+
+    if codes:
+        # All in one code, along with any that text starts with,
+        # so that there is only one span for them
+        params = list(codes)
+        leading = LEADING_SGR_RE.match(text)
+        if leading:
+            params += SGR_RE.findall(leading.group(0))
+            text = text[leading.end() :]
+        text = "\033[%sm%s" % (";".join(params), text)
+    text = text.replace("&", "&amp;")
+    text = text.replace("<", "&lt;")
+    text = text.replace(">", "&gt;")
+    text = text.replace("\n", "<br/>")
+    # The converter keeps what it is working on so each call needs its own
+    conv = ansi2html.Ansi2HTMLConverter(escaped=False, scheme="xterm")
+    return conv.convert(text, full=False), new_state
+
+
+class RenderCache(object):
+    """
+    Least recently used cache of converted output.
+    Limited by the total length of the values.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, size):
+        """
+        Input:
+          key: Hashable key
+          value: Value to store
+          size[int]: What value counts against OUTPUT_RENDER_CACHE_SIZE
+        """
+        max_size = settings.OUTPUT_RENDER_CACHE_SIZE
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            # Don't let one huge log push out everything else
+            if max_size <= 0 or size > max_size // 4:
+                return
+            self._entries[key] = (value, size)
+            self._size += size
+            while self._size > max_size:
+                old_key, old = self._entries.popitem(last=False)
+                self._size -= old[1]
+
+    def delete(self, key):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size(self):
+        return self._size
+
+
+cache = RenderCache()
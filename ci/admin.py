@@ -115,7 +115,7 @@ class PullRequestAdmin(admin.ModelAdmin):
 
 class StepResultInline(admin.TabularInline):
     model = models.StepResult
-    exclude = ["output", "position"]
+    exclude = ["output_data", "output_length", "legacy_output", "position"]
     readonly_fields = [
         "name",
         "filename",
@@ -189,7 +189,8 @@ class StepEnvironmentAdmin(admin.ModelAdmin):
 class StepResultAdmin(admin.ModelAdmin):
     search_fields = ["filename", "name"]
     list_display = ["result_display"]
-    readonly_fields = ["output"]
+    exclude = ["output_data", "legacy_output"]
+    readonly_fields = ["output", "output_length"]
 
     def result_display(self, obj):
         return "%s: %s : %s" % (obj.job.recipe.filename, obj.job.pk, obj.name)
@@ -20,7 +20,7 @@ from django.utils.html import escape
 from ci.tests import utils
 from mock import patch
 from ci.github import api
-from ci import models, Permissions
+from ci import models, Permissions, Dashboard
 from ci.tests import DBTester
 from django.test import override_settings
 
@@ -106,6 +106,139 @@ class Tests(DBTester.DBTester):
             response = self.client.get(url)
             self.assertEqual(response.status_code, 403)
 
+    @patch.object(api.GitHubAPI, "is_collaborator")
+    @override_settings(PERMISSION_CACHE_TIMEOUT=0)
+    def test_step_output_tail(self, mock_is_collaborator):
+        mock_is_collaborator.return_value = False
+        url = reverse("ci:ajax:step_output_tail")
+        # no parameters
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 400)
+
+        result = utils.create_step_result()
+        recipe = result.job.recipe
+        recipe.private = False
+        recipe.save()
+        repo = recipe.repository
+        repo.active = True
+        repo.save()
+        response = self.client.get(url, {"result_id": result.pk, "offset": "bad"})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(url, {"result_id": 0, "offset": 0})
+        self.assertEqual(response.status_code, 404)
+
+        # Nothing yet
+        data = {"result_id": result.pk, "offset": 0}
+        response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        json_data = response.json()
+        self.assertEqual(json_data["output"], "")
+        self.assertEqual(json_data["offset"], 0)
+        self.assertFalse(json_data["reset"])
+        self.assertFalse(json_data["complete"])
+
+        result.append_output("foo <\n", offset=0)
+        result.append_output("bar\n", offset=6)
+        response = self.client.get(url, data)
+        json_data = response.json()
+        self.assertEqual(json_data["output"], "foo &lt;<br/>bar<br/>")
+        self.assertEqual(json_data["offset"], 10)
+        self.assertFalse(json_data["reset"])
+
+        # Only the new output
+        result.append_output("baz\n", offset=10)
+        data["offset"] = json_data["offset"]
+        json_data = self.client.get(url, data).json()
+        self.assertEqual(json_data["output"], "baz<br/>")
+        self.assertEqual(json_data["offset"], 14)
+
+        # Output that was removed for being over budget
+        result.append_output("end\n", offset=100)
+        data["offset"] = json_data["offset"]
+        json_data = self.client.get(url, data).json()
+        self.assertIn("86", json_data["output"])
+        self.assertTrue(json_data["output"].endswith("end<br/>"))
+        self.assertEqual(json_data["offset"], 104)
+
+        # Nothing new
+        data["offset"] = json_data["offset"]
+        json_data = self.client.get(url, data).json()
+        self.assertEqual(json_data["output"], "")
+        self.assertEqual(json_data["offset"], 104)
+
+        # Once the step is complete all of the output is sent
+        result.output = "all the output\n"
+        result.complete = True
+        result.save()
+        json_data = self.client.get(url, data).json()
+        self.assertTrue(json_data["reset"])
+        self.assertTrue(json_data["complete"])
+        self.assertEqual(json_data["output"], "all the output<br/>")
+        self.assertEqual(json_data["offset"], 0)
+
+        # Same permissions as the rest of the results
+        result.job.recipe.private = True
+        result.job.recipe.save()
+        response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 403)
+        mock_is_collaborator.return_value = True
+        utils.simulate_login(self.client.session, utils.get_test_user())
+        response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        with patch.object(models.Repository, "public") as mock_public:
+            mock_public.return_value = False
+            mock_is_collaborator.return_value = False
+            response = self.client.get(url, data)
+            self.assertEqual(response.status_code, 403)
+
+    @patch.object(api.GitHubAPI, "is_collaborator")
+    @override_settings(PERMISSION_CACHE_TIMEOUT=0, LIVE_UPDATES_MAX_STREAM_SECONDS=0)
+    def test_live_update_streams(self, mock_is_collaborator):
+        mock_is_collaborator.return_value = False
+        job = utils.create_job()
+        job.recipe.private = False
+        job.recipe.save()
+        repo = job.recipe.repository
+        repo.active = True
+        repo.save()
+        job_url = reverse("ci:ajax:job_stream", args=[job.pk])
+        event_url = reverse("ci:ajax:event_stream", args=[job.event.pk])
+
+        # The pages poll instead
+        with self.settings(LIVE_UPDATES_ENABLED=False):
+            response = self.client.get(job_url)
+            self.assertEqual(response.status_code, 404)
+            response = self.client.get(event_url)
+            self.assertEqual(response.status_code, 404)
+
+        with self.settings(LIVE_UPDATES_ENABLED=True):
+            response = self.client.get(reverse("ci:ajax:job_stream", args=[0]))
+            self.assertEqual(response.status_code, 404)
+            response = self.client.get(reverse("ci:ajax:event_stream", args=[0]))
+            self.assertEqual(response.status_code, 404)
+
+            for url in [job_url, event_url]:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response["Content-Type"], "text/event-stream")
+                self.assertEqual(response["Cache-Control"], "no-cache")
+                content = b"".join(response.streaming_content)
+                self.assertEqual(content, b"retry: 3000\n\n")
+
+            # Output is only streamed to those that can see the results
+            job.recipe.private = True
+            job.recipe.save()
+            response = self.client.get(job_url)
+            self.assertEqual(response.status_code, 403)
+            response = self.client.get(event_url)
+            self.assertEqual(response.status_code, 200)
+            b"".join(response.streaming_content)
+
+            with patch.object(models.Repository, "public") as mock_public:
+                mock_public.return_value = False
+                response = self.client.get(event_url)
+                self.assertEqual(response.status_code, 403)
+
     @override_settings(PERMISSION_CACHE_TIMEOUT=0)
     def test_event_update(self):
         ev = utils.create_event()
@@ -133,7 +266,9 @@ class Tests(DBTester.DBTester):
             response = self.client.get(url)
             self.assertEqual(response.status_code, 403)
 
+    @override_settings(DASHBOARD_MIN_REFRESH_INTERVAL=0)
     def test_main_update(self):
+        utils.use_shared_cache(self)
         url = reverse("ci:ajax:main_update")
         # no parameters
         response = self.client.get(url)
@@ -177,6 +312,66 @@ class Tests(DBTester.DBTester):
         )
         self.assertEqual(pr_closed.pk, json_data["closed"][0]["id"])
 
+        # Nothing changed since the last update
+        data["version"] = json_data["version"]
+        with self.assertNumQueries(0):
+            response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        json_data = response.json()
+        self.assertTrue(json_data["unchanged"])
+        self.assertEqual(json_data["repo_status"], [])
+        self.assertEqual(json_data["last_request"], 10)
+        self.assertEqual(json_data["version"], data["version"])
+
+        pr_open.title = "New title"
+        with self.captureOnCommitCallbacks(execute=True):
+            pr_open.save()
+        response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        json_data = response.json()
+        self.assertNotIn("unchanged", json_data)
+        self.assertGreater(json_data["version"], data["version"])
+        self.assertIn("New title", json_data["repo_status"][0]["prs"][0]["description"])
+
+        # The next update gets what changed after the snapshot was built
+        snapshot = Dashboard.get_snapshot()
+        self.assertEqual(json_data["version"], snapshot["version"])
+        self.assertLessEqual(json_data["last_request"], snapshot["built"])
+
+        # The snapshot isn't rebuilt right away
+        pr_open.title = "Newer title"
+        with self.captureOnCommitCallbacks(execute=True):
+            pr_open.save()
+        data["version"] = json_data["version"]
+        data["last_request"] = json_data["last_request"]
+        with self.settings(DASHBOARD_MIN_REFRESH_INTERVAL=60):
+            response = self.client.get(url, data)
+        json_data = response.json()
+        self.assertTrue(json_data["unchanged"])
+        self.assertEqual(json_data["last_request"], data["last_request"])
+
+        response = self.client.get(url, data)
+        json_data = response.json()
+        self.assertGreater(json_data["version"], data["version"])
+        self.assertIn(
+            "Newer title", json_data["repo_status"][0]["prs"][0]["description"]
+        )
+
+        # Without a shared cache there is no version to compare against
+        local = {
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+        }
+        with self.settings(CACHES=local):
+            data["version"] = "None"
+            response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        json_data = response.json()
+        self.assertNotIn("unchanged", json_data)
+        self.assertIsNone(json_data["version"])
+        self.assertIn(
+            "Newer title", json_data["repo_status"][0]["prs"][0]["description"]
+        )
+
     @patch.object(api.GitHubAPI, "is_collaborator")
     @patch.object(Permissions, "is_allowed_to_see_clients")
     @override_settings(PERMISSION_CACHE_TIMEOUT=0)
@@ -239,6 +434,12 @@ class Tests(DBTester.DBTester):
         self.assertEqual(step_result.job.pk, json_data["job_info"]["id"])
         self.assertEqual(step_result.pk, json_data["results"][0]["id"])
         self.assertEqual(json_data["job_info"]["client_name"], client.name)
+        self.assertIn("output", json_data["results"][0])
+
+        # The job page gets the output separately
+        response = self.client.get(url, dict(data, output=0))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("output", response.json()["results"][0])
 
         # should work now but return no results since nothing has changed
         data["last_request"] = json_data["last_request"] + 10
@@ -20,12 +20,17 @@ app_name = "ajax"
 
 urlpatterns = [
     re_path(r"^result_output/", views.get_result_output, name="get_result_output"),
+    re_path(r"^step_output_tail/", views.step_output_tail, name="step_output_tail"),
     re_path(r"^main_update/", views.main_update, name="main_update"),
     re_path(r"^main_update_html/", views.main_update_html, name="main_update_html"),
     re_path(r"^pr_update/(?P<pr_id>[0-9]+)/$", views.pr_update, name="pr_update"),
     re_path(
         r"^event_update/(?P<event_id>[0-9]+)/$", views.event_update, name="event_update"
     ),
+    re_path(
+        r"^event_stream/(?P<event_id>[0-9]+)/$", views.event_stream, name="event_stream"
+    ),
+    re_path(r"^job_stream/(?P<job_id>[0-9]+)/$", views.job_stream, name="job_stream"),
     re_path(r"^job_results/", views.job_results, name="job_results"),
     re_path(r"^job_results_html/", views.job_results_html, name="job_results_html"),
     re_path(r"^repo_update/", views.repo_update, name="repo_update"),
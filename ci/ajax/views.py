@@ -14,12 +14,25 @@
 
 from __future__ import unicode_literals, absolute_import
 from django.utils import timezone
-from django.http import JsonResponse, HttpResponseBadRequest, HttpResponseForbidden
+from django.http import (
+    Http404,
+    JsonResponse,
+    HttpResponseBadRequest,
+    HttpResponseForbidden,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, render
 from django.urls import reverse
 from ci import models, views
 import datetime
-from ci import Permissions, TimeUtils, EventsStatus, RepositoryStatus
+from ci import (
+    Permissions,
+    TimeUtils,
+    EventsStatus,
+    RepositoryStatus,
+    LiveUpdates,
+    Dashboard,
+)
 import logging
 
 logger = logging.getLogger("ci")
@@ -42,6 +55,51 @@ def get_result_output(request):
     return JsonResponse({"contents": result.clean_output()})
 
 
+def step_output_tail(request):
+    """
+    Returns the output of a step that was added after an offset, so that
+    the job page doesn't need to get all the output of a running step every time.
+    GET parameters:
+      result_id: The pk of the StepResult
+      offset: The offset returned by the last request, or from the job page
+    If the offset can't be used, like when the step has completed, then
+    "reset" is true and "output" has all of the output.
+    """
+    if "result_id" not in request.GET or "offset" not in request.GET:
+        return HttpResponseBadRequest("Missing parameters")
+    try:
+        offset = int(request.GET["offset"])
+    except ValueError:
+        return HttpResponseBadRequest("Bad offset")
+
+    q = models.StepResult.objects.select_related("job__recipe__repository")
+    result = get_object_or_404(q, pk=request.GET["result_id"])
+
+    if not Permissions.can_view_repo(request.session, result.job.recipe.repository):
+        return HttpResponseForbidden("Can't see repo")
+    if not Permissions.can_see_results(request.session, result.job.recipe):
+        return HttpResponseForbidden("Can't see results")
+
+    reset = offset < 0
+    output = None
+    if not reset:
+        output, offset = result.clean_output_since(offset)
+        reset = output is None
+    if reset:
+        output = result.clean_output()
+        offset = result.output_tail_offset()
+
+    return JsonResponse(
+        {
+            "id": result.pk,
+            "output": output,
+            "offset": offset,
+            "reset": reset,
+            "complete": result.complete,
+        }
+    )
+
+
 def event_update(request, event_id):
     q = models.Event.objects.select_related("base__branch__repository")
     ev = get_object_or_404(q, pk=event_id)
@@ -60,6 +118,50 @@ def event_update(request, event_id):
     return JsonResponse(ev_data)
 
 
+def event_stream_response(channels):
+    response = StreamingHttpResponse(
+        LiveUpdates.stream(channels), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    # Keep nginx from buffering the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def job_stream(request, job_id):
+    """
+    Server-Sent Events stream of the output and status changes of a job.
+    The job page falls back to polling if this isn't available.
+    """
+    if not LiveUpdates.enabled():
+        raise Http404("Live updates are disabled")
+
+    q = models.Job.objects.select_related("recipe__repository")
+    job = get_object_or_404(q, pk=job_id)
+    if not Permissions.can_view_repo(request.session, job.recipe.repository):
+        return HttpResponseForbidden("Can't see repo")
+    if not Permissions.can_see_results(request.session, job.recipe):
+        return HttpResponseForbidden("Can't see results")
+
+    return event_stream_response([LiveUpdates.job_channel(job.pk)])
+
+
+def event_stream(request, event_id):
+    """
+    Server-Sent Events stream of the status changes of the jobs of an event.
+    The event page falls back to polling if this isn't available.
+    """
+    if not LiveUpdates.enabled():
+        raise Http404("Live updates are disabled")
+
+    q = models.Event.objects.select_related("base__branch__repository")
+    ev = get_object_or_404(q, pk=event_id)
+    if not Permissions.can_view_repo(request.session, ev.base.repo()):
+        return HttpResponseForbidden("Can't see repo")
+
+    return event_stream_response([LiveUpdates.event_channel(ev.pk)])
+
+
 def pr_update(request, pr_id):
     q = models.PullRequest.objects.select_related("repository")
     pr = get_object_or_404(q, pk=pr_id)
@@ -93,6 +195,28 @@ def main_update(request):
     this_request = TimeUtils.get_local_timestamp()
     limit = int(request.GET["limit"])
     last_request = int(float(request.GET["last_request"]))  # in case it has decimals
+    version = None
+    served = Dashboard.served()
+    if served is not None:
+        # Get what changed after the snapshot was built on the next update
+        version, built = served
+        this_request = min(this_request, built)
+    if version is not None and request.GET.get("version") == str(version):
+        # Nothing on the main page has changed since the last update.
+        # Keep the same last_request so that the next update still
+        # gets everything since then.
+        return JsonResponse(
+            {
+                "repo_status": [],
+                "closed": [],
+                "last_request": last_request,
+                "events": [],
+                "limit": limit,
+                "version": version,
+                "unchanged": True,
+            }
+        )
+
     dt = timezone.localtime(
         timezone.make_aware(datetime.datetime.utcfromtimestamp(last_request))
     )
@@ -115,6 +239,7 @@ def main_update(request):
             "last_request": this_request,
             "events": einfo,
             "limit": limit,
+            "version": version,
         }
     )
 
@@ -237,10 +362,12 @@ def job_results(request):
             )
 
     result_info = []
+    # The job page gets the output with step_output_tail instead
+    include_output = request.GET.get("output", "1") != "0"
 
-    for result in job.step_results.all():
-        if dt > result.last_modified:
-            continue
+    results = [r for r in job.step_results.all() if dt <= r.last_modified]
+    models.StepResult.load_output_lengths(results)
+    for result in results:
         exit_status = ""
         if result.complete:
             exit_status = result.exit_status
@@ -249,12 +376,13 @@ def job_results(request):
             "name": result.name,
             "runtime": str(result.seconds),
             "exit_status": exit_status,
-            "output": result.clean_output(),
             "status": result.status_slug(),
             "running": result.status != models.JobStatus.NOT_STARTED,
             "complete": result.complete,
             "output_size": result.output_size(),
         }
+        if include_output:
+            info["output"] = result.clean_output()
         result_info.append(info)
 
     return JsonResponse(
@@ -0,0 +1,59 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals, absolute_import
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+
+# Cache backends that only live in one process
+LOCAL_CACHE_BACKENDS = [
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+]
+
+
+def shared_cache():
+    """
+    Return:
+      bool: Whether the default cache is shared by all the server processes
+    """
+    backend = caches["default"].__class__
+    return "%s.%s" % (backend.__module__, backend.__name__) not in LOCAL_CACHE_BACKENDS
+
+
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Some settings only work when all the server processes see the same cache.
+    """
+    if shared_cache():
+        return []
+    errors = []
+    if settings.GET_JOB_UPDATE_INTERVAL > 0:
+        errors.append(
+            checks.Warning(
+                "GET_JOB_UPDATE_INTERVAL is set but the cache is not shared between processes",
+                hint="Jobs made ready by other processes won't be handed out until the ready job index is checked. Set GET_JOB_UPDATE_INTERVAL to 0 or configure a shared cache like redis.",
+                id="ci.W001",
+            )
+        )
+    if settings.GET_JOB_LONG_POLL_MAX_WAIT > 0:
+        errors.append(
+            checks.Warning(
+                "GET_JOB_LONG_POLL_MAX_WAIT is set but the cache is not shared between processes",
+                hint="Waiting clients won't be woken up for jobs made ready by other processes. Set GET_JOB_LONG_POLL_MAX_WAIT to 0 or configure a shared cache like redis.",
+                id="ci.W002",
+            )
+        )
+    return errors
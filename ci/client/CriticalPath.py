@@ -0,0 +1,158 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Estimates how long it will take to finish the jobs that are waiting
+on a job in an event. Jobs at the start of a long dependency chain
+should be started first so that the event finishes sooner.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from ci import models
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg
+from django.utils import timezone
+from datetime import timedelta
+
+# Key in the cache that holds the historical run time of each recipe
+RECIPE_DURATIONS_KEY = "recipe_durations"
+
+
+def _event_cache_key(event_id):
+    return "critical_path:event:%s" % event_id
+
+
+def longest_paths(durations, depends_on):
+    """
+    Computes the length of the longest chain of dependents starting at each node.
+    Input:
+      durations[dict]: node => seconds that the node takes to run
+      depends_on[dict]: node => list of nodes that it depends on
+    Return:
+      dict: node => seconds to run the node and the longest chain of nodes that depend on it
+    """
+    dependents = {node: [] for node in durations.keys()}
+    for node, deps in depends_on.items():
+        for dep in deps:
+            if dep in dependents and dep != node:
+                dependents[dep].append(node)
+
+    paths = {}
+
+    def visit(node, visiting):
+        if node in paths:
+            return paths[node]
+        visiting.add(node)
+        longest = 0
+        for dependent in dependents[node]:
+            # A cycle shouldn't happen but don't recurse forever if it does
+            if dependent not in visiting:
+                longest = max(longest, visit(dependent, visiting))
+        visiting.discard(node)
+        paths[node] = durations[node] + longest
+        return paths[node]
+
+    for node in durations.keys():
+        visit(node, set())
+    return paths
+
+
+def recipe_durations():
+    """
+    Gets the average run time of each recipe over the last RECIPE_DURATION_WINDOW days.
+    Recipes are identified by their filename since a new Recipe record
+    is created every time the recipes are loaded.
+    Return:
+      dict: {"recipes": {filename: seconds}, "default": seconds for recipes that haven't run}
+    """
+    durations = cache.get(RECIPE_DURATIONS_KEY)
+    if durations is not None:
+        return durations
+
+    cutoff = timezone.now() - timedelta(days=settings.RECIPE_DURATION_WINDOW)
+    rows = (
+        models.Job.objects.filter(
+            complete=True,
+            last_modified__gte=cutoff,
+            status__in=[
+                models.JobStatus.SUCCESS,
+                models.JobStatus.FAILED,
+                models.JobStatus.FAILED_OK,
+            ],
+        )
+        .order_by()
+        .values("recipe__filename")
+        .annotate(avg=Avg("seconds"))
+    )
+    recipes = {}
+    for row in rows:
+        recipes[row["recipe__filename"]] = (
+            row["avg"].total_seconds() if row["avg"] else 0
+        )
+    default = sum(recipes.values()) / len(recipes) if recipes else 0
+    durations = {"recipes": recipes, "default": default}
+    cache.set(RECIPE_DURATIONS_KEY, durations, settings.RECIPE_DURATION_CACHE_TIMEOUT)
+    return durations
+
+
+def _compute_event_paths(event_id):
+    """
+    Input:
+      event_id[int]: models.Event pk
+    Return:
+      dict: job pk => critical path length in seconds
+    """
+    jobs = list(
+        models.Job.objects.filter(event_id=event_id, active=True).values_list(
+            "pk", "recipe_id", "recipe__filename"
+        )
+    )
+    # Dependencies between jobs in an event are by recipe filename,
+    # see Event.get_job_depends_on()
+    recipe_files = {recipe_id: filename for pk, recipe_id, filename in jobs}
+    depends_on = {}
+    deps = models.Recipe.depends_on.through.objects.filter(
+        from_recipe_id__in=recipe_files.keys()
+    ).values_list("from_recipe_id", "to_recipe__filename")
+    for recipe_id, dep_filename in deps:
+        depends_on.setdefault(recipe_files[recipe_id], []).append(dep_filename)
+
+    history = recipe_durations()
+    durations = {}
+    for filename in recipe_files.values():
+        durations[filename] = history["recipes"].get(filename, history["default"])
+    paths = longest_paths(durations, depends_on)
+    return {pk: paths[filename] for pk, recipe_id, filename in jobs}
+
+
+def critical_path(job):
+    """
+    Estimated number of seconds to run a job and the longest chain
+    of jobs in its event that depend on it.
+    Results are cached for each event for RECIPE_DURATION_CACHE_TIMEOUT seconds.
+    Input:
+      job[models.Job]: The job
+    Return:
+      int: seconds
+    """
+    if not settings.READY_JOB_CRITICAL_PATH:
+        return 0
+    key = _event_cache_key(job.event_id)
+    paths = cache.get(key)
+    if paths is None or job.pk not in paths:
+        # Jobs can be added to an event later on, like alternate recipes
+        paths = _compute_event_paths(job.event_id)
+        cache.set(key, paths, settings.RECIPE_DURATION_CACHE_TIMEOUT)
+    return int(round(paths.get(job.pk, 0)))
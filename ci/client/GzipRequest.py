@@ -0,0 +1,92 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Lets the clients send compressed request bodies to the /client/ endpoints.
+Clients only compress their requests after seeing GZIP_HEADER on
+a response so that they still work with older servers.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseBadRequest
+from io import BytesIO
+import logging
+import zlib
+
+logger = logging.getLogger("ci")
+
+# Path of the client endpoints
+CLIENT_PATH = "/client/"
+# Set on responses to the client endpoints so the client knows it can compress
+GZIP_HEADER = "X-Civet-Gzip"
+
+
+class DecompressedTooBig(Exception):
+    pass
+
+
+def decompress(body, max_size):
+    """
+    Decompresses a gzip request body.
+    Input:
+      body[bytes]: The compressed body
+      max_size[int]: Maximum number of decompressed bytes
+    Return:
+      bytes: The decompressed body
+    Raises:
+      DecompressedTooBig: If the decompressed body is over max_size
+      zlib.error: If the body isn't valid gzip
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    # Don't decompress more than we need to find out that it is too big
+    data = decompressor.decompress(body, max_size + 1)
+    if len(data) > max_size:
+        raise DecompressedTooBig()
+    if not decompressor.eof:
+        raise zlib.error("Incomplete gzip data")
+    return data
+
+
+class GzipRequestMiddleware(object):
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not request.path_info.startswith(CLIENT_PATH):
+            return self.get_response(request)
+
+        encoding = request.META.get("HTTP_CONTENT_ENCODING", "").strip().lower()
+        if encoding == "gzip":
+            max_size = settings.CLIENT_GZIP_MAX_BYTES
+            try:
+                body = decompress(request.body, max_size)
+            except DecompressedTooBig:
+                logger.warning(
+                    "Decompressed request to %s is over %s bytes"
+                    % (request.path_info, max_size)
+                )
+                return HttpResponse("Request too large", status=413)
+            except zlib.error as e:
+                logger.warning("Bad gzip request to %s: %s" % (request.path_info, e))
+                return HttpResponseBadRequest("Invalid gzip data")
+            # Make it look like the client sent the decompressed body
+            request._body = body
+            request._stream = BytesIO(body)
+            request.META["CONTENT_LENGTH"] = str(len(body))
+            del request.META["HTTP_CONTENT_ENCODING"]
+
+        response = self.get_response(request)
+        response[GZIP_HEADER] = "1"
+        return response
@@ -0,0 +1,120 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Keeps the output of steps under STEP_OUTPUT_MAX_BYTES and the output
+of a job under JOB_OUTPUT_MAX_BYTES, no matter what the client sends.
+Once a step goes over its budget the first half of the budget is kept
+along with a rolling tail of the most recent output.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from django.conf import settings
+from django.db.models import Sum, Value
+from django.db.models.functions import Least
+from ci import models
+
+
+def step_budget(step_result):
+    """
+    Number of bytes of output that a step can keep.
+    Input:
+      step_result[models.StepResult]: The step
+    Return:
+      int: The budget in bytes
+    """
+    step_max = settings.STEP_OUTPUT_MAX_BYTES
+    # Other steps can't have kept more than the step maximum
+    others = (
+        models.StepResult.objects.filter(job_id=step_result.job_id)
+        .exclude(pk=step_result.pk)
+        .aggregate(total=Sum(Least("output_bytes_seen", Value(step_max))))["total"]
+    )
+    return max(min(step_max, settings.JOB_OUTPUT_MAX_BYTES - (others or 0)), 0)
+
+
+def _decode(data):
+    # The budget can split a character so just drop partial characters
+    return data.decode("utf-8", "ignore")
+
+
+def trim_output(output, budget):
+    """
+    Keeps the start and the end of output that is over budget.
+    Input:
+      output[str]: The output
+      budget[int]: Number of bytes that can be kept
+    Return:
+      tuple(str, bool): The output and whether it was trimmed
+    """
+    data = output.encode("utf-8", "replace")
+    if len(data) <= budget:
+        return output, False
+    head = budget // 2
+    tail = budget - head
+    trimmed = _decode(data[:head]) + models.output_removed_marker(
+        len(data) - head - tail
+    )
+    if tail:
+        trimmed += _decode(data[-tail:])
+    return trimmed, True
+
+
+def append_output(step_result, output):
+    """
+    Appends live output from the client to a step, keeping the step
+    under its budget. The caller needs to save the step_result.
+    Input:
+      step_result[models.StepResult]: The step
+      output[str]: New output from the client
+    Return:
+      bool: Whether output is being removed
+    """
+    data = output.encode("utf-8", "replace")
+    start = step_result.output_bytes_seen
+    end = start + len(data)
+    step_result.output_bytes_seen = end
+
+    budget = step_budget(step_result)
+    if end <= budget:
+        step_result.append_output(output, offset=start)
+        return False
+
+    head_end = budget // 2
+    tail_start = end - (budget - head_end)
+    if start < head_end:
+        step_result.append_output(_decode(data[: head_end - start]), offset=start)
+    keep_from = max(start, head_end, tail_start)
+    if keep_from < end:
+        step_result.append_output(_decode(data[keep_from - start :]), offset=keep_from)
+    # Output that has rolled out of the tail
+    step_result.remove_output_chunks(head_end, tail_start)
+    return True
+
+
+def replace_output(step_result, output):
+    """
+    Sets all of the output of a step, like when it completes,
+    keeping the step under its budget. The caller needs to save the step_result.
+    Input:
+      step_result[models.StepResult]: The step
+      output[str]: All of the output of the step
+    Return:
+      bool: Whether output was removed
+    """
+    size = len(output.encode("utf-8", "replace"))
+    step_result.output_bytes_seen = max(step_result.output_bytes_seen, size)
+    output, trimmed = trim_output(output, step_budget(step_result))
+    step_result.output = output
+    return trimmed
@@ -24,16 +24,21 @@ def set_job_stats(job):
     failed = 0
     skipped = 0
     for s in job.step_results.all():
-        output = "\n".join(s.clean_output().split("<br/>"))
-        matches = re.findall(
-            r">(?P<passed>\d+) passed<.*, .*>(?P<skipped>\d+) skipped<.*, .*>(?P<failed>\d+) failed",
-            output,
-            flags=re.IGNORECASE,
-        )
-        for match in matches:
-            passed += int(match[0])
-            failed += int(match[2])
-            skipped += int(match[1])
+        # Go a line at a time so that large output doesn't need to be
+        # loaded all at once. Only lines that could match get converted.
+        for line in s.iter_output_lines():
+            lower = line.lower()
+            if "passed" not in lower or "skipped" not in lower or "failed" not in lower:
+                continue
+            matches = re.findall(
+                r">(?P<passed>\d+) passed<.*, .*>(?P<skipped>\d+) skipped<.*, .*>(?P<failed>\d+) failed",
+                models.terminalize_output(line),
+                flags=re.IGNORECASE,
+            )
+            for match in matches:
+                passed += int(match[0])
+                failed += int(match[2])
+                skipped += int(match[1])
     job.test_stats.all().delete()
     if passed or failed or skipped:
         models.JobTestStatistics.objects.create(
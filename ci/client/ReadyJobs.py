@@ -14,17 +14,54 @@
 
 from __future__ import unicode_literals, absolute_import
 from ci import models
-from django.db.models import F, Q
+from ci.client import CriticalPath, SchedulingPolicy
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When, Window
+from django.db.models.functions import DenseRank
+from datetime import datetime
+import bisect
+import contextlib
+import hashlib
+import heapq
+import logging
+import threading
+import time
 
+logger = logging.getLogger("ci")
 
-def get_ready_jobs():
+# Key in the cache that holds the metadata for the ready job index
+READY_JOB_INDEX_KEY = "ready_job_index"
+
+# Key in the cache that is bumped every time jobs are added to the index.
+# Long polling clients watch this to know when to look for a job again.
+READY_JOB_VERSION_KEY = "ready_job_index:version"
+
+# Used to serialize changes to the index when the cache doesn't support locking
+_local_index_lock = threading.RLock()
+
+# Wakes up long polling requests in this process when jobs are added to the index
+_ready_condition = threading.Condition()
+
+# Serializes claiming jobs on databases that don't support SKIP LOCKED
+_local_claim_lock = threading.Lock()
+
+
+def _ready_jobs_by_priority():
     jobs = (
         models.Job.objects.filter(
             complete=False, active=True, ready=True, status=models.JobStatus.NOT_STARTED
         )
         .filter(Q(recipe__client_runner_user=None))
         .select_related(
-            "config", "client", "recipe__client_runner_user", "recipe__build_user"
+            "config",
+            "client",
+            "event",
+            "recipe__client_runner_user",
+            "recipe__build_user",
+            "recipe__repository__user__server",
+            "event__base",
         )
         .order_by(
             F("prioritized").desc(nulls_last=True), "-recipe__priority", "created"
@@ -34,16 +71,756 @@ def get_ready_jobs():
     first_jobs = []
     later_jobs = []
     for job in jobs.all():
-        # Delay push jobs that are not prioritized and have no set priority
-        delay = (
-            job.event.cause == models.Event.PUSH
-            and job.prioritized is None
-            and job.recipe.priority == 0
-        )
-
-        if delay:
+        if delay_job(job):
             later_jobs.append(job)
         else:
             first_jobs.append(job)
 
     return first_jobs + later_jobs
+
+
+def get_ready_jobs():
+    """
+    Gets all the ready jobs in the order the scheduling policy would hand them out.
+    Return:
+      list[models.Job]: The ready jobs
+    """
+    entries = []
+    for job in _ready_jobs_by_priority():
+        entry = job_entry(job)
+        entry["job"] = job
+        entries.append(entry)
+    entries.sort(key=_entry_sort_key)
+    return [entry["job"] for entry in SchedulingPolicy.get_policy().order(entries)]
+
+
+def delay_job(job):
+    """
+    Push jobs that are not prioritized and have no set priority
+    get put behind everything else.
+    """
+    return (
+        job.event.cause == models.Event.PUSH
+        and job.prioritized is None
+        and job.recipe.priority == 0
+    )
+
+
+def is_ready_job(job):
+    """
+    Whether the job should be available to be claimed by a client.
+    This matches the filter in get_ready_jobs()
+    """
+    return (
+        not job.complete
+        and job.active
+        and job.ready
+        and job.status == models.JobStatus.NOT_STARTED
+        and job.recipe.client_runner_user_id is None
+    )
+
+
+def job_bucket(job):
+    """
+    The index bucket that a job belongs in.
+    Return:
+      tuple(str, int, str): (build config name, build key, pinned client name or None)
+    """
+    client_user = job.recipe.client_runner_user
+    if client_user is None:
+        build_key = job.recipe.build_user.build_key
+    else:
+        build_key = client_user.build_key
+    client_name = job.client.name if job.client else None
+    return (job.config.name, build_key, client_name)
+
+
+def job_sort_key(job):
+    """
+    Key used to order jobs within a bucket.
+    Jobs with the same priority go out by the oldest event. Within an
+    event the jobs that start a longer chain of dependent jobs go first.
+    """
+    prioritized = -job.prioritized.timestamp() if job.prioritized else 0
+    return (
+        delay_job(job),
+        job.prioritized is None,
+        prioritized,
+        -job.recipe.priority,
+        job.event.created.timestamp(),
+        -CriticalPath.critical_path(job),
+        job.created.timestamp(),
+        job.pk,
+    )
+
+
+def job_workspace(job):
+    """
+    What a client needs to have checked out to have a warm workspace for a job.
+    Return:
+      tuple(str, str): (repository name, base SHA)
+    """
+    return (str(job.recipe.repository), job.event.base.sha)
+
+
+def job_entry(job):
+    """
+    Entry that is stored in the index for a job.
+    The scheduling policy can add its own data to it.
+    """
+    entry = SchedulingPolicy.get_policy().entry_data(job)
+    entry.update(
+        {
+            "pk": job.pk,
+            "bucket": job_bucket(job),
+            "sort_key": job_sort_key(job),
+            "workspace": job_workspace(job),
+            "created": job.created.timestamp(),
+        }
+    )
+    return entry
+
+
+def _entry_sort_key(entry):
+    return entry["sort_key"]
+
+
+def _bucket_cache_key(generation, bucket):
+    # Config names can contain anything so hash them to get a valid cache key
+    digest = hashlib.sha1(repr(bucket).encode("utf-8")).hexdigest()
+    return "%s:%s:bucket:%s" % (READY_JOB_INDEX_KEY, generation, digest)
+
+
+def _jobs_cache_key(generation):
+    # Maps job pk to the bucket it is in so that a job can be found when it changes
+    return "%s:%s:jobs" % (READY_JOB_INDEX_KEY, generation)
+
+
+@contextlib.contextmanager
+def index_lock():
+    """
+    Serializes changes to the index. Uses the cache lock if the
+    cache supports it, otherwise a process local lock.
+    Yields:
+      bool: Whether the lock was acquired
+    """
+    if hasattr(cache, "lock"):
+        from redis.exceptions import LockError
+
+        lock = cache.lock("ready_job_index_lock", blocking_timeout=2)
+        try:
+            locked = bool(lock.acquire())
+        except LockError:
+            locked = False
+        if not locked:
+            logger.warning("Failed to acquire ready job index lock")
+        try:
+            yield locked
+        finally:
+            if locked:
+                try:
+                    lock.release()
+                except LockError:
+                    logger.warning(
+                        "Ready job index lock expired before it was released"
+                    )
+    else:
+        with _local_index_lock:
+            yield True
+
+
+def _now():
+    return datetime.now().timestamp()
+
+
+def can_skip_locked():
+    """
+    Whether the database can skip rows locked by other transactions
+    (SELECT ... FOR UPDATE SKIP LOCKED), like PostgreSQL.
+    """
+    return connection.features.has_select_for_update_skip_locked
+
+
+def use_ready_job_index():
+    """
+    Whether jobs are claimed through the ready job index.
+    Databases that support SKIP LOCKED don't need it. It also isn't used
+    when GET_JOB_UPDATE_INTERVAL is 0, since it would have to be checked
+    against the database on every claim, which is more work than reading
+    the ready jobs directly.
+    """
+    return not can_skip_locked() and settings.GET_JOB_UPDATE_INTERVAL > 0
+
+
+@contextlib.contextmanager
+def claim_lock():
+    """
+    Should be held while claiming a job.
+    When the database supports SKIP LOCKED then nothing is held
+    and clients claim jobs concurrently, each skipping the jobs
+    that are locked by the others.
+    Otherwise (like SQLite) claims are serialized within this process.
+    Claims from other processes are guarded by mark_job_claimed().
+    """
+    if can_skip_locked():
+        yield
+    else:
+        with _local_claim_lock:
+            yield
+
+
+def _claim_query():
+    return models.Job.objects.select_related(
+        "config",
+        "client",
+        "recipe__build_user",
+        "recipe__client_runner_user",
+        "recipe__repository__user__server",
+        "event__base__branch__repository__user",
+        "event__head__branch__repository__user",
+        "event__pull_request",
+    )
+
+
+def load_ready_job(job_id):
+    """
+    Loads a job from the index so that it can be claimed.
+    Input:
+      job_id[int]: models.Job pk
+    Return:
+      models.Job: The job, None if it doesn't exist
+    """
+    return _claim_query().filter(pk=job_id).first()
+
+
+def ready_jobs_query(build_config, build_keys, client_name):
+    """
+    Query for the ready jobs that a client can run, in priority order.
+    This matches the jobs in the index buckets that get_candidates() reads.
+    Input:
+      build_config[str]: The build config name
+      build_keys[list]: Build keys the client has
+      client_name[str]: Name of the client
+    Return:
+      A query on models.Job
+    """
+    delayed = Case(
+        When(
+            event__cause=models.Event.PUSH,
+            prioritized=None,
+            recipe__priority=0,
+            then=Value(1),
+        ),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    return (
+        _claim_query()
+        .filter(
+            complete=False,
+            active=True,
+            ready=True,
+            status=models.JobStatus.NOT_STARTED,
+            recipe__client_runner_user=None,
+            config__name=build_config,
+            recipe__build_user__build_key__in=build_keys,
+        )
+        .filter(Q(client=None) | Q(client__name=client_name))
+        .annotate(delayed=delayed)
+        .order_by(
+            "delayed",
+            F("prioritized").desc(nulls_last=True),
+            "-recipe__priority",
+            "created",
+        )
+    )
+
+
+def candidate_jobs_query(build_config, build_keys, client_name, per_share):
+    """
+    Query for the ready jobs that the scheduling policy chooses between.
+    These are the jobs of the first per_share (priority class, event) pairs
+    of each (repository, build user). The policy only reorders jobs within
+    a priority class, and an event's jobs are ordered by their critical path,
+    so the first per_share jobs that the policy hands out are always in here,
+    however many jobs are ready.
+    Input:
+      build_config[str]: The build config name
+      build_keys[list]: Build keys the client has
+      client_name[str]: Name of the client
+      per_share[int]: Number of (priority class, event) pairs of each share
+    Return:
+      A query on models.Job
+    """
+    rank = Window(
+        DenseRank(),
+        partition_by=[F("recipe__repository"), F("recipe__build_user")],
+        order_by=[
+            F("delayed").asc(),
+            F("prioritized").desc(nulls_last=True),
+            F("recipe__priority").desc(),
+            F("event__created").asc(),
+            F("event_id").asc(),
+        ],
+    )
+    return (
+        ready_jobs_query(build_config, build_keys, client_name)
+        .annotate(share_rank=rank)
+        .filter(share_rank__lte=per_share)
+    )
+
+
+def lock_jobs_query(job_q):
+    """
+    Locks the jobs that are still ready, skipping the jobs that are locked
+    by other transactions (SELECT ... FOR UPDATE SKIP LOCKED).
+    Nothing is locked if the database doesn't support SKIP LOCKED,
+    claim_lock() and mark_job_claimed() guard the claims then.
+    Input:
+      job_q[QuerySet]: Jobs to lock
+    Return:
+      A query on models.Job
+    """
+    job_q = job_q.filter(
+        complete=False,
+        active=True,
+        ready=True,
+        status=models.JobStatus.NOT_STARTED,
+    )
+    if not can_skip_locked():
+        return job_q
+    # Only lock the job row, the related rows can be on the nullable
+    # side of an outer join which can't be locked
+    return job_q.select_for_update(skip_locked=True, of=("self",))
+
+
+def lock_ready_jobs(build_config, build_keys, client_name, num_jobs, workspaces=None):
+    """
+    Locks ready jobs that a client can run straight from the database,
+    when the ready job index isn't used.
+    The scheduling policy orders the candidates from candidate_jobs_query()
+    and they are locked in that order until num_jobs plus
+    READY_JOB_AFFINITY_WINDOW of them are locked, so that the workspaces
+    can choose between them. Jobs that are locked by other clients are
+    skipped. The ones that aren't claimed are unlocked when the transaction ends.
+    Must be called inside a transaction.
+    Input:
+      num_jobs[int]: Number of jobs that the client wants
+      workspaces[list]: Workspaces the client has, see workspace_order()
+    Return:
+      iterator of dict: index entries, with the job in "job",
+        in the order they should be claimed
+    """
+    limit = num_jobs + max(settings.READY_JOB_AFFINITY_WINDOW, 0)
+    entries = []
+    for job in candidate_jobs_query(build_config, build_keys, client_name, limit):
+        entry = job_entry(job)
+        entry["job"] = job
+        entries.append(entry)
+    entries.sort(key=_entry_sort_key)
+    ordered = list(SchedulingPolicy.get_policy().order(entries))
+
+    locked = []
+    for start in range(0, len(ordered), limit):
+        chunk = ordered[start : start + limit]
+        job_q = models.Job.objects.filter(pk__in=[entry["pk"] for entry in chunk])
+        pks = set(lock_jobs_query(job_q).values_list("pk", flat=True))
+        locked.extend(entry for entry in chunk if entry["pk"] in pks)
+        if len(locked) >= limit:
+            break
+
+    if len(locked) < num_jobs and len(locked) < len(ordered):
+        # Other clients have the candidates locked. There might be
+        # more ready jobs after them so fall back to priority order.
+        job_q = ready_jobs_query(build_config, build_keys, client_name).exclude(
+            pk__in=[entry["pk"] for entry in ordered]
+        )
+        for job in lock_jobs_query(job_q)[: limit - len(locked)]:
+            entry = job_entry(job)
+            entry["job"] = job
+            locked.append(entry)
+    return workspace_order(locked, workspaces)
+
+
+def mark_job_claimed(job, client):
+    """
+    Atomically marks a ready job as running on a client.
+    This only succeeds if the job is still ready in the database,
+    so a job can never be handed out twice even if another process
+    claimed it after it was loaded.
+    Input:
+      job[models.Job]: Job loaded with load_ready_job() or lock_ready_jobs()
+      client[models.Client]: The client claiming the job
+    Return:
+      bool: Whether the job was claimed
+    """
+    updated = models.Job.objects.filter(
+        pk=job.pk,
+        complete=False,
+        active=True,
+        ready=True,
+        status=models.JobStatus.NOT_STARTED,
+    ).update(status=models.JobStatus.RUNNING, client=client)
+    if updated:
+        job.client = client
+        job.status = models.JobStatus.RUNNING
+        new = (job.event_id, job.status, False)
+        models.EventJobCount.move(
+            (job.event_id, models.JobStatus.NOT_STARTED, False), new
+        )
+        job._counted = new
+        models.job_state_changed()
+    return updated == 1
+
+
+def rebuild_ready_job_index():
+    """
+    Rebuilds the ready job index from the database.
+    The new index is written under a new generation so that
+    readers never see a partially built index.
+    Return:
+      dict: The index metadata
+    """
+    logger.info("Rebuilding ready job index")
+    old_index = cache.get(READY_JOB_INDEX_KEY)
+    generation = old_index["generation"] + 1 if old_index else 1
+
+    buckets = {}
+    ready_jobs = 0
+    for job in _ready_jobs_by_priority():
+        entry = job_entry(job)
+        buckets.setdefault(entry["bucket"], []).append(entry)
+        ready_jobs += 1
+
+    values = {}
+    job_buckets = {}
+    for bucket, entries in buckets.items():
+        entries.sort(key=_entry_sort_key)
+        values[_bucket_cache_key(generation, bucket)] = entries
+        for entry in entries:
+            job_buckets[entry["pk"]] = bucket
+    values[_jobs_cache_key(generation)] = job_buckets
+    cache.set_many(values, timeout=None)
+
+    index = {
+        "generation": generation,
+        "buckets": list(buckets.keys()),
+        "expires": _now() + settings.GET_JOB_UPDATE_INTERVAL / 1000,
+    }
+    cache.set(READY_JOB_INDEX_KEY, index, timeout=None)
+
+    if old_index:
+        old_keys = [
+            _bucket_cache_key(old_index["generation"], b) for b in old_index["buckets"]
+        ]
+        old_keys.append(_jobs_cache_key(old_index["generation"]))
+        cache.delete_many(old_keys)
+
+    logger.info(f"Ready job index rebuilt with {ready_jobs} ready job(s)")
+    return index
+
+
+def get_ready_job_index():
+    """
+    Gets the index metadata, building the index if it doesn't exist
+    or checking it against the database if it has expired.
+    Return:
+      dict: The index metadata
+    """
+    index = cache.get(READY_JOB_INDEX_KEY)
+    if index is None:
+        logger.info("Building ready job index as it is not yet built")
+        with index_lock():
+            return rebuild_ready_job_index()
+    if index["expires"] <= _now():
+        return check_ready_job_index(repair=True)[0]
+    return index
+
+
+def get_bucket(index, bucket):
+    return cache.get(_bucket_cache_key(index["generation"], bucket), [])
+
+
+def workspace_order(entries, workspaces):
+    """
+    Moves jobs that the client has a warm workspace for ahead of other jobs.
+    A job that is checked out at the same base SHA beats one that is just in
+    the same repository. Only jobs with the same priority class are reordered
+    and only READY_JOB_AFFINITY_WINDOW jobs are looked at. A job that was
+    created more than READY_JOB_AFFINITY_MAX_WAIT seconds ago is never passed
+    over so that jobs without a warm client don't starve.
+    Input:
+      entries[iterator of dict]: index entries, in the order they should be claimed
+      workspaces[list[tuple(str, str)]]: (repository name, base SHA) that the client has
+    Return:
+      iterator of dict: index entries
+    """
+    if not workspaces or settings.READY_JOB_AFFINITY_WINDOW <= 1:
+        yield from entries
+        return
+
+    shas = set(tuple(w) for w in workspaces)
+    repos = set(w[0] for w in workspaces)
+
+    def score(entry):
+        workspace = tuple(entry["workspace"])
+        if workspace in shas:
+            return 2
+        if workspace[0] in repos:
+            return 1
+        return 0
+
+    entries = iter(entries)
+    window = []
+    pending = None
+    while True:
+        while len(window) < settings.READY_JOB_AFFINITY_WINDOW:
+            if pending is None:
+                pending = next(entries, None)
+            if pending is None:
+                break
+            if window and SchedulingPolicy.priority_class(
+                pending
+            ) != SchedulingPolicy.priority_class(window[0]):
+                break
+            window.append(pending)
+            pending = None
+        if not window:
+            return
+
+        cutoff = _now() - settings.READY_JOB_AFFINITY_MAX_WAIT
+        if window[0]["created"] <= cutoff:
+            yield window.pop(0)
+            continue
+        best = 0
+        for i, entry in enumerate(window):
+            if score(entry) > score(window[best]):
+                best = i
+        yield window.pop(best)
+
+
+def get_candidates(index, build_config, build_keys, client_name, workspaces=None):
+    """
+    Gets the index entries that a client could run for a build config,
+    in the order that the scheduling policy hands them out, with jobs
+    that the client has a warm workspace for moved up.
+    Only the buckets matching the client are read.
+    Input:
+      index[dict]: The index metadata
+      build_config[str]: The build config name
+      build_keys[list]: Build keys the client has
+      client_name[str]: Name of the client
+      workspaces[list]: Workspaces the client has, see workspace_order()
+    Return:
+      iterator of dict: index entries
+    """
+    keys = []
+    for build_key in build_keys:
+        for client in [None, client_name]:
+            keys.append(
+                _bucket_cache_key(
+                    index["generation"], (build_config, build_key, client)
+                )
+            )
+    buckets = cache.get_many(keys)
+    entries = heapq.merge(*buckets.values(), key=_entry_sort_key)
+    return order_entries(entries, workspaces)
+
+
+def order_entries(entries, workspaces=None):
+    """
+    Orders index entries by the scheduling policy, with jobs
+    that the client has a warm workspace for moved up.
+    Input:
+      entries[iterator of dict]: index entries, sorted by their sort key
+      workspaces[list]: Workspaces the client has, see workspace_order()
+    Return:
+      iterator of dict: index entries
+    """
+    entries = SchedulingPolicy.get_policy().order(entries)
+    return workspace_order(entries, workspaces)
+
+
+def _remove_entry(generation, job_buckets, job_id):
+    """
+    Removes a job from the index, if it is there.
+    Must be called with the index lock.
+    """
+    bucket = job_buckets.pop(job_id, None)
+    if bucket is None:
+        return
+    bucket_key = _bucket_cache_key(generation, bucket)
+    entries = cache.get(bucket_key, [])
+    entries = [e for e in entries if e["pk"] != job_id]
+    cache.set(bucket_key, entries, timeout=None)
+
+
+def _add_entry(index, job_buckets, entry):
+    """
+    Adds a job entry to the index in the correct position.
+    Must be called with the index lock.
+    """
+    bucket = entry["bucket"]
+    bucket_key = _bucket_cache_key(index["generation"], bucket)
+    entries = cache.get(bucket_key, [])
+    bisect.insort(entries, entry, key=_entry_sort_key)
+    cache.set(bucket_key, entries, timeout=None)
+    job_buckets[entry["pk"]] = bucket
+    if bucket not in index["buckets"]:
+        index["buckets"].append(bucket)
+        cache.set(READY_JOB_INDEX_KEY, index, timeout=None)
+
+
+def _apply_changes(changes):
+    """
+    Input:
+      changes[list]: list of tuple(job pk, entry or None). If the entry is None then
+        the job is removed from the index.
+    """
+    with index_lock() as locked:
+        if not locked:
+            return
+        index = cache.get(READY_JOB_INDEX_KEY)
+        if index is None:
+            # Nothing to update, the index will be built from the DB when needed
+            return
+        jobs_key = _jobs_cache_key(index["generation"])
+        job_buckets = cache.get(jobs_key, {})
+        added = False
+        for job_id, entry in changes:
+            _remove_entry(index["generation"], job_buckets, job_id)
+            if entry is not None:
+                _add_entry(index, job_buckets, entry)
+                added = True
+        cache.set(jobs_key, job_buckets, timeout=None)
+
+    if added:
+        notify_ready_jobs()
+
+
+def ready_jobs_version():
+    """
+    Return:
+      int: Counter that changes every time jobs are added to the index
+    """
+    return cache.get(READY_JOB_VERSION_KEY, 0)
+
+
+def notify_ready_jobs():
+    """
+    Wakes up anything waiting in wait_for_ready_jobs()
+    """
+    try:
+        cache.incr(READY_JOB_VERSION_KEY)
+    except ValueError:
+        cache.set(READY_JOB_VERSION_KEY, 1, timeout=None)
+    with _ready_condition:
+        _ready_condition.notify_all()
+
+
+def wait_for_ready_jobs(version, timeout):
+    """
+    Waits until jobs have been added to the index.
+    Requests in this process are woken up immediately. Changes
+    made by other processes are picked up by checking the version
+    in the cache every GET_JOB_LONG_POLL_CHECK_INTERVAL seconds.
+    Input:
+      version[int]: Value of ready_jobs_version() that the caller has already seen
+      timeout[float]: Maximum number of seconds to wait
+    Return:
+      int: The current value of ready_jobs_version()
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        current = ready_jobs_version()
+        remaining = deadline - time.monotonic()
+        if current != version or remaining <= 0:
+            return current
+        with _ready_condition:
+            _ready_condition.wait(
+                min(remaining, settings.GET_JOB_LONG_POLL_CHECK_INTERVAL)
+            )
+
+
+def update_ready_jobs(jobs):
+    """
+    Updates the index with the current state of jobs.
+    Jobs that are ready get added (or moved to their proper spot) and
+    jobs that are no longer ready get removed.
+    The index is only changed once the current transaction commits.
+    Input:
+      jobs[list[models.Job]]: Jobs that have changed
+    """
+    if not use_ready_job_index():
+        # Clients read the ready jobs from the database, they just
+        # need to know when there are new ones
+        if any(is_ready_job(job) for job in jobs):
+            transaction.on_commit(notify_ready_jobs)
+        return
+    changes = []
+    for job in jobs:
+        entry = job_entry(job) if is_ready_job(job) else None
+        changes.append((job.pk, entry))
+    if changes:
+        transaction.on_commit(lambda: _apply_changes(changes))
+
+
+def update_ready_job(job):
+    update_ready_jobs([job])
+
+
+def remove_ready_job(job_id):
+    """
+    Removes a job from the index without needing to load it.
+    """
+    if not use_ready_job_index():
+        return
+    transaction.on_commit(lambda: _apply_changes([(job_id, None)]))
+
+
+def check_ready_job_index(repair=False):
+    """
+    Checks that the index matches the ready jobs in the database.
+    Input:
+      repair[bool]: If the index is inconsistent then rebuild it.
+        The expiration of the index is also refreshed.
+    Return:
+      tuple(dict, list[str]): The (possibly rebuilt) index metadata and a list of problems found
+    """
+    index = cache.get(READY_JOB_INDEX_KEY)
+    if index is None:
+        problems = ["Index is not built"]
+    else:
+        expected = {}
+        for job in _ready_jobs_by_priority():
+            expected[job.pk] = job_entry(job)
+
+        found = {}
+        problems = []
+        for bucket in index["buckets"]:
+            entries = get_bucket(index, bucket)
+            if entries != sorted(entries, key=_entry_sort_key):
+                problems.append("Bucket %s is out of order" % (bucket,))
+            for entry in entries:
+                found[entry["pk"]] = entry
+
+        for job_id, entry in expected.items():
+            if job_id not in found:
+                problems.append("Job %s is ready but not in the index" % job_id)
+            elif found[job_id] != entry:
+                problems.append("Job %s is out of date in the index" % job_id)
+        for job_id in found.keys():
+            if job_id not in expected:
+                problems.append("Job %s is in the index but not ready" % job_id)
+
+    for problem in problems:
+        logger.warning("Ready job index: %s" % problem)
+
+    if repair:
+        with index_lock():
+            if problems:
+                index = rebuild_ready_job_index()
+            else:
+                index["expires"] = _now() + settings.GET_JOB_UPDATE_INTERVAL / 1000
+                cache.set(READY_JOB_INDEX_KEY, index, timeout=None)
+    return index, problems
@@ -0,0 +1,199 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals, absolute_import
+from ci import models
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from collections import deque
+from datetime import timedelta
+import heapq
+import itertools
+import logging
+
+logger = logging.getLogger("ci")
+
+# Key in the cache that holds the recent usage of each fair share,
+# kept next to the ready job index
+FAIR_SHARE_USAGE_KEY = "ready_job_index:fair_share_usage"
+
+# Instances of the scheduling policies, by their dotted path
+_policies = {}
+
+
+def get_policy():
+    """
+    Return:
+      PriorityPolicy: The policy set by READY_JOB_SCHEDULING_POLICY
+    """
+    path = settings.READY_JOB_SCHEDULING_POLICY
+    policy = _policies.get(path)
+    if policy is None:
+        policy = import_string(path)()
+        _policies[path] = policy
+    return policy
+
+
+def priority_class(entry):
+    """
+    Jobs with the same priority class only differ in when they were created.
+    Policies are only allowed to reorder jobs within a priority class.
+    """
+    return entry["sort_key"][:4]
+
+
+class PriorityPolicy(object):
+    """
+    Hands out jobs in priority order and then oldest first.
+    This is the order of the ready job index.
+    """
+
+    def entry_data(self, job):
+        """
+        Extra information that the policy needs stored in the index entry of a job.
+        Input:
+          job[models.Job]: A ready job
+        Return:
+          dict: Merged into the index entry
+        """
+        return {}
+
+    def order(self, entries, usage=None):
+        """
+        Orders index entries to be handed out to clients.
+        Input:
+          entries[iterator of dict]: index entries, sorted by their sort key
+          usage[dict]: Recent usage to use instead of loading it from the database
+        Return:
+          iterator of dict: index entries, in the order they should be claimed
+        """
+        return entries
+
+
+class FairSharePolicy(PriorityPolicy):
+    """
+    Weighted fair share between (repository, build user) pairs.
+    Within a priority class, the next job handed out belongs to the share
+    that has used the fewest client seconds recently, relative to its weight.
+    The weight of a repository is the "fair_share_weight" repository setting.
+    """
+
+    def entry_data(self, job):
+        repo = job.recipe.repository
+        return {
+            "share": (repo.pk, job.recipe.build_user_id),
+            "weight": self.weight(repo),
+        }
+
+    def weight(self, repo):
+        """
+        Return:
+          float: The "fair_share_weight" repository setting, 1 if it isn't a number
+        """
+        value = repo.get_repo_setting("fair_share_weight", 1)
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            logger.warning(f"Invalid fair_share_weight for {repo}: {value!r}")
+            return 1.0
+
+    def charge(self):
+        """
+        Return:
+          float: Number of seconds that a share is charged for a running job
+        """
+        return float(settings.FAIR_SHARE_RUNNING_JOB_SECONDS)
+
+    def get_usage(self):
+        """
+        Gets the recent usage of each share from the database.
+        This is the time spent running jobs that finished within FAIR_SHARE_USAGE_WINDOW
+        seconds plus a charge for each job that is currently running.
+        Return:
+          dict: tuple(repository pk, build user pk) => client seconds
+        """
+        cutoff = timezone.now() - timedelta(seconds=settings.FAIR_SHARE_USAGE_WINDOW)
+        running = Q(status=models.JobStatus.RUNNING)
+        rows = (
+            models.Job.objects.filter(
+                Q(complete=True, last_modified__gte=cutoff) | running
+            )
+            .order_by()
+            .values("recipe__repository", "recipe__build_user")
+            .annotate(
+                total=Sum("seconds", filter=Q(complete=True)),
+                running=Count("pk", filter=running),
+            )
+        )
+        usage = {}
+        charge = self.charge()
+        for row in rows:
+            seconds = row["total"].total_seconds() if row["total"] else 0
+            share = (row["recipe__repository"], row["recipe__build_user"])
+            usage[share] = seconds + row["running"] * charge
+        return usage
+
+    def cached_usage(self):
+        """
+        Same as get_usage() but cached for FAIR_SHARE_USAGE_CACHE_TIMEOUT
+        seconds so that it isn't loaded on every claim.
+        """
+        usage = cache.get(FAIR_SHARE_USAGE_KEY)
+        if usage is None:
+            usage = self.get_usage()
+            cache.set(
+                FAIR_SHARE_USAGE_KEY, usage, settings.FAIR_SHARE_USAGE_CACHE_TIMEOUT
+            )
+        return usage
+
+    def order(self, entries, usage=None):
+        for key, group in itertools.groupby(entries, key=priority_class):
+            group = list(group)
+            if len(set(tuple(e["share"]) for e in group)) == 1:
+                yield from group
+                continue
+            if usage is None:
+                usage = self.cached_usage()
+            yield from self._order_group(group, usage)
+
+    def _order_group(self, group, usage):
+        """
+        Round robin between the shares in a priority class, always picking
+        the share with the lowest weighted usage. Each job handed out charges
+        its share so that a single claim doesn't take everything from one share.
+        """
+        queues = {}
+        for entry in group:
+            queues.setdefault(tuple(entry["share"]), deque()).append(entry)
+
+        def share_key(share):
+            queue = queues[share]
+            weight = queue[0]["weight"]
+            used = usage.get(share, 0)
+            ratio = used / weight if weight > 0 else float("inf")
+            return (ratio, queue[0]["sort_key"], share)
+
+        heap = [share_key(share) for share in queues.keys()]
+        heapq.heapify(heap)
+        charge = self.charge()
+        while heap:
+            share = heapq.heappop(heap)[2]
+            queue = queues[share]
+            yield queue.popleft()
+            usage[share] = usage.get(share, 0) + charge
+            if queue:
+                heapq.heappush(heap, share_key(share))
@@ -0,0 +1,311 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Replays a trace of job arrivals against a scheduling policy to see
+how long jobs from each repository would wait for a client.
+
+A trace is a dict like:
+  {
+    "weights": {"owner/repo": 2},
+    "jobs": [
+      {"arrival": 0, "duration": 600, "repository": "owner/repo", "build_user": "user",
+        "priority": 0, "delayed": False},
+      ...
+    ]
+  }
+"arrival" and "duration" are in seconds. "priority", "delayed" and "weights" are optional.
+Jobs can also have an "id", the "event" they belong to, and "depends_on" with a list of
+the ids of jobs that have to finish before they can run.
+The simulation doesn't use the database or the cache so it is deterministic.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from ci import models
+from ci.client import CriticalPath, ReadyJobs
+from django.conf import settings
+import heapq
+import math
+import random
+
+
+def record_trace(since):
+    """
+    Builds a trace from the jobs that have run.
+    Input:
+      since[datetime]: Only jobs created after this are included
+    Return:
+      dict: The trace
+    """
+    jobs = list(
+        models.Job.objects.filter(created__gte=since, complete=True)
+        .select_related(
+            "event", "recipe__build_user", "recipe__repository__user__server"
+        )
+        .prefetch_related("recipe__depends_on")
+        .order_by("created")
+    )
+    # Dependencies are by recipe filename, see Event.get_job_depends_on()
+    event_files = {}
+    for job in jobs:
+        event_files.setdefault(job.event_id, {}).setdefault(
+            job.recipe.filename, []
+        ).append(job.pk)
+
+    trace = {"weights": {}, "jobs": []}
+    start = jobs[0].created if jobs else None
+    for job in jobs:
+        repo = job.recipe.repository
+        trace["weights"][str(repo)] = repo.get_repo_setting("fair_share_weight", 1)
+        depends_on = []
+        for recipe in job.recipe.depends_on.all():
+            depends_on += event_files[job.event_id].get(recipe.filename, [])
+        trace["jobs"].append(
+            {
+                "id": job.pk,
+                "event": job.event_id,
+                "depends_on": depends_on,
+                "arrival": (job.created - start).total_seconds(),
+                "duration": job.seconds.total_seconds(),
+                "repository": str(repo),
+                "build_user": str(job.recipe.build_user),
+                "priority": job.recipe.priority,
+                "delayed": ReadyJobs.delay_job(job),
+            }
+        )
+    return trace
+
+
+def percentile(values, percent):
+    """
+    Nearest rank percentile.
+    Input:
+      values[list]: sorted values
+      percent[float]: 0-100
+    """
+    if not values:
+        return 0
+    rank = max(int(math.ceil(percent / 100.0 * len(values))), 1)
+    return values[rank - 1]
+
+
+def _entry(idx, job, weights, event_arrival, critical_path):
+    return {
+        "pk": idx,
+        "sort_key": (
+            bool(job.get("delayed", False)),
+            True,
+            0,
+            -job.get("priority", 0),
+            event_arrival,
+            -critical_path,
+            job["arrival"],
+            idx,
+        ),
+        "share": (job["repository"], job["build_user"]),
+        "weight": float(weights.get(job["repository"], 1)),
+    }
+
+
+def _usage(history, running, now, policy):
+    """
+    Usage of each share the way FairSharePolicy.get_usage() would see it.
+    """
+    cutoff = now - settings.FAIR_SHARE_USAGE_WINDOW
+    usage = {}
+    for finished, share, duration in history:
+        if finished >= cutoff:
+            usage[share] = usage.get(share, 0) + duration
+    charge = policy.charge() if hasattr(policy, "charge") else 0
+    for share in running:
+        usage[share] = usage.get(share, 0) + charge
+    return usage
+
+
+def simulate(trace, policy, num_clients, critical_path=False):
+    """
+    Runs the trace with a number of identical clients.
+    A job isn't ready until it has arrived and the jobs it depends on have finished.
+    Input:
+      trace[dict]: Trace of job arrivals
+      policy[SchedulingPolicy.PriorityPolicy]: The policy to hand out jobs with
+      num_clients[int]: Number of clients running jobs
+      critical_path[bool]: Whether jobs that start the longest chain of dependent
+        jobs go first, using the actual durations as the estimates.
+    Return:
+      tuple(dict, dict): repository => list of seconds that each job waited for a client,
+        event => seconds from the first job arriving to the last job finishing
+    """
+    jobs = sorted(trace["jobs"], key=lambda j: j["arrival"])
+    weights = trace.get("weights", {})
+    ids = {job.get("id", idx): idx for idx, job in enumerate(jobs)}
+    blocked_on = {}
+    dependents = {}
+    for idx, job in enumerate(jobs):
+        blocked_on[idx] = set(ids[d] for d in job.get("depends_on", []) if d in ids)
+        for dep in blocked_on[idx]:
+            dependents.setdefault(dep, []).append(idx)
+
+    paths = {}
+    if critical_path:
+        durations = {idx: job["duration"] for idx, job in enumerate(jobs)}
+        paths = CriticalPath.longest_paths(durations, blocked_on)
+
+    waits = {}
+    events = {}
+    ready = []
+    ready_at = {}
+    arrived = set()
+    history = []
+    # heap of (finish time, job index, share)
+    running = []
+    free = num_clients
+    next_job = 0
+    now = 0
+
+    first_arrivals = {}
+    for job in jobs:
+        if job.get("event") is not None:
+            first_arrivals.setdefault(job["event"], job["arrival"])
+
+    def make_ready(idx, when):
+        ready_at[idx] = when
+        job = jobs[idx]
+        event_arrival = first_arrivals.get(job.get("event"), job["arrival"])
+        ready.append(_entry(idx, job, weights, event_arrival, paths.get(idx, 0)))
+
+    while next_job < len(jobs) or ready or running:
+        # Move time to the next arrival or job finishing
+        times = []
+        if next_job < len(jobs):
+            times.append(jobs[next_job]["arrival"])
+        if running:
+            times.append(running[0][0])
+        if times and (not ready or free == 0):
+            now = max(now, min(times))
+
+        while running and running[0][0] <= now:
+            finished, idx, share = heapq.heappop(running)
+            history.append((finished, share, jobs[idx]["duration"]))
+            free += 1
+            event = jobs[idx].get("event")
+            if event is not None:
+                events[event] = max(events[event], finished)
+            for dependent in dependents.get(idx, []):
+                blocked_on[dependent].discard(idx)
+                if dependent in arrived and not blocked_on[dependent]:
+                    make_ready(dependent, finished)
+        while next_job < len(jobs) and jobs[next_job]["arrival"] <= now:
+            event = jobs[next_job].get("event")
+            if event is not None:
+                events.setdefault(event, jobs[next_job]["arrival"])
+            arrived.add(next_job)
+            if not blocked_on[next_job]:
+                make_ready(next_job, jobs[next_job]["arrival"])
+            next_job += 1
+
+        if not ready or free == 0:
+            continue
+
+        ready.sort(key=lambda e: e["sort_key"])
+        usage = _usage(history, [r[2] for r in running], now, policy)
+        claimed = []
+        for entry in policy.order(iter(ready), usage=usage):
+            if len(claimed) == free:
+                break
+            claimed.append(entry)
+
+        for entry in claimed:
+            job = jobs[entry["pk"]]
+            wait = now - ready_at[entry["pk"]]
+            waits.setdefault(job["repository"], []).append(wait)
+            heapq.heappush(
+                running, (now + job["duration"], entry["pk"], entry["share"])
+            )
+        free -= len(claimed)
+        claimed_pks = set(e["pk"] for e in claimed)
+        ready = [e for e in ready if e["pk"] not in claimed_pks]
+
+    event_times = {}
+    for event, finished in events.items():
+        event_times[event] = finished - first_arrivals[event]
+    return waits, event_times
+
+
+def synthetic_trace(num_events, seed=0, interval=600):
+    """
+    Builds a trace of events like a typical pull request: a chain of
+    dependent jobs along with a bunch of independent jobs.
+    The jobs in an event are created in a random order.
+    Input:
+      num_events[int]: Number of events
+      seed[int]: Seed for the random number generator
+      interval[int]: Average number of seconds between events
+    Return:
+      dict: The trace
+    """
+    rng = random.Random(seed)
+    trace = {"jobs": []}
+    arrival = 0
+    job_id = 0
+    for event in range(num_events):
+        event_jobs = []
+        previous = None
+        for i in range(rng.randint(2, 4)):
+            job = {"id": job_id, "duration": rng.randint(300, 900)}
+            if previous is not None:
+                job["depends_on"] = [previous]
+            previous = job_id
+            job_id += 1
+            event_jobs.append(job)
+        for i in range(rng.randint(3, 8)):
+            event_jobs.append({"id": job_id, "duration": rng.randint(60, 600)})
+            job_id += 1
+        rng.shuffle(event_jobs)
+        for offset, job in enumerate(event_jobs):
+            job.update(
+                {
+                    # Jobs in an event get created one after another
+                    "arrival": arrival + offset * 0.01,
+                    "event": event,
+                    "repository": "owner/repo%s" % (event % 3),
+                    "build_user": "moosebuild",
+                }
+            )
+            trace["jobs"].append(job)
+        arrival += rng.randint(interval // 2, interval * 3 // 2)
+    return trace
+
+
+def wait_report(waits):
+    """
+    Input:
+      waits[dict]: As returned by simulate()
+    Return:
+      list[dict]: Wait time percentiles (in seconds) for each repository, sorted by repository
+    """
+    report = []
+    for repo in sorted(waits.keys()):
+        values = sorted(waits[repo])
+        report.append(
+            {
+                "repository": repo,
+                "jobs": len(values),
+                "p50": percentile(values, 50),
+                "p90": percentile(values, 90),
+                "p99": percentile(values, 99),
+                "max": values[-1],
+            }
+        )
+    return report
@@ -0,0 +1,162 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals, absolute_import
+from django.test import override_settings
+from django.core.cache import cache
+from ci import models
+from ci.client import CriticalPath, ReadyJobs, SchedulingPolicy, SchedulingSimulation
+from ci.tests import DBTester, utils
+from datetime import timedelta
+
+
+@override_settings(INSTALLED_GITSERVERS=[utils.github_config()])
+class Tests(DBTester.DBTester):
+    def setUp(self):
+        super(Tests, self).setUp()
+        self.build_user = utils.create_user_with_token(name="moosebuild")
+        self.repo = utils.create_repo(name="repo", user=self.build_user)
+        # build -> test -> docs, along with an independent lint
+        self.build = self.create_recipe("build")
+        self.test = self.create_recipe("test")
+        self.docs = self.create_recipe("docs")
+        self.lint = self.create_recipe("lint")
+        self.test.depends_on.add(self.build)
+        self.docs.depends_on.add(self.test)
+        self.commit = 1000
+
+    def create_recipe(self, name):
+        return utils.create_recipe(name=name, user=self.build_user, repo=self.repo)
+
+    def create_event(self):
+        self.commit += 1
+        return utils.create_event(user=self.build_user, commit1=str(self.commit))
+
+    def create_job(self, recipe, event, ready=True):
+        job = utils.create_job(recipe=recipe, event=event)
+        utils.update_job(job, ready=ready, active=True)
+        return job
+
+    def create_history(self, recipe, seconds):
+        job = self.create_job(recipe, self.create_event())
+        job.complete = True
+        job.status = models.JobStatus.SUCCESS
+        job.seconds = timedelta(seconds=seconds)
+        job.save()
+
+    def test_longest_paths(self):
+        durations = {"a": 10, "b": 20, "c": 5, "d": 1}
+        depends_on = {"b": ["a"], "c": ["a"], "d": ["b", "c"]}
+        paths = CriticalPath.longest_paths(durations, depends_on)
+        self.assertEqual(paths, {"a": 31, "b": 21, "c": 6, "d": 1})
+
+        # A cycle doesn't recurse forever
+        paths = CriticalPath.longest_paths({"a": 1, "b": 2}, {"a": ["b"], "b": ["a"]})
+        self.assertEqual(set(paths.keys()), {"a", "b"})
+
+    def test_recipe_durations(self):
+        self.assertEqual(CriticalPath.recipe_durations(), {"recipes": {}, "default": 0})
+        cache.clear()
+        self.create_history(self.build, 100)
+        self.create_history(self.build, 200)
+        self.create_history(self.lint, 50)
+        durations = CriticalPath.recipe_durations()
+        self.assertEqual(durations["recipes"], {"build": 150, "lint": 50})
+        self.assertEqual(durations["default"], 100)
+
+        # Results are cached
+        self.create_history(self.lint, 150)
+        self.assertEqual(CriticalPath.recipe_durations(), durations)
+
+    def test_critical_path(self):
+        self.create_history(self.build, 300)
+        self.create_history(self.test, 600)
+        self.create_history(self.docs, 60)
+        self.create_history(self.lint, 120)
+
+        event = self.create_event()
+        lint = self.create_job(self.lint, event)
+        build = self.create_job(self.build, event)
+        test = self.create_job(self.test, event, ready=False)
+        docs = self.create_job(self.docs, event, ready=False)
+        self.assertEqual(CriticalPath.critical_path(build), 960)
+        self.assertEqual(CriticalPath.critical_path(test), 660)
+        self.assertEqual(CriticalPath.critical_path(docs), 60)
+        self.assertEqual(CriticalPath.critical_path(lint), 120)
+
+        # build starts the longest chain so it goes first even though lint is older
+        self.assertEqual(
+            [j.pk for j in ReadyJobs.get_ready_jobs()], [build.pk, lint.pk]
+        )
+        with self.settings(READY_JOB_CRITICAL_PATH=False):
+            self.assertEqual(CriticalPath.critical_path(build), 0)
+            self.assertEqual(
+                [j.pk for j in ReadyJobs.get_ready_jobs()], [lint.pk, build.pk]
+            )
+
+        # Jobs in older events still go first
+        new_event = self.create_event()
+        new_build = self.create_job(self.build, new_event)
+        self.assertEqual(
+            [j.pk for j in ReadyJobs.get_ready_jobs()],
+            [build.pk, lint.pk, new_build.pk],
+        )
+
+    def test_simulate(self):
+        trace = {"jobs": []}
+        for i in range(2):
+            trace["jobs"].append(
+                {
+                    "id": "lint%s" % i,
+                    "arrival": 0,
+                    "duration": 100,
+                    "event": 0,
+                    "repository": "owner/repo",
+                    "build_user": "moosebuild",
+                }
+            )
+        trace["jobs"].append(
+            {
+                "id": "build",
+                "arrival": 0,
+                "duration": 100,
+                "event": 0,
+                "repository": "owner/repo",
+                "build_user": "moosebuild",
+            }
+        )
+        trace["jobs"].append(
+            {
+                "id": "test",
+                "arrival": 0,
+                "duration": 100,
+                "event": 0,
+                "depends_on": ["build"],
+                "repository": "owner/repo",
+                "build_user": "moosebuild",
+            }
+        )
+        policy = SchedulingPolicy.PriorityPolicy()
+        waits, events = SchedulingSimulation.simulate(trace, policy, 1)
+        self.assertEqual(events, {0: 400})
+        waits, events = SchedulingSimulation.simulate(
+            trace, policy, 1, critical_path=True
+        )
+        self.assertEqual(events, {0: 400})
+        waits, events = SchedulingSimulation.simulate(trace, policy, 2)
+        self.assertEqual(events, {0: 300})
+        waits, events = SchedulingSimulation.simulate(
+            trace, policy, 2, critical_path=True
+        )
+        self.assertEqual(events, {0: 200})
@@ -0,0 +1,63 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals, absolute_import
+from django.urls import reverse
+from ci import models
+from ci.client import GzipRequest
+from ci.tests import DBTester
+import gzip
+import json
+import zlib
+
+
+class Tests(DBTester.DBTester):
+    def post(self, url, body, **extra):
+        return self.client.post(url, body, content_type="application/json", **extra)
+
+    def test_decompress(self):
+        data = b"foo" * 100
+        self.assertEqual(GzipRequest.decompress(gzip.compress(data), 300), data)
+        with self.assertRaises(GzipRequest.DecompressedTooBig):
+            GzipRequest.decompress(gzip.compress(data), 299)
+        with self.assertRaises(zlib.error):
+            GzipRequest.decompress(b"not gzip", 300)
+        with self.assertRaises(zlib.error):
+            GzipRequest.decompress(gzip.compress(data)[:20], 300)
+
+    def test_middleware(self):
+        url = reverse("ci:client:client_ping", args=["new_client"])
+        body = json.dumps({"message": "message"}).encode("utf-8")
+        response = self.post(url, gzip.compress(body), HTTP_CONTENT_ENCODING="gzip")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], "OK")
+        self.assertEqual(response[GzipRequest.GZIP_HEADER], "1")
+        self.assertEqual(models.Client.objects.filter(name="new_client").count(), 1)
+
+        # Not compressed still works
+        response = self.post(url, body)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response[GzipRequest.GZIP_HEADER], "1")
+
+        response = self.post(url, b"not gzip", HTTP_CONTENT_ENCODING="gzip")
+        self.assertEqual(response.status_code, 400)
+
+        with self.settings(CLIENT_GZIP_MAX_BYTES=10):
+            response = self.post(url, gzip.compress(body), HTTP_CONTENT_ENCODING="gzip")
+            self.assertEqual(response.status_code, 413)
+
+        # Only the client endpoints
+        response = self.client.get(reverse("ci:main"))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header(GzipRequest.GZIP_HEADER))
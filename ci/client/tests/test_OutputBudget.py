@@ -0,0 +1,106 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals, absolute_import
+from django.test import override_settings
+from ci import models
+from ci.client import OutputBudget
+from ci.tests import DBTester, utils
+
+
+@override_settings(STEP_OUTPUT_MAX_BYTES=20, JOB_OUTPUT_MAX_BYTES=30)
+class Tests(DBTester.DBTester):
+    def setUp(self):
+        super(Tests, self).setUp()
+        self.job = utils.create_job()
+        self.step_result = utils.create_step_result(job=self.job)
+
+    def append(self, output):
+        trimmed = OutputBudget.append_output(self.step_result, output)
+        self.step_result.save()
+        return trimmed
+
+    def test_step_budget(self):
+        self.assertEqual(OutputBudget.step_budget(self.step_result), 20)
+        other = utils.create_step_result(job=self.job, name="other", position=1)
+        other.output_bytes_seen = 100
+        other.save()
+        # The other step can only have kept 20 bytes
+        self.assertEqual(OutputBudget.step_budget(self.step_result), 10)
+        other2 = utils.create_step_result(job=self.job, name="other2", position=2)
+        other2.output_bytes_seen = 15
+        other2.save()
+        self.assertEqual(OutputBudget.step_budget(self.step_result), 0)
+
+    def test_trim_output(self):
+        self.assertEqual(
+            OutputBudget.trim_output("0123456789", 10), ("0123456789", False)
+        )
+        output, trimmed = OutputBudget.trim_output("0123456789abcdef", 10)
+        self.assertTrue(trimmed)
+        self.assertEqual(output, "01234" + models.output_removed_marker(6) + "bcdef")
+        # Split characters get dropped
+        output, trimmed = OutputBudget.trim_output("‘‘‘‘", 8)
+        self.assertEqual(output, "‘" + models.output_removed_marker(4) + "‘")
+        output, trimmed = OutputBudget.trim_output("abc", 0)
+        self.assertEqual(output, models.output_removed_marker(3))
+
+    def test_append_output(self):
+        self.assertFalse(self.append("0123456789"))
+        self.assertFalse(self.append("abcdefghij"))
+        self.assertEqual(self.step_result.output, "0123456789abcdefghij")
+
+        # Over budget, keep the first 10 bytes and the last 10 bytes
+        self.assertTrue(self.append("klmno"))
+        self.assertEqual(self.step_result.output_bytes_seen, 25)
+        self.assertEqual(
+            self.step_result.output,
+            "0123456789abcdefghijklmno",
+        )
+        self.assertTrue(self.append("pqrstuvwxyz"))
+        self.assertEqual(self.step_result.output_bytes_seen, 36)
+        # "abcdefghij" and "klmno" rolled out of the tail
+        self.assertEqual(
+            self.step_result.output,
+            "0123456789" + models.output_removed_marker(16) + "qrstuvwxyz",
+        )
+        self.assertEqual(self.step_result.output_chunks.count(), 2)
+
+        # A chunk bigger than the tail only keeps its end
+        self.assertTrue(self.append("A" * 5 + "B" * 10))
+        self.assertEqual(
+            self.step_result.output,
+            "0123456789" + models.output_removed_marker(31) + "B" * 10,
+        )
+        self.assertEqual(self.step_result.output_chunks.count(), 2)
+
+    def test_append_output_head(self):
+        # The first update goes past the head and the budget
+        self.assertTrue(self.append("0123456789abcdefghijklmno"))
+        self.assertEqual(
+            self.step_result.output,
+            "0123456789" + models.output_removed_marker(5) + "fghijklmno",
+        )
+
+    def test_replace_output(self):
+        self.assertFalse(OutputBudget.replace_output(self.step_result, "0123456789"))
+        self.assertEqual(self.step_result.output_bytes_seen, 10)
+        self.assertTrue(OutputBudget.replace_output(self.step_result, "0123456789" * 3))
+        self.step_result.save()
+        self.step_result.refresh_from_db()
+        self.assertEqual(self.step_result.output_bytes_seen, 30)
+        self.assertEqual(
+            self.step_result.output,
+            "0123456789" + models.output_removed_marker(10) + "0123456789",
+        )
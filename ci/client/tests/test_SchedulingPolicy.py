@@ -0,0 +1,219 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals, absolute_import
+from django.test import override_settings
+from django.core.cache import cache
+from ci import models
+from ci.client import views, ReadyJobs, SchedulingPolicy, SchedulingSimulation
+from ci.tests import DBTester, utils
+from datetime import timedelta
+
+
+@override_settings(INSTALLED_GITSERVERS=[utils.github_config()])
+@override_settings(
+    READY_JOB_SCHEDULING_POLICY="ci.client.SchedulingPolicy.FairSharePolicy",
+    FAIR_SHARE_USAGE_CACHE_TIMEOUT=0,
+)
+class Tests(DBTester.DBTester):
+    def setUp(self):
+        super(Tests, self).setUp()
+        cache.clear()
+        self.build_user = utils.create_user_with_token(name="moosebuild")
+        self.repo_a = utils.create_repo(name="repo_a", user=self.build_user)
+        self.repo_b = utils.create_repo(name="repo_b", user=self.build_user)
+        self.recipe_a = utils.create_recipe(
+            name="recipe_a", user=self.build_user, repo=self.repo_a
+        )
+        self.recipe_b = utils.create_recipe(
+            name="recipe_b", user=self.build_user, repo=self.repo_b
+        )
+        self.commit = 1000
+
+    def create_ready_job(self, recipe):
+        self.commit += 1
+        event = utils.create_event(user=self.build_user, commit1=str(self.commit))
+        job = utils.create_job(recipe=recipe, event=event)
+        utils.update_job(job, ready=True, active=True)
+        return job
+
+    def create_finished_job(self, recipe, seconds):
+        job = self.create_ready_job(recipe)
+        job.complete = True
+        job.status = models.JobStatus.SUCCESS
+        job.seconds = timedelta(seconds=seconds)
+        job.save()
+        return job
+
+    def ready_pks(self):
+        return [j.pk for j in ReadyJobs.get_ready_jobs()]
+
+    @override_settings(
+        READY_JOB_SCHEDULING_POLICY="ci.client.SchedulingPolicy.PriorityPolicy"
+    )
+    def test_priority_policy(self):
+        a0 = self.create_ready_job(self.recipe_a)
+        a1 = self.create_ready_job(self.recipe_a)
+        b0 = self.create_ready_job(self.recipe_b)
+        self.assertEqual(self.ready_pks(), [a0.pk, a1.pk, b0.pk])
+        self.assertEqual(ReadyJobs.job_entry(a0).get("share"), None)
+
+    def test_fair_share(self):
+        a0 = self.create_ready_job(self.recipe_a)
+        a1 = self.create_ready_job(self.recipe_a)
+        b0 = self.create_ready_job(self.recipe_b)
+        entry = ReadyJobs.job_entry(a0)
+        self.assertEqual(entry["share"], (self.repo_a.pk, self.build_user.pk))
+        self.assertEqual(entry["weight"], 1)
+
+        # No usage, so the shares alternate
+        self.assertEqual(self.ready_pks(), [a0.pk, b0.pk, a1.pk])
+
+        # repo_a has used more time recently
+        self.create_finished_job(self.recipe_a, 3600)
+        self.assertEqual(self.ready_pks(), [b0.pk, a0.pk, a1.pk])
+
+        # repo_a is allowed to use 10 times as much time
+        self.create_finished_job(self.recipe_b, 900)
+        repo_settings = {str(self.repo_a): {"fair_share_weight": 10}}
+        with self.settings(
+            INSTALLED_GITSERVERS=[utils.github_config(repo_settings=repo_settings)]
+        ):
+            self.assertEqual(self.ready_pks(), [a0.pk, a1.pk, b0.pk])
+
+        # Fair share doesn't change the order between priorities
+        self.recipe_a.priority = 10
+        self.recipe_a.save()
+        self.assertEqual(self.ready_pks(), [a0.pk, a1.pk, b0.pk])
+
+    def test_bad_weight(self):
+        a0 = self.create_ready_job(self.recipe_a)
+        for weight in ["heavy", None, [2]]:
+            repo_settings = {str(self.repo_a): {"fair_share_weight": weight}}
+            with self.settings(
+                INSTALLED_GITSERVERS=[utils.github_config(repo_settings=repo_settings)]
+            ):
+                self.assertEqual(ReadyJobs.job_entry(a0)["weight"], 1)
+        repo_settings = {str(self.repo_a): {"fair_share_weight": "2.5"}}
+        with self.settings(
+            INSTALLED_GITSERVERS=[utils.github_config(repo_settings=repo_settings)]
+        ):
+            self.assertEqual(ReadyJobs.job_entry(a0)["weight"], 2.5)
+
+    @override_settings(FAIR_SHARE_USAGE_CACHE_TIMEOUT=60)
+    def test_cached_usage(self):
+        policy = SchedulingPolicy.FairSharePolicy()
+        share_a = (self.repo_a.pk, self.build_user.pk)
+        self.create_finished_job(self.recipe_a, 100)
+        with self.assertNumQueries(1):
+            self.assertEqual(policy.cached_usage(), {share_a: 100})
+        self.create_finished_job(self.recipe_a, 100)
+        with self.assertNumQueries(0):
+            self.assertEqual(policy.cached_usage(), {share_a: 100})
+        cache.delete(SchedulingPolicy.FAIR_SHARE_USAGE_KEY)
+        self.assertEqual(policy.cached_usage(), {share_a: 200})
+
+    def test_get_usage(self):
+        policy = SchedulingPolicy.FairSharePolicy()
+        self.assertEqual(policy.get_usage(), {})
+        share_a = (self.repo_a.pk, self.build_user.pk)
+        share_b = (self.repo_b.pk, self.build_user.pk)
+
+        self.create_finished_job(self.recipe_a, 100)
+        running = self.create_ready_job(self.recipe_b)
+        utils.update_job(running, status=models.JobStatus.RUNNING)
+        with self.settings(FAIR_SHARE_RUNNING_JOB_SECONDS=60):
+            self.assertEqual(policy.get_usage(), {share_a: 100, share_b: 60})
+
+        # Jobs that finished before the window aren't counted
+        models.Job.objects.filter(complete=True).update(
+            last_modified=models.Job.objects.first().last_modified - timedelta(days=2)
+        )
+        with self.settings(FAIR_SHARE_RUNNING_JOB_SECONDS=60):
+            self.assertEqual(policy.get_usage(), {share_b: 60})
+
+    def test_claim_order(self):
+        a0 = self.create_ready_job(self.recipe_a)
+        b0 = self.create_ready_job(self.recipe_b)
+        self.create_finished_job(self.recipe_a, 3600)
+        client = utils.create_client()
+        build_keys = [self.build_user.build_key]
+        configs = [a0.config.name]
+        job = views.get_cached_job(client, build_keys, configs)[0]
+        self.assertEqual(job.pk, b0.pk)
+        job = views.get_cached_job(client, build_keys, configs)[0]
+        self.assertEqual(job.pk, a0.pk)
+
+    def test_simulate(self):
+        jobs = []
+        for i in range(20):
+            jobs.append(
+                {
+                    "arrival": 0,
+                    "duration": 100,
+                    "repository": "owner/big",
+                    "build_user": "moosebuild",
+                }
+            )
+        for i in range(2):
+            jobs.append(
+                {
+                    "arrival": 1,
+                    "duration": 100,
+                    "repository": "owner/small",
+                    "build_user": "moosebuild",
+                }
+            )
+        trace = {"jobs": jobs}
+
+        waits, events = SchedulingSimulation.simulate(
+            trace, SchedulingPolicy.PriorityPolicy(), 2
+        )
+        self.assertEqual(events, {})
+        self.assertEqual(len(waits["owner/big"]), 20)
+        self.assertEqual(sorted(waits["owner/small"]), [999, 999])
+
+        fair = SchedulingSimulation.simulate(
+            trace, SchedulingPolicy.FairSharePolicy(), 2
+        )[0]
+        # Each running job is charged so the shares take turns
+        self.assertEqual(sorted(fair["owner/small"]), [99, 199])
+        self.assertEqual(
+            fair,
+            SchedulingSimulation.simulate(trace, SchedulingPolicy.FairSharePolicy(), 2)[
+                0
+            ],
+        )
+
+        report = SchedulingSimulation.wait_report(fair)
+        self.assertEqual(
+            [r["repository"] for r in report], ["owner/big", "owner/small"]
+        )
+        self.assertEqual(report[1]["jobs"], 2)
+        self.assertEqual(report[1]["p50"], 99)
+        self.assertEqual(report[1]["p99"], 199)
+
+        # A weight of 0 only gets clients when nobody else wants them
+        trace["weights"] = {"owner/small": 0}
+        fair = SchedulingSimulation.simulate(
+            trace, SchedulingPolicy.FairSharePolicy(), 2
+        )[0]
+        self.assertEqual(sorted(fair["owner/small"]), [999, 999])
+
+    def test_percentile(self):
+        self.assertEqual(SchedulingSimulation.percentile([], 50), 0)
+        values = list(range(1, 101))
+        self.assertEqual(SchedulingSimulation.percentile(values, 50), 50)
+        self.assertEqual(SchedulingSimulation.percentile(values, 99), 99)
+        self.assertEqual(SchedulingSimulation.percentile(values, 0), 1)
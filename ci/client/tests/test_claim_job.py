@@ -0,0 +1,227 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals, absolute_import
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TransactionTestCase, override_settings
+from mock import patch
+import threading
+from ci import models
+from ci.client import views, ReadyJobs
+from ci.tests import utils
+
+
+@override_settings(INSTALLED_GITSERVERS=[utils.github_config()])
+@override_settings(GET_JOB_UPDATE_INTERVAL=60 * 1000)
+class Tests(TransactionTestCase):
+    """
+    The claims need to be committed to be seen by the other
+    threads so this can't run inside a TestCase transaction.
+    """
+
+    def setUp(self):
+        super(Tests, self).setUp()
+        cache.clear()
+        self.user = utils.get_test_user()
+
+    def create_ready_jobs(self, num_jobs):
+        jobs = []
+        for i in range(num_jobs):
+            event = utils.create_event(user=self.user, commit1=str(1000 + i))
+            job = utils.create_job(user=self.user, event=event)
+            utils.update_job(job, ready=True, active=True)
+            jobs.append(job)
+        ReadyJobs.rebuild_ready_job_index()
+        return jobs
+
+    def test_mark_job_claimed(self):
+        job = self.create_ready_jobs(1)[0]
+        client = utils.create_client(name="client")
+        other_client = utils.create_client(name="other_client")
+
+        locked_job = ReadyJobs.load_ready_job(job.pk)
+        self.assertEqual(locked_job, job)
+        self.assertTrue(ReadyJobs.mark_job_claimed(locked_job, client))
+        self.assertEqual(locked_job.status, models.JobStatus.RUNNING)
+        self.assertEqual(
+            job.event.job_status_counts(), {(models.JobStatus.RUNNING, False): 1}
+        )
+
+        # Already claimed
+        self.assertFalse(ReadyJobs.mark_job_claimed(job, other_client))
+        job.refresh_from_db()
+        self.assertEqual(job.client, client)
+        self.assertEqual(job.status, models.JobStatus.RUNNING)
+
+        # Doesn't exist
+        self.assertIsNone(ReadyJobs.load_ready_job(job.pk + 1000))
+
+    def test_claimed_elsewhere(self):
+        # Another process claimed the job without this process's index knowing about it
+        job = self.create_ready_jobs(1)[0]
+        client = utils.create_client(name="client")
+        models.Job.objects.filter(pk=job.pk).update(status=models.JobStatus.RUNNING)
+        claimed, _, _ = views.get_cached_job(
+            client, [self.user.build_key], [job.config.name]
+        )
+        self.assertIsNone(claimed)
+        self.assertEqual(ReadyJobs.check_ready_job_index()[1], [])
+
+    def test_concurrent_claims(self):
+        num_jobs = 40
+        num_clients = 8
+        jobs = self.create_ready_jobs(num_jobs)
+        config = jobs[0].config.name
+        clients = [utils.create_client(name="client%s" % i) for i in range(num_clients)]
+        start = threading.Barrier(num_clients)
+        claimed = []
+        errors = []
+
+        def claim(client):
+            try:
+                start.wait()
+                while True:
+                    job, _, _ = views.get_cached_job(
+                        client, [self.user.build_key], [config]
+                    )
+                    if job is None:
+                        break
+                    claimed.append((job.pk, client.pk))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=claim, args=(c,)) for c in clients]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        # Every job was handed out exactly once
+        self.assertEqual(len(claimed), num_jobs)
+        self.assertEqual(sorted(pk for pk, _ in claimed), sorted(j.pk for j in jobs))
+
+        # And the database agrees on who got it
+        for job_id, client_id in claimed:
+            job = models.Job.objects.get(pk=job_id)
+            self.assertEqual(job.status, models.JobStatus.RUNNING)
+            self.assertEqual(job.client_id, client_id)
+        index = cache.get(ReadyJobs.READY_JOB_INDEX_KEY)
+        self.assertEqual(index["buckets"][0][0], config)
+        self.assertEqual(ReadyJobs.get_bucket(index, index["buckets"][0]), [])
+
+    @patch.object(ReadyJobs, "can_skip_locked")
+    def test_skip_locked_claims(self, mock_skip_locked):
+        # SQLite doesn't lock rows so this just checks that the jobs
+        # come straight from the database instead of the index
+        mock_skip_locked.return_value = True
+        jobs = self.create_ready_jobs(3)
+        config = jobs[0].config.name
+        client = utils.create_client(name="client")
+
+        # Made ready by another process that has its own index
+        other = utils.create_job(
+            user=self.user, event=utils.create_event(user=self.user, commit1="2000")
+        )
+        models.Job.objects.filter(pk=other.pk).update(ready=True, active=True)
+
+        # A pushed job without a priority goes last
+        jobs[0].event.cause = models.Event.PUSH
+        jobs[0].event.save()
+
+        # A single query for the jobs between BEGIN and COMMIT
+        with self.assertNumQueries(3):
+            views.get_cached_jobs(client, [self.user.build_key], ["other_config"], 2)
+
+        claimed = views.get_cached_jobs(client, [self.user.build_key], [config], 10)
+        self.assertEqual(
+            [job.pk for job, _, _ in claimed],
+            [jobs[1].pk, jobs[2].pk, other.pk, jobs[0].pk],
+        )
+        for job, _, build_key in claimed:
+            self.assertEqual(build_key, self.user.build_key)
+            job.refresh_from_db()
+            self.assertEqual(job.status, models.JobStatus.RUNNING)
+            self.assertEqual(job.client, client)
+        self.assertEqual(
+            views.get_cached_jobs(client, [self.user.build_key], [config], 1), []
+        )
+
+    def test_skip_locked_query(self):
+        with (
+            patch.object(connection.features, "has_select_for_update", True),
+            patch.object(
+                connection.features, "has_select_for_update_skip_locked", True
+            ),
+            patch.object(connection.features, "has_select_for_update_of", True),
+            transaction.atomic(),
+        ):
+            query = ReadyJobs.lock_jobs_query(
+                ReadyJobs.ready_jobs_query("config", [self.user.build_key], "client")
+            )[:5]
+            sql = str(query.query)
+        self.assertIn("FOR UPDATE", sql)
+        self.assertIn("SKIP LOCKED", sql)
+        self.assertIn("LIMIT 5", sql)
+
+    @override_settings(
+        READY_JOB_SCHEDULING_POLICY="ci.client.SchedulingPolicy.FairSharePolicy",
+        FAIR_SHARE_USAGE_CACHE_TIMEOUT=0,
+        READY_JOB_AFFINITY_WINDOW=2,
+    )
+    @patch.object(ReadyJobs, "can_skip_locked")
+    def test_skip_locked_fair_share(self, mock_skip_locked):
+        # One repository has a lot more ready jobs than are locked at once
+        mock_skip_locked.return_value = True
+        busy_recipe = utils.create_recipe(name="busy", user=self.user)
+        busy_jobs = []
+        for i in range(10):
+            event = utils.create_event(user=self.user, commit1=str(3000 + i))
+            job = utils.create_job(recipe=busy_recipe, event=event)
+            utils.update_job(job, ready=True, active=True)
+            busy_jobs.append(job)
+        other_repo = utils.create_repo(name="other_repo", user=self.user)
+        other_recipe = utils.create_recipe(
+            name="other", user=self.user, repo=other_repo
+        )
+        event = utils.create_event(user=self.user, commit1="4000")
+        other = utils.create_job(recipe=other_recipe, event=event)
+        utils.update_job(other, ready=True, active=True)
+        client = utils.create_client(name="client")
+        config = other.config.name
+
+        # The other repository hasn't used anything so it goes before
+        # the older jobs of the busy repository
+        claimed = views.get_cached_jobs(client, [self.user.build_key], [config], 2)
+        self.assertEqual([job.pk for job, _, _ in claimed], [busy_jobs[0].pk, other.pk])
+        claimed = views.get_cached_jobs(client, [self.user.build_key], [config], 20)
+        self.assertEqual(
+            [job.pk for job, _, _ in claimed], [j.pk for j in busy_jobs[1:]]
+        )
+
+    @patch.object(ReadyJobs, "can_skip_locked")
+    def test_skip_locked_locked_candidates(self, mock_skip_locked):
+        # The candidates are locked by other clients
+        mock_skip_locked.return_value = True
+        jobs = self.create_ready_jobs(3)
+        client = utils.create_client(name="client")
+        with patch.object(ReadyJobs, "lock_jobs_query") as mock_lock:
+            mock_lock.side_effect = lambda job_q: job_q.filter(pk=jobs[2].pk)
+            claimed = views.get_cached_jobs(
+                client, [self.user.build_key], [jobs[0].config.name], 1
+            )
+        self.assertEqual([job.pk for job, _, _ in claimed], [jobs[2].pk])
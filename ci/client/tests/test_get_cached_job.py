@@ -15,19 +15,25 @@
 from __future__ import unicode_literals, absolute_import
 from django.test import override_settings
 from django.conf import settings
+import sys
+import threading
 import time
-from ci import models
-from ci.client import views
+from ci import models, views as ci_views
+from ci.client import views, ReadyJobs
 from ci.tests import utils
 from ci.client.tests import ClientTester
 from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from mock import MagicMock, patch
+from ci.recipe import file_utils
 
 
 @override_settings(INSTALLED_GITSERVERS=[utils.github_config()])
 @override_settings(GET_JOB_UPDATE_INTERVAL=5000)
 class Tests(ClientTester.ClientTester):
     def setUp(self):
-        super(ClientTester.ClientTester, self).setUp()
+        super(Tests, self).setUp()
 
         self.poll_time = int(settings.GET_JOB_UPDATE_INTERVAL / 1000 + 2)
         self.client = utils.create_client()
@@ -39,8 +45,7 @@ class Tests(ClientTester.ClientTester):
             self.client, self.build_keys, self.build_configs
         )[0]
 
-        self.cached_jobs_key = "cached_jobs"
-        self.get_cached_jobs = lambda: cache.get(self.cached_jobs_key)
+        self.get_index = lambda: cache.get(ReadyJobs.READY_JOB_INDEX_KEY)
 
         self.event_counter = 0
 
@@ -54,33 +59,38 @@ class Tests(ClientTester.ClientTester):
         job.save()
         return job
 
+    def indexed_pks(self, bucket=None):
+        index = self.get_index()
+        if bucket is None:
+            bucket = (self.build_configs[0], self.user.build_key, None)
+        return [e["pk"] for e in ReadyJobs.get_bucket(index, bucket)]
+
     def test_cached(self):
-        # Should have no cache at this point
-        cached_jobs = self.get_cached_jobs()
-        self.assertIsNone(cached_jobs)
+        # Should have no index at this point
+        self.assertIsNone(self.get_index())
 
         # Nothing available
         self.assertIsNone(self.get_cached_job())
-        cached_jobs = self.get_cached_jobs()
-        self.assertIsNotNone(cached_jobs)
-        cached_jobs_expires = cached_jobs.get("expires")
+        index = self.get_index()
+        self.assertIsNotNone(index)
+        index_expires = index.get("expires")
 
-        # Create a job
+        # Create a job without going through anything that updates the index
         job = self.create_ready_job()
 
         # Should still be nothing available
-        cached_jobs = self.get_cached_jobs()
-        self.assertEqual(cached_jobs["expires"], cached_jobs_expires)
+        index = self.get_index()
+        self.assertEqual(index["expires"], index_expires)
         self.assertIsNone(self.get_cached_job())
 
-        # Eventually a job should be available
+        # Eventually the index gets checked and the job should be available
         for i in range(self.poll_time):
             time.sleep(1)
             get_job = self.get_cached_job()
 
             if get_job is not None:
-                cached_jobs = self.get_cached_jobs()
-                self.assertNotEqual(cached_jobs.get("expires"), cached_jobs_expires)
+                index = self.get_index()
+                self.assertNotEqual(index.get("expires"), index_expires)
                 get_job_again = self.get_cached_job()
                 self.assertIsNone(get_job_again)
                 break
@@ -101,40 +111,36 @@ class Tests(ClientTester.ClientTester):
         self.assertEqual(second_job.config, other_build_config)
 
         # Should get the second job first, even though it was added second
-        for i in range(self.poll_time):
-            job, _, _ = views.get_cached_job(
-                self.client, self.build_keys, build_configs
-            )
-
-            if job is not None:
-                self.assertEqual(other_build_config, job.config)
-                break
-        self.assertGreater(i, 0)
+        job, _, _ = views.get_cached_job(self.client, self.build_keys, build_configs)
+        self.assertEqual(job, second_job)
+        job, _, _ = views.get_cached_job(self.client, self.build_keys, build_configs)
+        self.assertEqual(job, first_job)
 
     def test_job_changed(self):
         def check(before_action, after_action, modify_job=None):
-            cached_jobs = views.update_cached_jobs()
-            self.assertEqual(len(cached_jobs["jobs_by_config"]), 0)
+            index = ReadyJobs.rebuild_ready_job_index()
+            self.assertEqual(len(index["buckets"]), 0)
             job = self.create_ready_job()
             if modify_job is not None:
                 modify_job(job)
-            cached_jobs = views.update_cached_jobs()
-            self.assertEqual(len(cached_jobs["jobs_by_config"]), 1)
-            self.assertIn(self.build_configs[0], cached_jobs["jobs_by_config"])
-            jobs = cached_jobs["jobs_by_config"][self.build_configs[0]]
-            self.assertEqual(len(jobs), 1)
-            self.assertEqual(jobs[0]["pk"], job.pk)
+            index = ReadyJobs.rebuild_ready_job_index()
+            self.assertEqual(len(index["buckets"]), 1)
+            bucket = index["buckets"][0]
+            self.assertEqual(bucket[0], self.build_configs[0])
+            self.assertEqual(self.indexed_pks(bucket), [job.pk])
 
             state = {}
             before_action(job, state)
             get_job = self.get_cached_job()
             self.assertIsNone(get_job)
             after_action(job, state)
+            # Let the index know about the change
+            with self.captureOnCommitCallbacks(execute=True):
+                ReadyJobs.update_ready_job(job)
             get_job = self.get_cached_job()
             self.assertIsNotNone(get_job)
-            self.assertEqual(
-                cached_jobs["jobs_by_config"][self.build_configs[0]][0]["pk"], job.pk
-            )
+            self.assertEqual(get_job.pk, job.pk)
+            job.delete()
 
         def set_running(job, state):
             job.status = models.JobStatus.RUNNING
@@ -142,6 +148,7 @@ class Tests(ClientTester.ClientTester):
 
         def set_not_started(job, state):
             job.status = models.JobStatus.NOT_STARTED
+            job.client = None
             job.save()
 
         check(set_running, set_not_started)
@@ -161,27 +168,342 @@ class Tests(ClientTester.ClientTester):
 
         def change_build_key(job, state):
             state["build_key"] = self.user.build_key
-            self.user.build_key = "9999"
+            self.user.build_key = 9999
             self.user.save()
 
         def change_back_build_key(job, state):
             self.user.build_key = state["build_key"]
             self.user.save()
+            job.recipe.build_user.refresh_from_db()
 
-        check(change_build_config, change_back_build_config)
+        check(change_build_key, change_back_build_key)
 
         def set_client(job, state):
             job.client = self.client
             job.save()
 
-        def remove_client(job, state):
-            job.client = None
+        def set_other_client(job, state):
+            job.client = utils.create_client(name="other_client")
             job.save()
 
-        check(set_client, remove_client)
+        check(set_other_client, set_client)
+
+    def test_index_updates(self):
+        ReadyJobs.rebuild_ready_job_index()
+        r0 = utils.create_recipe(name="r0", user=self.user)
+        r1 = utils.create_recipe(name="r1", user=self.user)
+        r1.depends_on.add(r0)
+        ev = utils.create_event(user=self.user)
+        j0 = utils.create_job(recipe=r0, event=ev, user=self.user)
+        j1 = utils.create_job(recipe=r1, event=ev, user=self.user)
+        self.assertEqual(self.indexed_pks(), [])
+
+        # Only the job with no dependencies gets ready
+        with self.captureOnCommitCallbacks(execute=True):
+            ev.make_jobs_ready()
+        self.assertEqual(self.indexed_pks(), [j0.pk])
+        j0.refresh_from_db()
+
+        # Another ready job goes in priority order
+        j2 = self.create_ready_job()
+        j2.recipe.priority = 10
+        j2.recipe.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            ReadyJobs.update_ready_job(j2)
+        self.assertEqual(self.indexed_pks(), [j2.pk, j0.pk])
+
+        # Prioritizing moves it to the front
+        with self.captureOnCommitCallbacks(execute=True):
+            j0.set_prioritized("prioritized")
+        self.assertEqual(self.indexed_pks(), [j0.pk, j2.pk])
+
+        # Invalidating with the same client moves it to the client bucket
+        j0.client = self.client
+        j0.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            j0.set_invalidated("invalidated", same_client=True, check_ready=True)
+        self.assertEqual(self.indexed_pks(), [j2.pk])
+        client_bucket = (self.build_configs[0], self.user.build_key, self.client.name)
+        self.assertEqual(self.indexed_pks(client_bucket), [j0.pk])
+
+        # Claiming removes it
+        with self.captureOnCommitCallbacks(execute=True):
+            job = self.get_cached_job()
+        self.assertEqual(job, j0)
+        self.assertEqual(self.indexed_pks(client_bucket), [])
+
+        # Canceling removes it
+        with self.captureOnCommitCallbacks(execute=True):
+            ci_views.set_job_canceled(j2, "canceled")
+        self.assertEqual(self.indexed_pks(), [])
+
+        j1.refresh_from_db()
+        self.assertFalse(j1.ready)
+        index, problems = ReadyJobs.check_ready_job_index()
+        self.assertEqual(problems, [])
+
+    def test_check_index(self):
+        index, problems = ReadyJobs.check_ready_job_index()
+        self.assertEqual(len(problems), 1)
+        self.assertIsNone(index)
+
+        index, problems = ReadyJobs.check_ready_job_index(repair=True)
+        self.assertEqual(len(problems), 1)
+        self.assertEqual(index["buckets"], [])
+        index, problems = ReadyJobs.check_ready_job_index()
+        self.assertEqual(problems, [])
+
+        # Job that isn't in the index
+        job = self.create_ready_job()
+        index, problems = ReadyJobs.check_ready_job_index(repair=True)
+        self.assertEqual(len(problems), 1)
+        self.assertEqual(self.indexed_pks(), [job.pk])
+        index, problems = ReadyJobs.check_ready_job_index()
+        self.assertEqual(problems, [])
+
+        # Job in the index that isn't ready
+        job.status = models.JobStatus.RUNNING
+        job.save()
+        index, problems = ReadyJobs.check_ready_job_index(repair=True)
+        self.assertEqual(len(problems), 1)
+        self.assertEqual(self.indexed_pks(), [])
+
+    @override_settings(GET_JOB_UPDATE_INTERVAL=0)
+    def test_without_index(self):
+        # The ready jobs are read straight from the database
+        self.assertFalse(ReadyJobs.use_ready_job_index())
+        job = self.create_ready_job()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            ReadyJobs.update_ready_job(job)
+        # Only waiting clients are told
+        self.assertEqual(callbacks, [ReadyJobs.notify_ready_jobs])
+        self.assertIsNone(self.get_index())
+
+        with patch.object(ReadyJobs, "check_ready_job_index") as mock_check:
+            self.assertEqual(self.get_cached_job(), job)
+            mock_check.assert_not_called()
+        self.assertIsNone(self.get_index())
+        self.assertIsNone(self.get_cached_job())
+
+    def test_index_lock(self):
+        class LockError(Exception):
+            pass
+
+        lock = MagicMock()
+        fake_cache = MagicMock()
+        fake_cache.lock.return_value = lock
+        exceptions = MagicMock(LockError=LockError)
+        modules = {
+            "redis": MagicMock(exceptions=exceptions),
+            "redis.exceptions": exceptions,
+        }
+        with (
+            patch.dict(sys.modules, modules),
+            patch.object(ReadyJobs, "cache", fake_cache),
+        ):
+            lock.acquire.return_value = True
+            with ReadyJobs.index_lock() as locked:
+                self.assertTrue(locked)
+            lock.release.assert_called_once_with()
+
+            # Expired before it was released
+            lock.release.side_effect = LockError()
+            with ReadyJobs.index_lock() as locked:
+                self.assertTrue(locked)
+
+            # Errors in the body aren't swallowed
+            with self.assertRaises(ValueError):
+                with ReadyJobs.index_lock() as locked:
+                    raise ValueError()
+
+            lock.reset_mock()
+            lock.acquire.return_value = False
+            with ReadyJobs.index_lock() as locked:
+                self.assertFalse(locked)
+            lock.release.assert_not_called()
+
+            lock.acquire.side_effect = LockError()
+            with ReadyJobs.index_lock() as locked:
+                self.assertFalse(locked)
+
+    def test_multiple_build_keys(self):
+        other_user = utils.create_user_with_token(name="other_user")
+        other_recipe = utils.create_recipe(name="other", user=other_user)
+        other_recipe.priority = 5
+        other_recipe.save()
+        job = self.create_ready_job()
+        other_event = utils.create_event(user=other_user, commit1="9999")
+        other_job = utils.create_job(recipe=other_recipe, event=other_event)
+        utils.update_job(other_job, ready=True, active=True)
 
-        def modify_job(job):
-            job.client = self.client
-            job.save()
+        # Only gets jobs for its build key
+        self.assertEqual(self.get_cached_job(), job)
+        self.assertIsNone(self.get_cached_job())
+
+        # The highest priority job of all the build keys is claimed first
+        job.status = models.JobStatus.NOT_STARTED
+        job.client = None
+        job.save()
+        ReadyJobs.rebuild_ready_job_index()
+        self.build_keys.append(other_user.build_key)
+        self.assertEqual(self.get_cached_job(), other_job)
+        self.assertEqual(self.get_cached_job(), job)
+
+    def test_wait_for_cached_job(self):
+        ReadyJobs.rebuild_ready_job_index()
 
-        check(remove_client, set_client, modify_job)
+        # Nothing available
+        start = time.monotonic()
+        job, _, _ = views.wait_for_cached_job(
+            self.client, self.build_keys, self.build_configs, 0.5
+        )
+        self.assertIsNone(job)
+        self.assertGreaterEqual(time.monotonic() - start, 0.5)
+
+        # Nothing ready yet, a notification just wakes it up
+        version = ReadyJobs.ready_jobs_version()
+        timer = threading.Timer(0.2, ReadyJobs.notify_ready_jobs)
+        timer.start()
+        start = time.monotonic()
+        new_version = ReadyJobs.wait_for_ready_jobs(version, 10)
+        timer.join()
+        self.assertNotEqual(new_version, version)
+        self.assertLess(time.monotonic() - start, 5)
+
+        # A job that becomes ready while waiting gets claimed
+        # without having to wait the full time
+        ready_job = self.create_ready_job()
+        entry = ReadyJobs.job_entry(ready_job)
+        timer = threading.Timer(
+            0.2, ReadyJobs._apply_changes, args=[[(ready_job.pk, entry)]]
+        )
+        timer.start()
+        start = time.monotonic()
+        job, _, _ = views.wait_for_cached_job(
+            self.client, self.build_keys, self.build_configs, 10
+        )
+        timer.join()
+        self.assertEqual(job, ready_job)
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_get_cached_jobs(self):
+        jobs = [self.create_ready_job() for i in range(3)]
+
+        claimed = views.get_cached_jobs(
+            self.client, self.build_keys, self.build_configs, 2
+        )
+        self.assertEqual([job for job, _, _ in claimed], jobs[:2])
+        for job, job_info, build_key in claimed:
+            self.assertEqual(job_info["job_id"], job.pk)
+            self.assertEqual(build_key, self.user.build_key)
+            job.refresh_from_db()
+            self.assertEqual(job.status, models.JobStatus.RUNNING)
+            self.assertEqual(job.client, self.client)
+
+        claimed = views.get_cached_jobs(
+            self.client, self.build_keys, self.build_configs, 2
+        )
+        self.assertEqual([job for job, _, _ in claimed], jobs[2:])
+        self.assertEqual(
+            views.get_cached_jobs(self.client, self.build_keys, self.build_configs, 2),
+            [],
+        )
+
+    def test_workspace_affinity(self):
+        jobs = []
+        for i in range(5):
+            event = utils.create_event(
+                user=self.user, commit1=str(5000 + i), commit2=str(6000 + i)
+            )
+            job = utils.create_job(user=self.user, event=event)
+            utils.update_job(job, ready=True, active=True)
+            jobs.append(job)
+        repo = str(jobs[0].recipe.repository)
+        workspaces = [(repo, jobs[3].event.base.sha)]
+        get_job = lambda: views.get_cached_job(
+            self.client, self.build_keys, self.build_configs, workspaces
+        )[0]
+
+        # Jobs that aren't passed over
+        with self.settings(READY_JOB_AFFINITY_MAX_WAIT=0):
+            self.assertEqual(get_job(), jobs[0])
+        # Too far down the list
+        with self.settings(READY_JOB_AFFINITY_WINDOW=2):
+            self.assertEqual(get_job(), jobs[1])
+        # Same SHA wins
+        self.assertEqual(get_job(), jobs[3])
+        # Same repository otherwise so the normal order
+        self.assertEqual(get_job(), jobs[2])
+        workspaces = [("otherUser/otherRepo", jobs[4].event.base.sha)]
+        self.assertEqual(get_job(), jobs[4])
+
+    def test_workspace_order(self):
+        def entry(pk, repo, sha, priority=0):
+            return {
+                "pk": pk,
+                "sort_key": (False, True, 0, -priority),
+                "workspace": (repo, sha),
+                "created": time.time(),
+            }
+
+        entries = [
+            entry(1, "a", "1", priority=1),
+            entry(2, "b", "1"),
+            entry(3, "a", "2"),
+            entry(4, "a", "1"),
+        ]
+        order = lambda workspaces: [
+            e["pk"] for e in ReadyJobs.workspace_order(entries, workspaces)
+        ]
+        self.assertEqual(order([]), [1, 2, 3, 4])
+        # Doesn't go past a different priority
+        self.assertEqual(order([("b", "1")]), [1, 2, 3, 4])
+        self.assertEqual(order([("a", "1")]), [1, 4, 3, 2])
+        self.assertEqual(order([("a", "5")]), [1, 3, 4, 2])
+
+    def create_recipe_with_steps(self, name, num_steps):
+        recipe = utils.create_recipe(name=name, user=self.user)
+        utils.create_recipe_environment(recipe=recipe)
+        utils.create_prestepsource(recipe=recipe)
+        for i in range(num_steps):
+            step = utils.create_step(name="step%s" % i, recipe=recipe, position=i)
+            utils.create_step_environment(step=step)
+        return recipe
+
+    @patch.object(file_utils, "get_contents")
+    def test_claim_num_queries(self, contents_mock):
+        contents_mock.return_value = "contents"
+        models.RecipeRepository.objects.create(sha="1234")
+        recipes = [
+            self.create_recipe_with_steps("warm", 1),
+            self.create_recipe_with_steps("small", 2),
+            self.create_recipe_with_steps("big", 40),
+        ]
+        for recipe in recipes:
+            event = utils.create_event(user=self.user, commit1=recipe.name)
+            job = utils.create_job(recipe=recipe, event=event)
+            utils.update_job(job, ready=True, active=True)
+
+        # Build the index and everything else that gets cached
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.get_cached_job().recipe, recipes[0])
+
+        # The recipe payloads aren't cached yet so the whole recipe
+        # is loaded, but that shouldn't depend on the number of steps
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as small_queries:
+                job, job_info, build_key = views.get_cached_job(
+                    self.client, self.build_keys, self.build_configs
+                )
+        self.assertEqual(job.recipe, recipes[1])
+        self.assertEqual(len(job_info["steps"]), 2)
+
+        with self.assertNumQueries(len(small_queries)):
+            job, job_info, build_key = views.get_cached_job(
+                self.client, self.build_keys, self.build_configs
+            )
+        self.assertEqual(job.recipe, recipes[2])
+        self.assertEqual(len(job_info["steps"]), 40)
+        self.assertEqual(job.step_results.count(), 40)
+        job.refresh_from_db()
+        self.assertEqual(job.recipe_repo_sha, "1234")
@@ -16,10 +16,14 @@ from __future__ import unicode_literals, absolute_import
 from django.urls import reverse
 from django.http import HttpResponseNotAllowed, HttpResponseBadRequest
 from django.test import override_settings
+from django.db import DatabaseError
 import json
+import time
+from datetime import timedelta
+from django.utils import timezone
 from mock import patch
-from ci import models, Permissions
-from ci.client import views
+from ci import models, Permissions, LiveUpdates
+from ci.client import views, UpdateRemoteStatus
 from ci.recipe import file_utils
 from ci.tests import utils
 from ci.github.api import GitHubAPI
@@ -27,6 +31,8 @@ from ci.client.tests import ClientTester
 
 
 @override_settings(INSTALLED_GITSERVERS=[utils.github_config()])
+# Jobs are made ready directly in the DB so always check the ready job index
+@override_settings(GET_JOB_UPDATE_INTERVAL=0)
 class Tests(ClientTester.ClientTester):
     def test_client_ip(self):
         request = self.factory.get("/")
@@ -317,6 +323,133 @@ class Tests(ClientTester.ClientTester):
             self.assertEqual(j.status, models.JobStatus.RUNNING)
             self.assertEqual(j.event.status, models.JobStatus.RUNNING)
 
+    @override_settings(GET_JOB_LONG_POLL_MAX_WAIT=1)
+    def test_get_job_long_poll(self):
+        user = utils.get_test_user()
+        url = reverse("ci:client:get_job")
+        post_data = {
+            "client_name": "testClient",
+            "build_keys": [user.build_key],
+            "build_configs": ["testconfig"],
+        }
+
+        # The server advertises long polling
+        response = self.client_post_json(url, post_data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Civet-Long-Poll"], "1")
+        self.assertEqual(response.json()["job_id"], None)
+
+        # Bad wait
+        post_data["wait"] = "foo"
+        response = self.client_post_json(url, post_data)
+        self.assertEqual(response.status_code, 400)
+
+        # Nothing available, waits up to the max allowed
+        post_data["wait"] = 100
+        start = time.monotonic()
+        response = self.client_post_json(url, post_data)
+        self.assertGreaterEqual(time.monotonic() - start, 1)
+        self.assertLess(time.monotonic() - start, 10)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["job_id"], None)
+
+        # A job that is available is returned immediately
+        job = utils.create_job(user=user)
+        utils.update_job(job, ready=True, active=True)
+        post_data["build_configs"] = [job.config.name]
+        response = self.client_post_json(url, post_data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["job_id"], job.pk)
+
+        # Long polling disabled
+        with self.settings(GET_JOB_LONG_POLL_MAX_WAIT=0):
+            response = self.client_post_json(url, post_data)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("X-Civet-Long-Poll", response)
+
+    def test_claim_jobs(self):
+        user = utils.get_test_user()
+        url = reverse("ci:client:claim_jobs")
+        post_data = {
+            "client_name": "testClient",
+            "build_keys": [user.build_key],
+            "build_configs": ["testconfig"],
+        }
+
+        # only post allowed
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 405)
+
+        # missing slots
+        response = self.client_post_json(url, post_data)
+        self.assertEqual(response.status_code, 400)
+
+        # bad slots
+        for slots in [0, "foo"]:
+            post_data["slots"] = slots
+            response = self.client_post_json(url, post_data)
+            self.assertEqual(response.status_code, 400)
+
+        # nothing there
+        post_data["slots"] = 3
+        self.set_counts()
+        response = self.client_post_json(url, post_data)
+        self.compare_counts(num_clients=1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"status": "OK", "jobs": []})
+
+        # Two ready jobs, both get claimed at once
+        jobs = []
+        for i in range(2):
+            event = utils.create_event(user=user, commit1=str(100 + i))
+            recipe = utils.create_recipe(name="recipe%s" % i, user=user)
+            for pos in range(3):
+                utils.create_step(name="step%s" % pos, recipe=recipe, position=pos)
+            job = utils.create_job(recipe=recipe, event=event, user=user)
+            utils.update_job(job, ready=True, active=True)
+            jobs.append(job)
+        post_data["build_configs"] = [jobs[0].config.name]
+        response = self.client_post_json(url, post_data)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["status"], "OK")
+        self.assertEqual(len(data["jobs"]), 2)
+        self.assertEqual(
+            sorted(j["job_id"] for j in data["jobs"]), sorted(j.pk for j in jobs)
+        )
+        for claimed in data["jobs"]:
+            job = models.Job.objects.get(pk=claimed["job_id"])
+            self.assertEqual(job.status, models.JobStatus.RUNNING)
+            self.assertEqual(job.client.name, "testClient")
+            self.assertEqual(claimed["build_key"], user.build_key)
+            self.assertEqual(job.step_results.count(), 3)
+            step_result_ids = [s["stepresult_id"] for s in claimed["job_info"]["steps"]]
+            self.assertEqual(
+                step_result_ids,
+                list(
+                    job.step_results.order_by("position").values_list("pk", flat=True)
+                ),
+            )
+        client = models.Client.objects.get(name="testClient")
+        self.assertEqual(client.status, models.Client.RUNNING)
+
+        # Still running one of the jobs, the other one gets canceled
+        post_data["running_jobs"] = [jobs[0].pk]
+        response = self.client_post_json(url, post_data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["jobs"], [])
+        jobs[0].refresh_from_db()
+        jobs[1].refresh_from_db()
+        self.assertEqual(jobs[0].status, models.JobStatus.RUNNING)
+        self.assertEqual(jobs[1].status, models.JobStatus.CANCELED)
+        client.refresh_from_db()
+        self.assertEqual(client.status, models.Client.RUNNING)
+
+        # bad running jobs
+        post_data["running_jobs"] = ["foo"]
+        response = self.client_post_json(url, post_data)
+        self.assertEqual(response.status_code, 400)
+
     def test_job_finished_status(self):
         user = utils.get_test_user()
         recipe = utils.create_recipe(user=user)
@@ -402,6 +535,8 @@ class Tests(ClientTester.ClientTester):
         step_result = utils.create_step_result(job=job)
         step_result.output = self.get_file("ubuntu_gcc_output.txt")
         step_result.save()
+        # Output that never got completed
+        step_result.append_output("more output")
         client = utils.create_client()
         client2 = utils.create_client(name="other_client")
         job.client = client
@@ -458,20 +593,27 @@ class Tests(ClientTester.ClientTester):
         self.assertEqual(data["status"], "OK")
         job.refresh_from_db()
         self.assertTrue(job.complete)
+        step_result.refresh_from_db()
+        self.assertEqual(step_result.output_chunks.count(), 0)
+        self.assertTrue(step_result.compacted_output.endswith("more output"))
 
-        job2 = utils.create_job(event=job.event)
+        step_result.status = models.JobStatus.SUCCESS
+        step_result.save()
+        recipe2 = utils.create_recipe(name="recipe2")
+        recipe2.depends_on.add(job.recipe)
+        job2 = utils.create_job(recipe=recipe2, event=job.event)
         job2.ready = False
         job2.complete = False
         job2.status = models.JobStatus.NOT_STARTED
         job2.active = True
         job2.save()
-        # should be ok. Make sure jobs get ready after one is finished.
+        # should be ok. Make sure jobs that depend on it get ready after one is finished.
         url = reverse(
             "ci:client:job_finished", args=[user.build_key, client.name, job.pk]
         )
         self.set_counts()
         response = self.client_post_json(url, post_data)
-        self.compare_counts(ready=1)
+        self.compare_counts(ready=1, active_branches=1)
         self.assertEqual(response.status_code, 200)
         data = response.json()
         self.assertIn("message", data)
@@ -675,6 +817,10 @@ class Tests(ClientTester.ClientTester):
         self.assertEqual(data["command"], None)
         result.refresh_from_db()
         self.assertEqual(result.status, models.JobStatus.RUNNING)
+        # Output is appended in a chunk
+        self.assertEqual(result.output, "output")
+        self.assertEqual(result.compacted_output, "")
+        self.assertEqual(result.output_chunks.count(), 1)
 
         # test when the user invalidates a job while it is running
         job.status = models.JobStatus.NOT_STARTED
@@ -715,6 +861,136 @@ class Tests(ClientTester.ClientTester):
         self.assertEqual(result.exit_status, 1)
         self.assertEqual(result.status, models.JobStatus.RUNNING)
 
+    def test_update_step_result_timestamps(self):
+        job, result = self.create_running_job()
+        other = utils.create_step_result(job=job, name="other", position=1)
+        models.Job.objects.filter(pk=job.pk).update(seconds=timedelta(seconds=10))
+        models.StepResult.objects.filter(pk=other.pk).update(
+            seconds=timedelta(seconds=10)
+        )
+        url = reverse(
+            "ci:client:update_step_result",
+            args=[job.event.build_user.build_key, job.client.name, result.pk],
+        )
+        old = timezone.now() - timedelta(days=1)
+        models.Event.objects.filter(pk=job.event.pk).update(last_modified=old)
+        models.Job.objects.filter(pk=job.pk).update(last_modified=old)
+
+        with self.settings(TIMESTAMP_UPDATE_INTERVAL=60):
+            for seconds in [2, 5]:
+                post_data = self.create_complete_step_result_post_data(
+                    result.position, time=seconds, complete=False
+                )
+                response = self.client_post_json(url, post_data)
+                self.assertEqual(response.status_code, 200)
+                job.refresh_from_db()
+                # The total time is kept up to date without summing the steps
+                self.assertEqual(job.seconds, timedelta(seconds=10 + seconds))
+                self.assertEqual(job.seconds, job.calc_total_time())
+                if seconds == 2:
+                    job.event.refresh_from_db()
+                    self.assertGreater(job.event.last_modified, old)
+                    self.assertGreater(job.last_modified, old)
+                    bumped = (job.last_modified, job.event.last_modified)
+            # Only bumped once in the interval
+            job.event.refresh_from_db()
+            self.assertEqual((job.last_modified, job.event.last_modified), bumped)
+
+        with self.settings(TIMESTAMP_UPDATE_INTERVAL=0):
+            post_data = self.create_complete_step_result_post_data(
+                result.position, time=6, complete=False
+            )
+            response = self.client_post_json(url, post_data)
+            self.assertEqual(response.status_code, 200)
+            job.refresh_from_db()
+            job.event.refresh_from_db()
+            self.assertGreater(job.last_modified, bumped[0])
+            self.assertGreater(job.event.last_modified, bumped[1])
+            self.assertEqual(job.seconds, timedelta(seconds=16))
+
+    @override_settings(LIVE_UPDATES_ENABLED=True)
+    def test_live_updates(self):
+        job, result = self.create_running_job()
+        build_key = job.event.build_user.build_key
+        job_sub = LiveUpdates.get_backend().subscribe([LiveUpdates.job_channel(job.pk)])
+        event_sub = LiveUpdates.get_backend().subscribe(
+            [LiveUpdates.event_channel(job.event.pk)]
+        )
+        self.addCleanup(job_sub.close)
+        self.addCleanup(event_sub.close)
+
+        def get_data(sub, event):
+            msgs = sub.get(0)
+            self.assertEqual(len(msgs), 1)
+            name, data = msgs[0].split("\n")[:2]
+            self.assertEqual(name, "event: %s" % event)
+            return json.loads(data[len("data: ") :])
+
+        url = reverse(
+            "ci:client:start_step_result", args=[build_key, job.client.name, result.pk]
+        )
+        post_data = self.create_complete_step_result_post_data(
+            result.position, output="", time=0, complete=False
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client_post_json(url, post_data)
+        self.assertEqual(response.status_code, 200)
+        for sub in [job_sub, event_sub]:
+            data = get_data(sub, "status")
+            self.assertEqual(data["job_id"], job.pk)
+            self.assertEqual(data["step"]["id"], result.pk)
+            self.assertEqual(data["step"]["status"], "Running")
+
+        # Output only goes to the job page
+        url = reverse(
+            "ci:client:update_step_result", args=[build_key, job.client.name, result.pk]
+        )
+        for offset, output in [(0, "foo\n"), (4, "bar\n")]:
+            post_data = self.create_complete_step_result_post_data(
+                result.position, output=output, complete=False
+            )
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client_post_json(url, post_data)
+            self.assertEqual(response.status_code, 200)
+            data = get_data(job_sub, "output")
+            self.assertEqual(
+                data,
+                {
+                    "id": result.pk,
+                    "start": offset,
+                    "offset": offset + 4,
+                    "output": output.replace("\n", "<br/>"),
+                },
+            )
+        self.assertEqual(event_sub.get(0), [])
+
+        url = reverse(
+            "ci:client:complete_step_result",
+            args=[build_key, job.client.name, result.pk],
+        )
+        post_data = self.create_complete_step_result_post_data(
+            result.position, output="foo\nbar\n"
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client_post_json(url, post_data)
+        self.assertEqual(response.status_code, 200)
+        for sub in [job_sub, event_sub]:
+            data = get_data(sub, "status")
+            self.assertTrue(data["step"]["complete"])
+            self.assertFalse(data["complete"])
+
+        url = reverse(
+            "ci:client:job_finished", args=[build_key, job.client.name, job.pk]
+        )
+        post_data = {"seconds": 1, "complete": True}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client_post_json(url, post_data)
+        self.assertEqual(response.status_code, 200)
+        for sub in [job_sub, event_sub]:
+            data = get_data(sub, "status")
+            self.assertTrue(data["complete"])
+            self.assertNotIn("step", data)
+
     def create_running_job(self):
         user = utils.get_test_user()
         job = utils.create_job(user=user)
@@ -902,6 +1178,43 @@ class Tests(ClientTester.ClientTester):
         self.assertEqual(result.status, models.JobStatus.FAILED_OK)
         self.assertEqual(result.job.failed_step, result.name)
 
+    def test_step_result_output_chunks(self):
+        job, result = self.create_running_job()
+        update_url = reverse(
+            "ci:client:update_step_result",
+            args=[job.recipe.build_user.build_key, job.client.name, result.pk],
+        )
+        for output in ["foo\n", "", "bar\n"]:
+            post_data = self.create_complete_step_result_post_data(
+                result.position, output=output, complete=False
+            )
+            response = self.client_post_json(update_url, post_data)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(response.json()["output_trimmed"])
+        result.refresh_from_db()
+        self.assertEqual(result.output_chunks.count(), 2)
+        self.assertEqual(result.output, "foo\nbar\n")
+        self.assertEqual(result.output_bytes_seen, 8)
+
+        # The client is told when the server is removing output
+        with self.settings(STEP_OUTPUT_MAX_BYTES=10):
+            post_data = self.create_complete_step_result_post_data(
+                result.position, output="baz\n", complete=False
+            )
+            response = self.client_post_json(update_url, post_data)
+            self.assertTrue(response.json()["output_trimmed"])
+
+        # The complete output replaces the chunks
+        post_data = self.create_complete_step_result_post_data(
+            result.position, output="foo\nbar\nbaz\n"
+        )
+        response = self.client_post_json(self.complete_step_result_url(job), post_data)
+        self.assertEqual(response.status_code, 200)
+        result.refresh_from_db()
+        self.assertEqual(result.output_chunks.count(), 0)
+        self.assertEqual(result.compacted_output, "foo\nbar\nbaz\n")
+        self.assertEqual(result.output, "foo\nbar\nbaz\n")
+
     def test_complete_step_result_bad_output(self):
         job, result = self.create_running_job()
         post_data = self.create_complete_step_result_post_data(
@@ -915,6 +1228,144 @@ class Tests(ClientTester.ClientTester):
             self.compare_counts()
             self.assertEqual(response.status_code, 200)
 
+    def test_client_batch(self):
+        job, result0 = self.create_running_job()
+        result1 = utils.create_step_result(job=job, name="step1", position=1)
+        build_key = job.event.build_user.build_key
+        url = reverse(
+            "ci:client:client_batch", args=[build_key, job.client.name, job.pk]
+        )
+
+        def update(update_type, result, output="", complete=False):
+            return {
+                "type": update_type,
+                "stepresult_id": result.pk,
+                "payload": self.create_complete_step_result_post_data(
+                    result.position, output=output, complete=complete
+                ),
+            }
+
+        # only post allowed
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 405)
+
+        post_data = {
+            "updates": [
+                update("start_step_result", result0),
+                update("update_step_result", result0, "foo\n"),
+                update("update_step_result", result0, "bar\n"),
+                update("complete_step_result", result0, "foo\nbar\n", True),
+                update("start_step_result", result1),
+                update("update_step_result", result1, "baz\n"),
+            ],
+        }
+        response = self.client_post_json(url, post_data)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["status"], "OK")
+        self.assertEqual(data["command"], None)
+        self.assertEqual(data["applied"], 6)
+        self.assertFalse(data["output_trimmed"])
+        result0.refresh_from_db()
+        self.assertEqual(result0.status, models.JobStatus.SUCCESS)
+        self.assertEqual(result0.output, "foo\nbar\n")
+        self.assertEqual(result0.output_chunks.count(), 0)
+        result1.refresh_from_db()
+        self.assertEqual(result1.status, models.JobStatus.RUNNING)
+        self.assertEqual(result1.output, "baz\n")
+        job.refresh_from_db()
+        self.assertEqual(job.running_step, "2/2")
+
+        # The job got canceled
+        utils.update_job(job, status=models.JobStatus.CANCELED)
+        post_data = {"updates": [update("update_step_result", result1, "more\n")]}
+        response = self.client_post_json(url, post_data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["command"], "cancel")
+        utils.update_job(job, status=models.JobStatus.RUNNING)
+
+        # A bad update stops the batch but the previous updates are kept
+        other_result = utils.create_step_result()
+        for bad in [
+            {"type": "bad_type", "stepresult_id": result1.pk, "payload": {}},
+            {"type": "update_step_result", "stepresult_id": result1.pk, "payload": {}},
+            {"type": "update_step_result", "stepresult_id": 0, "payload": {}},
+            update("update_step_result", other_result),
+            {"type": "job_finished", "payload": {}},
+            {"payload": {}},
+        ]:
+            post_data = {"updates": [update("update_step_result", result1, "x\n"), bad]}
+            response = self.client_post_json(url, post_data)
+            self.assertEqual(response.status_code, 400)
+        result1.refresh_from_db()
+        self.assertEqual(result1.output, "baz\nmore\n" + "x\n" * 6)
+
+        # Bad job, build key, and client
+        for args in [
+            [build_key, job.client.name, 0],
+            [build_key + 1, job.client.name, job.pk],
+            [build_key, "unknown_client", job.pk],
+        ]:
+            bad_url = reverse("ci:client:client_batch", args=args)
+            response = self.client_post_json(bad_url, {"updates": []})
+            self.assertEqual(response.status_code, 400)
+        response = self.client_post_json(url, {})
+        self.assertEqual(response.status_code, 400)
+
+        # Finish the job
+        post_data = {
+            "updates": [
+                update("complete_step_result", result1, "baz\n", True),
+                {"type": "job_finished", "payload": {"seconds": 5, "complete": True}},
+            ]
+        }
+        response = self.client_post_json(url, post_data)
+        self.assertEqual(response.status_code, 200)
+        job.refresh_from_db()
+        self.assertTrue(job.complete)
+        self.assertEqual(job.status, models.JobStatus.SUCCESS)
+        job.client.refresh_from_db()
+        self.assertEqual(job.client.status, models.Client.IDLE)
+
+    @patch.object(UpdateRemoteStatus, "job_complete")
+    def test_client_batch_errors(self, mock_job_complete):
+        job, result = self.create_running_job()
+        build_key = job.event.build_user.build_key
+        url = reverse(
+            "ci:client:client_batch", args=[build_key, job.client.name, job.pk]
+        )
+        update = {
+            "type": "complete_step_result",
+            "stepresult_id": result.pk,
+            "payload": self.create_complete_step_result_post_data(
+                result.position, output="foo\n", complete=True
+            ),
+        }
+        finished = {"type": "job_finished", "payload": {"seconds": 5, "complete": True}}
+
+        # A database problem doesn't apply any of the updates
+        # and the client is told to send them again
+        with patch.object(
+            views, "apply_job_finished", side_effect=DatabaseError("locked")
+        ):
+            response = self.client_post_json(url, {"updates": [update, finished]})
+        self.assertEqual(response.status_code, 503)
+        result.refresh_from_db()
+        self.assertEqual(result.output, "")
+        job.refresh_from_db()
+        self.assertFalse(job.complete)
+        mock_job_complete.assert_not_called()
+
+        # A problem with the git server doesn't lose the updates
+        mock_job_complete.side_effect = Exception("Git server is down")
+        response = self.client_post_json(url, {"updates": [update, finished]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_job_complete.call_count, 1)
+        result.refresh_from_db()
+        self.assertEqual(result.output, "foo\n")
+        job.refresh_from_db()
+        self.assertTrue(job.complete)
+
     @patch.object(Permissions, "is_collaborator")
     def test_update_remote_job_status(self, mock_collab):
         mock_collab.return_value = False
@@ -20,6 +20,7 @@ app_name = "client"
 
 urlpatterns = [
     path("get_job/", views.get_job, name="get_job"),
+    path("claim_jobs/", views.claim_jobs, name="claim_jobs"),
     re_path(
         r"^job_finished/(?P<build_key>[0-9]+)/(?P<client_name>[-\w.]+)/(?P<job_id>[0-9]+)/$",
         views.job_finished,
@@ -40,6 +41,11 @@ urlpatterns = [
         views.complete_step_result,
         name="complete_step_result",
     ),
+    re_path(
+        r"^batch/(?P<build_key>[0-9]+)/(?P<client_name>[-\w.]+)/(?P<job_id>[0-9]+)/$",
+        views.client_batch,
+        name="client_batch",
+    ),
     re_path(r"^ping/(?P<client_name>[-\w.]+)/$", views.client_ping, name="client_ping"),
     re_path(
         r"^update_remote_job_status/(?P<job_id>[0-9]+)/$",
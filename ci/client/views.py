@@ -14,19 +14,24 @@
 
 from __future__ import unicode_literals, absolute_import
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse, HttpResponseNotAllowed, HttpResponseBadRequest
+from django.http import (
+    HttpResponse,
+    JsonResponse,
+    HttpResponseNotAllowed,
+    HttpResponseBadRequest,
+)
+import copy
 import json
-from ci import models, views, Permissions
-from ci.recipe import file_utils
+import time
+from ci import models, views, Permissions, LiveUpdates
+from ci.recipe import RecipePayload
 import logging
 from django.conf import settings
 from datetime import timedelta
-from ci.client import UpdateRemoteStatus
+from ci.client import UpdateRemoteStatus, OutputBudget
 from django.shortcuts import render, redirect, get_object_or_404
-from django.core.cache import cache
-from .ReadyJobs import get_ready_jobs
-from datetime import datetime
-from django.db import transaction
+from ci.client import ReadyJobs
+from django.db import DatabaseError, connection, transaction
 
 logger = logging.getLogger("ci")
 
@@ -47,168 +52,221 @@ def get_or_create_client(name, ip):
     return client
 
 
-def update_cached_jobs():
-    # Key in the cache used for storing the polled jobs
-    cached_jobs_key = "cached_jobs"
-
-    logger.info("Rebuilding ready job cache")
-    cached_jobs = {"expires": None, "jobs_by_config": {}}
-    jobs_by_config = cached_jobs.get("jobs_by_config")
-    ready_jobs = 0
-    for job in get_ready_jobs():
-        client_user = job.recipe.client_runner_user
-        build_key = None
-        client_build_key = None
-        if client_user is None:
-            build_key = job.recipe.build_user.build_key
-        else:
-            client_build_key = client_user.build_key
+def get_cached_job(client, build_keys, build_configs, workspaces=None):
+    """
+    Claims the highest priority ready job that the client can run.
+    Input:
+      workspaces[list[tuple(str, str)]]: (repository, base SHA) that the client
+        has checked out. Jobs for these are preferred.
+    Return:
+      tuple(models.Job, dict, int): The claimed job, its job info and the build key.
+        All None if no job was found.
+    """
+    claimed = get_cached_jobs(client, build_keys, build_configs, 1, workspaces)
+    if claimed:
+        return claimed[0]
+    return None, None, None
 
-        entry = {
-            "pk": job.pk,
-            "build_key": build_key,
-            "client_build_key": client_build_key,
-            "client": job.client.name if job.client else None,
-        }
 
-        if job.config.name not in jobs_by_config:
-            jobs_by_config[job.config.name] = []
-        jobs_by_config[job.config.name].append(entry)
-        ready_jobs += 1
+def get_cached_jobs(client, build_keys, build_configs, num_jobs, workspaces=None):
+    """
+    Claims up to num_jobs of the highest priority ready jobs that
+    the client can run. All the jobs are claimed in one transaction.
+    Return:
+      list[tuple(models.Job, dict, int)]: The claimed jobs, their job info and build keys.
+    """
+    with ReadyJobs.claim_lock():
+        return claim_cached_jobs(
+            client, build_keys, build_configs, num_jobs, workspaces
+        )
 
-    logger.info(f"Job cache rebuilt with {ready_jobs} ready job(s)")
-    cached_jobs["expires"] = (
-        datetime.now().timestamp() + settings.GET_JOB_UPDATE_INTERVAL / 1000
-    )
-    cache.set(cached_jobs_key, cached_jobs)
 
-    return cached_jobs
+def locked_candidates(client, build_keys, build_configs, num_jobs, workspaces=None):
+    """
+    Generator of the jobs that the client can claim, in the order they
+    should be claimed. The jobs are read straight from the database.
+    If it supports SKIP LOCKED then they are locked so clients in any
+    process claim concurrently without handing out the same job.
+    Must be called inside a transaction.
+    Yields:
+      tuple(models.Job, int): The job and the build key it was claimed with
+    """
+    # Go through the jobs by our build configs; this lets
+    # a client prioritize build config. That is, if any jobs exist
+    # with the first config, they will take priority. Then the second,
+    # and so on
+    for build_config in build_configs:
+        entries = ReadyJobs.lock_ready_jobs(
+            build_config, build_keys, client.name, num_jobs, workspaces
+        )
+        for entry in entries:
+            job = entry["job"]
+            if not ReadyJobs.mark_job_claimed(job, client):
+                continue
+            yield job, entry["bucket"][1]
 
 
-@transaction.atomic(durable=True)
-def get_cached_job(client, build_keys, build_configs):
-    # Key in the cache used for storing the polled jobs
-    cached_jobs_key = "cached_jobs"
-
-    # For thread locking if we have a cache that supports it
-    lock_context = None
-    if hasattr(cache, "lock"):
-        acquire_timeout = 2
-        lock_context = cache.lock(
-            "get_cached_job_lock", blocking_timeout=acquire_timeout
+def indexed_candidates(client, build_keys, build_configs, workspaces=None):
+    """
+    Generator of the jobs that the client can claim, in the order they
+    should be claimed. The candidates come from the ready job index so
+    only the jobs matching the client's build configs and build keys are
+    looked at. Only used when ReadyJobs.use_ready_job_index() is True.
+    Must be called inside a transaction.
+    Yields:
+      tuple(models.Job, int): The job and the build key it was claimed with
+    """
+    index = ReadyJobs.get_ready_job_index()
+
+    for build_config in build_configs:
+        candidates = ReadyJobs.get_candidates(
+            index, build_config, build_keys, client.name, workspaces
         )
+        for entry in candidates:
+            job = ReadyJobs.load_ready_job(entry["pk"])
+            if job is None:
+                logger.warning(f"Job {entry['pk']} is indexed but doesn't exist")
+                ReadyJobs.remove_ready_job(entry["pk"])
+                continue
+            if not ReadyJobs.is_ready_job(job) or ReadyJobs.job_bucket(job) != tuple(
+                entry["bucket"]
+            ):
+                logger.warning(f"Job {job.pk} is in different state than index")
+                ReadyJobs.update_ready_job(job)
+                continue
 
-    def run_locked():
-        build_key = None
-        job_info = None
-        job = None
-
-        cached_jobs = cache.get(cached_jobs_key)
-        rebuild_cache = False
-        now = datetime.now().timestamp()
-        if cached_jobs is None:
-            logger.info("Rebuilding job cache as it is not yet built")
-            rebuild_cache = True
-        elif cached_jobs["expires"] <= now:
-            logger.info("Rebuilding job cache because it is expired")
-            rebuild_cache = True
-        if rebuild_cache:
-            cached_jobs = update_cached_jobs()
-
-        # Sort through the cached jobs by our build configs; this lets
-        # a client prioritize build config. That is, if any jobs exist
-        # with the first config, they will take priority. Then the second,
-        # and so on
-        jobs_by_config = cached_jobs["jobs_by_config"]
-        for build_config in build_configs:
-            # No jobs by this config found
-            if build_config not in jobs_by_config:
+            if not ReadyJobs.mark_job_claimed(job, client):
+                # Claimed by another process after we loaded it
+                ReadyJobs.remove_ready_job(job.pk)
                 continue
 
-            jobs = jobs_by_config[build_config]
-            for job_i in range(len(jobs)):
-                job_entry = jobs[job_i]
-                job_build_key = job_entry["build_key"]
-                job_client_build_key = job_entry["client_build_key"]
-                # Job isn't for this build key
-                if job_build_key is not None and job_build_key in build_keys:
-                    build_key = job_build_key
-                elif (
-                    job_client_build_key is not None
-                    and job_client_build_key in build_keys
-                ):
-                    build_key = job_client_build_key
-                else:
-                    continue
-                # Job has a client set and it's not this one
-                if (
-                    job_entry["client"] is not None
-                    and job_entry["client"] != client.name
-                ):
-                    continue
-                # We could check server here, but I don't think it's necessary beacuse
-                # the build keys should be unique
-
-                job = models.Job.objects.select_related(
-                    "config", "client", "recipe", "event"
-                ).get(pk=job_entry["pk"])
-
-                if job.status != models.JobStatus.NOT_STARTED:
-                    logger.warning(f"Job {job.pk} is cached but has already started")
-                    job = None
-                    continue
-                if (
-                    job.config.name != build_config
-                    or job.recipe.build_user.build_key != job_entry["build_key"]
-                    or (
-                        job.client is not None
-                        and job_entry["client"] != job.client.name
-                    )
-                    or (job.client is None and job_entry["client"] is not None)
-                ):
-                    logger.warning(f"Job {job.pk} is in different state than cache")
-                    job = None
-                    continue
-
-                job_info = get_job_info(job)
-                job.client = client
-                job.set_status(models.JobStatus.RUNNING)  # will save
-
-                # Remove this job from being available in the cache
-                del cached_jobs["jobs_by_config"][build_config][job_i]
-                cache.set(cached_jobs_key, cached_jobs)
+            # Remove this job from being available in the index
+            ReadyJobs.remove_ready_job(job.pk)
+            yield job, entry["bucket"][1]
 
-                break
 
-            if job:
+@transaction.atomic(durable=True)
+def claim_cached_jobs(client, build_keys, build_configs, num_jobs, workspaces=None):
+    claimed = []
+    if num_jobs > 0:
+        if ReadyJobs.use_ready_job_index():
+            candidates = indexed_candidates(
+                client, build_keys, build_configs, workspaces
+            )
+        else:
+            candidates = locked_candidates(
+                client, build_keys, build_configs, num_jobs, workspaces
+            )
+        for job, build_key in candidates:
+            claimed.append((job, build_key))
+            if len(claimed) >= num_jobs:
                 break
 
-        return job, job_info, build_key
+    jobs = [job for job, build_key in claimed]
+    jobs_info = get_jobs_info(jobs)
+    for job in jobs:
+        job.set_status(models.JobStatus.RUNNING)  # will save
+    return [
+        (job, job_info, build_key)
+        for (job, build_key), job_info in zip(claimed, jobs_info)
+    ]
 
-    if lock_context is None:
-        return run_locked()
-    else:
-        from redis.exceptions import LockError
 
-        try:
-            with lock_context:
-                return run_locked()
-        except LockError:
-            logger.warning(f"Failed to acquire cached job lock for {client.name}")
+def wait_for_cached_jobs(
+    client, build_keys, build_configs, num_jobs, wait, workspaces=None
+):
+    """
+    Claims jobs like get_cached_jobs(), but if there aren't any
+    available then waits up to wait seconds for some to become ready.
+    Input:
+      wait[float]: Maximum number of seconds to wait
+    Return:
+      Same as get_cached_jobs()
+    """
+    deadline = time.monotonic() + wait
+    while True:
+        # Get the version first so that we don't miss jobs that
+        # become ready while we are looking
+        version = ReadyJobs.ready_jobs_version()
+        claimed = get_cached_jobs(
+            client, build_keys, build_configs, num_jobs, workspaces
+        )
+        remaining = deadline - time.monotonic()
+        if claimed or remaining <= 0:
+            return claimed
+        ReadyJobs.wait_for_ready_jobs(version, remaining)
+
 
+def wait_for_cached_job(client, build_keys, build_configs, wait, workspaces=None):
+    """
+    Same as wait_for_cached_jobs() but for a single job.
+    Return:
+      Same as get_cached_job()
+    """
+    claimed = wait_for_cached_jobs(
+        client, build_keys, build_configs, 1, wait, workspaces
+    )
+    if claimed:
+        return claimed[0]
     return None, None, None
 
 
-@csrf_exempt
-def get_job(request):
-    data, response = check_post(request, ["client_name", "build_keys", "build_configs"])
-    if response is not None:
-        return response
+def long_poll_response(response):
+    """
+    Advertise to the client the maximum number of seconds it
+    can ask to wait for a job.
+    Old clients don't allow extra keys in the JSON so this is done
+    with a header.
+    """
+    if settings.GET_JOB_LONG_POLL_MAX_WAIT > 0:
+        response["X-Civet-Long-Poll"] = str(settings.GET_JOB_LONG_POLL_MAX_WAIT)
+    return response
+
+
+def get_wait(data):
+    """
+    Gets the optional number of seconds a client wants to wait for a job.
+    Return:
+      float: Seconds to wait, limited to GET_JOB_LONG_POLL_MAX_WAIT. None if invalid.
+    """
+    try:
+        wait = float(data.get("wait", 0))
+    except (TypeError, ValueError):
+        return None
+    return max(0, min(wait, settings.GET_JOB_LONG_POLL_MAX_WAIT))
 
-    client_name = data.get("client_name")
-    build_keys = data.get("build_keys")
-    build_configs = data.get("build_configs")
 
+def get_workspaces(data):
+    """
+    Gets the optional list of workspaces that the client has checked out.
+    Each is a dict with "repository" and "sha".
+    Return:
+      list[tuple(str, str)]: (repository, base SHA), limited to CLIENT_MAX_WORKSPACES.
+        None if invalid.
+    """
+    workspaces = data.get("workspaces", [])
+    if not isinstance(workspaces, list):
+        return None
+    result = []
+    for workspace in workspaces[: settings.CLIENT_MAX_WORKSPACES]:
+        if not isinstance(workspace, dict):
+            return None
+        repo = workspace.get("repository")
+        sha = workspace.get("sha")
+        if not isinstance(repo, str) or not isinstance(sha, str):
+            return None
+        result.append((repo, sha))
+    return result
+
+
+def get_idle_client(request, client_name, running_jobs=None):
+    """
+    Gets the client that is asking for work and sets it to idle.
+    Input:
+      running_jobs[list[int]]: Jobs that the client is still running
+        in its other slots. Any other jobs the server thinks it is
+        running are canceled.
+    """
     client, created = models.Client.objects.get_or_create(
         name=client_name, ip=get_client_ip(request)
     )
@@ -220,21 +278,53 @@ def get_job(request):
         past_running_jobs = models.Job.objects.filter(
             client=client, complete=False, status=models.JobStatus.RUNNING
         )
+        if running_jobs:
+            past_running_jobs = past_running_jobs.exclude(pk__in=running_jobs)
         msg = "Canceled due to client %s not finishing job" % client.name
         for j in past_running_jobs.all():
             views.set_job_canceled(j, msg)
             UpdateRemoteStatus.job_complete(j)
 
-    client.status_message = "Looking for work"
-    client.status = models.Client.IDLE
+    if running_jobs:
+        client.status_message = "Running {} job(s), looking for work".format(
+            len(running_jobs)
+        )
+        client.status = models.Client.RUNNING
+    else:
+        client.status_message = "Looking for work"
+        client.status = models.Client.IDLE
     client.save()
+    return client
+
+
+@csrf_exempt
+def get_job(request):
+    data, response = check_post(request, ["client_name", "build_keys", "build_configs"])
+    if response is not None:
+        return response
+
+    client_name = data.get("client_name")
+    build_keys = data.get("build_keys")
+    build_configs = data.get("build_configs")
+    # Optional, number of seconds to wait for a job to become ready
+    wait = get_wait(data)
+    # Optional, workspaces the client has checked out
+    workspaces = get_workspaces(data)
+    if wait is None or workspaces is None:
+        return HttpResponseBadRequest("Bad POST data")
+
+    client = get_idle_client(request, client_name)
 
     # This is atomic
-    job, job_info, build_key = get_cached_job(client, build_keys, build_configs)
+    job, job_info, build_key = wait_for_cached_job(
+        client, build_keys, build_configs, wait, workspaces
+    )
 
     # No job found
     if job is None:
-        return json_claim_response(None, None, None, None, None, None)
+        return long_poll_response(
+            json_claim_response(None, None, None, None, None, None)
+        )
 
     # The client is now running
     client.status = models.Client.RUNNING
@@ -247,19 +337,91 @@ def get_job(request):
     )
 
     UpdateRemoteStatus.job_started(job)
-    return json_claim_response(
-        job.pk, job.config.name, True, "Success", build_key, job_info
+    return long_poll_response(
+        json_claim_response(
+            job.pk, job.config.name, True, "Success", build_key, job_info
+        )
     )
 
 
+@csrf_exempt
+def claim_jobs(request):
+    """
+    Claims up to "slots" jobs at once for a client that can
+    run several jobs at the same time.
+    The client can pass the ids of the jobs it is still running
+    in "running_jobs" so that they don't get canceled, and the
+    repositories it has checked out in "workspaces", like get_job.
+    The response has a "jobs" list where each entry is the same
+    as what get_job returns for a single job.
+    """
+    data, response = check_post(
+        request, ["client_name", "build_keys", "build_configs", "slots"]
+    )
+    if response is not None:
+        return response
+
+    client_name = data.get("client_name")
+    build_keys = data.get("build_keys")
+    build_configs = data.get("build_configs")
+    try:
+        slots = int(data.get("slots"))
+    except (TypeError, ValueError):
+        slots = 0
+    wait = get_wait(data)
+    workspaces = get_workspaces(data)
+    running_jobs = data.get("running_jobs", [])
+    if (
+        slots < 1
+        or wait is None
+        or workspaces is None
+        or not isinstance(running_jobs, list)
+        or not all(isinstance(job_id, int) for job_id in running_jobs)
+    ):
+        return HttpResponseBadRequest("Bad POST data")
+    slots = min(slots, settings.CLIENT_MAX_SLOTS)
+
+    client = get_idle_client(request, client_name, running_jobs)
+
+    # This is atomic
+    claimed = wait_for_cached_jobs(
+        client, build_keys, build_configs, slots, wait, workspaces
+    )
+
+    jobs = []
+    for job, job_info, build_key in claimed:
+        logger.info(
+            "Client %s got job %s: %s: on %s"
+            % (client_name, job.pk, job, job.recipe.repository)
+        )
+        UpdateRemoteStatus.job_started(job)
+        jobs.append(
+            claim_dict(job.pk, job.config.name, True, "Success", build_key, job_info)
+        )
+
+    if claimed:
+        # The client is now running
+        client.status = models.Client.RUNNING
+        client.status_message = ", ".join(
+            "Job {}: {}".format(job.pk, job) for job, _, _ in claimed
+        )
+        if running_jobs:
+            client.status_message += " (and {} more)".format(len(running_jobs))
+        client.save()
+
+    return long_poll_response(JsonResponse({"status": "OK", "jobs": jobs}))
+
+
+def has_keys(data, required_keys):
+    return set(required_keys).issubset(set(data.keys()))
+
+
 def check_post(request, required_keys):
     if request.method != "POST":
         return None, HttpResponseNotAllowed(["POST"])
     try:
         data = json.loads(request.body)
-        required = set(required_keys)
-        available = set(data.keys())
-        if not required.issubset(available):
+        if not has_keys(data, required_keys):
             logger.debug("Bad POST data.\nRequest: %s" % data)
             return data, HttpResponseBadRequest("Bad POST data")
         return data, None
@@ -275,122 +437,120 @@ def get_job_info(job):
     of the user changing the recipe while a job is running
     and causing problems.
     """
-    job_dict = {
-        "recipe_name": job.recipe.name,
-        "job_id": job.pk,
-    }
+    return get_jobs_info([job])[0]
 
-    recipe_env = {
-        "CIVET_JOB_ID": job.pk,
-        "CIVET_RECIPE_NAME": job.recipe.name,
-        "CIVET_RECIPE_ID": job.recipe.pk,
-        "CIVET_COMMENTS_URL": str(job.event.comments_url),
-        "CIVET_BASE_REPO": str(job.event.base.repo()),
-        "CIVET_BASE_REF_ORIGINAL": job.event.base.branch.name,
-        "CIVET_BASE_REF": job.event.base.branch.name,
-        "CIVET_BASE_SHA": job.event.base.sha,
-        "CIVET_BASE_SSH_URL": str(job.event.base.ssh_url),
-        "CIVET_HEAD_REPO": str(job.event.head.repo()),
-        "CIVET_HEAD_REF": job.event.head.branch.name,
-        "CIVET_HEAD_SHA": job.event.head.sha,
-        "CIVET_HEAD_SSH_URL": str(job.event.head.ssh_url),
-        "CIVET_EVENT_CAUSE": job.recipe.cause_str(),
-        "CIVET_EVENT_ID": job.event.pk,
-        "CIVET_BUILD_CONFIG": job.config.name,
-        "CIVET_INVALIDATED": str(job.invalidated),
-        "CIVET_NUM_STEPS": "0",
-    }
 
-    if job.event.pull_request:
-        recipe_env["CIVET_PR_NUM"] = str(job.event.pull_request.number)
-        if job.recipe.pr_base_ref_override:
-            recipe_env["CIVET_BASE_REF"] = job.recipe.pr_base_ref_override
-    else:
-        recipe_env["CIVET_PR_NUM"] = "0"
-
-    for env in job.recipe.environment_vars.all():
-        recipe_env[env.name] = env.value
-
-    job_dict["environment"] = recipe_env
-
-    base_file_dir = settings.RECIPE_BASE_DIR
-    prestep_env = []
-    for prestep in job.recipe.prestepsources.all():
-        if prestep.filename:
-            contents = file_utils.get_contents(base_file_dir, prestep.filename)
-            if contents:
-                prestep_env.append(contents)
-
-    job_dict["prestep_sources"] = prestep_env
-
-    job.step_results.all().delete()
-    step_recipes = []
-    for step in job.recipe.steps.order_by("position"):
-        step_dict = {
-            "step_num": step.position,
-            "step_position": step.position,
-            "step_name": step.name,
-            "abort_on_failure": step.abort_on_failure,
-            "allowed_to_fail": step.allowed_to_fail,
+def get_jobs_info(jobs):
+    """
+    Same as get_job_info() but for several jobs at once.
+    The recipe parts come from the recipe payload cache so that
+    only the event specific variables need to be filled in.
+    The StepResults for all the jobs are created with a single insert
+    so the number of queries doesn't depend on the number of steps.
+    Input:
+      jobs[list[models.Job]]: Jobs being handed out to a client
+    Return:
+      list[dict]: The job info for each job, in the same order
+    """
+    models.StepResult.objects.filter(job__in=jobs).delete()
+    jobs_info = []
+    step_results = []
+    recipe_repo_sha = RecipePayload.recipe_repo_sha() if jobs else None
+    payloads = RecipePayload.get_payloads([job.recipe for job in jobs], recipe_repo_sha)
+    for job in jobs:
+        # The steps get the StepResult ids added so each job needs its own copy
+        payload = copy.deepcopy(payloads[job.recipe_id])
+        job_dict = {
+            "recipe_name": payload["recipe_name"],
+            "job_id": job.pk,
         }
 
-        step_result, created = models.StepResult.objects.get_or_create(
-            job=job,
-            name=step.name,
-            position=step.position,
-            abort_on_failure=step.abort_on_failure,
-            allowed_to_fail=step.allowed_to_fail,
-            filename=step.filename,
-        )
+        recipe_env = {
+            "CIVET_JOB_ID": job.pk,
+            "CIVET_RECIPE_NAME": payload["environment"]["CIVET_RECIPE_NAME"],
+            "CIVET_RECIPE_ID": payload["environment"]["CIVET_RECIPE_ID"],
+            "CIVET_COMMENTS_URL": str(job.event.comments_url),
+            "CIVET_BASE_REPO": str(job.event.base.repo()),
+            "CIVET_BASE_REF_ORIGINAL": job.event.base.branch.name,
+            "CIVET_BASE_REF": job.event.base.branch.name,
+            "CIVET_BASE_SHA": job.event.base.sha,
+            "CIVET_BASE_SSH_URL": str(job.event.base.ssh_url),
+            "CIVET_HEAD_REPO": str(job.event.head.repo()),
+            "CIVET_HEAD_REF": job.event.head.branch.name,
+            "CIVET_HEAD_SHA": job.event.head.sha,
+            "CIVET_HEAD_SSH_URL": str(job.event.head.ssh_url),
+            "CIVET_EVENT_CAUSE": payload["environment"]["CIVET_EVENT_CAUSE"],
+            "CIVET_EVENT_ID": job.event.pk,
+            "CIVET_BUILD_CONFIG": job.config.name,
+            "CIVET_INVALIDATED": str(job.invalidated),
+            "CIVET_NUM_STEPS": "0",
+        }
 
-        logger.info(
-            "Created step result for {}: {}: {}: {}".format(
-                job.pk, job, step_result.pk, step.name
-            )
+        if job.event.pull_request:
+            recipe_env["CIVET_PR_NUM"] = str(job.event.pull_request.number)
+            if payload["pr_base_ref_override"]:
+                recipe_env["CIVET_BASE_REF"] = payload["pr_base_ref_override"]
+        else:
+            recipe_env["CIVET_PR_NUM"] = "0"
+
+        for name, value in payload["recipe_environment"]:
+            recipe_env[name] = value
+
+        job_dict["environment"] = recipe_env
+        job_dict["prestep_sources"] = payload["prestep_sources"]
+
+        for step_result in payload["step_results"]:
+            step_results.append(models.StepResult(job=job, **step_result))
+
+        job_dict["environment"]["CIVET_NUM_STEPS"] = str(len(payload["steps"]))
+        job_dict["steps"] = payload["steps"]
+        job.recipe_repo_sha = recipe_repo_sha
+        jobs_info.append(job_dict)
+
+    if jobs:
+        models.Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            recipe_repo_sha=recipe_repo_sha
         )
-        step_result.output = ""
-        step_result.complete = False
-        step_result.seconds = timedelta(seconds=0)
-        step_result.status = models.JobStatus.NOT_STARTED
-        step_result.save()
-        step_dict["stepresult_id"] = step_result.pk
-
-        step_env = {
-            "CIVET_STEP_NUM": step_dict["step_num"],
-            "CIVET_STEP_POSITION": step_dict["step_position"],
-            "CIVET_STEP_NAME": step_dict["step_name"],
-            "CIVET_STEP_ABORT_ON_FAILURE": step_dict["abort_on_failure"],
-            "CIVET_STEP_ALLOWED_TO_FAIL": step_dict["allowed_to_fail"],
-        }
-        for env in step.step_environment.all():
-            step_env[env.name] = env.value
-        step_dict["environment"] = step_env
 
-        if step.filename:
-            contents = file_utils.get_contents(base_file_dir, step.filename)
-            step_dict["script"] = str(contents)  # in case of empty file, use str
+    step_results = models.StepResult.objects.bulk_create(step_results)
+    if not connection.features.can_return_rows_from_bulk_insert:
+        # The pks weren't set by the insert so we need to look them up
+        pks = dict(
+            ((sr.job_id, sr.position), sr.pk)
+            for sr in models.StepResult.objects.filter(job__in=jobs)
+        )
+        for step_result in step_results:
+            step_result.pk = pks[(step_result.job_id, step_result.position)]
+
+    step_results = iter(step_results)
+    for job, job_dict in zip(jobs, jobs_info):
+        for step_dict in job_dict["steps"]:
+            step_result = next(step_results)
+            step_dict["stepresult_id"] = step_result.pk
+            logger.info(
+                "Created step result for {}: {}: {}: {}".format(
+                    job.pk, job, step_result.pk, step_result.name
+                )
+            )
 
-        step_recipes.append(step_dict)
+    return jobs_info
 
-    job_dict["environment"]["CIVET_NUM_STEPS"] = str(len(step_recipes))
-    job_dict["steps"] = step_recipes
-    job.recipe_repo_sha = file_utils.get_repo_sha(base_file_dir)
-    job.save()
 
-    return job_dict
+def claim_dict(job_id, config_name, claimed, msg, build_key, job_info=None):
+    return {
+        "job_id": job_id,
+        "config": config_name,
+        "success": claimed,
+        "message": msg,
+        "status": "OK",
+        "job_info": job_info,
+        "build_key": build_key,
+    }
 
 
 def json_claim_response(job_id, config_name, claimed, msg, build_key, job_info=None):
     return JsonResponse(
-        {
-            "job_id": job_id,
-            "config": config_name,
-            "success": claimed,
-            "message": msg,
-            "status": "OK",
-            "job_info": job_info,
-            "build_key": build_key,
-        }
+        claim_dict(job_id, config_name, claimed, msg, build_key, job_info)
     )
 
 
@@ -398,40 +558,61 @@ def json_finished_response(status, msg):
     return JsonResponse({"status": status, "message": msg})
 
 
-def check_job_finished_post(request, build_key, client_name, job_id):
-    data, response = check_post(request, ["seconds", "complete"])
+# Keys that need to be in the data sent for a job_finished update
+JOB_FINISHED_KEYS = ["seconds", "complete"]
+# Keys that need to be in the data sent for a step result update
+STEP_RESULT_KEYS = ["step_num", "output", "time", "complete", "exit_status"]
 
-    if response:
-        return response, None, None, None
 
+def get_post_client(request, client_name):
+    """
+    Gets the client that is posting an update.
+    Return:
+      models.Client or None if it doesn't exist
+    """
     try:
-        client = models.Client.objects.get(name=client_name, ip=get_client_ip(request))
+        return models.Client.objects.get(name=client_name, ip=get_client_ip(request))
     except models.Client.DoesNotExist:
-        return HttpResponseBadRequest("Invalid client"), None, None, None
+        return None
+
 
+def get_client_job(client, build_key, job_id):
+    """
+    Gets a job that is running on a client.
+    Return:
+      models.Job or None if it doesn't exist
+    """
     try:
-        job = models.Job.objects.get(
+        return models.Job.objects.get(
             pk=job_id, client=client, event__build_user__build_key=build_key
         )
     except models.Job.DoesNotExist:
+        return None
+
+
+def check_job_finished_post(request, build_key, client_name, job_id):
+    data, response = check_post(request, JOB_FINISHED_KEYS)
+
+    if response:
+        return response, None, None, None
+
+    client = get_post_client(request, client_name)
+    if client is None:
+        return HttpResponseBadRequest("Invalid client"), None, None, None
+
+    job = get_client_job(client, build_key, job_id)
+    if job is None:
         return HttpResponseBadRequest("Invalid job/build_key"), None, None, None
 
     return None, data, client, job
 
 
-@csrf_exempt
-def job_finished(request, build_key, client_name, job_id):
+def apply_job_finished(job, client, data):
     """
-    Called when all the steps in the job are finished or when a job fails and is not
-    going to do anymore steps.
-    Should be called for every job, no matter if it was canceled or failed.
+    Marks a job as finished with the data sent by the client.
+    Return:
+      tuple(str, bool): Command for the client and whether output was trimmed.
     """
-    response, data, client, job = check_job_finished_post(
-        request, build_key, client_name, job_id
-    )
-    if response:
-        return response
-
     job.running_step = ""
     job.seconds = timedelta(seconds=data["seconds"])
     job.complete = data["complete"]
@@ -442,6 +623,11 @@ def job_finished(request, build_key, client_name, job_id):
     job.save()
     job.event.save()  # update timestamp
 
+    # Steps that didn't complete, like when the job was canceled,
+    # still have their output in chunks
+    for step_result in job.step_results.filter(output_chunks__isnull=False).distinct():
+        step_result.compact_output()
+
     status = None
     # If the job is already set to canceled, we don't want to change it
     if job.status == models.JobStatus.CANCELED:
@@ -451,43 +637,93 @@ def job_finished(request, build_key, client_name, job_id):
     client.status = models.Client.IDLE
     client.status_message = "Finished job {}: {}".format(job.pk, job)
     client.save()
-    if not UpdateRemoteStatus.job_complete(job):
-        job.event.make_jobs_ready()
+    LiveUpdates.publish_status(job)
+    return None, False
+
+
+def finish_job(job):
+    """
+    Updates the git server for a finished job and makes the jobs
+    that depend on it ready.
+    This talks to the git server so it should be called after the
+    updates from the client are committed. A problem with the git
+    server is logged instead of losing them.
+    """
+    try:
+        all_done = UpdateRemoteStatus.job_complete(job)
+    except Exception:
+        logger.exception(f"Failed to update the status of finished job {job.pk}")
+        all_done = False
+    if not all_done:
+        job.event.make_dependents_ready(job)
+
+
+@csrf_exempt
+def job_finished(request, build_key, client_name, job_id):
+    """
+    Called when all the steps in the job are finished or when a job fails and is not
+    going to do anymore steps.
+    Should be called for every job, no matter if it was canceled or failed.
+    """
+    response, data, client, job = check_job_finished_post(
+        request, build_key, client_name, job_id
+    )
+    if response:
+        return response
+
+    apply_job_finished(job, client, data)
+    finish_job(job)
     return json_finished_response("OK", "Success")
 
 
-def json_update_response(status, msg, cmd=None):
+def update_dict(status, msg, cmd=None, output_trimmed=False):
     """
     status: current status of the job
     msg: "success" so that the client knows everything was handled properly
     cmd : None or "cancel" if the job got canceled
+    output_trimmed: Whether the server is removing output to keep the step under budget
     """
-    data = {"status": status, "message": msg, "command": cmd}
-    return JsonResponse(data)
+    return {
+        "status": status,
+        "message": msg,
+        "command": cmd,
+        "output_trimmed": output_trimmed,
+    }
 
 
-def check_step_result_post(request, build_key, client_name, stepresult_id):
-    data, response = check_post(
-        request, ["step_num", "output", "time", "complete", "exit_status"]
-    )
+def json_update_response(status, msg, cmd=None, output_trimmed=False):
+    return JsonResponse(update_dict(status, msg, cmd, output_trimmed))
 
-    if response:
-        return response, None, None, None
 
+def get_step_result(stepresult_id):
+    """
+    Return:
+      models.StepResult or None if it doesn't exist
+    """
     try:
-        step_result = models.StepResult.objects.select_related(
+        return models.StepResult.objects.select_related(
             "job",
             "job__event",
             "job__event__base__branch__repository",
             "job__client",
             "job__event__pull_request",
         ).get(pk=stepresult_id)
-    except models.StepResult.DoesNotExist:
+    except (models.StepResult.DoesNotExist, ValueError, TypeError):
+        return None
+
+
+def check_step_result_post(request, build_key, client_name, stepresult_id):
+    data, response = check_post(request, STEP_RESULT_KEYS)
+
+    if response:
+        return response, None, None, None
+
+    step_result = get_step_result(stepresult_id)
+    if step_result is None:
         return HttpResponseBadRequest("Invalid stepresult id"), None, None, None
 
-    try:
-        client = models.Client.objects.get(name=client_name, ip=get_client_ip(request))
-    except models.Client.DoesNotExist:
+    client = get_post_client(request, client_name)
+    if client is None:
         return HttpResponseBadRequest("Invalid client"), None, None, None
 
     if client != step_result.job.client:
@@ -500,14 +736,12 @@ def check_step_result_post(request, build_key, client_name, stepresult_id):
     return None, data, step_result, client
 
 
-@csrf_exempt
-def start_step_result(request, build_key, client_name, stepresult_id):
-    response, data, step_result, client = check_step_result_post(
-        request, build_key, client_name, stepresult_id
-    )
-    if response:
-        return response
-
+def apply_start_step_result(step_result, client, data):
+    """
+    Marks a step as running.
+    Return:
+      tuple(str, bool): Command for the client and whether output was trimmed.
+    """
     cmd = None
     # could have been canceled in between getting the job and starting the job
     status = models.JobStatus.RUNNING
@@ -527,12 +761,25 @@ def start_step_result(request, build_key, client_name, stepresult_id):
     )
     client.save()
     step_result.job.event.save()  # update timestamp
+    LiveUpdates.publish_status(step_result.job, step_result)
+    return cmd, False
+
+
+@csrf_exempt
+def start_step_result(request, build_key, client_name, stepresult_id):
+    response, data, step_result, client = check_step_result_post(
+        request, build_key, client_name, stepresult_id
+    )
+    if response:
+        return response
+
+    cmd, trimmed = apply_start_step_result(step_result, client, data)
     return json_update_response("OK", "success", cmd)
 
 
-def save_step_result(step_result):
+def save_step_result(step_result, update_fields=None):
     try:
-        step_result.save()
+        step_result.save(update_fields=update_fields)
     except Exception as e:
         # We could potentially have bad output that causes errors when saving.
         # For example, on Postgresql:
@@ -541,23 +788,60 @@ def save_step_result(step_result):
         step_result.save()
 
 
-def step_result_from_data(step_result, data, status):
+def append_step_output(step_result, output):
+    """
+    Return:
+      bool: Whether output is being removed to keep the step under budget
+    """
+    try:
+        with transaction.atomic():
+            return OutputBudget.append_output(step_result, output)
+    except Exception as e:
+        # Same as in save_step_result()
+        step_result.append_output("Failed to save output:\n%s" % e)
+    return False
+
+
+# The fields of a StepResult that change when output is appended
+APPEND_OUTPUT_FIELDS = [
+    "seconds",
+    "complete",
+    "exit_status",
+    "status",
+    "output_bytes_seen",
+    "last_modified",
+]
+
+
+def step_result_from_data(step_result, data, status, replace_output=False):
+    """
+    Updates a StepResult with the data sent by the client.
+    Input:
+      replace_output[bool]: If True then the output replaces all the
+        existing output, otherwise it gets appended.
+    Return:
+      bool: Whether output was removed to keep the step under budget
+    """
     step_result.seconds = timedelta(seconds=data["time"])
-    step_result.output = step_result.output + data["output"]
     step_result.complete = data["complete"]
     step_result.exit_status = int(data["exit_status"])
     step_result.status = status
-    save_step_result(step_result)
+    if replace_output:
+        trimmed = OutputBudget.replace_output(step_result, data["output"])
+        save_step_result(step_result)
+    else:
+        trimmed = append_step_output(step_result, data["output"])
+        # The output is in the chunks so only save what changed
+        save_step_result(step_result, APPEND_OUTPUT_FIELDS)
+    return trimmed
 
 
-@csrf_exempt
-def complete_step_result(request, build_key, client_name, stepresult_id):
-    response, data, step_result, client = check_step_result_post(
-        request, build_key, client_name, stepresult_id
-    )
-    if response:
-        return response
-
+def apply_complete_step_result(step_result, client, data):
+    """
+    Sets the final status and output of a step.
+    Return:
+      tuple(str, bool): Command for the client and whether output was trimmed.
+    """
     status = models.JobStatus.SUCCESS
     if data.get("canceled"):
         status = models.JobStatus.CANCELED
@@ -573,52 +857,75 @@ def complete_step_result(request, build_key, client_name, stepresult_id):
         if step_result.allowed_to_fail:
             status = models.JobStatus.FAILED_OK
 
-    step_result_from_data(step_result, data, status)
+    # The client sends all of the output when the step is complete
+    # so it replaces the chunks that were sent while it was running
+    trimmed = step_result_from_data(
+        step_result, data, status, replace_output=data["complete"]
+    )
 
     step_result.job.seconds = step_result.job.calc_total_time()
     step_result.job.save()  # update timestamp
     step_result.job.event.save()  # update timestamp
     if data["complete"]:
-        step_result.output = data["output"]
-        save_step_result(step_result)
-
         client.status_msg = "Completed {}: {}".format(step_result.job, step_result.name)
         client.save()
-
-    return json_update_response("OK", "success")
+    LiveUpdates.publish_status(step_result.job, step_result)
+    return None, trimmed
 
 
 @csrf_exempt
-def update_step_result(request, build_key, client_name, stepresult_id):
+def complete_step_result(request, build_key, client_name, stepresult_id):
     response, data, step_result, client = check_step_result_post(
         request, build_key, client_name, stepresult_id
     )
     if response:
         return response
 
-    step_result_from_data(step_result, data, models.JobStatus.RUNNING)
+    cmd, trimmed = apply_complete_step_result(step_result, client, data)
+    return json_update_response("OK", "success", output_trimmed=trimmed)
+
+
+def apply_update_step_result(step_result, client, data):
+    """
+    Adds the output of a running step.
+    Return:
+      tuple(str, bool): Command for the client and whether output was trimmed.
+    """
     job = step_result.job
+    previous_seconds = step_result.seconds
+    previous_offset = step_result.output_bytes_seen
 
     cmd = None
+    status = models.JobStatus.RUNNING
     # somebody canceled or invalidated the job
     if (
         job.status == models.JobStatus.CANCELED
         or job.status == models.JobStatus.NOT_STARTED
     ):
-        step_result.status = job.status
-        step_result.save()
+        status = job.status
         cmd = "cancel"
 
-    client.status_msg = "Running {} ({}): {} : {}".format(
-        step_result.job, step_result.job.pk, step_result.name, step_result.seconds
-    )
-    client.save()
+    trimmed = step_result_from_data(step_result, data, status)
 
-    job.seconds = job.calc_total_time()
-    job.save()
-    job.event.save()  # update timestamp
+    # These come in often while a step is running so only the columns
+    # that changed are written and the timestamps are only bumped occasionally
+    models.touch(client, "last_seen")
+    job.add_seconds(step_result.seconds - previous_seconds)
+    models.touch(job.event)
+    LiveUpdates.publish_output(step_result, previous_offset)
+    return cmd, trimmed
 
-    return json_update_response("OK", "success", cmd)
+
+@csrf_exempt
+def update_step_result(request, build_key, client_name, stepresult_id):
+    response, data, step_result, client = check_step_result_post(
+        request, build_key, client_name, stepresult_id
+    )
+    if response:
+        return response
+
+    cmd, trimmed = apply_update_step_result(step_result, client, data)
+    return json_update_response("OK", "success", cmd, trimmed)
 
 
 @csrf_exempt
@@ -632,6 +939,108 @@ def client_ping(request, client_name):
     return json_update_response("OK", "success", "")
 
 
+# Updates that can be sent to client_batch() => function to apply them
+STEP_RESULT_UPDATES = {
+    "start_step_result": apply_start_step_result,
+    "update_step_result": apply_update_step_result,
+    "complete_step_result": apply_complete_step_result,
+}
+
+
+def apply_batch_update(client, job, update):
+    """
+    Applies one of the updates sent to client_batch().
+    finish_job() isn't called for a job_finished update.
+    Input:
+      client[models.Client]: The client that sent the update
+      job[models.Job]: The job the updates are for
+      update[dict]: The update, with "type", "payload", and "stepresult_id" for step updates
+    Return:
+      tuple(HttpResponse, str, bool): The response is set if the update is invalid.
+        Otherwise the command for the client and whether output was trimmed.
+    """
+    if not isinstance(update, dict) or not has_keys(update, ["type", "payload"]):
+        return HttpResponseBadRequest("Bad update"), None, False
+    data = update["payload"]
+    if update["type"] == "job_finished":
+        if not isinstance(data, dict) or not has_keys(data, JOB_FINISHED_KEYS):
+            return HttpResponseBadRequest("Bad POST data"), None, False
+        cmd, trimmed = apply_job_finished(job, client, data)
+        return None, cmd, trimmed
+
+    apply_func = STEP_RESULT_UPDATES.get(update["type"])
+    if apply_func is None:
+        return HttpResponseBadRequest("Bad update type"), None, False
+    if not isinstance(data, dict) or not has_keys(data, STEP_RESULT_KEYS):
+        return HttpResponseBadRequest("Bad POST data"), None, False
+    step_result = get_step_result(update.get("stepresult_id"))
+    if step_result is None:
+        return HttpResponseBadRequest("Invalid stepresult id"), None, False
+    if step_result.job_id != job.pk:
+        return HttpResponseBadRequest("Step result is not in the job"), None, False
+    # Use the same job instance so that updates to it aren't lost between steps
+    step_result.job = job
+    cmd, trimmed = apply_func(step_result, client, data)
+    return None, cmd, trimmed
+
+
+@csrf_exempt
+def client_batch(request, build_key, client_name, job_id):
+    """
+    Applies a list of updates for a job in one request.
+    The updates are the same as posting to start_step_result, update_step_result,
+    complete_step_result and job_finished, and are applied in order.
+    The data looks like:
+      {"updates": [{"type": "update_step_result", "stepresult_id": 1, "payload": {...}}, ...]}
+    Any batch counts as a ping since the client is saved.
+    If an update is bad then a bad request is returned but the updates
+    before it are still applied, like they would have been if posted
+    one at a time.
+    The updates are applied in one transaction. If that fails then none
+    of them are applied and a 503 is returned so that the client sends
+    them again. The git server is updated for a finished job once the
+    updates are committed.
+    """
+    data, response = check_post(request, ["updates"])
+    if response:
+        return response
+
+    client = get_post_client(request, client_name)
+    if client is None:
+        return HttpResponseBadRequest("Invalid client")
+
+    job = get_client_job(client, build_key, job_id)
+    if job is None:
+        return HttpResponseBadRequest("Invalid job/build_key")
+
+    response = None
+    cmd = None
+    output_trimmed = False
+    finished = False
+    try:
+        with transaction.atomic():
+            for update in data["updates"]:
+                response, update_cmd, trimmed = apply_batch_update(client, job, update)
+                if response:
+                    break
+                cmd = cmd or update_cmd
+                output_trimmed = output_trimmed or trimmed
+                finished = finished or update["type"] == "job_finished"
+            client.save()
+    except DatabaseError:
+        logger.exception(f"Failed to apply batch of updates for job {job.pk}")
+        return HttpResponse("Failed to apply updates, try again", status=503)
+
+    if finished:
+        finish_job(job)
+    if response:
+        return response
+
+    ret = update_dict("OK", "success", cmd, output_trimmed)
+    ret["applied"] = len(data["updates"])
+    return JsonResponse(ret)
+
+
 def update_remote_job_status(request, job_id):
     """
     End point for manually update the remote status of a job.
@@ -16,7 +16,7 @@ from __future__ import unicode_literals, absolute_import
 from ci import models
 import logging
 import re
-from ci.client import UpdateRemoteStatus
+from ci.client import UpdateRemoteStatus, ReadyJobs
 
 logger = logging.getLogger("ci")
 
@@ -44,6 +44,8 @@ def cancel_event(ev, message, update_remote=False, do_pr_status_update=True):
             models.JobChangeLog.objects.create(job=job, message=message)
             cancelled_jobs.append(job)
 
+    ReadyJobs.update_ready_jobs(cancelled_jobs)
+
     if ev.complete and ev.status == models.JobStatus.CANCELED and not cancelled_jobs:
         return
     ev.complete = True
@@ -99,6 +101,7 @@ def auto_cancel_event(ev, message):
       ev: models.Event
     """
     logger.info("Auto canceling event {}: {}".format(ev.pk, ev))
+    cancelled_jobs = []
     for job in ev.jobs.all():
         if not job.complete and job.recipe.auto_cancel_on_push:
             job.status = models.JobStatus.CANCELED
@@ -110,6 +113,8 @@ def auto_cancel_event(ev, message):
                 )
             )
             models.JobChangeLog.objects.create(job=job, message=message)
+            cancelled_jobs.append(job)
 
+    ReadyJobs.update_ready_jobs(cancelled_jobs)
     ev.save()  # update the timestamp so the js updater works
     ev.set_complete_if_done()
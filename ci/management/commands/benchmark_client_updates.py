@@ -0,0 +1,204 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals, absolute_import
+from django.core.management.base import BaseCommand, CommandError
+from ci.client.SchedulingSimulation import percentile
+from client import HttpSession
+from client.ServerUpdater import ServerUpdater
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+import time
+
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+
+class UpdateHandler(BaseHTTPRequestHandler):
+    """
+    Stands in for the update endpoints, counting what the client sends.
+    """
+
+    protocol_version = "HTTP/1.1"
+    # Otherwise the body of the reply waits on a delayed ACK from the client
+    disable_nagle_algorithm = True
+    reply = b'{"status": "OK", "message": "success", "command": null, "output_trimmed": false}'
+
+    def setup(self):
+        super(UpdateHandler, self).setup()
+        # A new handler is created for each connection
+        self.server.connections += 1
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.bytes_received += (
+            len(self.requestline) + len(str(self.headers)) + len(body)
+        )
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.reply)))
+        self.send_header(HttpSession.GZIP_HEADER, "1")
+        self.end_headers()
+        self.wfile.write(self.reply)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def synthetic_log(num_bytes):
+    """
+    Build output that looks like compiling and running tests.
+    """
+    lines = []
+    size = 0
+    i = 0
+    while size < num_bytes:
+        if i % 50 == 49:
+            line = (
+                "src/kernels/Kernel%s.C:%s:5: warning: unused variable 'x%s' [-Wunused-variable]\n"
+                % (
+                    i,
+                    i % 300,
+                    i,
+                )
+            )
+        else:
+            line = (
+                "[%6d] Compiling C++ object build/src/kernels/Kernel%s.C.o ... OK (%.2fs)\n"
+                % (
+                    i,
+                    i,
+                    (i % 97) / 10.0,
+                )
+            )
+        lines.append(line)
+        size += len(line)
+        i += 1
+    return "".join(lines)[:num_bytes]
+
+
+class Command(BaseCommand):
+    help = "Measure the bytes sent and the latency of step updates for a job with a large log, with and without keep-alive sessions and gzip."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output-kb",
+            default=20 * 1024,
+            type=int,
+            help="Kilobytes of output the step produces",
+        )
+        parser.add_argument(
+            "--chunk-kb",
+            default=64,
+            type=int,
+            help="Kilobytes of output sent in each update",
+        )
+
+    def run_updates(self, server, chunks, session, gzip_min_size):
+        client_info = {
+            "client_name": "benchmark",
+            "servers": [],
+            "ssl_verify": False,
+            "request_timeout": 30,
+            "gzip_min_size": gzip_min_size,
+        }
+        updater = ServerUpdater(
+            None, client_info, Queue(), Queue(), Queue(), session=session
+        )
+        server.bytes_received = 0
+        server.connections = 0
+        url = "http://%s:%s/client/update_step_result/1/benchmark/1/" % (
+            server.server_address[0],
+            server.server_address[1],
+        )
+        times = []
+        for i, chunk in enumerate(chunks):
+            data = {
+                "step_num": 0,
+                "output": chunk,
+                "time": i,
+                "complete": False,
+                "exit_status": 0,
+            }
+            start = time.perf_counter()
+            if updater.post_json(url, data) is None:
+                raise CommandError("Failed to post to the benchmark server")
+            times.append(time.perf_counter() - start)
+        times.sort()
+        return {
+            "bytes": server.bytes_received,
+            "connections": server.connections,
+            "mean": 1000 * sum(times) / len(times),
+            "p90": 1000 * percentile(times, 90),
+        }
+
+    def handle(self, *args, **options):
+        if options["output_kb"] < 1 or options["chunk_kb"] < 1:
+            raise CommandError("--output-kb and --chunk-kb must be at least 1")
+
+        output = synthetic_log(options["output_kb"] * 1024)
+        chunk_size = options["chunk_kb"] * 1024
+        chunks = [output[i : i + chunk_size] for i in range(0, len(output), chunk_size)]
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), UpdateHandler)
+        server.daemon_threads = True
+        thread = Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        try:
+            results = [
+                (
+                    "New connection, uncompressed",
+                    self.run_updates(server, chunks, None, None),
+                ),
+                (
+                    "Keep-alive session",
+                    self.run_updates(
+                        server, chunks, HttpSession.create_session(), None
+                    ),
+                ),
+                (
+                    "Keep-alive session, gzip",
+                    self.run_updates(
+                        server,
+                        chunks,
+                        HttpSession.create_session(),
+                        HttpSession.GZIP_MIN_SIZE,
+                    ),
+                ),
+            ]
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.stdout.write(
+            "%s KB of output in %s updates" % (options["output_kb"], len(chunks))
+        )
+        self.stdout.write(
+            "%-30s %14s %12s %10s %10s"
+            % ("", "Bytes sent", "Connections", "Mean ms", "p90 ms")
+        )
+        for name, result in results:
+            self.stdout.write(
+                "%-30s %14s %12s %10.2f %10.2f"
+                % (
+                    name,
+                    result["bytes"],
+                    result["connections"],
+                    result["mean"],
+                    result["p90"],
+                )
+            )
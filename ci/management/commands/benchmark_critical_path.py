@@ -0,0 +1,65 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals, absolute_import
+from django.core.management.base import BaseCommand, CommandError
+from ci.client import SchedulingPolicy, SchedulingSimulation
+
+
+class Command(BaseCommand):
+    help = "Compare the mean event completion time on a synthetic workload with and without critical path first dispatch."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--events", default=200, type=int, help="Number of events to simulate"
+        )
+        parser.add_argument(
+            "--clients", default=8, type=int, help="Number of clients running jobs"
+        )
+        parser.add_argument(
+            "--interval",
+            default=600,
+            type=int,
+            help="Average number of seconds between events",
+        )
+        parser.add_argument(
+            "--seed", default=0, type=int, help="Seed for the synthetic workload"
+        )
+
+    def handle(self, *args, **options):
+        if options["clients"] < 1 or options["events"] < 1:
+            raise CommandError("--clients and --events must be at least 1")
+
+        trace = SchedulingSimulation.synthetic_trace(
+            options["events"], seed=options["seed"], interval=options["interval"]
+        )
+        policy = SchedulingPolicy.PriorityPolicy()
+        results = []
+        for critical_path in [False, True]:
+            event_times = SchedulingSimulation.simulate(
+                trace, policy, options["clients"], critical_path=critical_path
+            )[1]
+            results.append(sum(event_times.values()) / len(event_times))
+
+        self.stdout.write(
+            "%s events, %s jobs, %s clients"
+            % (options["events"], len(trace["jobs"]), options["clients"])
+        )
+        self.stdout.write("Mean event completion time (seconds):")
+        self.stdout.write("  Oldest first:        %10.0f" % results[0])
+        self.stdout.write("  Critical path first: %10.0f" % results[1])
+        self.stdout.write(
+            "  Change:              %9.1f%%"
+            % (100.0 * (results[1] - results[0]) / results[0])
+        )
@@ -0,0 +1,156 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals, absolute_import
+from django.core.management.base import BaseCommand, CommandError
+from django.core.cache import cache
+from django.conf import settings
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from ci import models, EventsStatus
+import time
+
+
+def create_events(num_events, num_jobs):
+    """
+    Creates pull request events that each have a precheck job,
+    test jobs that depend on it and a merge job that depends on those.
+    Return:
+      list[models.Event]: The events
+    """
+    server = models.GitServer.objects.get_or_create(
+        name="benchmark_server", host_type=settings.GITSERVER_GITHUB
+    )[0]
+    user = models.GitUser.objects.get_or_create(name="benchmark", server=server)[0]
+    repo = models.Repository.objects.get_or_create(name="benchmark", user=user)[0]
+    branch = models.Branch.objects.get_or_create(name="devel", repository=repo)[0]
+    base = models.Commit.objects.get_or_create(branch=branch, sha="base")[0]
+    config = models.BuildConfig.objects.get_or_create(name="benchmark")[0]
+
+    names = ["Precheck"] + ["Test %s" % i for i in range(num_jobs - 2)] + ["Merge"]
+    recipes = []
+    for name in names:
+        recipe = models.Recipe.objects.create(
+            name=name,
+            display_name=name,
+            filename="benchmark/%s.cfg" % name,
+            build_user=user,
+            repository=repo,
+        )
+        recipe.build_configs.add(config)
+        recipes.append(recipe)
+    for recipe in recipes[1:-1]:
+        recipe.depends_on.add(recipes[0])
+    recipes[-1].depends_on.add(*recipes[1:-1])
+
+    events = []
+    for i in range(num_events):
+        pr = models.PullRequest.objects.create(
+            number=i + 1,
+            repository=repo,
+            title="Benchmark pull request %s" % i,
+            url="http://localhost/pr/%s" % i,
+            username="benchmark",
+        )
+        head = models.Commit.objects.create(branch=branch, sha="head%s" % i)
+        event = models.Event.objects.create(
+            build_user=user, head=head, base=base, pull_request=pr
+        )
+        models.Job.objects.bulk_create(
+            [
+                models.Job(
+                    recipe=recipe,
+                    event=event,
+                    config=config,
+                    status=models.JobStatus.SUCCESS,
+                    complete=True,
+                )
+                for recipe in recipes
+            ]
+        )
+        models.EventJobCount.add(
+            (event.pk, models.JobStatus.SUCCESS, True), len(recipes)
+        )
+        events.append(event)
+    return events
+
+
+def time_events_info(num_events):
+    """
+    Return:
+      tuple(float, int): Milliseconds and number of queries to build the event list
+    """
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        EventsStatus.all_events_info(limit=num_events)
+        elapsed = time.perf_counter() - start
+    return 1000 * elapsed, len(queries)
+
+
+class Command(BaseCommand):
+    help = "Measure the time to build the main page list of events with and without the event info cached. The events are created in a transaction that is rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--events",
+            default=[30, 100, 500],
+            type=int,
+            nargs="+",
+            help="Numbers of events to list",
+        )
+        parser.add_argument(
+            "--jobs", default=8, type=int, help="Number of jobs in each event"
+        )
+        parser.add_argument(
+            "--repeat", default=3, type=int, help="Use the best of this many runs"
+        )
+
+    def measure(self, num_events, num_jobs, repeat):
+        events = create_events(num_events, num_jobs)
+        keys = [EventsStatus.event_info_cache_key(ev, False) for ev in events]
+        cold = []
+        warm = []
+        for i in range(repeat):
+            cache.delete_many(keys)
+            cold.append(time_events_info(num_events))
+            warm.append(time_events_info(num_events))
+        cache.delete_many(keys)
+        return min(cold), min(warm)
+
+    def handle(self, *args, **options):
+        if options["jobs"] < 2 or options["repeat"] < 1:
+            raise CommandError("--jobs must be at least 2 and --repeat at least 1")
+
+        self.stdout.write("%s jobs in each event" % options["jobs"])
+        self.stdout.write(
+            "%8s %10s %10s %10s %10s %8s"
+            % ("Events", "Cold ms", "Queries", "Warm ms", "Queries", "Speedup")
+        )
+        for num_events in options["events"]:
+            with transaction.atomic():
+                cold, warm = self.measure(
+                    num_events, options["jobs"], options["repeat"]
+                )
+                transaction.set_rollback(True)
+            self.stdout.write(
+                "%8s %10.1f %10s %10.1f %10s %7.1fx"
+                % (
+                    num_events,
+                    cold[0],
+                    cold[1],
+                    warm[0],
+                    warm[1],
+                    cold[0] / max(warm[0], 0.001),
+                )
+            )
@@ -0,0 +1,40 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals, absolute_import
+from django.core.management.base import BaseCommand
+from ci.client import ReadyJobs
+
+
+class Command(BaseCommand):
+    help = "Check the ready job index against the database and rebuild it if it is inconsistent."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            default=False,
+            dest="dryrun",
+            action="store_true",
+            help="Just report problems, don't rebuild the index",
+        )
+
+    def handle(self, *args, **options):
+        dryrun = options.get("dryrun", False)
+        index, problems = ReadyJobs.check_ready_job_index(repair=not dryrun)
+        for problem in problems:
+            self.stdout.write(problem)
+        if not problems:
+            self.stdout.write("Ready job index is consistent")
+        elif not dryrun:
+            self.stdout.write("Ready job index rebuilt")
@@ -0,0 +1,97 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals, absolute_import
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from ci import models
+import time
+
+
+class Command(BaseCommand):
+    help = "Compress step output that was stored before output was compressed. Rows are converted in small batches so this can run while the server is up."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            default=500,
+            type=int,
+            help="Number of step results to convert in each transaction",
+        )
+        parser.add_argument(
+            "--sleep",
+            default=0.0,
+            type=float,
+            help="Seconds to sleep between batches to limit the load on the database",
+        )
+        parser.add_argument(
+            "--dry-run",
+            default=False,
+            dest="dryrun",
+            action="store_true",
+            help="Just report how many step results need to be converted",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        legacy_q = models.StepResult.objects.exclude(legacy_output="")
+        if options["dryrun"]:
+            self.stdout.write(
+                "DRY RUN: %s step result(s) to compress" % legacy_q.count()
+            )
+            return
+
+        last_pk = 0
+        total = 0
+        total_before = 0
+        total_after = 0
+        while True:
+            with transaction.atomic():
+                batch = list(
+                    legacy_q.filter(pk__gt=last_pk)
+                    .order_by("pk")
+                    .only("pk", "legacy_output")
+                    .select_for_update()[:batch_size]
+                )
+                if not batch:
+                    break
+                for step_result in batch:
+                    output = step_result.legacy_output
+                    step_result.output_data = models.compress_output(output)
+                    step_result.output_length = len(output)
+                    step_result.legacy_output = ""
+                    total_before += len(output)
+                    total_after += len(step_result.output_data)
+                models.StepResult.objects.bulk_update(
+                    batch, ["output_data", "output_length", "legacy_output"]
+                )
+            last_pk = batch[-1].pk
+            total += len(batch)
+            self.stdout.write(
+                "Compressed %s step result(s), up to id %s" % (total, last_pk)
+            )
+            if options["sleep"] > 0:
+                time.sleep(options["sleep"])
+
+        self.stdout.write(
+            "Compressed %s step result(s): %s -> %s"
+            % (
+                total,
+                models.humanize_bytes(total_before),
+                models.humanize_bytes(total_after),
+            )
+        )
@@ -0,0 +1,50 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals, absolute_import
+from django.core.management.base import BaseCommand
+from ci import models
+
+
+class Command(BaseCommand):
+    help = "Recompute the per event job status counts from the jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            default=False,
+            dest="dryrun",
+            action="store_true",
+            help="Just report events with wrong counts, don't fix them",
+        )
+        parser.add_argument(
+            "--event",
+            type=int,
+            action="append",
+            dest="events",
+            help="Only check this event. Can be given multiple times.",
+        )
+
+    def handle(self, *args, **options):
+        dryrun = options.get("dryrun", False)
+        event_q = models.Event.objects.all()
+        if options.get("events"):
+            event_q = event_q.filter(pk__in=options["events"])
+        wrong = models.EventJobCount.recompute(event_q, repair=not dryrun)
+        for event in wrong:
+            self.stdout.write("Event %s: %s has wrong job counts" % (event.pk, event))
+        if not wrong:
+            self.stdout.write("Event job counts are consistent")
+        elif not dryrun:
+            self.stdout.write("Fixed job counts for %s events" % len(wrong))
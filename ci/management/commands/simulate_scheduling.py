@@ -0,0 +1,112 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals, absolute_import
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from ci.client import SchedulingSimulation
+from datetime import timedelta
+import json
+
+
+class Command(BaseCommand):
+    help = "Replay a trace of job arrivals against a scheduling policy and report how long jobs wait for each repository."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "trace",
+            help="JSON file with the trace of jobs to replay (or write with --record)",
+        )
+        parser.add_argument(
+            "--record",
+            default=False,
+            action="store_true",
+            help="Write a trace of the jobs in the database to the trace file instead of replaying it",
+        )
+        parser.add_argument(
+            "--days",
+            default=7,
+            type=int,
+            help="With --record, include jobs created in the last number of days",
+        )
+        parser.add_argument(
+            "--clients",
+            default=10,
+            type=int,
+            help="Number of clients running jobs",
+        )
+        parser.add_argument(
+            "--policy",
+            default=None,
+            help="Dotted path of the scheduling policy class. Defaults to READY_JOB_SCHEDULING_POLICY",
+        )
+
+    def handle(self, *args, **options):
+        if options["record"]:
+            since = timezone.now() - timedelta(days=options["days"])
+            trace = SchedulingSimulation.record_trace(since)
+            with open(options["trace"], "w") as f:
+                json.dump(trace, f, indent=2)
+            self.stdout.write(
+                "Recorded %s job(s) to %s" % (len(trace["jobs"]), options["trace"])
+            )
+            return
+
+        if options["clients"] < 1:
+            raise CommandError("--clients must be at least 1")
+        policy_path = options["policy"] or settings.READY_JOB_SCHEDULING_POLICY
+        try:
+            policy = import_string(policy_path)()
+        except ImportError as e:
+            raise CommandError("Bad scheduling policy: %s" % e)
+
+        with open(options["trace"], "r") as f:
+            trace = json.load(f)
+
+        waits, event_times = SchedulingSimulation.simulate(
+            trace,
+            policy,
+            options["clients"],
+            critical_path=settings.READY_JOB_CRITICAL_PATH,
+        )
+        self.stdout.write(
+            "Policy: %s, clients: %s, wait times in seconds"
+            % (policy_path, options["clients"])
+        )
+        self.stdout.write(
+            "%-40s %8s %10s %10s %10s %10s"
+            % ("Repository", "Jobs", "p50", "p90", "p99", "Max")
+        )
+        for row in SchedulingSimulation.wait_report(waits):
+            self.stdout.write(
+                "%-40s %8s %10.0f %10.0f %10.0f %10.0f"
+                % (
+                    row["repository"],
+                    row["jobs"],
+                    row["p50"],
+                    row["p90"],
+                    row["p99"],
+                    row["max"],
+                )
+            )
+        if event_times:
+            self.stdout.write(
+                "Mean event completion time: %.0f seconds over %s event(s)"
+                % (
+                    sum(event_times.values()) / len(event_times),
+                    len(event_times),
+                )
+            )
@@ -0,0 +1,908 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Generated by Django 5.2.15 on 2026-10-17 10:59
+
+import ci.models
+import datetime
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="Branch",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=120)),
+                (
+                    "status",
+                    models.IntegerField(
+                        choices=[
+                            (0, "Not started"),
+                            (1, "Passed"),
+                            (2, "Running"),
+                            (3, "Failed"),
+                            (4, "Allowed to fail"),
+                            (5, "Canceled by user"),
+                            (6, "Requires activation"),
+                            (7, "Intermittent Failure"),
+                            (8, "Skipped"),
+                        ],
+                        default=0,
+                    ),
+                ),
+                ("last_modified", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="BuildConfig",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=120)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="Client",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=120)),
+                ("ip", models.GenericIPAddressField()),
+                (
+                    "status",
+                    models.IntegerField(
+                        choices=[
+                            (0, "Running a job"),
+                            (1, "Looking for work"),
+                            (2, "Not active"),
+                        ],
+                        default=2,
+                    ),
+                ),
+                ("status_message", models.CharField(blank=True, max_length=120)),
+                ("last_seen", models.DateTimeField(auto_now=True)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "get_latest_by": "last_seen",
+            },
+        ),
+        migrations.CreateModel(
+            name="GitServer",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=120, unique=True)),
+                (
+                    "host_type",
+                    models.IntegerField(
+                        choices=[(0, "GitHub"), (1, "GitLab"), (2, "BitBucket")]
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="PullRequest",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("number", models.IntegerField()),
+                ("title", models.CharField(max_length=120)),
+                ("url", models.URLField()),
+                ("username", models.CharField(blank=True, default="", max_length=200)),
+                ("closed", models.BooleanField(default=False)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "status",
+                    models.IntegerField(
+                        choices=[
+                            (0, "Not started"),
+                            (1, "Passed"),
+                            (2, "Running"),
+                            (3, "Failed"),
+                            (4, "Allowed to fail"),
+                            (5, "Canceled by user"),
+                            (6, "Requires activation"),
+                            (7, "Intermittent Failure"),
+                            (8, "Skipped"),
+                        ],
+                        default=0,
+                    ),
+                ),
+                ("review_comments_url", models.URLField(blank=True, null=True)),
+                ("last_modified", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "ordering": ["repository", "number"],
+                "get_latest_by": "last_modified",
+            },
+        ),
+        migrations.CreateModel(
+            name="RecipeRepository",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("sha", models.CharField(blank=True, max_length=120)),
+                ("last_modified", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="Commit",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("sha", models.CharField(max_length=120)),
+                ("ssh_url", models.URLField(blank=True)),
+                (
+                    "branch",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="commits",
+                        to="ci.branch",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("branch", "sha")},
+            },
+        ),
+        migrations.CreateModel(
+            name="GitUser",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=120)),
+                (
+                    "build_key",
+                    models.IntegerField(
+                        default=ci.models.generate_build_key, unique=True
+                    ),
+                ),
+                ("token", models.CharField(blank=True, max_length=1024)),
+                (
+                    "server",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="users",
+                        to="ci.gitserver",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["name"],
+            },
+        ),
+        migrations.CreateModel(
+            name="Event",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "description",
+                    models.CharField(blank=True, default="", max_length=200),
+                ),
+                (
+                    "trigger_user",
+                    models.CharField(blank=True, default="", max_length=200),
+                ),
+                (
+                    "status",
+                    models.IntegerField(
+                        choices=[
+                            (0, "Not started"),
+                            (1, "Passed"),
+                            (2, "Running"),
+                            (3, "Failed"),
+                            (4, "Allowed to fail"),
+                            (5, "Canceled by user"),
+                            (6, "Requires activation"),
+                            (7, "Intermittent Failure"),
+                            (8, "Skipped"),
+                        ],
+                        default=0,
+                    ),
+                ),
+                ("complete", models.BooleanField(default=False)),
+                (
+                    "cause",
+                    models.IntegerField(
+                        choices=[
+                            (0, "Pull request"),
+                            (1, "Push"),
+                            (2, "Scheduled"),
+                            (3, "Release"),
+                        ],
+                        default=0,
+                    ),
+                ),
+                ("comments_url", models.URLField(blank=True, null=True)),
+                ("duplicates", models.IntegerField(default=0)),
+                ("json_data", models.TextField(blank=True)),
+                ("changed_files", models.TextField(blank=True)),
+                ("update_branch_status", models.BooleanField(default=True)),
+                ("last_modified", models.DateTimeField(auto_now=True)),
+                ("created", models.DateTimeField(auto_now_add=True, db_index=True)),
+                (
+                    "base",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="event_base",
+                        to="ci.commit",
+                    ),
+                ),
+                (
+                    "head",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="event_head",
+                        to="ci.commit",
+                    ),
+                ),
+                (
+                    "build_user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="events",
+                        to="ci.gituser",
+                    ),
+                ),
+                (
+                    "pull_request",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="events",
+                        to="ci.pullrequest",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created"],
+                "get_latest_by": "last_modified",
+                "unique_together": {("build_user", "head", "base", "duplicates")},
+            },
+        ),
+        migrations.CreateModel(
+            name="Job",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("complete", models.BooleanField(default=False)),
+                ("invalidated", models.BooleanField(default=False)),
+                ("same_client", models.BooleanField(default=False)),
+                ("ready", models.BooleanField(default=False)),
+                ("active", models.BooleanField(default=True)),
+                (
+                    "status",
+                    models.IntegerField(
+                        choices=[
+                            (0, "Not started"),
+                            (1, "Passed"),
+                            (2, "Running"),
+                            (3, "Failed"),
+                            (4, "Allowed to fail"),
+                            (5, "Canceled by user"),
+                            (6, "Requires activation"),
+                            (7, "Intermittent Failure"),
+                            (8, "Skipped"),
+                        ],
+                        default=0,
+                    ),
+                ),
+                ("seconds", models.DurationField(default=datetime.timedelta)),
+                ("recipe_repo_sha", models.CharField(blank=True, max_length=120)),
+                ("failed_step", models.CharField(blank=True, max_length=120)),
+                ("running_step", models.CharField(blank=True, max_length=120)),
+                ("last_modified", models.DateTimeField(auto_now=True)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "prioritized",
+                    models.DateTimeField(blank=True, default=None, null=True),
+                ),
+                (
+                    "client",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="ci.client",
+                    ),
+                ),
+                (
+                    "config",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="jobs",
+                        to="ci.buildconfig",
+                    ),
+                ),
+                (
+                    "event",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="jobs",
+                        to="ci.event",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-last_modified"],
+                "get_latest_by": "last_modified",
+            },
+        ),
+        migrations.CreateModel(
+            name="JobChangeLog",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("message", models.TextField()),
+                ("notes", models.TextField(blank=True)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "job",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="changelog",
+                        to="ci.job",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created"],
+            },
+        ),
+        migrations.CreateModel(
+            name="JobTestStatistics",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("passed", models.IntegerField(default=0)),
+                ("failed", models.IntegerField(default=0)),
+                ("skipped", models.IntegerField(default=0)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "job",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="test_stats",
+                        to="ci.job",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="Recipe",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=120)),
+                ("display_name", models.CharField(max_length=120)),
+                ("help_text", models.TextField(blank=True)),
+                ("filename", models.CharField(blank=True, max_length=120)),
+                ("pr_base_ref_override", models.CharField(blank=True, max_length=120)),
+                ("filename_sha", models.CharField(blank=True, max_length=120)),
+                ("private", models.BooleanField(default=False)),
+                ("current", models.BooleanField(default=False)),
+                ("active", models.BooleanField(default=True)),
+                (
+                    "cause",
+                    models.IntegerField(
+                        choices=[
+                            (0, "Pull request"),
+                            (1, "Push"),
+                            (2, "Scheduled"),
+                            (3, "Pull request alternatives"),
+                            (5, "Release"),
+                        ],
+                        default=0,
+                    ),
+                ),
+                ("auto_cancel_on_push", models.BooleanField(default=False)),
+                ("create_issue_on_fail", models.BooleanField(default=False)),
+                (
+                    "create_issue_on_fail_message",
+                    models.TextField(blank=True, default=""),
+                ),
+                (
+                    "create_issue_on_fail_new_comment",
+                    models.BooleanField(default=False),
+                ),
+                (
+                    "automatic",
+                    models.IntegerField(
+                        choices=[
+                            (0, "Scheduled"),
+                            (1, "Authorized users"),
+                            (2, "Automatic"),
+                        ],
+                        default=2,
+                    ),
+                ),
+                ("priority", models.PositiveIntegerField(default=0)),
+                ("activate_label", models.CharField(blank=True, max_length=120)),
+                ("last_modified", models.DateTimeField(auto_now=True)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("scheduler", models.CharField(max_length=120, null=True)),
+                (
+                    "last_scheduled",
+                    models.DateTimeField(
+                        default=datetime.datetime(
+                            1970, 1, 1, 0, 0, tzinfo=datetime.timezone.utc
+                        )
+                    ),
+                ),
+                ("schedule_initial_run", models.BooleanField(default=False)),
+                (
+                    "auto_authorized",
+                    models.ManyToManyField(
+                        blank=True, related_name="auto_authorized", to="ci.gituser"
+                    ),
+                ),
+                (
+                    "branch",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="recipes",
+                        to="ci.branch",
+                    ),
+                ),
+                ("build_configs", models.ManyToManyField(to="ci.buildconfig")),
+                (
+                    "build_user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="recipes",
+                        to="ci.gituser",
+                    ),
+                ),
+                (
+                    "client_runner_user",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="client_runner_recipes",
+                        to="ci.gituser",
+                    ),
+                ),
+                ("depends_on", models.ManyToManyField(blank=True, to="ci.recipe")),
+            ],
+            options={
+                "get_latest_by": "last_modified",
+            },
+        ),
+        migrations.AddField(
+            model_name="pullrequest",
+            name="alternate_recipes",
+            field=models.ManyToManyField(
+                blank=True, related_name="pull_requests", to="ci.recipe"
+            ),
+        ),
+        migrations.CreateModel(
+            name="PreStepSource",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("filename", models.CharField(blank=True, max_length=120)),
+                (
+                    "recipe",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="prestepsources",
+                        to="ci.recipe",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="job",
+            name="recipe",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="jobs",
+                to="ci.recipe",
+            ),
+        ),
+        migrations.CreateModel(
+            name="RecipeEnvironment",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=120)),
+                ("value", models.CharField(max_length=512)),
+                (
+                    "recipe",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="environment_vars",
+                        to="ci.recipe",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="Repository",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=120)),
+                ("active", models.BooleanField(default=False)),
+                ("last_modified", models.DateTimeField(auto_now=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="repositories",
+                        to="ci.gituser",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("user", "name")},
+            },
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="repository",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="recipes",
+                to="ci.repository",
+            ),
+        ),
+        migrations.AddField(
+            model_name="pullrequest",
+            name="repository",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="pull_requests",
+                to="ci.repository",
+            ),
+        ),
+        migrations.AddField(
+            model_name="gituser",
+            name="preferred_repos",
+            field=models.ManyToManyField(
+                blank=True, related_name="users_with_preferences", to="ci.repository"
+            ),
+        ),
+        migrations.AddField(
+            model_name="branch",
+            name="repository",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="branches",
+                to="ci.repository",
+            ),
+        ),
+        migrations.CreateModel(
+            name="Step",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=120)),
+                ("filename", models.CharField(max_length=120)),
+                ("position", models.PositiveIntegerField(default=0)),
+                ("abort_on_failure", models.BooleanField(default=True)),
+                ("allowed_to_fail", models.BooleanField(default=False)),
+                (
+                    "recipe",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="steps",
+                        to="ci.recipe",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["position"],
+            },
+        ),
+        migrations.CreateModel(
+            name="StepEnvironment",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=120)),
+                ("value", models.CharField(max_length=512)),
+                (
+                    "step",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="step_environment",
+                        to="ci.step",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name="job",
+            unique_together={("recipe", "event", "config")},
+        ),
+        migrations.CreateModel(
+            name="RecipeViewableByTeam",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("team", models.CharField(max_length=120)),
+                ("git_id", models.IntegerField(default=0)),
+                (
+                    "recipe",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="viewable_by_teams",
+                        to="ci.recipe",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("recipe", "team")},
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name="pullrequest",
+            unique_together={("repository", "number")},
+        ),
+        migrations.AlterUniqueTogether(
+            name="gituser",
+            unique_together={("name", "server")},
+        ),
+        migrations.AlterUniqueTogether(
+            name="branch",
+            unique_together={("name", "repository")},
+        ),
+        migrations.CreateModel(
+            name="RepositoryBadge",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("filename", models.CharField(max_length=120)),
+                ("url", models.URLField(blank=True)),
+                ("name", models.CharField(max_length=120)),
+                (
+                    "status",
+                    models.IntegerField(
+                        choices=[
+                            (0, "Not started"),
+                            (1, "Passed"),
+                            (2, "Running"),
+                            (3, "Failed"),
+                            (4, "Allowed to fail"),
+                            (5, "Canceled by user"),
+                            (6, "Requires activation"),
+                            (7, "Intermittent Failure"),
+                            (8, "Skipped"),
+                        ],
+                        default=0,
+                    ),
+                ),
+                ("last_modified", models.DateTimeField(auto_now=True)),
+                (
+                    "repository",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="badges",
+                        to="ci.repository",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("repository", "filename")},
+            },
+        ),
+        migrations.CreateModel(
+            name="StepResult",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(blank=True, default="", max_length=120)),
+                ("filename", models.CharField(blank=True, default="", max_length=120)),
+                ("position", models.PositiveIntegerField(default=0)),
+                ("abort_on_failure", models.BooleanField(default=True)),
+                ("allowed_to_fail", models.BooleanField(default=False)),
+                ("exit_status", models.IntegerField(default=0)),
+                (
+                    "status",
+                    models.IntegerField(
+                        choices=[
+                            (0, "Not started"),
+                            (1, "Passed"),
+                            (2, "Running"),
+                            (3, "Failed"),
+                            (4, "Allowed to fail"),
+                            (5, "Canceled by user"),
+                            (6, "Requires activation"),
+                            (7, "Intermittent Failure"),
+                            (8, "Skipped"),
+                        ],
+                        default=0,
+                    ),
+                ),
+                ("complete", models.BooleanField(default=False)),
+                ("output", models.TextField(blank=True)),
+                ("seconds", models.DurationField(default=datetime.timedelta)),
+                ("last_modified", models.DateTimeField(auto_now=True)),
+                (
+                    "job",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="step_results",
+                        to="ci.job",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["position"],
+                "unique_together": {("job", "position")},
+            },
+        ),
+    ]
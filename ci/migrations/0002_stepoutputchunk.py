@@ -0,0 +1,69 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ci", "0001_initial"),
+    ]
+
+    operations = [
+        # Only the field is renamed. It keeps using the "output" column
+        # so that the output that is already stored isn't dropped.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RemoveField(
+                    model_name="stepresult",
+                    name="output",
+                ),
+                migrations.AddField(
+                    model_name="stepresult",
+                    name="compacted_output",
+                    field=models.TextField(blank=True, db_column="output"),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="StepOutputChunk",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("sequence", models.PositiveIntegerField()),
+                ("output", models.TextField(blank=True)),
+                (
+                    "step_result",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="output_chunks",
+                        to="ci.stepresult",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["sequence"],
+                "unique_together": {("step_result", "sequence")},
+            },
+        ),
+    ]
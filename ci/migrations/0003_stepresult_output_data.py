@@ -0,0 +1,47 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ci", "0002_stepoutputchunk"),
+    ]
+
+    operations = [
+        # Only the field is renamed. It keeps using the "output" column
+        # so that compress_step_output can move the output that is already
+        # stored into output_data.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RenameField(
+                    model_name="stepresult",
+                    old_name="compacted_output",
+                    new_name="legacy_output",
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="stepresult",
+            name="output_data",
+            field=models.BinaryField(blank=True, default=b""),
+        ),
+        migrations.AddField(
+            model_name="stepresult",
+            name="output_length",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
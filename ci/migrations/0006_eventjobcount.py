@@ -0,0 +1,95 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def seed_counts(apps, schema_editor):
+    """
+    Counts the jobs of the existing events.
+    """
+    Job = apps.get_model("ci", "Job")
+    EventJobCount = apps.get_model("ci", "EventJobCount")
+    rows = (
+        Job.objects.values_list("event_id", "status", "complete")
+        .annotate(num=Count("pk"))
+        .order_by()
+    )
+    counts = []
+    for event_id, status, complete, num in rows.iterator(chunk_size=2000):
+        counts.append(
+            EventJobCount(
+                event_id=event_id, status=status, complete=complete, count=num
+            )
+        )
+        if len(counts) >= 1000:
+            EventJobCount.objects.bulk_create(counts)
+            counts = []
+    EventJobCount.objects.bulk_create(counts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ci", "0005_output_budgets"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EventJobCount",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.IntegerField(
+                        choices=[
+                            (0, "Not started"),
+                            (1, "Passed"),
+                            (2, "Running"),
+                            (3, "Failed"),
+                            (4, "Allowed to fail"),
+                            (5, "Canceled by user"),
+                            (6, "Requires activation"),
+                            (7, "Intermittent Failure"),
+                            (8, "Skipped"),
+                        ]
+                    ),
+                ),
+                ("complete", models.BooleanField()),
+                ("count", models.IntegerField(default=0)),
+                (
+                    "event",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="job_counts",
+                        to="ci.event",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("event", "status", "complete")},
+            },
+        ),
+        migrations.RunPython(seed_counts, migrations.RunPython.noop),
+    ]
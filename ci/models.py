@@ -13,7 +13,7 @@
 # limitations under the License.
 
 from __future__ import unicode_literals, absolute_import
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from django.conf import settings
 from django.urls import reverse
 from django.utils.timezone import make_aware
@@ -27,15 +27,23 @@ from ci.github import oauth as github_auth
 import random, re
 from django.utils import timezone
 from datetime import timedelta, datetime
-from ci import TimeUtils
+from ci import TimeUtils, LogStore, OutputRender
 import json
-import ansi2html
+import hashlib
 import logging
 import pytz
-from django.db.models import Sum
+import threading
+import zlib
+from django.db.models import Sum, F
+from django.db.models.functions import Length
 
 logger = logging.getLogger("ci")
 
+# Bumped whenever a job is saved or deleted in this process so that
+# an EventGraph knows when it needs to be loaded again
+_job_state_version = 0
+_job_state_lock = threading.Lock()
+
 
 class DBException(Exception):
     pass
@@ -84,6 +92,15 @@ class JobStatus(object):
         return JobStatus.SHORT_CHOICES[status][1]
 
 
+# A job that depends on a job that finished with one of these can run
+DEPENDS_MET_STATUS = [
+    JobStatus.FAILED_OK,
+    JobStatus.SUCCESS,
+    JobStatus.INTERMITTENT_FAILURE,
+    JobStatus.SKIPPED,
+]
+
+
 @python_2_unicode_compatible
 class GitServer(models.Model):
     """
@@ -156,6 +173,55 @@ def generate_build_key():
     return random.SystemRandom().randint(0, 2000000000)
 
 
+def job_state_version():
+    return _job_state_version
+
+
+def job_state_changed():
+    global _job_state_version
+    with _job_state_lock:
+        _job_state_version += 1
+
+
+def dashboard_changed():
+    """
+    Something that is shown on the main page changed.
+    """
+    from ci import Dashboard
+
+    Dashboard.changed()
+
+
+def touch(obj, field="last_modified", **updates):
+    """
+    Updates only some columns of a row instead of saving the whole row.
+    The timestamp is only bumped if it hasn't been in the last
+    TIMESTAMP_UPDATE_INTERVAL seconds.
+    Input:
+      obj[models.Model]: The object to update
+      field[str]: Name of the timestamp field
+      updates: Other fields to update. These can be expressions like F("seconds") + 1
+        in which case the attribute on obj isn't updated.
+    Return:
+      bool: Whether the timestamp was bumped
+    """
+    now = timezone.now()
+    last = getattr(obj, field)
+    bump = last is None or now - last >= timedelta(
+        seconds=settings.TIMESTAMP_UPDATE_INTERVAL
+    )
+    if bump:
+        updates[field] = now
+    if updates:
+        obj.__class__.objects.filter(pk=obj.pk).update(**updates)
+        for name, value in updates.items():
+            if not hasattr(value, "resolve_expression"):
+                setattr(obj, name, value)
+    if bump and isinstance(obj, Event):
+        dashboard_changed()
+    return bump
+
+
 @python_2_unicode_compatible
 class GitUser(models.Model):
     """
@@ -220,6 +286,15 @@ class Repository(models.Model):
     def __str__(self):
         return "%s/%s" % (self.user.name, self.name)
 
+    def save(self, *args, **kwargs):
+        super(Repository, self).save(*args, **kwargs)
+        dashboard_changed()
+
+    def delete(self, *args, **kwargs):
+        ret = super(Repository, self).delete(*args, **kwargs)
+        dashboard_changed()
+        return ret
+
     def server(self):
         return self.user.server
 
@@ -287,6 +362,15 @@ class Branch(models.Model):
     def __str__(self):
         return "{}:{}".format(str(self.repository), self.name)
 
+    def save(self, *args, **kwargs):
+        super(Branch, self).save(*args, **kwargs)
+        dashboard_changed()
+
+    def delete(self, *args, **kwargs):
+        ret = super(Branch, self).delete(*args, **kwargs)
+        dashboard_changed()
+        return ret
+
     def user(self):
         return self.repository.user
 
@@ -368,6 +452,15 @@ class PullRequest(models.Model):
     def __str__(self):
         return "#{} : {}".format(self.number, self.title)
 
+    def save(self, *args, **kwargs):
+        super(PullRequest, self).save(*args, **kwargs)
+        dashboard_changed()
+
+    def delete(self, *args, **kwargs):
+        ret = super(PullRequest, self).delete(*args, **kwargs)
+        dashboard_changed()
+        return ret
+
     class Meta:
         get_latest_by = "last_modified"
         ordering = ["repository", "number"]
@@ -377,6 +470,8 @@ class PullRequest(models.Model):
         return JobStatus.to_slug(self.status)
 
     def set_status_from_event(self, ev):
+        if self.status == ev.status:
+            return
         latest_event = (
             Event.objects.filter(pull_request=self).order_by("-created").first()
         )
@@ -444,6 +539,15 @@ class Event(models.Model):
     def __str__(self):
         return "{} : {}".format(self.CAUSE_CHOICES[self.cause][1], str(self.head))
 
+    def save(self, *args, **kwargs):
+        super(Event, self).save(*args, **kwargs)
+        dashboard_changed()
+
+    def delete(self, *args, **kwargs):
+        ret = super(Event, self).delete(*args, **kwargs)
+        dashboard_changed()
+        return ret
+
     class Meta:
         ordering = ["-created"]
         get_latest_by = "last_modified"
@@ -482,49 +586,38 @@ class Event(models.Model):
         data = json.loads(self.json_data)
         return data
 
+    def graph(self):
+        """
+        The dependencies between the jobs of this event.
+        Kept until a job is saved so that they aren't loaded again.
+        Return:
+          EventGraph.EventGraph
+        """
+        from ci.EventGraph import EventGraph
+
+        graph = self.__dict__.get("_graph")
+        if graph is None or not graph.is_current():
+            graph = EventGraph(self)
+            self._graph = graph
+        return graph
+
     def get_job_depends_on(self):
         """
         For each job attached to this event, get a list of dependencies.
         Return:
           dict: jobs are keys with a list of jobs as values
         """
-        depends_on = {}
-        all_jobs = [j for j in self.jobs.all()]
-        for j in all_jobs:
-            deps = []
-            for r in j.recipe.depends_on.all():
-                for j2 in all_jobs:
-                    if j2 != j and j2.recipe.filename == r.filename:
-                        deps.append(j2)
-            depends_on[j] = deps
-        return depends_on
+        return self.graph().job_depends_on()
 
     def get_unrunnable_jobs(self):
         """
         Get a list of jobs that won't run due to failed dependencies.
+        This includes the whole dependency chain, so if we have
+        j0 -> j1 -> j2 and j0 fails, then j1 and j2 won't run.
         Return:
           list[Job]: jobs that won't run
         """
-        wont_run = []
-        depends = self.get_job_depends_on()
-        # We want to check the whole dependecy chain.
-        # So if we have j0 -> j1 -> j2 and j0 fails
-        # we want the list to have j1 and j2.
-        while True:
-            added = False
-            for job, deps in depends.items():
-                if job in wont_run:
-                    continue
-                for d in deps:
-                    if d in wont_run or (
-                        d.complete
-                        and d.status in [JobStatus.FAILED, JobStatus.CANCELED]
-                    ):
-                        wont_run.append(job)
-                        added = True
-            if not added:
-                break
-        return wont_run
+        return list(self.graph().unrunnable())
 
     @staticmethod
     def sorted_jobs(jobs):
@@ -543,43 +636,16 @@ class Event(models.Model):
         Return:
           list: Each entry is a list of sorted jobs
         """
-        job_depends = self.get_job_depends_on()
-        added_jobs = set()
-        other = []
-        job_groups = []
-
-        other = list(job_depends.keys())
-        while other:
-            new_other = []
-            new_group = []
-            for job in other:
-                deps = set(job_depends.get(job, []))
-                if deps.issubset(added_jobs):
-                    new_group.append(job)
-                else:
-                    new_other.append(job)
-            if not new_group:
-                """
-                If we haven't made any progress just stop.
-                """
-                new_group.extend(other)
-                other = []
-            else:
-                other = new_other
-            added_jobs |= set(new_group)
-            job_groups.append(self.sorted_jobs(new_group))
-
-        return job_groups
+        return [self.sorted_jobs(group) for group in self.graph().levels()]
 
     def check_done(self):
         """
         Check to see if the event is done running jobs
         """
-        unrunnable_jobs = self.get_unrunnable_jobs()
-        for j in self.jobs.all():
-            if not j.complete and j not in unrunnable_jobs:
-                return False
-        return True
+        counts = self.job_status_counts()
+        if counts and all(complete for status, complete in counts):
+            return True
+        return self.graph().is_done()
 
     def set_complete_if_done(self):
         """
@@ -591,16 +657,25 @@ class Event(models.Model):
             self.set_complete()
         return ret
 
+    def job_status_counts(self):
+        """
+        Number of jobs with each status, from EventJobCount.
+        Return:
+          dict: (JobStatus, complete) => number of jobs
+        """
+        counts = self.job_counts.all()
+        if not counts:
+            # Created before the counts were kept
+            return EventJobCount.count_jobs(self.jobs.all())
+        return {(c.status, c.complete): c.count for c in counts if c.count}
+
     def status_from_jobs(self):
         """
         Get the status of the event
         assuming that the event is
         not done yet.
         """
-        status = set()
-        for job in self.jobs.all():
-            status.add(job.status)
-
+        status = set(status for status, complete in self.job_status_counts())
         return incomplete_status(status)
 
     def set_status(self, status=None):
@@ -617,7 +692,7 @@ class Event(models.Model):
 
         if self.pull_request:
             self.pull_request.set_status_from_event(self)
-        elif self.update_branch_status:
+        elif self.update_branch_status and self.base.branch.status != self.status:
             self.base.branch.status = self.status
             self.base.branch.save()
 
@@ -628,12 +703,19 @@ class Event(models.Model):
         with associated branch of pull request
         """
         self.complete = True
-        status = set()
-        unrunnable_jobs = self.get_unrunnable_jobs()
-        for j in self.jobs.all():
-            if j.complete and j not in unrunnable_jobs:
-                status.add(j.status)
-        self.set_status(complete_status(status))
+        counts = dict(
+            (status, num)
+            for (status, complete), num in self.job_status_counts().items()
+            if complete
+        )
+        if JobStatus.FAILED in counts or JobStatus.CANCELED in counts:
+            # Jobs that depend on a failed job aren't counted even if they completed
+            for j in self.graph().unrunnable():
+                if j.complete and j.status in counts:
+                    counts[j.status] -= 1
+        self.set_status(
+            complete_status(set(status for status, num in counts.items() if num > 0))
+        )
 
     def make_jobs_ready(self):
         """
@@ -649,34 +731,79 @@ class Event(models.Model):
             logger.info("Event {}: {} complete".format(self.pk, self))
             return
 
-        job_depends = self.get_job_depends_on()
-        for job, deps in job_depends.items():
-            if job.complete or job.ready or not job.active:
-                continue
-            ready = True
-            for d in deps:
-                if not d.complete or d.status not in [
-                    JobStatus.FAILED_OK,
-                    JobStatus.SUCCESS,
-                    JobStatus.INTERMITTENT_FAILURE,
-                    JobStatus.SKIPPED,
-                ]:
-                    logger.info(
-                        "job {}: {} does not have depends met: {}".format(
-                            job.pk, job, d
-                        )
-                    )
-                    ready = False
-                    break
+        graph = self.graph()
+        self._set_jobs_ready(
+            [job for job in graph.jobs if self._can_be_ready(graph, job)]
+        )
 
-            if ready:
-                job.ready = ready
-                job.save()
+    def make_dependents_ready(self, job):
+        """
+        Marks the jobs that depend on a job that just finished as ready to run.
+        Only the jobs that depend on it are checked, the rest of the
+        jobs in the event couldn't have changed.
+        This doesn't check if the event is done, UpdateRemoteStatus.job_complete()
+        already does that.
+        Input:
+          job[Job]: The job that finished
+        """
+        graph = self.graph()
+        self._set_jobs_ready(
+            [
+                dependent
+                for dependent in graph.dependents.get(job.pk, [])
+                if self._can_be_ready(graph, dependent)
+            ]
+        )
+
+    @staticmethod
+    def _can_be_ready(graph, job):
+        """
+        Return:
+          bool: Whether the job isn't ready yet but all of its dependencies are met
+        """
+        if job.complete or job.ready or not job.active:
+            return False
+        for d in graph.depends_on[job.pk]:
+            if not d.complete or d.status not in DEPENDS_MET_STATUS:
                 logger.info(
-                    "{}: {}: {} : ready: {} : on {}".format(
-                        job.event, job.pk, job, job.ready, job.recipe.repository
-                    )
+                    "job {}: {} does not have depends met: {}".format(job.pk, job, d)
+                )
+                return False
+        return True
+
+    def _set_jobs_ready(self, jobs):
+        """
+        Marks jobs as ready with one update and adds them to the ready job index.
+        Input:
+          jobs[list[Job]]: Jobs that have their dependencies met
+        """
+        if not jobs:
+            return
+
+        from ci.client import ReadyJobs
+
+        Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            ready=True, last_modified=timezone.now()
+        )
+        job_state_changed()
+        # Reload them with everything that the ready job index needs
+        ready_jobs = list(
+            Job.objects.filter(pk__in=[job.pk for job in jobs]).select_related(
+                "config",
+                "client",
+                "recipe__client_runner_user",
+                "recipe__build_user",
+                "recipe__repository__user__server",
+            )
+        )
+        for job in ready_jobs:
+            job.event = self
+            logger.info(
+                "{}: {}: {} : ready: {} : on {}".format(
+                    job.event, job.pk, job, job.ready, job.recipe.repository
                 )
+            )
+        ReadyJobs.update_ready_jobs(ready_jobs)
 
     def auto_cancel_event_except_current(self):
         return self.base.branch.get_branch_setting(
@@ -1022,6 +1149,63 @@ class Job(models.Model):
     def __str__(self):
         return "{}:{}".format(self.recipe.name, self.config.name)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        job = super(Job, cls).from_db(db, field_names, values)
+        job._counted = job._count_key()
+        return job
+
+    def refresh_from_db(self, *args, **kwargs):
+        super(Job, self).refresh_from_db(*args, **kwargs)
+        self._counted = self._count_key()
+
+    def _count_key(self):
+        """
+        Where this job is counted in EventJobCount.
+        Return:
+          tuple(int, JobStatus, bool): (event pk, status, complete), None if not loaded
+        """
+        fields = self.__dict__
+        if (
+            "event_id" not in fields
+            or "status" not in fields
+            or "complete" not in fields
+        ):
+            return None
+        return (self.event_id, self.status, self.complete)
+
+    def _saved_count_key(self):
+        """
+        Same as _count_key() but read from the database.
+        Used when some of the fields weren't loaded.
+        """
+        return (
+            Job.objects.filter(pk=self.pk)
+            .values_list("event_id", "status", "complete")
+            .first()
+        )
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        with transaction.atomic():
+            old = None
+            if not adding:
+                old = getattr(self, "_counted", None) or self._saved_count_key()
+            super(Job, self).save(*args, **kwargs)
+            new = self._count_key() or self._saved_count_key()
+            EventJobCount.move(old, new)
+            self._counted = new
+        job_state_changed()
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            old = self._count_key() or self._saved_count_key()
+            ret = super(Job, self).delete(*args, **kwargs)
+            # After the job is gone so that it isn't counted if the event gets seeded
+            EventJobCount.move(old, None)
+        job_state_changed()
+        return ret
+
     def str_with_client(self):
         if self.client:
             return "%s on %s" % (self, self.client)
@@ -1057,10 +1241,9 @@ class Job(models.Model):
         return None
 
     def total_output_size(self):
-        total = 0
-        for result in self.step_results.all():
-            total += len(result.output)
-        return humanize_bytes(total)
+        results = list(self.step_results.all())
+        StepResult.load_output_lengths(results)
+        return humanize_bytes(sum(r.full_output_length() for r in results))
 
     def unique_name(self):
         if self.recipe.build_configs.count() > 1:
@@ -1096,6 +1279,8 @@ class Job(models.Model):
     def set_invalidated(
         self, message, same_client=False, client=None, check_ready=False
     ):
+        from ci.client import ReadyJobs
+
         logger.info(
             "Invalidating: %s : %s: %s" % (self.str_with_client(), self.pk, message)
         )
@@ -1123,6 +1308,7 @@ class Job(models.Model):
             JobStatus.NOT_STARTED, calc_event=True
         )  # this will save the job and event
         JobChangeLog.objects.create(job=self, message=message)
+        ReadyJobs.update_ready_job(self)
         if check_ready:
             self.event.make_jobs_ready()
         if old_recipe.jobs.count() == 0:
@@ -1132,10 +1318,14 @@ class Job(models.Model):
         """
         Prioritizes the job and updates the event status.
         """
+        from ci.client import ReadyJobs
+
         logger.info(f"Prioritizing:{self}:{self.pk}: {message}")
         self.prioritized = make_aware(datetime.now())
         JobChangeLog.objects.create(job=self, message=message)
         self.save()
+        # The job might need to move up in the ready job index
+        ReadyJobs.update_ready_job(self)
 
     def init_pr_status(self):
         """
@@ -1156,6 +1346,20 @@ class Job(models.Model):
         total = self.step_results.aggregate(Sum("seconds"))
         return total["seconds__sum"]
 
+    def add_seconds(self, seconds):
+        """
+        Adds to the total run time of the job without summing the steps
+        again, like calc_total_time() does.
+        last_modified is bumped like touch() does.
+        Input:
+          seconds[timedelta]: Time to add
+        """
+        if seconds:
+            touch(self, seconds=F("seconds") + seconds)
+            self.seconds += seconds
+        else:
+            touch(self)
+
     def absolute_url(self):
         return "%s%s" % (
             settings.ABSOLUTE_BASE_URL,
@@ -1180,6 +1384,158 @@ class Job(models.Model):
                 break
 
 
+class EventJobCount(models.Model):
+    """
+    Number of jobs of an event that have a status.
+    These are kept up to date as jobs are saved so that the status
+    of an event can be worked out without loading all of its jobs.
+    The repair_event_job_counts command recomputes them from the jobs.
+    """
+
+    event = models.ForeignKey(
+        "Event", related_name="job_counts", on_delete=models.CASCADE
+    )
+    status = models.IntegerField(choices=JobStatus.STATUS_CHOICES)
+    complete = models.BooleanField()
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return "{}:{}:{}: {}".format(
+            self.event_id, JobStatus.to_str(self.status), self.complete, self.count
+        )
+
+    class Meta:
+        unique_together = ["event", "status", "complete"]
+
+    @staticmethod
+    def count_jobs(job_q):
+        """
+        Input:
+          job_q[QuerySet]: Jobs to count
+        Return:
+          dict: (JobStatus, complete) => number of jobs
+        """
+        rows = (
+            job_q.values_list("status", "complete")
+            .annotate(num=models.Count("pk"))
+            .order_by()
+        )
+        return {(status, complete): num for status, complete, num in rows}
+
+    @staticmethod
+    def seed(event_id):
+        """
+        Creates the counts of an event from its jobs if it doesn't have any.
+        Events created before the counts were kept don't have them.
+        Input:
+          event_id[int]: pk of the event
+        Return:
+          bool: Whether the counts were created
+        """
+        if EventJobCount.objects.filter(event_id=event_id).exists():
+            return False
+        actual = EventJobCount.count_jobs(Job.objects.filter(event_id=event_id))
+        try:
+            with transaction.atomic():
+                EventJobCount.objects.bulk_create(
+                    [
+                        EventJobCount(
+                            event_id=event_id,
+                            status=status,
+                            complete=complete,
+                            count=num,
+                        )
+                        for (status, complete), num in actual.items()
+                    ]
+                )
+        except IntegrityError:
+            # Another process seeded them first
+            return False
+        return True
+
+    @staticmethod
+    def add(key, num):
+        """
+        If the event doesn't have any counts yet they are created
+        from its jobs instead, which already include this change.
+        Input:
+          key[tuple(int, JobStatus, bool)]: (event pk, status, complete)
+          num[int]: Number of jobs to add, can be negative
+        Return:
+          bool: Whether the counts of the event were created from its jobs
+        """
+        event_id, status, complete = key
+        counts = EventJobCount.objects.filter(
+            event_id=event_id, status=status, complete=complete
+        )
+        if counts.update(count=F("count") + num):
+            return False
+        if EventJobCount.seed(event_id):
+            return True
+        try:
+            with transaction.atomic():
+                EventJobCount.objects.create(
+                    event_id=event_id, status=status, complete=complete, count=num
+                )
+        except IntegrityError:
+            # Another process created it first
+            counts.update(count=F("count") + num)
+        return False
+
+    @staticmethod
+    def move(old, new):
+        """
+        Moves a job from one count to another.
+        This is called after the job is saved.
+        Input:
+          old[tuple(int, JobStatus, bool)]: Key where the job was counted, None if it wasn't
+          new[tuple(int, JobStatus, bool)]: Key where the job is counted now, None if it isn't
+        """
+        if old == new:
+            return
+        if old is not None and EventJobCount.add(old, -1):
+            return
+        if new is not None:
+            EventJobCount.add(new, 1)
+
+    @staticmethod
+    def recompute(event_q=None, repair=True):
+        """
+        Recomputes the counts from the jobs.
+        Input:
+          event_q[QuerySet]: Events to recompute. All if None.
+          repair[bool]: Whether to fix the counts that are wrong
+        Return:
+          list[Event]: Events that had wrong counts
+        """
+        if event_q is None:
+            event_q = Event.objects.all()
+        wrong = []
+        for event in event_q.prefetch_related("job_counts").iterator(chunk_size=500):
+            actual = EventJobCount.count_jobs(Job.objects.filter(event=event))
+            stored = {
+                (c.status, c.complete): c.count
+                for c in event.job_counts.all()
+                if c.count
+            }
+            if actual == stored:
+                continue
+            wrong.append(event)
+            if not repair:
+                continue
+            with transaction.atomic():
+                event.job_counts.all().delete()
+                EventJobCount.objects.bulk_create(
+                    [
+                        EventJobCount(
+                            event=event, status=status, complete=complete, count=num
+                        )
+                        for (status, complete), num in actual.items()
+                    ]
+                )
+        return wrong
+
+
 @python_2_unicode_compatible
 class JobTestStatistics(models.Model):
     """
@@ -1222,20 +1578,72 @@ class JobChangeLog(models.Model):
         ]
 
 
+# Prefix for step output compressed with zlib. The prefix allows
+# other compression formats to be used later on.
+ZLIB_OUTPUT_PREFIX = b"z"
+
+
+def compress_output(output):
+    """
+    Input:
+      output[str]: Step output
+    Return:
+      bytes: The compressed output. Empty output stays empty.
+    """
+    if not output:
+        return b""
+    return ZLIB_OUTPUT_PREFIX + zlib.compress(output.encode("utf-8", "replace"))
+
+
+def decompress_output(data):
+    """
+    Input:
+      data[bytes]: Output from compress_output()
+    Return:
+      str: The step output
+    """
+    data = bytes(data)  # some databases return a memoryview
+    if not data:
+        return ""
+    if data[:1] != ZLIB_OUTPUT_PREFIX:
+        raise ValueError("Unknown step output format")
+    return zlib.decompress(data[1:]).decode("utf-8", "replace")
+
+
+def output_removed_marker(num_bytes):
+    """
+    Text that replaces output that was removed to keep a step under its output budget.
+    """
+    return (
+        "\n\n*****************************************************\n"
+        "CIVET: %s of output was removed to stay under the output limit\n"
+        "*****************************************************\n\n"
+        % humanize_bytes(num_bytes)
+    )
+
+
+def remove_terminal_codes(output):
+    prefix = re.escape("\33[")
+    new_out = re.sub(prefix + r"1m", "", output)
+    new_out = re.sub(prefix + r"(1;)*(\d{1,2})m", "", new_out)
+    return new_out
+
+
+# Output longer than this isn't shown on the job page
+MAX_CLEAN_OUTPUT_SIZE = 1024 * 1024 * 2
+OUTPUT_TOO_LARGE = (
+    "Output too large. You will need to download the results to see this."
+)
+
+
 def terminalize_output(output):
-    # Replace "<,&,>" signs
-    output = output.replace("&", "&amp;")
-    output = output.replace("<", "&lt;")
-    output = output.replace(">", "&gt;")
-    output = output.replace("\n", "<br/>")
     """
-       Substitute terminal color codes for CSS tags.
-       The bold tag can be a modifier on another tag
-       and thus sometimes doesn't have its own
-       closing tag. Just ignore it in that case.
+    Substitute terminal color codes for CSS tags.
+    The bold tag can be a modifier on another tag
+    and thus sometimes doesn't have its own
+    closing tag. Just ignore it in that case.
     """
-    conv = ansi2html.Ansi2HTMLConverter(escaped=False, scheme="xterm")
-    return conv.convert(output, full=False)
+    return OutputRender.render(output)[0]
 
 
 @python_2_unicode_compatible
@@ -1262,7 +1670,19 @@ class StepResult(models.Model):
         choices=JobStatus.STATUS_CHOICES, default=JobStatus.NOT_STARTED
     )
     complete = models.BooleanField(default=False)
-    output = models.TextField(blank=True)  # output of the step
+    # Output of the step that has been compacted into a single compressed blob.
+    # While the step is running new output is stored in output_chunks.
+    # Use the "output" property to get all of it.
+    output_data = models.BinaryField(blank=True, default=b"")
+    # Number of characters in output_data once it is decompressed
+    output_length = models.PositiveBigIntegerField(default=0)
+    # Uncompressed output from before output was compressed.
+    # The compress_step_output command moves this into output_data.
+    legacy_output = models.TextField(blank=True, db_column="output")
+    # If the compacted output is in the LogStore, this is its digest
+    output_digest = models.CharField(max_length=64, blank=True, default="")
+    # Number of bytes of output sent by the client, including any that was removed
+    output_bytes_seen = models.PositiveBigIntegerField(default=0)
     seconds = models.DurationField(default=timedelta)  # run time
     last_modified = models.DateTimeField(auto_now=True)
 
@@ -1275,25 +1695,395 @@ class StepResult(models.Model):
             "position",
         ]
 
+    @property
+    def compacted_output(self):
+        """
+        The output that has been compacted, without any output chunks.
+        """
+        if self.output_digest:
+            return LogStore.read_range(self.output_digest).decode("utf-8", "replace")
+        if self.output_data:
+            return decompress_output(self.output_data)
+        return self.legacy_output
+
+    @property
+    def output(self):
+        """
+        The full output of the step.
+        The output chunks are only loaded the first time this is accessed.
+        """
+        if self.__dict__.get("_full_output") is None:
+            chunks = self._iter_chunk_output() if self.pk is not None else []
+            self._full_output = self.compacted_output + "".join(chunks)
+        return self._full_output
+
+    @output.setter
+    def output(self, value):
+        """
+        Replaces all the output. Any output chunks get removed on save()
+        If the LogStore is enabled then the output is written to it.
+        """
+        if value and LogStore.enabled():
+            self.output_digest = LogStore.store(value)[0]
+            self.output_data = b""
+        else:
+            self.output_digest = ""
+            self.output_data = compress_output(value)
+        self.output_length = len(value)
+        self.legacy_output = ""
+        self._full_output = value
+        self.__dict__.pop("_output_length", None)
+        self._replace_output_chunks = True
+
+    def save(self, *args, **kwargs):
+        replace_chunks = self.__dict__.pop("_replace_output_chunks", False)
+        adding = self._state.adding
+        super(StepResult, self).save(*args, **kwargs)
+        if replace_chunks and not adding:
+            self.output_chunks.all().delete()
+
+    def iter_output_lines(self):
+        """
+        Generator over the lines of the full output.
+        Output in the LogStore is read a line at a time instead of all at once.
+        Yields:
+          str: Each line, including the newline
+        """
+        partial = ""
+        for piece in self._iter_output_pieces():
+            text = partial + piece
+            start = 0
+            end = text.find("\n")
+            while end >= 0:
+                yield text[start : end + 1]
+                start = end + 1
+                end = text.find("\n", start)
+            partial = text[start:]
+        if partial:
+            yield partial
+
+    def _iter_output_pieces(self):
+        if self.__dict__.get("_full_output") is not None:
+            yield self._full_output
+            return
+        if self.output_digest:
+            for line in LogStore.iter_lines(self.output_digest):
+                yield line
+        else:
+            yield self.compacted_output
+        if self.pk is not None:
+            for chunk in self._iter_chunk_output():
+                yield chunk
+
+    def _iter_chunk_output(self):
+        """
+        Generator over the output in the chunks. Where output
+        was removed between chunks a marker is added.
+        """
+        end = None
+        for offset, size, output in self.output_chunks.values_list(
+            "offset", "size", "output"
+        ):
+            if end is not None and offset > end:
+                yield output_removed_marker(offset - end)
+            end = offset + size
+            yield output
+
+    def read_output(self, offset=0, length=None):
+        """
+        Reads part of the output. If the output is in the LogStore then
+        only the requested part is read from the file.
+        Input:
+          offset[int]: Offset into the UTF-8 encoded output. Negative offsets are from the end.
+          length[int]: Maximum number of bytes to read. None reads to the end.
+        Return:
+          str: The output. Characters split at the ends of the range are replaced.
+        """
+        if self.output_digest and not self.output_chunks.exists():
+            data = LogStore.read_range(self.output_digest, offset, length)
+        else:
+            data = self.output.encode("utf-8", "replace")
+            if offset < 0:
+                offset = max(len(data) + offset, 0)
+            data = data[offset:] if length is None else data[offset : offset + length]
+        return data.decode("utf-8", "replace")
+
+    def output_tail_offset(self):
+        """
+        Return:
+          int: Offset to pass to output_since() to get output added after now
+        """
+        last = (
+            self.output_chunks.order_by("-sequence")
+            .values_list("offset", "size")
+            .first()
+        )
+        return last[0] + last[1] if last else 0
+
+    def output_since(self, offset):
+        """
+        Gets the output of a running step that was added after an offset.
+        Offsets are into everything the client sent, like StepOutputChunk.offset,
+        so they don't move when output is removed to keep the step under budget.
+        Input:
+          offset[int]: From output_tail_offset() or a previous call
+        Return:
+          tuple(str, int): The new output and the offset to use next time.
+            The output is None if the output has been compacted, like when
+            the step is complete, and the whole output needs to be read.
+        """
+        if self.output_digest or self.output_length or self.legacy_output:
+            return None, offset
+        pieces = []
+        end = offset
+        for chunk_offset, size, output in self.output_chunks.filter(
+            offset__gte=offset
+        ).values_list("offset", "size", "output"):
+            if chunk_offset > end:
+                pieces.append(output_removed_marker(chunk_offset - end))
+            pieces.append(output)
+            end = chunk_offset + size
+        return "".join(pieces), end
+
+    def refresh_from_db(self, *args, **kwargs):
+        self.__dict__.pop("_full_output", None)
+        self.__dict__.pop("_output_length", None)
+        self.__dict__.pop("_replace_output_chunks", None)
+        super(StepResult, self).refresh_from_db(*args, **kwargs)
+
+    def append_output(self, output, offset=None):
+        """
+        Appends to the output of the step without rewriting
+        the output that is already stored.
+        Input:
+          output[str]: Output to append
+          offset[int]: Byte offset of the output in everything the client sent.
+            Defaults to right after the last chunk.
+        """
+        if not output:
+            return
+        last = (
+            self.output_chunks.order_by("-sequence")
+            .values_list("sequence", "offset", "size")
+            .first()
+        )
+        if offset is None:
+            offset = last[1] + last[2] if last else 0
+        StepOutputChunk.objects.create(
+            step_result=self,
+            sequence=0 if last is None else last[0] + 1,
+            offset=offset,
+            size=len(output.encode("utf-8", "replace")),
+            output=output,
+        )
+        self.__dict__.pop("_full_output", None)
+        self.__dict__.pop("_output_length", None)
+
+    def remove_output_chunks(self, start, end):
+        """
+        Removes the output chunks that are entirely between two byte offsets.
+        Input:
+          start[int]: Starting byte offset
+          end[int]: Ending byte offset
+        """
+        chunks = self.output_chunks.annotate(end=F("offset") + F("size")).filter(
+            offset__gte=start, end__lte=end
+        )
+        if chunks.delete()[0]:
+            self.__dict__.pop("_full_output", None)
+            self.__dict__.pop("_output_length", None)
+
+    def compact_output(self):
+        """
+        Joins the output chunks into the compacted output and removes them.
+        Called when the step is complete.
+        """
+        if not self.output_chunks.exists():
+            return
+        self.output = self.output
+        self.save()
+
     def status_slug(self):
         return JobStatus.to_slug(self.status)
 
     def clean_output(self):
         # If the output is over 2Mb then just return a too big message.
-        if len(self.output) > (1024 * 1024 * 2):
-            return (
-                "Output too large. You will need to download the results to see this."
-            )
-        return terminalize_output(self.output)
+        # Check the stored length first so that we don't need to decompress it.
+        if self.output_length > MAX_CLEAN_OUTPUT_SIZE:
+            return OUTPUT_TOO_LARGE
+        if self.pk is not None:
+            if self.complete:
+                return self._cached_clean_output()
+            if not self._has_compacted_output():
+                before, after = self._running_render()
+                if after is not None:
+                    if after["length"] > MAX_CLEAN_OUTPUT_SIZE:
+                        return OUTPUT_TOO_LARGE
+                    return after["html"]
+        output = self.output
+        if len(output) > MAX_CLEAN_OUTPUT_SIZE:
+            return OUTPUT_TOO_LARGE
+        return terminalize_output(output)
+
+    def clean_output_since(self, offset):
+        """
+        Gets the output of a running step that was added after an offset, like
+        output_since(), converted to HTML. Terminal codes from earlier output
+        still apply to the new output.
+        Input:
+          offset[int]: From output_tail_offset() or a previous call
+        Return:
+          tuple(str, int): The HTML and the offset to use next time.
+            The HTML is None if the output has been compacted.
+        """
+        if self._has_compacted_output():
+            return None, offset
+        before, after = self._running_render()
+        if after is None:
+            return None, offset
+        if before["offset"] == offset and after["length"] <= MAX_CLEAN_OUTPUT_SIZE:
+            return after["html"][len(before["html"]) :], after["offset"]
+        output, end = self.output_since(offset)
+        if output is None:
+            return None, end
+        return (terminalize_output(output) if output else ""), end
+
+    def _has_compacted_output(self):
+        return bool(self.output_digest or self.output_length or self.legacy_output)
+
+    def _output_fingerprint(self):
+        if self.output_digest:
+            return self.output_digest
+        if self.output_data:
+            return hashlib.sha1(bytes(self.output_data)).hexdigest()
+        return hashlib.sha1(self.legacy_output.encode("utf-8", "replace")).hexdigest()
+
+    def _cached_clean_output(self):
+        """
+        Converted output of a complete step, from the cache if possible.
+        """
+        key = ("output", self.pk, self._output_fingerprint())
+        html = OutputRender.cache.get(key)
+        if html is None:
+            OutputRender.cache.delete(("running", self.pk))
+            output = self.output
+            if len(output) > MAX_CLEAN_OUTPUT_SIZE:
+                html = OUTPUT_TOO_LARGE
+            else:
+                html = terminalize_output(output)
+            OutputRender.cache.set(key, html, len(html))
+        return html
+
+    def _running_render(self):
+        """
+        Brings the converted output of a running step up to date.
+        Only the output that was added since the last time is converted.
+        Return:
+          tuple(dict, dict): The cache entry before and after. Both are None
+            if the output was compacted in the meantime.
+        """
+        key = ("running", self.pk)
+        entry = OutputRender.cache.get(key)
+        if entry is not None:
+            # Output that was removed to keep the step under budget is still in the HTML
+            num_chunks = self.output_chunks.filter(offset__lt=entry["offset"]).count()
+            if num_chunks != entry["chunks"]:
+                entry = None
+        if entry is None:
+            entry = {"html": "", "state": None, "offset": 0, "chunks": 0, "length": 0}
+        if entry["length"] > MAX_CLEAN_OUTPUT_SIZE:
+            # Too big to show so don't bother converting any more
+            return entry, entry
+
+        output, offset = self.output_since(entry["offset"])
+        if output is None:
+            OutputRender.cache.delete(key)
+            return None, None
+        if not output:
+            return entry, entry
+        html, state = OutputRender.render(output, entry["state"])
+        new_entry = {
+            "html": entry["html"] + html,
+            "state": state,
+            "offset": offset,
+            "chunks": self.output_chunks.filter(offset__lt=offset).count(),
+            "length": entry["length"] + len(output),
+        }
+        OutputRender.cache.set(key, new_entry, len(new_entry["html"]))
+        return entry, new_entry
 
     def plain_output(self):
-        prefix = re.escape("\33[")
-        new_out = re.sub(prefix + r"1m", "", self.output)
-        new_out = re.sub(prefix + r"(1;)*(\d{1,2})m", "", new_out)
-        return new_out
+        return remove_terminal_codes(self.output)
+
+    @staticmethod
+    def load_output_lengths(step_results):
+        """
+        Works out the number of characters in the full output of each step
+        without reading the output. The chunk lengths are read in one query.
+        Input:
+          step_results[list[StepResult]]: The step results to load the lengths for
+        """
+        by_pk = {}
+        for result in step_results:
+            result._output_length = result.output_length or len(result.legacy_output)
+            if result.pk is not None:
+                by_pk[result.pk] = result
+        if not by_pk:
+            return
+        chunks = (
+            StepOutputChunk.objects.filter(step_result__in=list(by_pk))
+            .annotate(chars=Length("output"))
+            .order_by("step_result", "sequence")
+            .values_list("step_result_id", "offset", "size", "chars")
+        )
+        ends = {}
+        for pk, offset, size, chars in chunks:
+            end = ends.get(pk)
+            if end is not None and offset > end:
+                chars += len(output_removed_marker(offset - end))
+            ends[pk] = offset + size
+            by_pk[pk]._output_length += chars
+
+    def full_output_length(self):
+        """
+        Return:
+          int: Number of characters in the full output, the same as len(self.output)
+        """
+        if self.__dict__.get("_full_output") is not None:
+            return len(self._full_output)
+        if self.__dict__.get("_output_length") is None:
+            StepResult.load_output_lengths([self])
+        return self._output_length
 
     def output_size(self):
-        return humanize_bytes(len(self.output))
+        return humanize_bytes(self.full_output_length())
+
+
+class StepOutputChunk(models.Model):
+    """
+    A piece of output from a running step.
+    Each update from the client adds a new chunk so that the
+    output that is already stored doesn't get rewritten.
+    """
+
+    step_result = models.ForeignKey(
+        StepResult, related_name="output_chunks", on_delete=models.CASCADE
+    )
+    sequence = models.PositiveIntegerField()
+    # Where this output starts in all the output that was sent for the step,
+    # and its size, in bytes. Gaps between chunks are output that was removed.
+    offset = models.PositiveBigIntegerField(default=0)
+    size = models.PositiveIntegerField(default=0)
+    output = models.TextField(blank=True)
+
+    def __str__(self):
+        return "{}:{}".format(self.step_result, self.sequence)
+
+    class Meta:
+        unique_together = ["step_result", "sequence"]
+        ordering = [
+            "sequence",
+        ]
 
 
 def incomplete_status(status):
@@ -1364,3 +2154,12 @@ class RepositoryBadge(models.Model):
 
     def __str__(self):
         return "%s:%s" % (self.repository, self.name)
+
+    def save(self, *args, **kwargs):
+        super(RepositoryBadge, self).save(*args, **kwargs)
+        dashboard_changed()
+
+    def delete(self, *args, **kwargs):
+        ret = super(RepositoryBadge, self).delete(*args, **kwargs)
+        dashboard_changed()
+        return ret
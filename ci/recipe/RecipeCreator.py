@@ -15,7 +15,7 @@
 from __future__ import unicode_literals, absolute_import
 from django.conf import settings
 from django.db import transaction
-from ci.recipe import RecipeRepoReader, file_utils
+from ci.recipe import RecipeRepoReader, RecipePayload, file_utils
 from ci import models
 
 
@@ -222,6 +222,10 @@ class RecipeCreator(object):
             self._recipe_repo_rec.sha = self._repo_sha
             self._recipe_repo_rec.save()
             self._update_pull_requests()
+            # Replace any cached payloads, in case the scripts changed
+            transaction.on_commit(
+                lambda: RecipePayload.build_payloads(self._repo_sha, self._recipes_dir)
+            )
         return removed, new, changed
 
     def install_webhooks(self):
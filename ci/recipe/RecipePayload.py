@@ -0,0 +1,185 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Caches the parts of the job info sent to a client that only depend
+on the recipe: the scripts, the environment and the steps.
+Payloads are keyed by the recipe and the SHA of the recipe repository
+so that they never need to be read from disk while claiming a job.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch
+from ci.recipe import file_utils
+from ci import models
+import logging
+
+logger = logging.getLogger("ci")
+
+
+def _payload_key(recipe_id, repo_sha):
+    return "recipe_payload:%s:%s" % (repo_sha, recipe_id)
+
+
+def recipe_repo_sha():
+    """
+    The SHA of the recipe repository that the recipes were loaded from.
+    This is stored in the database by load_recipes so it doesn't need git.
+    If the recipes have never been loaded then git is asked for the SHA of RECIPE_BASE_DIR.
+    Return:
+      str: The SHA
+    """
+    sha = models.RecipeRepository.objects.values_list("sha", flat=True).first()
+    if not sha:
+        sha = file_utils.get_repo_sha(settings.RECIPE_BASE_DIR)
+    return sha
+
+
+def with_recipe_graph(recipe_q):
+    """
+    Adds the prefetches needed by build_payload() so that building
+    payloads takes the same number of queries no matter how many
+    steps the recipes have.
+    Input:
+      recipe_q[QuerySet]: Recipe query
+    Return:
+      QuerySet: The query with the steps, environments and prestep sources prefetched
+    """
+    step_q = models.Step.objects.order_by("position").prefetch_related(
+        "step_environment"
+    )
+    return recipe_q.prefetch_related(
+        Prefetch("steps", queryset=step_q),
+        "environment_vars",
+        "prestepsources",
+    )
+
+
+def build_payload(recipe, base_dir):
+    """
+    Reads everything that a recipe needs to run.
+    The recipe should come from a query passed through with_recipe_graph().
+    Input:
+      recipe[models.Recipe]: The recipe
+      base_dir[str]: Directory with the recipe scripts
+    Return:
+      dict: The payload
+    """
+    payload = {
+        "recipe_name": recipe.name,
+        "environment": {
+            "CIVET_RECIPE_NAME": recipe.name,
+            "CIVET_RECIPE_ID": recipe.pk,
+            "CIVET_EVENT_CAUSE": recipe.cause_str(),
+        },
+        "pr_base_ref_override": recipe.pr_base_ref_override,
+        "recipe_environment": [
+            (env.name, env.value) for env in recipe.environment_vars.all()
+        ],
+        "prestep_sources": [],
+        "steps": [],
+        "step_results": [],
+    }
+
+    for prestep in recipe.prestepsources.all():
+        if prestep.filename:
+            contents = file_utils.get_contents(base_dir, prestep.filename)
+            if contents:
+                payload["prestep_sources"].append(contents)
+
+    for step in recipe.steps.all():
+        step_dict = {
+            "step_num": step.position,
+            "step_position": step.position,
+            "step_name": step.name,
+            "abort_on_failure": step.abort_on_failure,
+            "allowed_to_fail": step.allowed_to_fail,
+        }
+        step_env = {
+            "CIVET_STEP_NUM": step.position,
+            "CIVET_STEP_POSITION": step.position,
+            "CIVET_STEP_NAME": step.name,
+            "CIVET_STEP_ABORT_ON_FAILURE": step.abort_on_failure,
+            "CIVET_STEP_ALLOWED_TO_FAIL": step.allowed_to_fail,
+        }
+        for env in step.step_environment.all():
+            step_env[env.name] = env.value
+        step_dict["environment"] = step_env
+
+        if step.filename:
+            contents = file_utils.get_contents(base_dir, step.filename)
+            step_dict["script"] = str(contents)  # in case of empty file, use str
+
+        payload["steps"].append(step_dict)
+        # What is needed to create the StepResult for the step
+        payload["step_results"].append(
+            {
+                "name": step.name,
+                "position": step.position,
+                "abort_on_failure": step.abort_on_failure,
+                "allowed_to_fail": step.allowed_to_fail,
+                "filename": step.filename,
+            }
+        )
+    return payload
+
+
+def get_payloads(recipes, repo_sha):
+    """
+    Gets the payloads for recipes, building the ones that aren't cached.
+    Input:
+      recipes[list[models.Recipe]]: The recipes
+      repo_sha[str]: The SHA of the recipe repository
+    Return:
+      dict: recipe pk => payload. These are shared so copy them before modifying.
+    """
+    recipes = dict((recipe.pk, recipe) for recipe in recipes)
+    keys = dict((_payload_key(pk, repo_sha), pk) for pk in recipes.keys())
+    cached = cache.get_many(keys.keys())
+    payloads = {}
+    new_payloads = {}
+    missing = [recipe_id for key, recipe_id in keys.items() if key not in cached]
+    if missing:
+        # Load the whole recipe graph in a fixed number of queries
+        missing_q = with_recipe_graph(models.Recipe.objects.filter(pk__in=missing))
+        for recipe in missing_q:
+            recipes[recipe.pk] = recipe
+    for key, recipe_id in keys.items():
+        payload = cached.get(key)
+        if payload is None:
+            payload = build_payload(recipes[recipe_id], settings.RECIPE_BASE_DIR)
+            new_payloads[key] = payload
+        payloads[recipe_id] = payload
+    if new_payloads:
+        cache.set_many(new_payloads, settings.RECIPE_PAYLOAD_CACHE_TIMEOUT)
+    return payloads
+
+
+def build_payloads(repo_sha, base_dir):
+    """
+    Builds and caches the payloads for all the current recipes,
+    replacing any that are already cached.
+    Called after the recipes are loaded.
+    Input:
+      repo_sha[str]: The SHA of the recipe repository
+      base_dir[str]: Directory the recipes were loaded from
+    """
+    payloads = {}
+    recipe_q = models.Recipe.objects.filter(current=True, active=True)
+    for recipe in with_recipe_graph(recipe_q):
+        payloads[_payload_key(recipe.pk, repo_sha)] = build_payload(recipe, base_dir)
+    cache.set_many(payloads, settings.RECIPE_PAYLOAD_CACHE_TIMEOUT)
+    logger.info("Built %s recipe payloads for %s" % (len(payloads), repo_sha[:8]))
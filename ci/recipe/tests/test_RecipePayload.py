@@ -0,0 +1,106 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals, absolute_import
+from ci.recipe.tests import RecipeTester
+from ci.tests import utils as test_utils
+from ci import models
+from ci.client import views
+from ci.recipe import RecipePayload, file_utils
+from django.core.cache import cache
+from django.test import override_settings
+from mock import patch
+
+
+@override_settings(INSTALLED_GITSERVERS=[test_utils.github_config()])
+class Tests(RecipeTester.RecipeTester):
+    def setUp(self):
+        super(Tests, self).setUp()
+        cache.clear()
+
+    def test_build_payload(self):
+        with test_utils.RecipeDir() as recipes_dir:
+            recipe = test_utils.create_recipe()
+            test_utils.create_recipe_environment(recipe=recipe)
+            fname = self.write_script_to_repo(recipes_dir, "echo pre", "pre.sh")
+            test_utils.create_prestepsource(filename=fname, recipe=recipe)
+            step = test_utils.create_step(recipe=recipe, position=1)
+            test_utils.create_step_environment(step=step)
+            test_utils.create_step(recipe=recipe, position=0, name="first")
+            payload = RecipePayload.build_payload(recipe, recipes_dir)
+            self.assertEqual(payload["recipe_name"], recipe.name)
+            self.assertEqual(payload["environment"]["CIVET_RECIPE_ID"], recipe.pk)
+            self.assertEqual(len(payload["recipe_environment"]), 1)
+            self.assertEqual(payload["prestep_sources"], ["echo pre"])
+            self.assertEqual([s["step_name"] for s in payload["steps"]][0], "first")
+            self.assertEqual(len(payload["steps"][1]["environment"]), 6)
+            self.assertIn("script", payload["steps"][1])
+            self.assertEqual([s["position"] for s in payload["step_results"]], [0, 1])
+
+    def test_get_payloads(self):
+        with test_utils.RecipeDir():
+            recipe = test_utils.create_recipe()
+            test_utils.create_step(recipe=recipe)
+            payloads = RecipePayload.get_payloads([recipe], "1234")
+            self.assertEqual(list(payloads.keys()), [recipe.pk])
+
+            # Cached, so the scripts aren't read again
+            with patch.object(file_utils, "get_contents") as mock_contents:
+                self.assertEqual(RecipePayload.get_payloads([recipe], "1234"), payloads)
+                self.assertEqual(mock_contents.call_count, 0)
+
+                # A new recipe repository SHA needs new payloads
+                RecipePayload.get_payloads([recipe], "5678")
+                self.assertEqual(mock_contents.call_count, 1)
+
+    def test_recipe_repo_sha(self):
+        with test_utils.RecipeDir() as recipes_dir:
+            git_sha = file_utils.get_repo_sha(recipes_dir)
+            self.assertEqual(RecipePayload.recipe_repo_sha(), git_sha)
+            models.RecipeRepository.load()
+            models.RecipeRepository.objects.update(sha="1234")
+            with patch.object(file_utils, "get_repo_sha") as mock_sha:
+                self.assertEqual(RecipePayload.recipe_repo_sha(), "1234")
+                self.assertEqual(mock_sha.call_count, 0)
+
+    def test_load_recipes(self):
+        with test_utils.RecipeDir() as recipes_dir:
+            with self.captureOnCommitCallbacks(execute=True):
+                test_utils.create_git_server()
+                self.create_recipe_in_repo(recipes_dir, "push_dep.cfg", "push_dep.cfg")
+                self.load_recipes(recipes_dir)
+            repo_sha = RecipePayload.recipe_repo_sha()
+            recipes = models.Recipe.objects.filter(current=True, active=True)
+            self.assertGreater(recipes.count(), 0)
+            with patch.object(file_utils, "get_contents") as mock_contents:
+                payloads = RecipePayload.get_payloads(recipes, repo_sha)
+                self.assertEqual(mock_contents.call_count, 0)
+            self.assertEqual(len(payloads), recipes.count())
+
+    def test_job_info(self):
+        with test_utils.RecipeDir():
+            recipe = test_utils.create_recipe()
+            test_utils.create_step(recipe=recipe)
+            job0 = test_utils.create_job(recipe=recipe)
+            job1 = test_utils.create_job(
+                recipe=recipe, event=test_utils.create_event(commit1="5678")
+            )
+            info = views.get_jobs_info([job0, job1])
+            step_ids = [i["steps"][0]["stepresult_id"] for i in info]
+            # Jobs with the same recipe share a cached payload
+            # but still get their own step results
+            self.assertEqual(
+                step_ids, [job0.step_results.first().pk, job1.step_results.first().pk]
+            )
+            self.assertNotEqual(step_ids[0], step_ids[1])
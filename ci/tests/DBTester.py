@@ -15,9 +15,10 @@
 from __future__ import unicode_literals, absolute_import
 from django.test import TestCase, Client
 from django.conf import settings
-from ci import models
+from ci import models, OutputRender, Dashboard
 from ci.tests import utils
 from django.test.client import RequestFactory
+from django.core.cache import cache
 
 
 class DBCompare(object):
@@ -322,3 +323,8 @@ class DBTester(TestCase, DBCompare):
     def setUp(self):
         self.client = Client()
         self.factory = RequestFactory()
+        # Things like the ready job index are kept in the cache
+        # and would refer to objects from other tests
+        cache.clear()
+        OutputRender.cache.clear()
+        Dashboard.clear()
@@ -0,0 +1,223 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals, absolute_import
+from django.test import TransactionTestCase, override_settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from ci.tests import DBTester, utils
+from ci import Dashboard, EventsStatus, RepositoryStatus, models
+from mock import patch
+import math
+
+
+@override_settings(DASHBOARD_MIN_REFRESH_INTERVAL=0)
+class Tests(DBTester.DBTester):
+    def setUp(self):
+        utils.use_shared_cache(self)
+        super(Tests, self).setUp()
+
+    def create_data(self):
+        user = utils.create_user_with_token()
+        self.repo0 = utils.create_repo(name="repo0", user=user, active=True)
+        self.repo1 = utils.create_repo(name="repo1", user=user, active=True)
+        self.repo2 = utils.create_repo(name="repo2", user=user)
+        self.events = []
+        for i, repo in enumerate([self.repo0, self.repo1, self.repo2]):
+            branch = utils.create_branch(name="devel", repo=repo)
+            branch.status = models.JobStatus.SUCCESS
+            branch.save()
+            pr = utils.create_pr(title="pr%s" % i, repo=repo)
+            ev = utils.create_event(
+                user=user, commit1="head%s" % i, branch1=branch, branch2=branch
+            )
+            ev.pull_request = pr
+            ev.save()
+            utils.create_job(event=ev, user=user)
+            self.events.append(ev)
+        badge = utils.create_badge(repo=self.repo0)
+        badge.status = models.JobStatus.FAILED
+        badge.save()
+
+    def test_version(self):
+        pr = utils.create_pr()
+        version = Dashboard.version()
+        self.assertEqual(Dashboard.version(), version)
+
+        # Only bumped when the transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            Dashboard.changed()
+            self.assertEqual(Dashboard.version(), version)
+        self.assertEqual(Dashboard.version(), version + 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pr.save()
+        self.assertEqual(Dashboard.version(), version + 2)
+
+        cache.clear()
+        self.assertNotEqual(Dashboard.version(), version + 2)
+
+    def test_user_dashboard(self):
+        self.create_data()
+        all_ids = [self.repo0.pk, self.repo1.pk, self.repo2.pk]
+        repos, events, version = Dashboard.user_dashboard(all_ids, 30)
+        self.assertEqual(version, Dashboard.version())
+        self.assertEqual(repos, RepositoryStatus.main_repos_status())
+        self.assertEqual(events, EventsStatus.all_events_info())
+        self.assertEqual(len(repos), 2)
+        self.assertEqual(len(repos[0]["badges"]), 1)
+        self.assertEqual(len(events), 3)
+
+        # Other users share the snapshot
+        with self.assertNumQueries(0):
+            repos, events, version = Dashboard.user_dashboard([self.repo1.pk], 30)
+        self.assertEqual(
+            repos, RepositoryStatus.main_repos_status(filter_repo_ids=[self.repo1.pk])
+        )
+        self.assertEqual(
+            events, EventsStatus.all_events_info(filter_repo_ids=[self.repo1.pk])
+        )
+        self.assertEqual(len(events), 1)
+        self.assertEqual(Dashboard.user_dashboard([], 30), ([], [], version))
+
+        # Preferred repositories don't have to be active
+        repos, events, version = Dashboard.user_dashboard(
+            [self.repo2.pk], 30, active_only=False
+        )
+        self.assertEqual(repos, RepositoryStatus.filter_repos_status([self.repo2.pk]))
+        self.assertEqual(events, EventsStatus.events_filter_by_repo([self.repo2.pk]))
+        self.assertEqual(len(repos), 1)
+
+        # Only what changed
+        dt = timezone.now()
+        repos, events, version = Dashboard.user_dashboard(all_ids, 30, last_modified=dt)
+        self.assertEqual(len(repos), 2)
+        self.assertEqual(repos[0]["prs"], [])
+        self.assertEqual(repos[0]["branches"], [])
+        self.assertEqual(repos[0]["badges"], [])
+        self.assertEqual(events, [])
+
+        pr = self.events[1].pull_request
+        pr.title = "new title"
+        with self.captureOnCommitCallbacks(execute=True):
+            pr.save()
+            self.events[1].save()
+        repos, events, new_version = Dashboard.user_dashboard(
+            all_ids, 30, last_modified=dt
+        )
+        self.assertGreater(new_version, version)
+        self.assertEqual(repos, RepositoryStatus.main_repos_status(last_modified=dt))
+        self.assertEqual(len(repos[1]["prs"]), 1)
+        self.assertIn("new title", repos[1]["prs"][0]["description"])
+        self.assertEqual(len(events), 1)
+        self.assertIn("new title", events[0]["description"])
+
+        # Limit the events
+        repos, events, version = Dashboard.user_dashboard(all_ids, 2)
+        self.assertEqual(events, EventsStatus.all_events_info(limit=2))
+
+    @override_settings(DASHBOARD_SNAPSHOT_EVENTS=2)
+    def test_older_events(self):
+        self.create_data()
+        # The snapshot only has the two latest events
+        self.assertIsNotNone(Dashboard.user_dashboard([self.repo2.pk], 1))
+        self.assertIsNone(Dashboard.user_dashboard([self.repo0.pk], 1))
+        self.assertIsNone(Dashboard.user_dashboard([self.repo1.pk, self.repo2.pk], 3))
+
+    def test_get_snapshot(self):
+        self.create_data()
+        snapshot = Dashboard.get_snapshot()
+        self.assertEqual(snapshot["version"], Dashboard.version())
+        self.assertEqual(len(snapshot["events"]), 3)
+        with self.assertNumQueries(0):
+            self.assertIs(Dashboard.get_snapshot(), snapshot)
+
+        # Other processes get it from the cache
+        Dashboard.clear()
+        self.assertEqual(Dashboard.get_snapshot(), snapshot)
+
+        # Don't build it while another process is
+        with self.captureOnCommitCallbacks(execute=True):
+            Dashboard.changed()
+        cache.add(Dashboard.REFRESH_LOCK_KEY, True)
+        with self.assertNumQueries(0):
+            self.assertEqual(Dashboard.get_snapshot(), snapshot)
+            # Nothing to use yet
+            cache.delete(Dashboard.SNAPSHOT_KEY)
+            Dashboard.clear()
+            self.assertIsNone(Dashboard.get_snapshot())
+            self.assertIsNone(Dashboard.served())
+            self.assertIsNone(Dashboard.user_dashboard([self.repo0.pk], 30))
+        cache.delete(Dashboard.REFRESH_LOCK_KEY)
+
+        new_snapshot = Dashboard.refresh()
+        self.assertEqual(new_snapshot["version"], Dashboard.version())
+        self.assertIs(Dashboard.get_snapshot(), new_snapshot)
+        self.assertEqual(
+            Dashboard.served(),
+            (new_snapshot["version"], math.floor(new_snapshot["built"])),
+        )
+
+    @override_settings(DASHBOARD_MIN_REFRESH_INTERVAL=60)
+    def test_min_refresh_interval(self):
+        self.create_data()
+        snapshot = Dashboard.get_snapshot()
+        pr = self.events[0].pull_request
+        with self.captureOnCommitCallbacks(execute=True):
+            pr.save()
+        self.assertGreater(Dashboard.version(), snapshot["version"])
+
+        # Not rebuilt until the interval has passed
+        with self.assertNumQueries(0):
+            self.assertIs(Dashboard.get_snapshot(), snapshot)
+        self.assertEqual(
+            Dashboard.served(), (snapshot["version"], math.floor(snapshot["built"]))
+        )
+        Dashboard.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(Dashboard.get_snapshot(), snapshot)
+
+        with patch.object(Dashboard.time, "time") as mock_time:
+            mock_time.return_value = snapshot["built"] + 60
+            new_snapshot = Dashboard.get_snapshot()
+        self.assertEqual(new_snapshot["version"], Dashboard.version())
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    def test_local_cache(self):
+        # Other processes wouldn't see the changes
+        self.create_data()
+        self.assertFalse(Dashboard.enabled())
+        self.assertIsNone(Dashboard.version())
+        Dashboard.changed()
+        self.assertIsNone(Dashboard.version())
+        self.assertIsNone(Dashboard.user_dashboard([self.repo0.pk], 30))
+
+
+class TransactionTests(TransactionTestCase):
+    def setUp(self):
+        utils.use_shared_cache(self)
+        super(TransactionTests, self).setUp()
+
+    def test_changed_outside_atomic(self):
+        version = Dashboard.version()
+        transaction.set_autocommit(False)
+        try:
+            Dashboard.changed()
+        finally:
+            transaction.rollback()
+            transaction.set_autocommit(True)
+        self.assertEqual(Dashboard.version(), version + 1)
@@ -0,0 +1,99 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals, absolute_import
+from django.test import TestCase
+from ci import models, EventsStatus
+from ci.EventGraph import EventGraph
+from . import utils
+
+
+class Tests(TestCase):
+    def create_jobs(self):
+        """
+        precheck -> test, test1 -> merge
+        """
+        self.event = utils.create_event()
+        r0 = utils.create_recipe(name="precheck")
+        r1 = utils.create_recipe(name="test")
+        r2 = utils.create_recipe(name="test1")
+        r3 = utils.create_recipe(name="merge")
+        r1.depends_on.add(r0)
+        r2.depends_on.add(r0)
+        r3.depends_on.add(r1, r2)
+        self.j0 = utils.create_job(recipe=r0, event=self.event)
+        self.j1 = utils.create_job(recipe=r1, event=self.event)
+        self.j2 = utils.create_job(recipe=r2, event=self.event)
+        self.j3 = utils.create_job(recipe=r3, event=self.event)
+
+    def test_levels(self):
+        self.create_jobs()
+        with self.assertNumQueries(2):
+            graph = EventGraph(self.event)
+        with self.assertNumQueries(0):
+            levels = graph.levels()
+            deps = graph.job_depends_on()
+        self.assertEqual(len(levels), 3)
+        self.assertEqual(levels[0], [self.j0])
+        self.assertEqual(set(levels[1]), {self.j1, self.j2})
+        self.assertEqual(levels[2], [self.j3])
+        self.assertEqual(deps[self.j0], [])
+        self.assertEqual(set(deps[self.j3]), {self.j1, self.j2})
+
+        # A cycle ends up in the last group
+        self.j0.recipe.depends_on.add(self.j3.recipe)
+        levels = EventGraph(self.event).levels()
+        self.assertEqual(len(levels), 1)
+        self.assertEqual(len(levels[0]), 4)
+
+    def test_prefetched(self):
+        self.create_jobs()
+        event = EventsStatus.get_default_events_query().get(pk=self.event.pk)
+        with self.assertNumQueries(0):
+            levels = event.graph().levels()
+        self.assertEqual(len(levels), 3)
+
+    def test_unrunnable(self):
+        self.create_jobs()
+        graph = self.event.graph()
+        self.assertEqual(graph.unrunnable(), [])
+        self.assertFalse(graph.is_done())
+
+        self.j1.complete = True
+        self.j1.status = models.JobStatus.FAILED
+        self.j1.save()
+        self.assertFalse(graph.is_current())
+        graph = self.event.graph()
+        self.assertTrue(graph.is_current())
+        self.assertEqual([j.pk for j in graph.unrunnable()], [self.j3.pk])
+        self.assertFalse(graph.is_done())
+
+        self.j0.complete = True
+        self.j0.status = models.JobStatus.CANCELED
+        self.j0.save()
+        graph = self.event.graph()
+        self.assertEqual(
+            {j.pk for j in graph.unrunnable()}, {self.j1.pk, self.j2.pk, self.j3.pk}
+        )
+        self.assertTrue(graph.is_done())
+
+    def test_event_graph(self):
+        self.create_jobs()
+        graph = self.event.graph()
+        with self.assertNumQueries(0):
+            self.assertIs(self.event.graph(), graph)
+            self.event.get_sorted_jobs()
+            self.event.get_unrunnable_jobs()
+        self.j0.save()
+        self.assertIsNot(self.event.graph(), graph)
@@ -18,6 +18,7 @@ from __future__ import unicode_literals, absolute_import
 from ci.tests import DBTester, utils
 import datetime
 from ci import EventsStatus, models
+from django.core.cache import cache
 
 
 class Tests(DBTester.DBTester):
@@ -110,6 +111,7 @@ class Tests(DBTester.DBTester):
             self.assertEqual(len(info[0]["jobs"]), 6)
 
         # make sure limit works
+        cache.clear()
         with self.assertNumQueries(4):
             info = EventsStatus.all_events_info(limit=1)
             self.assertEqual(len(info), 1)
@@ -118,11 +120,36 @@ class Tests(DBTester.DBTester):
         last_modified = models.Event.objects.last().last_modified
         last_modified = last_modified + datetime.timedelta(0, 10)
 
-        # make sure last_modified works
-        with self.assertNumQueries(4):
+        # make sure last_modified works. The jobs aren't loaded for events that are skipped.
+        with self.assertNumQueries(1):
             info = EventsStatus.all_events_info(last_modified=last_modified)
             self.assertEqual(len(info), 0)
 
+    def test_events_info_cache(self):
+        self.create_events()
+        info = EventsStatus.all_events_info()
+
+        # Nothing changed so the jobs aren't loaded
+        with self.assertNumQueries(1):
+            self.assertEqual(EventsStatus.all_events_info(), info)
+
+        # Only the event that changed gets loaded again
+        ev = models.Event.objects.first()
+        job = ev.jobs.first()
+        job.running_step = "running step"
+        job.save()
+        ev.save()
+        with self.assertNumQueries(4):
+            new_info = EventsStatus.all_events_info()
+        self.assertNotEqual(new_info, info)
+        self.assertIn("running step", str(new_info))
+        self.assertEqual(new_info[1:], info[1:])
+
+        ev.pull_request.title = "New title"
+        ev.pull_request.save()
+        new_info = EventsStatus.all_events_info()
+        self.assertIn("New title", str(new_info))
+
     def test_events_with_head(self):
         self.create_events()
 
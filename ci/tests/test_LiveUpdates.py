@@ -0,0 +1,294 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals, absolute_import
+from ci import LiveUpdates
+from ci.tests import DBTester, utils
+from django.core.exceptions import ImproperlyConfigured
+from django.test import override_settings
+from mock import patch
+import json
+import queue
+import threading
+
+
+class FakePubSub(object):
+    """
+    Stand in for a redis-py PubSub
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.channels = set()
+        self.messages = queue.Queue()
+        with self.server.lock:
+            self.server.pubsubs.append(self)
+
+    def subscribe(self, *channels):
+        with self.server.lock:
+            self.channels.update(channels)
+
+    def unsubscribe(self, *channels):
+        with self.server.lock:
+            self.channels.difference_update(channels)
+
+    def get_message(self, timeout=0):
+        try:
+            return self.messages.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        with self.server.lock:
+            if self in self.server.pubsubs:
+                self.server.pubsubs.remove(self)
+
+
+class FakeRedis(object):
+    """
+    Stand in for a redis-py connection that only does pub/sub
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pubsubs = []
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return FakePubSub(self)
+
+    def subscribed(self):
+        with self.lock:
+            return sum(len(pubsub.channels) for pubsub in self.pubsubs)
+
+    def pubsub_numsub(self, *channels):
+        with self.lock:
+            return [
+                (
+                    channel.encode(),
+                    len([p for p in self.pubsubs if channel in p.channels]),
+                )
+                for channel in channels
+            ]
+
+    def publish(self, channel, message):
+        with self.lock:
+            pubsubs = [p for p in self.pubsubs if channel in p.channels]
+        for pubsub in pubsubs:
+            pubsub.messages.put(
+                {
+                    "type": "message",
+                    "channel": channel.encode(),
+                    "data": message.encode(),
+                }
+            )
+        return len(pubsubs)
+
+
+class Tests(DBTester.DBTester):
+    def setUp(self):
+        super(Tests, self).setUp()
+        LiveUpdates._backends.clear()
+        self.addCleanup(LiveUpdates._backends.clear)
+
+    def wait_for(self, check):
+        for i in range(100):
+            if check():
+                break
+            threading.Event().wait(0.05)
+        self.assertTrue(check())
+
+    def test_subscription(self):
+        broker = LiveUpdates.Broker()
+        sub = broker.subscribe(["job:1", "event:1"], 3)
+        self.assertTrue(broker.has_subscribers("job:1"))
+        self.assertTrue(broker.has_subscribers("event:1"))
+        self.assertFalse(broker.has_subscribers("job:2"))
+        self.assertEqual(sub.get(0), [])
+
+        broker.dispatch("job:1", "a")
+        broker.dispatch("job:2", "b")
+        broker.dispatch("event:1", "c")
+        self.assertEqual(sub.get(0), ["a", "c"])
+        self.assertEqual(sub.get(0), [])
+
+        # The page fell behind so it gets told to reset
+        for i in range(5):
+            broker.dispatch("job:1", str(i))
+        self.assertEqual(len(sub.messages), 2)
+        self.assertEqual(sub.get(0), [LiveUpdates.RESET_MESSAGE, "3", "4"])
+        self.assertEqual(sub.get(0), [])
+
+        sub.close()
+        self.assertFalse(broker.has_subscribers("job:1"))
+        self.assertFalse(broker.has_subscribers("event:1"))
+        sub.close()
+
+    def test_subscription_wait(self):
+        broker = LiveUpdates.Broker()
+        sub = broker.subscribe(["job:1"], 10)
+        timer = threading.Timer(0.1, broker.dispatch, args=("job:1", "a"))
+        timer.start()
+        self.assertEqual(sub.get(10), ["a"])
+        timer.join()
+        sub.close()
+
+    @override_settings(LIVE_UPDATES_ENABLED=True)
+    def test_publish(self):
+        job = utils.create_job()
+        backend = LiveUpdates.get_backend()
+        self.assertIsInstance(backend, LiveUpdates.LocalBackend)
+        self.assertIs(LiveUpdates.get_backend(), backend)
+
+        data_calls = []
+
+        def data():
+            data_calls.append(1)
+            return {"foo": "bar"}
+
+        # Nobody is listening so the data isn't built
+        with self.captureOnCommitCallbacks(execute=True):
+            LiveUpdates.publish(["job:%s" % job.pk], "test", data)
+        self.assertEqual(data_calls, [])
+
+        sub = backend.subscribe([LiveUpdates.job_channel(job.pk)])
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            LiveUpdates.publish(["job:%s" % job.pk], "test", data)
+            # Not sent until the transaction is committed
+            self.assertEqual(sub.get(0), [])
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(data_calls, [1])
+        self.assertEqual(sub.get(0), ['event: test\ndata: {"foo": "bar"}\n\n'])
+
+        # Nothing to send
+        with self.captureOnCommitCallbacks(execute=True):
+            LiveUpdates.publish(["job:%s" % job.pk], "test", lambda: None)
+        self.assertEqual(sub.get(0), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            LiveUpdates.publish_status(job)
+        msg = sub.get(0)
+        self.assertEqual(len(msg), 1)
+        self.assertTrue(msg[0].startswith("event: status\ndata: "))
+        data = json.loads(msg[0].split("data: ")[1])
+        self.assertEqual(
+            data, {"job_id": job.pk, "status": job.status_slug(), "complete": False}
+        )
+
+        # Errors don't make it to the client endpoints
+        with patch.object(LiveUpdates.LocalBackend, "publish") as mock_publish:
+            mock_publish.side_effect = Exception("Bam!")
+            with self.captureOnCommitCallbacks(execute=True):
+                LiveUpdates.publish_status(job)
+        sub.close()
+
+        with self.settings(LIVE_UPDATES_ENABLED=False):
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                LiveUpdates.publish_status(job)
+            self.assertEqual(len(callbacks), 0)
+
+    @override_settings(LIVE_UPDATES_ENABLED=True, LIVE_UPDATES_MAX_OUTPUT=20)
+    def test_publish_output(self):
+        result = utils.create_step_result()
+        sub = LiveUpdates.get_backend().subscribe(
+            [LiveUpdates.job_channel(result.job.pk)]
+        )
+
+        def get_output():
+            msg = sub.get(0)
+            self.assertEqual(len(msg), 1)
+            self.assertTrue(msg[0].startswith("event: output\ndata: "))
+            return json.loads(msg[0].split("data: ")[1])
+
+        result.append_output("foo <\n", offset=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            LiveUpdates.publish_output(result, 0)
+        self.assertEqual(
+            get_output(),
+            {"id": result.pk, "start": 0, "offset": 6, "output": "foo &lt;<br/>"},
+        )
+
+        # No new output
+        with self.captureOnCommitCallbacks(execute=True):
+            LiveUpdates.publish_output(result, 6)
+        self.assertEqual(sub.get(0), [])
+
+        # Too big so the page has to ask for it
+        result.append_output("b" * 30, offset=6)
+        with self.captureOnCommitCallbacks(execute=True):
+            LiveUpdates.publish_output(result, 6)
+        self.assertEqual(
+            get_output(), {"id": result.pk, "start": 6, "offset": 36, "output": None}
+        )
+        sub.close()
+
+    @override_settings(LIVE_UPDATES_KEEPALIVE=0.01, LIVE_UPDATES_MAX_STREAM_SECONDS=0.2)
+    def test_stream(self):
+        backend = LiveUpdates.get_backend()
+        stream = LiveUpdates.stream(["job:1"])
+        self.assertEqual(next(stream), "retry: 3000\n\n")
+        self.assertTrue(backend.has_listeners("job:1"))
+        self.assertEqual(next(stream), ": keepalive\n\n")
+        backend.publish("job:1", "a")
+        backend.publish("job:1", "b")
+        self.assertEqual(next(stream), "ab")
+        # Stops after LIVE_UPDATES_MAX_STREAM_SECONDS
+        rest = list(stream)
+        self.assertTrue(all(msg == ": keepalive\n\n" for msg in rest))
+        self.assertFalse(backend.has_listeners("job:1"))
+
+        # Closing the stream, like when the page goes away, unsubscribes
+        stream = LiveUpdates.stream(["job:1"])
+        next(stream)
+        self.assertTrue(backend.has_listeners("job:1"))
+        stream.close()
+        self.assertFalse(backend.has_listeners("job:1"))
+
+    def test_redis_backend(self):
+        with patch.object(LiveUpdates, "redis", None):
+            with self.assertRaises(ImproperlyConfigured):
+                LiveUpdates.RedisBackend()
+
+        # Two server processes sharing a redis server
+        server = FakeRedis()
+        backend0 = LiveUpdates.RedisBackend(server)
+        backend1 = LiveUpdates.RedisBackend(server)
+        self.addCleanup(backend0.stop)
+        self.addCleanup(backend1.stop)
+        self.assertFalse(backend0.has_listeners("job:1"))
+
+        sub = backend1.subscribe(["job:1"])
+        self.wait_for(lambda: server.subscribed() == 1)
+        self.assertTrue(backend0.has_listeners("job:1"))
+        self.assertFalse(backend0.has_listeners("job:2"))
+
+        backend0.publish("job:1", "a")
+        backend0.publish("job:2", "b")
+        self.assertEqual(sub.get(5), ["a"])
+        sub.close()
+        self.wait_for(lambda: server.subscribed() == 0)
+        self.assertFalse(backend0.has_listeners("job:1"))
+
+        with patch.object(server, "pubsub_numsub") as mock_numsub:
+            mock_numsub.side_effect = Exception("Bam!")
+            self.assertFalse(backend0.has_listeners("job:1"))
+
+        sub = backend1.subscribe(["job:1"])
+        self.wait_for(lambda: server.subscribed() == 1)
+
+        with patch.object(server, "publish") as mock_publish:
+            mock_publish.side_effect = Exception("Bam!")
+            backend0.publish("job:1", "a")
+
+        backend1.stop()
+        self.assertEqual(server.subscribed(), 0)
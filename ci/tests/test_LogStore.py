@@ -0,0 +1,91 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals, absolute_import
+from ci import models, LogStore
+from ci.client import ParseOutput
+from ci.tests import DBTester, utils
+import os
+import shutil
+import tempfile
+
+
+class Tests(DBTester.DBTester):
+    def setUp(self):
+        super(Tests, self).setUp()
+        self.store_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.store_dir)
+
+    def test_store(self):
+        with self.settings(STEP_OUTPUT_STORE_DIR=None):
+            self.assertFalse(LogStore.enabled())
+        with self.settings(STEP_OUTPUT_STORE_DIR=self.store_dir):
+            self.assertTrue(LogStore.enabled())
+            digest, size = LogStore.store("foo\nbar‘\n")
+            self.assertEqual(size, 11)
+            self.assertTrue(os.path.exists(LogStore.path(digest)))
+            self.assertTrue(LogStore.path(digest).startswith(self.store_dir))
+            self.assertEqual(LogStore.size(digest), 11)
+            # Same content, same file
+            self.assertEqual(LogStore.store("foo\nbar‘\n"), (digest, size))
+
+            self.assertEqual(LogStore.read_range(digest), "foo\nbar‘\n".encode())
+            self.assertEqual(LogStore.read_range(digest, 4, 3), b"bar")
+            self.assertEqual(LogStore.read_range(digest, -4), "‘\n".encode())
+            self.assertEqual(LogStore.read_range(digest, -100, 3), b"foo")
+            self.assertEqual(list(LogStore.iter_lines(digest)), ["foo\n", "bar‘\n"])
+
+    def test_step_result(self):
+        sr = utils.create_step_result()
+        output = "line 1\n\33[1m\33[32m1 passed\33[0m, \33[1m2 skipped\33[0m, \33[1m0 pending\33[0m, \33[1m3 failed\33[0m\nend"
+        with self.settings(STEP_OUTPUT_STORE_DIR=self.store_dir):
+            sr.output = output
+            sr.save()
+            sr = models.StepResult.objects.get(pk=sr.pk)
+            self.assertEqual(len(sr.output_digest), 64)
+            self.assertEqual(bytes(sr.output_data), b"")
+            self.assertEqual(sr.output_length, len(output))
+            self.assertEqual(sr.output, output)
+            self.assertEqual(sr.read_output(0, 6), "line 1")
+            self.assertEqual(sr.read_output(-3), "end")
+            lines = list(sr.iter_output_lines())
+            self.assertEqual(len(lines), 3)
+            self.assertEqual("".join(lines), output)
+
+            # Test stats are parsed from the store
+            ParseOutput.set_job_stats(sr.job)
+            stats = sr.job.test_stats.first()
+            self.assertEqual((stats.passed, stats.skipped, stats.failed), (1, 2, 3))
+
+            # Chunks added after the output was stored
+            sr.append_output(" more\nlast")
+            self.assertEqual(list(sr.iter_output_lines())[-2:], ["end more\n", "last"])
+            self.assertEqual(sr.read_output(-4), "last")
+
+            # Empty output doesn't need to be stored
+            sr.output = ""
+            sr.save()
+            self.assertEqual(sr.output_digest, "")
+
+        # Without the store output goes back in the database
+        with self.settings(STEP_OUTPUT_STORE_DIR=self.store_dir):
+            sr.output = output
+            sr.save()
+        with self.settings(STEP_OUTPUT_STORE_DIR=None):
+            sr.output = "new"
+            sr.save()
+            self.assertEqual(sr.output_digest, "")
+            sr = models.StepResult.objects.get(pk=sr.pk)
+            self.assertEqual(sr.output, "new")
+            self.assertEqual(sr.read_output(1), "ew")
@@ -0,0 +1,88 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals, absolute_import
+from ci import OutputRender
+from django.test import SimpleTestCase, override_settings
+
+
+class Tests(SimpleTestCase):
+    def test_render(self):
+        html, state = OutputRender.render("&<\n\33[30mfoo\33[0m")
+        self.assertEqual(html, '&amp;&lt;<br/><span class="ansi30">foo</span>')
+        self.assertEqual(state, ((), ""))
+
+        # The color carries over to the next piece
+        html, state = OutputRender.render("\33[1m\33[32mgreen\n")
+        self.assertEqual(state, (("1", "32"), ""))
+        html, state = OutputRender.render("still green\33[0m plain", state)
+        self.assertEqual(html, '<span class="ansi1 ansi32">still green</span> plain')
+        self.assertEqual(state, ((), ""))
+
+        # A reset with a new color starts over
+        html, state = OutputRender.render("\33[1mbold\33[0;31mred", state)
+        self.assertEqual(state, (("0;31",), ""))
+
+        # A code split between pieces waits for the rest of it
+        html, state = OutputRender.render("foo\33[3", state)
+        self.assertEqual(html, '<span class="ansi31">foo</span>')
+        self.assertEqual(state, (("0;31",), "\33[3"))
+        html, state = OutputRender.render("4mblue", state)
+        self.assertEqual(html, '<span class="ansi34">blue</span>')
+        self.assertEqual(state, (("0;31", "34"), ""))
+
+        html, state = OutputRender.render("", state)
+        self.assertEqual(html, "")
+
+        # Only the latest codes are kept
+        html, state = OutputRender.render("\33[31m" * 100)
+        self.assertEqual(len(state[0]), OutputRender.MAX_STATE_CODES)
+
+    @override_settings(OUTPUT_RENDER_CACHE_SIZE=40)
+    def test_cache(self):
+        cache = OutputRender.RenderCache()
+        self.assertIsNone(cache.get("a"))
+        cache.set("a", "A", 10)
+        cache.set("b", "B", 10)
+        cache.set("c", "C", 10)
+        self.assertEqual(cache.get("a"), "A")
+        self.assertEqual(cache.size, 30)
+        # "b" is the least recently used
+        cache.set("d", "D", 10)
+        cache.set("e", "E", 10)
+        self.assertEqual(len(cache), 4)
+        self.assertEqual(cache.size, 40)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "A")
+
+        # Replacing an entry
+        cache.set("a", "AA", 5)
+        self.assertEqual(cache.get("a"), "AA")
+        self.assertEqual(cache.size, 35)
+
+        # Too big to keep
+        cache.set("a", "big", 11)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.size, 30)
+
+        cache.delete("c")
+        cache.delete("c")
+        self.assertEqual(cache.size, 20)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.size, 0)
+
+        with self.settings(OUTPUT_RENDER_CACHE_SIZE=0):
+            cache.set("a", "", 0)
+            self.assertIsNone(cache.get("a"))
@@ -514,8 +514,9 @@ class Tests(DBTester.DBTester):
             self.assertEqual(j.complete, False)
 
         # Make a job failure on E2. Should uncancel E1.
-        e2_j0 = e2.jobs.first()
-        e2_j1 = e2.jobs.last()
+        # The jobs were made ready together so order them by pk
+        e2_j0 = e2.jobs.order_by("pk").first()
+        e2_j1 = e2.jobs.order_by("pk").last()
         utils.update_job(e2_j0, status=models.JobStatus.FAILED, complete=True)
         self.set_counts()
         UpdateRemoteStatus.start_canceled_on_fail(e2_j0)
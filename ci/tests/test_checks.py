@@ -0,0 +1,52 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals, absolute_import
+from django.test import SimpleTestCase, override_settings
+from ci import checks
+import tempfile
+
+LOCAL_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+def file_cache(path):
+    return {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": path,
+        }
+    }
+
+
+class Tests(SimpleTestCase):
+    def check_ids(self):
+        return [w.id for w in checks.check_shared_cache(None)]
+
+    @override_settings(
+        CACHES=LOCAL_CACHE, GET_JOB_UPDATE_INTERVAL=0, GET_JOB_LONG_POLL_MAX_WAIT=0
+    )
+    def test_local_cache(self):
+        self.assertFalse(checks.shared_cache())
+        self.assertEqual(self.check_ids(), [])
+        with self.settings(GET_JOB_UPDATE_INTERVAL=1000):
+            self.assertEqual(self.check_ids(), ["ci.W001"])
+        with self.settings(GET_JOB_LONG_POLL_MAX_WAIT=25):
+            self.assertEqual(self.check_ids(), ["ci.W002"])
+
+    @override_settings(GET_JOB_UPDATE_INTERVAL=1000, GET_JOB_LONG_POLL_MAX_WAIT=25)
+    def test_shared_cache(self):
+        with tempfile.TemporaryDirectory() as path:
+            with self.settings(CACHES=file_cache(path)):
+                self.assertTrue(checks.shared_cache())
+                self.assertEqual(self.check_ids(), [])
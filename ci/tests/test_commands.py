@@ -21,6 +21,8 @@ from mock import patch
 from ci import models, TimeUtils
 from ci.tests import DBTester, utils
 import json
+import os
+import tempfile
 from requests_oauthlib import OAuth2Session
 from datetime import timedelta
 
@@ -459,3 +461,185 @@ class Tests(DBTester.DBTester):
             self.set_counts()
             management.call_command("sync_badges", stdout=out)
             self.compare_counts(badges=-1)
+
+    def test_check_ready_job_index(self):
+        j = utils.create_job()
+        utils.update_job(j, ready=True, active=True)
+
+        # Index isn't built yet
+        out = StringIO()
+        management.call_command("check_ready_job_index", "--dry-run", stdout=out)
+        self.assertIn("Index is not built", out.getvalue())
+        self.assertNotIn("rebuilt", out.getvalue())
+
+        out = StringIO()
+        management.call_command("check_ready_job_index", stdout=out)
+        self.assertIn("Ready job index rebuilt", out.getvalue())
+
+        out = StringIO()
+        management.call_command("check_ready_job_index", stdout=out)
+        self.assertIn("Ready job index is consistent", out.getvalue())
+
+        # Job changed without updating the index
+        utils.update_job(j, status=models.JobStatus.RUNNING)
+        out = StringIO()
+        management.call_command("check_ready_job_index", stdout=out)
+        self.assertIn("Job %s is in the index but not ready" % j.pk, out.getvalue())
+
+    def test_repair_event_job_counts(self):
+        j = utils.create_job()
+        utils.update_job(j, complete=True, status=models.JobStatus.SUCCESS)
+        out = StringIO()
+        management.call_command("repair_event_job_counts", stdout=out)
+        self.assertIn("Event job counts are consistent", out.getvalue())
+
+        # Job changed without updating the counts
+        models.Job.objects.filter(pk=j.pk).update(status=models.JobStatus.FAILED)
+        out = StringIO()
+        management.call_command("repair_event_job_counts", "--dry-run", stdout=out)
+        self.assertIn("Event %s:" % j.event.pk, out.getvalue())
+        self.assertNotIn("Fixed", out.getvalue())
+        self.assertEqual(
+            j.event.job_status_counts(), {(models.JobStatus.SUCCESS, True): 1}
+        )
+
+        out = StringIO()
+        management.call_command(
+            "repair_event_job_counts", "--event", str(j.event.pk), stdout=out
+        )
+        self.assertIn("Fixed job counts for 1 events", out.getvalue())
+        self.assertEqual(
+            j.event.job_status_counts(), {(models.JobStatus.FAILED, True): 1}
+        )
+
+    def test_benchmark_event_list(self):
+        self.set_counts()
+        out = StringIO()
+        management.call_command(
+            "benchmark_event_list",
+            "--events",
+            "2",
+            "5",
+            "--jobs",
+            "3",
+            "--repeat",
+            "1",
+            stdout=out,
+        )
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(lines[2].split()[0], "2")
+        self.assertEqual(lines[3].split()[0], "5")
+        # Everything was rolled back
+        self.compare_counts()
+
+        with self.assertRaises(CommandError):
+            management.call_command("benchmark_event_list", "--jobs", "1", stdout=out)
+
+    def test_simulate_scheduling(self):
+        j = utils.create_job()
+        utils.update_job(j, complete=True, status=models.JobStatus.SUCCESS)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            trace_file = os.path.join(tmpdir, "trace.json")
+            out = StringIO()
+            management.call_command(
+                "simulate_scheduling", trace_file, "--record", stdout=out
+            )
+            self.assertIn("Recorded 1 job(s)", out.getvalue())
+            with open(trace_file, "r") as f:
+                trace = json.load(f)
+            self.assertEqual(trace["jobs"][0]["repository"], str(j.recipe.repository))
+
+            out = StringIO()
+            management.call_command(
+                "simulate_scheduling", trace_file, "--clients", "2", stdout=out
+            )
+            self.assertIn(str(j.recipe.repository), out.getvalue())
+            self.assertIn("PriorityPolicy", out.getvalue())
+
+            out = StringIO()
+            management.call_command(
+                "simulate_scheduling",
+                trace_file,
+                "--policy",
+                "ci.client.SchedulingPolicy.FairSharePolicy",
+                stdout=out,
+            )
+            self.assertIn("FairSharePolicy", out.getvalue())
+
+            with self.assertRaises(CommandError):
+                management.call_command(
+                    "simulate_scheduling", trace_file, "--clients", "0", stdout=out
+                )
+            with self.assertRaises(CommandError):
+                management.call_command(
+                    "simulate_scheduling",
+                    trace_file,
+                    "--policy",
+                    "ci.NoPolicy",
+                    stdout=out,
+                )
+
+    def test_benchmark_critical_path(self):
+        out = StringIO()
+        management.call_command(
+            "benchmark_critical_path", "--events", "20", "--clients", "4", stdout=out
+        )
+        self.assertIn("20 events", out.getvalue())
+        self.assertIn("Critical path first", out.getvalue())
+
+        with self.assertRaises(CommandError):
+            management.call_command("benchmark_critical_path", "--clients", "0")
+
+    def test_benchmark_client_updates(self):
+        out = StringIO()
+        management.call_command(
+            "benchmark_client_updates",
+            "--output-kb",
+            "128",
+            "--chunk-kb",
+            "32",
+            stdout=out,
+        )
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], "128 KB of output in 4 updates")
+        plain = lines[2].split()
+        gzipped = lines[4].split()
+        self.assertEqual(plain[-3], "4")
+        self.assertEqual(gzipped[-3], "1")
+        self.assertLess(int(gzipped[-4]), int(plain[-4]))
+
+        with self.assertRaises(CommandError):
+            management.call_command("benchmark_client_updates", "--chunk-kb", "0")
+
+    def test_compress_step_output(self):
+        results = []
+        for i in range(3):
+            sr = utils.create_step_result(position=i)
+            models.StepResult.objects.filter(pk=sr.pk).update(
+                legacy_output="output %s\n" % i * 100
+            )
+            results.append(sr)
+        # Already compressed
+        results[2].output = "new output"
+        results[2].save()
+
+        out = StringIO()
+        management.call_command("compress_step_output", "--dry-run", stdout=out)
+        self.assertIn("2 step result(s) to compress", out.getvalue())
+        self.assertEqual(models.StepResult.objects.exclude(legacy_output="").count(), 2)
+
+        out = StringIO()
+        management.call_command("compress_step_output", "--batch-size", "1", stdout=out)
+        self.assertIn("Compressed 2 step result(s):", out.getvalue())
+        self.assertEqual(models.StepResult.objects.exclude(legacy_output="").count(), 0)
+        for i, sr in enumerate(results[:2]):
+            sr.refresh_from_db()
+            self.assertEqual(sr.output, "output %s\n" % i * 100)
+            self.assertEqual(sr.output_length, len(sr.output))
+            self.assertLess(len(sr.output_data), sr.output_length)
+        results[2].refresh_from_db()
+        self.assertEqual(results[2].output, "new output")
+
+        with self.assertRaises(CommandError):
+            management.call_command("compress_step_output", "--batch-size", "0")
@@ -0,0 +1,78 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals, absolute_import
+from django.core import management
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+from io import StringIO
+from ci import models
+from ci.tests import utils
+
+
+class Tests(TransactionTestCase):
+    """
+    The migrations change the schema so this can't run inside a TestCase transaction.
+    """
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+
+    def latest(self):
+        return MigrationExecutor(connection).loader.graph.leaf_nodes("ci")
+
+    def test_makemigrations(self):
+        # The migrations match the models
+        out = StringIO()
+        management.call_command(
+            "makemigrations", "ci", check=True, dry_run=True, stdout=out
+        )
+
+    def test_legacy_output_kept(self):
+        step_result = utils.create_step_result()
+        self.addCleanup(self.migrate, self.latest())
+
+        # Before the output was moved into chunks and compressed
+        self.migrate([("ci", "0001_initial")])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE ci_stepresult SET output = %s WHERE id = %s",
+                ["Old output", step_result.pk],
+            )
+
+        self.migrate(self.latest())
+        step_result = models.StepResult.objects.get(pk=step_result.pk)
+        self.assertEqual(step_result.legacy_output, "Old output")
+        self.assertEqual(step_result.output, "Old output")
+
+        management.call_command("compress_step_output", stdout=StringIO())
+        step_result.refresh_from_db()
+        self.assertEqual(step_result.legacy_output, "")
+        self.assertEqual(step_result.output, "Old output")
+
+    def test_job_counts_seeded(self):
+        job = utils.create_job()
+        utils.create_job(recipe=utils.create_recipe(name="other"), event=job.event)
+        self.addCleanup(self.migrate, self.latest())
+
+        # Before the counts were kept
+        self.migrate([("ci", "0005_output_budgets")])
+        self.migrate(self.latest())
+        self.assertEqual(
+            models.EventJobCount.objects.get(event=job.event).count,
+            2,
+        )
+        self.assertEqual(models.EventJobCount.recompute(repair=False), [])
@@ -15,10 +15,13 @@
 from __future__ import unicode_literals, absolute_import
 from django.test import TestCase
 from django.conf import settings
+from django.core.cache import cache
 from django.test import override_settings
 from ci import models
+from mock import patch
 from . import utils
 import math
+from datetime import timedelta
 
 
 @override_settings(INSTALLED_GITSERVERS=[utils.github_config()])
@@ -182,6 +185,142 @@ class Tests(TestCase):
         self.assertEqual(len(unrunnable), 1)
         self.assertIn(j2, unrunnable)
 
+    @override_settings(GET_JOB_UPDATE_INTERVAL=60 * 1000)
+    def test_event_make_dependents_ready(self):
+        event = utils.create_event()
+        r0 = utils.create_recipe(name="precheck")
+        r1 = utils.create_recipe(name="other")
+        j0 = utils.create_job(recipe=r0, event=event)
+        j0.ready = True
+        j0.save()
+        j1 = utils.create_job(recipe=r1, event=event)
+        j1.ready = True
+        j1.save()
+        jobs = []
+        for i in range(100):
+            r = utils.create_recipe(name="test%s" % i)
+            r.depends_on.add(r0)
+            jobs.append(utils.create_job(recipe=r, event=event))
+        merge = utils.create_recipe(name="merge")
+        merge.depends_on.add(r0, r1)
+        j_merge = utils.create_job(recipe=merge, event=event)
+
+        event.make_dependents_ready(j0)
+        self.assertEqual(event.jobs.filter(ready=True).count(), 2)
+
+        j0.complete = True
+        j0.status = models.JobStatus.SUCCESS
+        j0.save()
+        event = models.Event.objects.get(pk=event.pk)
+        # Doesn't depend on how many jobs there are
+        cache.clear()
+        with self.assertNumQueries(12):
+            event.make_dependents_ready(j0)
+        self.assertEqual(event.jobs.filter(ready=True).count(), 102)
+        j_merge.refresh_from_db()
+        self.assertFalse(j_merge.ready)
+
+        j1.complete = True
+        j1.status = models.JobStatus.FAILED_OK
+        j1.save()
+        event.make_dependents_ready(j1)
+        j_merge.refresh_from_db()
+        self.assertTrue(j_merge.ready)
+
+    def test_event_job_counts(self):
+        event = utils.create_event()
+        j0 = utils.create_job(recipe=utils.create_recipe(name="r0"), event=event)
+        j1 = utils.create_job(recipe=utils.create_recipe(name="r1"), event=event)
+        self.assertEqual(
+            event.job_status_counts(), {(models.JobStatus.NOT_STARTED, False): 2}
+        )
+
+        j0.status = models.JobStatus.SUCCESS
+        j0.complete = True
+        j0.save()
+        # Saving without changing anything doesn't change the counts
+        j0.save()
+        # Loaded without the status
+        models.Job.objects.only("pk").get(pk=j1.pk).save()
+        self.assertEqual(
+            event.job_status_counts(),
+            {
+                (models.JobStatus.NOT_STARTED, False): 1,
+                (models.JobStatus.SUCCESS, True): 1,
+            },
+        )
+        self.assertEqual(event.status_from_jobs(), models.JobStatus.RUNNING)
+        self.assertFalse(event.check_done())
+
+        j1.refresh_from_db()
+        j1.status = models.JobStatus.FAILED_OK
+        j1.complete = True
+        j1.save()
+        with self.assertNumQueries(1):
+            self.assertTrue(event.check_done())
+        event.set_complete()
+        self.assertEqual(event.status, models.JobStatus.FAILED_OK)
+
+        j1.delete()
+        self.assertEqual(
+            event.job_status_counts(), {(models.JobStatus.SUCCESS, True): 1}
+        )
+        self.assertEqual(models.EventJobCount.recompute(), [])
+
+    def test_event_job_counts_seeded(self):
+        # Events from before the counts were kept don't have any
+        event = utils.create_event()
+        j0 = utils.create_job(recipe=utils.create_recipe(name="r0"), event=event)
+        j1 = utils.create_job(recipe=utils.create_recipe(name="r1"), event=event)
+        j2 = utils.create_job(recipe=utils.create_recipe(name="r2"), event=event)
+        event.job_counts.all().delete()
+        self.assertEqual(
+            event.job_status_counts(), {(models.JobStatus.NOT_STARTED, False): 3}
+        )
+        self.assertEqual(models.EventJobCount.recompute(repair=False), [event])
+
+        # The first change counts the jobs instead of going negative
+        j0.status = models.JobStatus.SUCCESS
+        j0.complete = True
+        j0.save()
+        self.assertFalse(event.job_counts.filter(count__lt=0).exists())
+        self.assertEqual(
+            event.job_status_counts(),
+            {
+                (models.JobStatus.NOT_STARTED, False): 2,
+                (models.JobStatus.SUCCESS, True): 1,
+            },
+        )
+        self.assertEqual(event.status_from_jobs(), models.JobStatus.RUNNING)
+        self.assertFalse(event.check_done())
+
+        # Deleting a job
+        event.job_counts.all().delete()
+        j1.delete()
+        self.assertEqual(
+            event.job_status_counts(),
+            {
+                (models.JobStatus.NOT_STARTED, False): 1,
+                (models.JobStatus.SUCCESS, True): 1,
+            },
+        )
+
+        # Adding a job
+        event.job_counts.all().delete()
+        utils.create_job(recipe=utils.create_recipe(name="r3"), event=event)
+        self.assertEqual(
+            event.job_status_counts(),
+            {
+                (models.JobStatus.NOT_STARTED, False): 2,
+                (models.JobStatus.SUCCESS, True): 1,
+            },
+        )
+
+        j2.status = models.JobStatus.FAILED
+        j2.complete = True
+        j2.save()
+        self.assertEqual(models.EventJobCount.recompute(), [])
+
     def test_event(self):
         event = utils.create_event()
         self.assertTrue(isinstance(event, models.Event))
@@ -478,10 +617,178 @@ class Tests(TestCase):
         sr.save()
         self.assertTrue(sr.clean_output().startswith("Output too large"))
 
+    def test_stepresult_compressed_output(self):
+        sr = utils.create_step_result()
+        self.assertEqual(sr.output, "")
+        output = "\33[1mfoo\33[0m\n" * 1000
+        sr.output = output
+        sr.save()
+        sr = models.StepResult.objects.get(pk=sr.pk)
+        self.assertEqual(sr.output, output)
+        self.assertEqual(sr.output_length, len(output))
+        self.assertEqual(sr.legacy_output, "")
+        self.assertLess(len(sr.output_data), len(output) / 10)
+        self.assertEqual(sr.plain_output(), "foo\n" * 1000)
+
+        # Output that was stored before compression
+        models.StepResult.objects.filter(pk=sr.pk).update(
+            output_data=b"", output_length=0, legacy_output="legacy"
+        )
+        sr.refresh_from_db()
+        self.assertEqual(sr.output, "legacy")
+
+        self.assertEqual(models.decompress_output(models.compress_output("")), "")
+        with self.assertRaises(ValueError):
+            models.decompress_output(b"bad")
+
+    def test_stepresult_output_chunks(self):
+        sr = utils.create_step_result()
+        sr.append_output("foo\n")
+        sr.append_output("")
+        sr.append_output("bar\n")
+        self.assertEqual(sr.output, "foo\nbar\n")
+        self.assertEqual(
+            list(sr.output_chunks.values_list("sequence", flat=True)), [0, 1]
+        )
+        sr = models.StepResult.objects.get(pk=sr.pk)
+        self.assertEqual(sr.compacted_output, "")
+        self.assertEqual(sr.output, "foo\nbar\n")
+        self.assertIn(sr.name, str(sr.output_chunks.first()))
+
+        sr.compact_output()
+        sr.refresh_from_db()
+        self.assertEqual(sr.output_chunks.count(), 0)
+        self.assertEqual(sr.compacted_output, "foo\nbar\n")
+        self.assertEqual(sr.output, "foo\nbar\n")
+
+        # Setting the output replaces any chunks
+        sr.append_output("baz\n")
+        sr.output = "new"
+        sr.save()
+        sr.refresh_from_db()
+        self.assertEqual(sr.output_chunks.count(), 0)
+        self.assertEqual(sr.output, "new")
+
+    def test_stepresult_output_size(self):
+        job = utils.create_job()
+        compressed = utils.create_step_result(job=job, position=0)
+        compressed.output = "compressed\n" * 100
+        compressed.save()
+        legacy = utils.create_step_result(job=job, position=1)
+        models.StepResult.objects.filter(pk=legacy.pk).update(legacy_output="legacy")
+        chunks = utils.create_step_result(job=job, position=2)
+        chunks.append_output("foo\n", offset=0)
+        # Output between the chunks was removed
+        chunks.append_output("bar\n", offset=2048)
+
+        results = list(models.StepResult.objects.filter(job=job))
+        sizes = [len(r.output) for r in models.StepResult.objects.filter(job=job)]
+        with patch.object(models, "decompress_output") as mock_decompress:
+            with self.assertNumQueries(1):
+                models.StepResult.load_output_lengths(results)
+                self.assertEqual([r.full_output_length() for r in results], sizes)
+                self.assertEqual(results[0].output_size(), "1.1 KiB")
+            self.assertEqual(mock_decompress.call_count, 0)
+
+        job = models.Job.objects.get(pk=job.pk)
+        with patch.object(models, "decompress_output") as mock_decompress:
+            with self.assertNumQueries(2):
+                self.assertEqual(
+                    job.total_output_size(), models.humanize_bytes(sum(sizes))
+                )
+            self.assertEqual(mock_decompress.call_count, 0)
+
+        # Adding output changes the size
+        chunks.full_output_length()
+        chunks.append_output("baz\n")
+        self.assertEqual(chunks.full_output_length(), len(chunks.output))
+
+    def test_stepresult_clean_output_cache(self):
+        models.OutputRender.cache.clear()
+        sr = utils.create_step_result()
+        # Running steps are converted as the output comes in
+        self.assertEqual(sr.clean_output(), "")
+        sr.append_output("\33[31mred\n", offset=0)
+        self.assertEqual(sr.clean_output(), '<span class="ansi31">red<br/></span>')
+        sr.append_output("still red\33[0m\n", offset=9)
+        sr = models.StepResult.objects.get(pk=sr.pk)
+        with patch.object(models.OutputRender, "render") as mock_render:
+            mock_render.return_value = ("new", ((), ""))
+            self.assertEqual(
+                sr.clean_output(),
+                '<span class="ansi31">red<br/></span>new',
+            )
+            # Only the new output
+            self.assertEqual(mock_render.call_args[0][0], "still red\33[0m\n")
+            self.assertEqual(mock_render.call_count, 1)
+        models.OutputRender.cache.clear()
+        html = '<span class="ansi31">red<br/>still red</span><br/>'
+        self.assertEqual(sr.clean_output(), html)
+        self.assertEqual(sr.clean_output_since(0), (html, 23))
+        self.assertEqual(sr.clean_output_since(23), ("", 23))
+
+        sr.append_output("more\n", offset=23)
+        self.assertEqual(sr.clean_output_since(23), ("more<br/>", 28))
+        self.assertEqual(sr.clean_output(), html + "more<br/>")
+        # Not where the cache left off
+        self.assertEqual(
+            sr.clean_output_since(9),
+            ("still red<br/>more<br/>", 28),
+        )
+
+        # Output removed to keep the step under budget
+        sr.remove_output_chunks(9, 23)
+        html = sr.clean_output()
+        self.assertNotIn("still red", html)
+        self.assertEqual(html, models.terminalize_output(sr.output))
+
+        # Complete steps are cached by their contents
+        sr.output = "\33[32mdone\33[0m"
+        sr.complete = True
+        sr.save()
+        self.assertEqual(sr.clean_output_since(0), (None, 0))
+        html = '<span class="ansi32">done</span>'
+        self.assertEqual(sr.clean_output(), html)
+        sr = models.StepResult.objects.get(pk=sr.pk)
+        with patch.object(models, "terminalize_output") as mock_terminalize:
+            self.assertEqual(sr.clean_output(), html)
+            self.assertEqual(mock_terminalize.call_count, 0)
+        sr.output = "changed"
+        sr.save()
+        self.assertEqual(sr.clean_output(), "changed")
+        self.assertEqual(len(models.OutputRender.cache), 2)
+
+        with self.settings(OUTPUT_RENDER_CACHE_SIZE=0):
+            sr.output = "a" * 1024 * 1024 * 3
+            sr.save()
+            self.assertTrue(sr.clean_output().startswith("Output too large"))
+            sr.output = ""
+            sr.save()
+            self.assertEqual(sr.clean_output(), "")
+
     def test_generate_build_key(self):
         build_key = models.generate_build_key()
         self.assertNotEqual("", build_key)
 
+    def test_touch(self):
+        job = utils.create_job()
+        last_modified = job.last_modified
+        with self.settings(TIMESTAMP_UPDATE_INTERVAL=60):
+            self.assertFalse(models.touch(job))
+            job.add_seconds(timedelta(seconds=3))
+            job.add_seconds(timedelta(seconds=2))
+            self.assertEqual(job.seconds, timedelta(seconds=5))
+            job.refresh_from_db()
+            self.assertEqual(job.seconds, timedelta(seconds=5))
+            self.assertEqual(job.last_modified, last_modified)
+
+        with self.settings(TIMESTAMP_UPDATE_INTERVAL=0):
+            self.assertTrue(models.touch(job, running_step="1/2"))
+            self.assertEqual(job.running_step, "1/2")
+            job.refresh_from_db()
+            self.assertGreater(job.last_modified, last_modified)
+            self.assertEqual(job.running_step, "1/2")
+
     def test_jobstatus(self):
         for i in models.JobStatus.STATUS_CHOICES:
             self.assertEqual(models.JobStatus.to_str(i[0]), i[1])
@@ -20,6 +20,8 @@ from ci import models, views, Permissions, PullRequestEvent, GitCommitData
 from ci.tests import utils, DBTester
 from ci.github import api
 import datetime
+import io
+import tarfile
 from requests_oauthlib import OAuth2Session
 
 
@@ -1443,8 +1445,9 @@ class Tests(DBTester.DBTester):
         job = utils.create_job(user=user)
         step = utils.create_step(recipe=job.recipe, filename="common/1.sh")
         sr = utils.create_step_result(job=job, step=step)
-        sr.output = "some output"
+        sr.output = "\33[1msome\33[0m output\nline 2"
         sr.save()
+        sr.append_output("\nmore")
         utils.create_step_environment(step=step)
 
         # needs to be active to view
@@ -1461,6 +1464,12 @@ class Tests(DBTester.DBTester):
         utils.simulate_login(self.client.session, user)
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
+        with tarfile.open(fileobj=io.BytesIO(response.content), mode="r:gz") as tar:
+            names = tar.getnames()
+            self.assertEqual(len(names), 1)
+            self.assertEqual(
+                tar.extractfile(names[0]).read(), b"some output\nline 2\nmore"
+            )
 
         self.check_private_repo(url)
 
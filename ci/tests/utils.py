@@ -404,8 +404,10 @@ class Response(object):
         use_links=False,
         status_code=200,
         do_raise=False,
+        headers=None,
     ):
         self.status_code = status_code
+        self.headers = headers or {}
         self.do_raise = do_raise
         self.reason = "some reason"
         if use_links:
@@ -448,3 +450,25 @@ def create_test_jobs():
     create_step_result(job=job2)
     create_step_result(job=job3)
     return (job0, job1, job2, job3)
+
+
+def use_shared_cache(test):
+    """
+    Makes a test use a file based cache in a temporary directory.
+    Some things are only cached when the cache is shared by all the
+    server processes and the local memory cache isn't.
+    Input:
+      test[TestCase]: The test. The settings are restored when it is done.
+    """
+    cache_dir = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, cache_dir, True)
+    caches = override_settings(
+        CACHES={
+            "default": {
+                "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                "LOCATION": cache_dir,
+            }
+        }
+    )
+    caches.enable()
+    test.addCleanup(caches.disable)
@@ -31,10 +31,11 @@ from django.db.models import Prefetch
 from datetime import timedelta
 import time
 import tarfile
-from io import BytesIO
+import tempfile
 from ci import (
     RepositoryStatus,
     EventsStatus,
+    Dashboard,
     Permissions,
     PullRequestEvent,
     ManualEvent,
@@ -44,7 +45,7 @@ from ci.client.ReadyJobs import get_ready_jobs
 from django.utils.html import escape
 from django.utils.text import get_valid_filename
 from django.views.decorators.cache import never_cache
-from ci.client import UpdateRemoteStatus
+from ci.client import UpdateRemoteStatus, ReadyJobs
 import os, re
 from datetime import datetime
 from croniter import croniter
@@ -95,7 +96,19 @@ def get_user_repos_info(request, limit=30, last_modified=None):
                     pks.append(repo.pk)
     else:
         default = True
+    # The snapshot shared by all users has everything except for users
+    # that only see a few repositories and need older events
     if pks:
+        info = Dashboard.user_dashboard(
+            pks, limit, last_modified=last_modified, active_only=False
+        )
+    else:
+        info = Dashboard.user_dashboard(
+            viewable_repos, limit, last_modified=last_modified
+        )
+    if info is not None:
+        repos, evs_info, version = info
+    elif pks:
         repos = RepositoryStatus.filter_repos_status(pks, last_modified=last_modified)
         evs_info = EventsStatus.events_filter_by_repo(
             pks, limit=limit, last_modified=last_modified
@@ -154,6 +167,13 @@ def main(request):
       django.http.HttpResponse based object
     """
     limit = 30
+    last_request = TimeUtils.get_local_timestamp()
+    version = None
+    served = Dashboard.served()
+    if served is not None:
+        # Updates need to get what changed after the snapshot was built
+        version, built = served
+        last_request = min(last_request, built)
     repos, evs_info, default = get_user_repos_info(request, limit=limit)
     return render(
         request,
@@ -161,10 +181,11 @@ def main(request):
         {
             "repos": repos,
             "recent_events": evs_info,
-            "last_request": TimeUtils.get_local_timestamp(),
+            "last_request": last_request,
             "event_limit": limit,
             "update_interval": settings.HOME_PAGE_UPDATE_INTERVAL,
             "default_view": default,
+            "dashboard_version": version,
         },
     )
 
@@ -379,6 +400,7 @@ def view_event(request, event_id):
         ),
         "update_interval": settings.EVENT_PAGE_UPDATE_INTERVAL,
         "has_unactivated": has_unactivated,
+        "live_updates": settings.LIVE_UPDATES_ENABLED,
     }
     return render(request, "ci/event.html", context)
 
@@ -412,16 +434,19 @@ def get_job_results(request, job_id):
                 base_name, result.position, get_valid_filename(result.name)
             )
         )
-        s = BytesIO(
-            result.plain_output()
-            .replace("\u2018", "'")
-            .replace("\u2019", "'")
-            .encode("utf-8", "replace")
-        )
-        buf = s.getvalue()
-        info.size = len(buf)
-        info.mtime = time.time()
-        tar.addfile(tarinfo=info, fileobj=s)
+        # Go a line at a time so that large output doesn't need to be in memory
+        with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as s:
+            for line in result.iter_output_lines():
+                s.write(
+                    models.remove_terminal_codes(line)
+                    .replace("\u2018", "'")
+                    .replace("\u2019", "'")
+                    .encode("utf-8", "replace")
+                )
+            info.size = s.tell()
+            info.mtime = time.time()
+            s.seek(0)
+            tar.addfile(tarinfo=info, fileobj=s)
     tar.close()
     return response
 
@@ -451,6 +476,8 @@ def view_job(request, job_id):
     if unauthorized is not None:
         return unauthorized
 
+    # The page shows the output size of each step
+    models.StepResult.load_output_lengths(job.step_results.all())
     perms = Permissions.job_permissions(request.session, job)
     clients = None
     if perms["can_see_client"]:
@@ -460,6 +487,7 @@ def view_job(request, job_id):
     perms["job"] = job
     perms["clients"] = clients
     perms["update_interval"] = settings.JOB_PAGE_UPDATE_INTERVAL
+    perms["live_updates"] = settings.LIVE_UPDATES_ENABLED
     return render(request, "ci/job.html", perms)
 
 
@@ -1256,6 +1284,7 @@ def set_job_active(request, job, user):
     )  # will save job and event
     message = "Activated by %s" % user
     models.JobChangeLog.objects.create(job=job, message=message)
+    ReadyJobs.update_ready_job(job)
     messages.info(request, "Job %s activated" % job)
     return True
 
@@ -1397,6 +1426,7 @@ def cancel_event(request, event_id):
 def set_job_canceled(job, msg=None, status=models.JobStatus.CANCELED):
     job.complete = True
     job.set_status(status, calc_event=True)  # This will save the job
+    ReadyJobs.update_ready_job(job)
     if msg:
         models.JobChangeLog.objects.create(job=job, message=msg)
 
@@ -65,6 +65,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "ci.client.GzipRequest.GzipRequestMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -234,6 +235,23 @@ LOGGING = {
 # location of the recipes directory, relative to the base project directory
 RECIPE_BASE_DIR = os.path.join(os.path.dirname(BASE_DIR), "civet_recipes")
 
+# Number of seconds that the scripts, environment and steps of a recipe
+# are cached for handing out jobs. The cache is rebuilt by load_recipes.
+RECIPE_PAYLOAD_CACHE_TIMEOUT = 24 * 60 * 60
+
+# If set, the output of completed steps is written to files under this
+# directory instead of being stored in the database. Files are named by
+# the SHA256 of their contents so identical output is only stored once.
+# Output that is already in the store is read from here as well, so
+# this shouldn't be unset once it has been used.
+STEP_OUTPUT_STORE_DIR = None
+
+# Maximum number of bytes of output kept for a single step and for all the
+# steps in a job. Output over the limit is removed from the middle, keeping
+# the start and a rolling tail of the output.
+STEP_OUTPUT_MAX_BYTES = 10 * 1024 * 1024
+JOB_OUTPUT_MAX_BYTES = 50 * 1024 * 1024
+
 # all the git servers that we support
 GITSERVER_GITHUB = 0
 GITSERVER_GITLAB = 1
@@ -257,10 +275,145 @@ HOME_PAGE_UPDATE_INTERVAL = 20000
 JOB_PAGE_UPDATE_INTERVAL = 20000
 EVENT_PAGE_UPDATE_INTERVAL = 20000
 
-# Internal (in milliseconds) at which to rebuild the cache for available jobs
-# 0 means to always update
+# Interval (in milliseconds) at which the ready job index is checked against
+# the database and rebuilt if it is inconsistent. The index is otherwise kept
+# up to date as jobs change.
+# The index is kept in the cache so this should only be set when the cache is
+# shared by all the server processes (like redis). Otherwise jobs made ready by
+# another process aren't handed out until the index is checked.
+# The index is only used on databases that don't support SKIP LOCKED, like
+# SQLite. With 0 it isn't used at all and clients read the ready jobs from
+# the database.
 GET_JOB_UPDATE_INTERVAL = 0
 
+# Maximum number of seconds that a client can have a request to
+# get a job held open while waiting for a job to become ready.
+# This should be less than the request timeout of the web server.
+# A waiting request holds a worker so this needs threaded or async workers.
+# Jobs made ready by other server processes are only noticed if the
+# cache is shared by all the server processes (like redis).
+# 0 disables long polling
+GET_JOB_LONG_POLL_MAX_WAIT = 0
+
+# Interval (in seconds) at which a long polling request checks
+# for jobs made ready by other server processes
+GET_JOB_LONG_POLL_CHECK_INTERVAL = 1
+
+# Maximum number of jobs a client can claim at once
+CLIENT_MAX_SLOTS = 32
+
+# Minimum number of seconds between bumping the last_modified of a job,
+# its event, and the last_seen of its client while a step is running.
+# Running steps send updates often and these are rows that every page reads.
+TIMESTAMP_UPDATE_INTERVAL = 5
+
+# Maximum number of bytes a gzip compressed request from a client
+# can decompress to. Larger requests get a 413 response.
+CLIENT_GZIP_MAX_BYTES = 64 * 1024 * 1024
+
+# Push step output and status changes to the job and event pages with
+# Server-Sent Events instead of having them poll for changes.
+# Each open page holds a request open so the web server needs
+# enough workers or threads for them. When disabled, or the stream
+# can't be opened, the pages poll like they always have.
+LIVE_UPDATES_ENABLED = False
+
+# Passes live updates between server processes.
+# "ci.LiveUpdates.LocalBackend" only works with a single server process.
+# "ci.LiveUpdates.RedisBackend" uses pub/sub on the Redis server at
+# LIVE_UPDATES_REDIS_URL and requires the redis package.
+LIVE_UPDATES_BACKEND = "ci.LiveUpdates.LocalBackend"
+LIVE_UPDATES_REDIS_URL = "redis://localhost:6379/0"
+LIVE_UPDATES_REDIS_PREFIX = "civet:live:"
+
+# Maximum number of messages waiting to be sent on a stream.
+# Pages that fall further behind than this are told to reload their state.
+LIVE_UPDATES_BUFFER_SIZE = 200
+
+# Maximum number of characters of output pushed in one message.
+# Pages get larger updates by asking for them.
+LIVE_UPDATES_MAX_OUTPUT = 64 * 1024
+
+# Seconds between keepalive comments on an idle stream
+LIVE_UPDATES_KEEPALIVE = 15
+
+# Seconds before a stream is closed. Browsers reconnect on their own.
+LIVE_UPDATES_MAX_STREAM_SECONDS = 5 * 60
+
+# Milliseconds browsers wait before reconnecting a closed stream
+LIVE_UPDATES_RETRY = 3000
+
+# Maximum number of characters of step output converted to HTML that
+# each server process keeps so that it doesn't need to be converted again.
+# 0 disables keeping it.
+OUTPUT_RENDER_CACHE_SIZE = 64 * 1024 * 1024
+
+# Decides the order that ready jobs are handed out to clients.
+# "ci.client.SchedulingPolicy.PriorityPolicy" hands out jobs by priority and then oldest first.
+# "ci.client.SchedulingPolicy.FairSharePolicy" does the same but shares clients between
+# repositories and build users with the same priority, weighted by the "fair_share_weight"
+# repository setting.
+READY_JOB_SCHEDULING_POLICY = "ci.client.SchedulingPolicy.PriorityPolicy"
+
+# Clients report the repositories and base SHAs that they have recently
+# checked out. Among this many jobs of the same priority the one that the
+# client already has checked out is handed out first.
+# 1 or less disables this.
+READY_JOB_AFFINITY_WINDOW = 10
+
+# Jobs that were created more than this many seconds ago are never
+# passed over for a job that a client has checked out
+READY_JOB_AFFINITY_MAX_WAIT = 10 * 60
+
+# Maximum number of workspaces that a client can report
+CLIENT_MAX_WORKSPACES = 10
+
+# Whether jobs with the same priority that start the longest chain of
+# dependent jobs in their event are handed out first
+READY_JOB_CRITICAL_PATH = True
+
+# Number of days of finished jobs used to estimate how long a recipe takes to run
+RECIPE_DURATION_WINDOW = 14
+
+# Number of seconds that the recipe run time estimates are cached for
+RECIPE_DURATION_CACHE_TIMEOUT = 60 * 60
+
+# Number of seconds that the rendered info of an event, as shown in the
+# event lists, is cached for. It is rendered again whenever the event changes.
+EVENT_INFO_CACHE_TIMEOUT = 60 * 60
+
+# Number of most recent events kept in the snapshot of the main page that is
+# shared by all users. Users that can only see a few repositories might need
+# older events which are then loaded directly.
+# The snapshot is only used with a cache that is shared by all the server
+# processes, like redis. Otherwise the main page is always loaded directly.
+DASHBOARD_SNAPSHOT_EVENTS = 200
+
+# Number of seconds that the snapshot of the main page is cached for.
+# It is rebuilt whenever an event, pull request, branch or badge changes.
+DASHBOARD_SNAPSHOT_TIMEOUT = 60 * 60
+
+# The snapshot of the main page is rebuilt at most once in this many seconds.
+# Running jobs change their events on every step update, so otherwise it
+# would be rebuilt for almost every request. Changes in between show up on
+# the main page once it is rebuilt.
+DASHBOARD_MIN_REFRESH_INTERVAL = 5
+
+# If True then an out of date snapshot of the main page is served while a new
+# one is built in a background thread. Otherwise the first request after
+# a change builds it.
+DASHBOARD_BACKGROUND_REFRESH = False
+
+# Number of seconds of past job run time that the fair share policy looks at
+FAIR_SHARE_USAGE_WINDOW = 24 * 60 * 60
+
+# Number of seconds that the fair share policy charges for a job that is
+# currently running, since its run time isn't known yet
+FAIR_SHARE_RUNNING_JOB_SECONDS = 15 * 60
+
+# Number of seconds that the usage the fair share policy looks at is cached for
+FAIR_SHARE_USAGE_CACHE_TIMEOUT = 60
+
 # This allows for cross origin resource sharing.
 # Mainly so that mooseframework.org can have access
 # to the mooseframework view.
@@ -18,7 +18,8 @@ from client.JobGetter import JobGetter
 from client.JobRunner import JobRunner
 from client.ServerUpdater import ServerUpdater
 from client.InterruptHandler import InterruptHandler
-import os, signal, sys
+from client import HttpSession
+import copy, os, signal, sys
 import time
 import traceback
 from typing import Callable
@@ -27,7 +28,10 @@ import logging
 
 logger = logging.getLogger("civet_client")
 
-from threading import Thread
+# Number of recently run repositories and SHAs that are reported to the server
+MAX_WORKSPACES = 5
+
+from threading import Thread, Lock
 
 try:
     from queue import Queue
@@ -121,10 +125,21 @@ class BaseClient(object):
 
         self.client_info["build_configs"] = []
         self.client_info["environment"] = {}
+        # Most recent first, see add_workspace()
+        self.client_info["workspaces"] = []
 
         if "client_name" in self.client_info:
             self.set_environment("CIVET_CLIENT_NAME", self.client_info["client_name"])
 
+        # Jobs running in slots when running more than one job at a time.
+        # Maps the slot number to a dict with the thread running the job,
+        # its command queue, the claimed job and the runner once it is done.
+        self.slots = {}
+        # server => requests.Session, shared by the poller and all the slots
+        # so that the connections to the server stay open between requests
+        self.sessions = {}
+        self.sessions_lock = Lock()
+
         # Entry point for running something before each runner step;
         # would be a function that takes an env (the step env) and returns
         # False it it failed
@@ -235,25 +250,78 @@ class BaseClient(object):
         environment[str(var)] = str(value)
         self.set_client_info("environment", environment)
 
-    def run_claimed_job(self, server, servers, claimed, fail: bool = False):
+    def add_workspace(self, job_info):
+        """
+        Remembers the repository and base SHA of a job so that the
+        server can give us follow up jobs that we already have checked out.
+        Input:
+          job_info: The job info of a claimed job
+        """
+        env = job_info.get("environment", {})
+        repo = env.get("CIVET_BASE_REPO")
+        sha = env.get("CIVET_BASE_SHA")
+        if not repo or not sha:
+            return
+        workspace = {"repository": repo, "sha": sha}
+        workspaces = [w for w in self.client_info["workspaces"] if w != workspace]
+        # Replace the list instead of modifying it since jobs running in
+        # slots update it from their own threads
+        self.client_info["workspaces"] = [workspace] + workspaces[: MAX_WORKSPACES - 1]
+
+    def run_claimed_job(
+        self,
+        server,
+        servers,
+        claimed,
+        fail: bool = False,
+        client_info=None,
+        command_q=None,
+        session=None,
+    ):
+        """
+        Runs a claimed job, updating the server as it goes.
+        Input:
+          server: The URL of the server the job was claimed on
+          servers: All the servers the client talks to
+          claimed: The claimed job from JobGetter
+          fail: Whether to fail the job immediately
+          client_info: The client info to run the job with, defaults to self.client_info
+          command_q: Queue of commands for the job. If not given then self.command_q
+            is used, which gets the cancel command from the signal handler.
+          session: requests.Session for the ServerUpdater to use, defaults to get_session(server)
+        Returns:
+          JobRunner: The runner that ran the job
+        """
+        if client_info is None:
+            client_info = self.client_info
+        if session is None:
+            session = self.get_session(server)
+        if command_q is None:
+            command_q = self.command_q
+            set_runner_status = True
+        else:
+            set_runner_status = False
+
         job_info = claimed["job_info"]
         job_id = job_info["job_id"]
         build_key = claimed["build_key"]
+        self.add_workspace(job_info)
         message_q = Queue()
         runner = JobRunner(
-            self.client_info,
+            client_info,
             job_info,
             message_q,
-            self.command_q,
+            command_q,
             build_key,
             pre_step=self._runner_pre_step,
             post_step=self._runner_post_step,
         )
-        self.cancel_signal.set_message({"job_id": job_id, "command": "cancel"})
+        if set_runner_status:
+            self.cancel_signal.set_message({"job_id": job_id, "command": "cancel"})
 
         control_q = Queue()
         updater = ServerUpdater(
-            server, self.client_info, message_q, self.command_q, control_q
+            server, client_info, message_q, command_q, control_q, session=session
         )
         for entry in servers:
             if entry != server:
@@ -290,25 +358,258 @@ class BaseClient(object):
                     job_id, job_info["recipe_name"]
                 )
             )
-        self.command_q.queue.clear()
-        self.runner_error = runner.error
-        self.runner_killed = runner.job_killed
+        command_q.queue.clear()
+        if set_runner_status:
+            self.runner_error = runner.error
+            self.runner_killed = runner.job_killed
+        return runner
+
+    def slot_client_info(self, slot):
+        """
+        Gets a copy of the client info for running a job in a slot.
+        If BUILD_ROOT is set then each slot gets its own directory under it
+        so that jobs running at the same time don't step on each other.
+        Input:
+          slot[int]: The slot number
+        Returns:
+          dict: The client info for the slot
+        """
+        client_info = copy.deepcopy(self.client_info)
+        build_root = client_info["environment"].get("BUILD_ROOT")
+        if build_root:
+            client_info["environment"]["BUILD_ROOT"] = os.path.join(
+                build_root, "slot_{}".format(slot)
+            )
+        return client_info
+
+    def get_session(self, server):
+        """
+        Gets the session used to talk to a server.
+        Input:
+          server: str: The URL of the server
+        Returns:
+          requests.Session
+        """
+        with self.sessions_lock:
+            if server not in self.sessions:
+                # Each slot has an updater, plus the poller
+                self.sessions[server] = HttpSession.create_session(
+                    pool_size=self.num_slots() + 1
+                )
+            return self.sessions[server]
+
+    def num_slots(self):
+        """
+        Returns:
+          int: The number of jobs this client can run at the same time
+        """
+        return self.client_info.get("slots", 1)
+
+    def free_slots(self):
+        """
+        Returns:
+          list[int]: The slots that aren't running a job
+        """
+        return [slot for slot in range(self.num_slots()) if slot not in self.slots]
+
+    def running_jobs(self, server=None):
+        """
+        Input:
+          server: Only get the jobs claimed on this server. All servers if None.
+        Returns:
+          list[int]: The ids of the jobs running in the slots
+        """
+        return [
+            info["claimed"]["job_id"]
+            for info in self.slots.values()
+            if server is None or info["server"] == server
+        ]
+
+    def run_slot_job(self, slot, server, servers, claimed, client_info, command_q):
+        """
+        Runs a claimed job in a slot. This is called in the slot's thread.
+        Input:
+          slot[int]: The slot number
+          server: The URL of the server the job was claimed on
+          servers: All the servers the client talks to
+          claimed: The claimed job from JobGetter
+          client_info: The client info for the slot, from slot_client_info()
+          command_q: Queue of commands for the job
+        Returns:
+          JobRunner: The runner that ran the job
+        """
+        return self.run_claimed_job(
+            server,
+            servers,
+            claimed,
+            client_info=client_info,
+            command_q=command_q,
+            session=self.get_session(server),
+        )
+
+    def start_slot_job(self, server, servers, claimed):
+        """
+        Starts running a claimed job in a free slot.
+        Input:
+          server: The URL of the server the job was claimed on
+          servers: All the servers the client talks to
+          claimed: The claimed job from JobGetter
+        """
+        slot = self.free_slots()[0]
+        # Get the client info now since the server info in
+        # self.client_info can change once the thread is started
+        client_info = self.slot_client_info(slot)
+        client_info["server"] = server
+        info = {
+            "server": server,
+            "claimed": claimed,
+            "command_q": Queue(),
+            "canceled": False,
+            "runner": None,
+        }
+
+        def run_slot():
+            try:
+                info["runner"] = self.run_slot_job(
+                    slot,
+                    server,
+                    servers,
+                    claimed,
+                    client_info,
+                    info["command_q"],
+                )
+            except Exception:
+                logger.warning("Error: %s" % traceback.format_exc())
+
+        logger.info("Running job {} in slot {}".format(claimed["job_id"], slot))
+        info["thread"] = Thread(target=run_slot)
+        self.slots[slot] = info
+        info["thread"].start()
+
+    def check_slots(self, timeout=0):
+        """
+        Frees up the slots that have finished their jobs, waiting up to
+        timeout seconds for one to finish.
+        If the cancel signal was received then it is passed on to all
+        of the running jobs since the signal handler can only send to one queue.
+        Input:
+          timeout[float]: Maximum number of seconds to wait for a slot to finish
+        Returns:
+          bool: True if any slots were freed
+        """
+        deadline = time.time() + timeout
+        while True:
+            if self.cancel_signal.triggered:
+                for info in self.slots.values():
+                    if not info["canceled"]:
+                        info["command_q"].put(
+                            {"job_id": info["claimed"]["job_id"], "command": "cancel"}
+                        )
+                        info["canceled"] = True
+
+            freed = False
+            for slot, info in list(self.slots.items()):
+                if info["thread"].is_alive():
+                    continue
+                info["thread"].join()
+                del self.slots[slot]
+                freed = True
+                runner = info["runner"]
+                if runner is not None:
+                    self.runner_error = self.runner_error or runner.error
+                    self.runner_killed = runner.job_killed
+
+            remaining = deadline - time.time()
+            if (
+                freed
+                or remaining <= 0
+                or self.cancel_signal.triggered
+                or self.graceful_signal.triggered
+            ):
+                return freed
+            time.sleep(min(remaining, 0.5))
+
+    def wait_for_slots(self):
+        """
+        Waits for all the slots to finish their jobs.
+        """
+        while self.slots:
+            self.check_slots(timeout=1)
+
+    def run_slots(self):
+        """
+        Main client loop when running more than one job at a time.
+        A single poller claims jobs for all of the free slots at once
+        and each job runs in its own thread.
+        """
+        # The signal handler can only send to one queue, so
+        # check_slots() passes the cancel on to the jobs
+        self.cancel_signal.set_message(None)
+        server = self.get_client_info("server")
+
+        while True:
+            self.check_slots()
+
+            if self.cancel_signal.triggered or self.graceful_signal.triggered:
+                logger.info("Received signal...exiting")
+                break
+
+            if self.runner_error:
+                logger.info("Error occurred in runner...exiting")
+                break
+
+            do_poll = False
+            free_slots = len(self.free_slots())
+            if free_slots:
+                try:
+                    getter = JobGetter(
+                        self.client_info,
+                        session=self.get_session(self.client_info["server"]),
+                    )
+                    claimed_jobs = getter.claim_jobs(
+                        free_slots, running_jobs=self.running_jobs()
+                    )
+                    for claimed in claimed_jobs:
+                        self.start_slot_job(server, [server], claimed)
+                    do_poll = not claimed_jobs and not getter.long_polled
+                except Exception:
+                    logger.warning("Error: %s" % traceback.format_exc())
+                    do_poll = True
+
+            if self.client_info["single_shot"]:
+                break
+
+            if do_poll or not self.free_slots():
+                # Wait for the next poll, or sooner if a slot frees up
+                self.check_slots(timeout=self.get_client_info("poll"))
+
+        self.wait_for_slots()
 
     def run(self):
         """
         Main client loop. Polls the server for jobs and runs them.
         """
 
+        if self.num_slots() > 1:
+            self.run_slots()
+            return
+
         while True:
             do_poll = True
             try:
-                getter = JobGetter(self.client_info)
+                getter = JobGetter(
+                    self.client_info,
+                    session=self.get_session(self.client_info["server"]),
+                )
                 claimed = getter.get_job()
                 if claimed:
                     server = self.get_client_info("server")
                     self.run_claimed_job(server, [server], claimed)
                     # finished the job, look for a new one immediately
                     do_poll = False
+                elif getter.long_polled:
+                    # Already waited on the server for a job
+                    do_poll = False
             except Exception:
                 logger.warning("Error: %s" % traceback.format_exc())
 
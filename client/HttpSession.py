@@ -0,0 +1,103 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Helpers for the HTTP connections between the client and the servers.
+Sessions keep their connections open between requests and large
+request bodies are compressed when the server says it accepts them.
+"""
+
+from __future__ import unicode_literals, absolute_import
+import gzip
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from urllib.parse import urlsplit
+except ImportError:
+    from urlparse import urlsplit
+
+# Request bodies with at least this many bytes are compressed
+GZIP_MIN_SIZE = 4096
+# Set by the server on its responses if it accepts compressed requests
+GZIP_HEADER = "X-Civet-Gzip"
+
+# (scheme, host) of the servers that accept compressed requests.
+# Shared between all the getters and updaters.
+_gzip_servers = set()
+_gzip_lock = threading.Lock()
+
+
+def create_session(pool_size=10):
+    """
+    Creates a session that keeps its connections to a server open.
+    Input:
+      pool_size: int: Number of connections to keep open to each host.
+        Should be at least the number of threads using the session.
+    Returns:
+      requests.Session
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    # The getters and updaters set their own User-Agent
+    session.headers.pop("User-Agent", None)
+    return session
+
+
+def _server_key(url):
+    parts = urlsplit(url)
+    return (parts.scheme, parts.netloc)
+
+
+def update_gzip(url, response):
+    """
+    Records whether the server accepts compressed requests from
+    the header in its response.
+    Input:
+      url: str: The URL that was posted to
+      response: requests.Response: The response from the server
+    """
+    headers = getattr(response, "headers", None) or {}
+    key = _server_key(url)
+    with _gzip_lock:
+        if headers.get(GZIP_HEADER):
+            _gzip_servers.add(key)
+        else:
+            _gzip_servers.discard(key)
+
+
+def encode_body(url, body, headers, min_size=GZIP_MIN_SIZE):
+    """
+    Compresses a request body if it is big enough and the server accepts it.
+    Input:
+      url: str: The URL that will be posted to
+      body: bytes or str: The request body
+      headers: dict: The request headers
+      min_size: int: Minimum number of bytes to compress. None to never compress.
+    Returns:
+      tuple(bytes, dict): The body and headers to send
+    """
+    if min_size is None or len(body) < min_size:
+        return body, headers
+    with _gzip_lock:
+        if _server_key(url) not in _gzip_servers:
+            return body, headers
+    if not isinstance(body, bytes):
+        body = body.encode("utf-8")
+    headers = dict(headers)
+    headers[b"Content-Encoding"] = b"gzip"
+    return gzip.compress(body, compresslevel=6), headers
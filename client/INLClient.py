@@ -18,6 +18,7 @@ import copy
 import os
 import platform
 import subprocess
+import threading
 import time, traceback
 import shutil
 from inspect import signature
@@ -51,6 +52,14 @@ class INLClient(BaseClient.BaseClient):
         # time we run a job, so that we can tell if one of the stages failed
         # within the runner and stop polling if so
         self.stage_commands_failed = []
+        # The stage commands of jobs running in slots fail from the slot threads
+        self.stage_commands_lock = threading.Lock()
+
+        # Whether the last server checked held the request open waiting for a job
+        self.long_polled = False
+
+        # jobs_ran is updated from the slot threads
+        self.jobs_ran_lock = threading.Lock()
 
     def check_server(self, server):
         """
@@ -63,8 +72,11 @@ class INLClient(BaseClient.BaseClient):
         self.client_info["server"] = server[0]
         self.client_info["build_keys"] = server[1]
         self.client_info["ssl_verify"] = server[2]
-        getter = JobGetter(self.client_info)
-        claimed = getter.get_job()
+        getter = JobGetter(self.client_info, session=self.get_session(server[0]))
+        # Split up the poll time between the servers so that waiting
+        # on one server doesn't hold up the others for too long
+        claimed = getter.get_job(self.get_client_info("poll") / len(settings.SERVERS))
+        self.long_polled = getter.long_polled
         if claimed:
             if self.get_client_info("manage_build_root"):
                 self.create_build_root()
@@ -91,6 +103,144 @@ class INLClient(BaseClient.BaseClient):
             return True
         return False
 
+    def run_slot_job(self, slot, server, servers, claimed, client_info, command_q):
+        """
+        Runs a claimed job in a slot, with the slot's own BUILD_ROOT
+        and pre_job/post_job commands.
+        See BaseClient.run_slot_job()
+        """
+        build_root = client_info["environment"]["BUILD_ROOT"]
+        stage_env = {"BUILD_ROOT": build_root, "CIVET_CLIENT_SLOT": str(slot)}
+        manage_build_root = self.get_client_info("manage_build_root")
+        if manage_build_root:
+            if self.build_root_exists(build_root):
+                logger.warning(
+                    "BUILD_ROOT {} already exists at beginning of job; removing".format(
+                        build_root
+                    )
+                )
+                self.remove_build_root(build_root)
+            # The slot build roots live under the main build root
+            os.makedirs(os.path.dirname(build_root), 0o770, exist_ok=True)
+            self.create_build_root(build_root)
+
+        # Run the pre_job command, if any, and fail the job if it fails
+        fail_job = not self.run_stage_command("pre_job", env=stage_env)
+
+        client_info["environment"]["CIVET_SERVER"] = server
+        client_info["environment"]["CIVET_CLIENT_SLOT"] = str(slot)
+
+        runner = self.run_claimed_job(
+            server,
+            servers,
+            claimed,
+            fail=fail_job,
+            client_info=client_info,
+            command_q=command_q,
+            session=self.get_session(server),
+        )
+        with self.jobs_ran_lock:
+            self.set_client_info("jobs_ran", self.get_client_info("jobs_ran") + 1)
+
+        if manage_build_root and self.build_root_exists(build_root):
+            self.remove_build_root(build_root)
+
+        # Run the post job cleanup, if any
+        # This will be checked for failure in the main loop
+        post_job_env = dict(stage_env)
+        post_job_env["CIVET_JOB_COMPLETED"] = "0" if runner.job_killed else "1"
+        self.run_stage_command("post_job", env=post_job_env)
+        return runner
+
+    def check_slot_servers(self):
+        """
+        Claims jobs for the free slots, checking each server in turn.
+        Returns:
+          bool: True if we claimed a job or every server waited for one
+        """
+        claimed_any = False
+        all_long_polled = True
+        servers = [s[0] for s in settings.SERVERS]
+        for server in settings.SERVERS:
+            free_slots = len(self.free_slots())
+            if (
+                not free_slots
+                or self.cancel_signal.triggered
+                or self.graceful_signal.triggered
+                or self.runner_error
+            ):
+                break
+            self.client_info["server"] = server[0]
+            self.client_info["build_keys"] = server[1]
+            self.client_info["ssl_verify"] = server[2]
+            getter = JobGetter(self.client_info, session=self.get_session(server[0]))
+            claimed_jobs = getter.claim_jobs(
+                free_slots,
+                self.get_client_info("poll") / len(settings.SERVERS),
+                running_jobs=self.running_jobs(server[0]),
+            )
+            for claimed in claimed_jobs:
+                self.start_slot_job(server[0], servers, claimed)
+                claimed_any = True
+            all_long_polled = all_long_polled and getter.long_polled
+        return claimed_any or all_long_polled
+
+    def run_slots(self, exit_if=None):
+        """
+        Main client loop when running more than one job at a time.
+        See run()
+        """
+        # The signal handler can only send to one queue, so
+        # check_slots() passes the cancel on to the jobs
+        self.cancel_signal.set_message(None)
+
+        try:
+            self.poll_slots(exit_if)
+        finally:
+            self.wait_for_slots()
+            # The slot build roots are under the main build root
+            if self.get_client_info("manage_build_root") and self.build_root_exists():
+                logger.info(
+                    "Removing BUILD_ROOT {} of the slots".format(self.get_build_root())
+                )
+                self.remove_build_root()
+        self.check_stage_commands()
+
+    def poll_slots(self, exit_if):
+        """
+        Claims and starts jobs until the client should stop.
+        See run_slots()
+        """
+        while True:
+            self.check_slots()
+            self.check_stage_commands()
+
+            if self.cancel_signal.triggered or self.graceful_signal.triggered:
+                logger.info("Received signal...exiting")
+                break
+            if self.runner_error:
+                logger.info("Error in runner...exiting")
+                break
+
+            do_poll = False
+            if self.free_slots():
+                try:
+                    do_poll = not self.check_slot_servers()
+                except Exception:
+                    logger.debug("Error: %s" % traceback.format_exc())
+                    do_poll = True
+
+            if exit_if is not None:
+                should_exit = exit_if(self)
+                if type(should_exit) != bool:
+                    raise BaseClient.ClientException("exit_if must return type bool")
+                if should_exit:
+                    break
+
+            if do_poll or not self.free_slots():
+                # Wait for the next poll, or sooner if a slot frees up
+                self.check_slots(timeout=self.get_client_info("poll"))
+
     def check_settings(self):
         """
         Do some basic checks to make sure the settings are good.
@@ -138,22 +288,29 @@ class INLClient(BaseClient.BaseClient):
         """
         return self.get_environment("BUILD_ROOT")
 
-    def build_root_exists(self):
+    def build_root_exists(self, build_root=None):
         """
+        Input:
+          build_root: The build root to check, defaults to BUILD_ROOT
         Returns:
           True if the BUILD_ROOT exists, False otherwise
         """
-        return os.path.isdir(self.get_build_root())
+        if build_root is None:
+            build_root = self.get_build_root()
+        return os.path.isdir(build_root)
 
-    def remove_build_root(self):
+    def remove_build_root(self, build_root=None):
         """
         Removes the build root.
+        Input:
+          build_root: The build root to remove, defaults to BUILD_ROOT
         Raises:
           BaseClient.ClientException: If BUILD_ROOT does not exist, or the directory removal failed.
         """
-        build_root = self.get_build_root()
+        if build_root is None:
+            build_root = self.get_build_root()
 
-        if self.build_root_exists():
+        if self.build_root_exists(build_root):
             logger.info("Removing BUILD_ROOT {}".format(build_root))
 
             # Mark everything as writeable (needed for sandboxed dirs that are dirty)
@@ -166,14 +323,17 @@ class INLClient(BaseClient.BaseClient):
                 "Failed to remove BUILD_ROOT {}; it does not exist".format(build_root)
             )
 
-    def create_build_root(self):
+    def create_build_root(self, build_root=None):
         """
         Creates the build root.
+        Input:
+          build_root: The build root to create, defaults to BUILD_ROOT
         Raises:
           BaseClient.ClientException: If the BUILD_ROOT directory could not be created or if it already exists.
         """
-        build_root = self.get_build_root()
-        if self.build_root_exists():
+        if build_root is None:
+            build_root = self.get_build_root()
+        if self.build_root_exists(build_root):
             raise BaseClient.ClientException(
                 "Failed to create BUILD_ROOT {}; it already exists".format(build_root)
             )
@@ -256,7 +416,8 @@ class INLClient(BaseClient.BaseClient):
         if returncode != 0:
             if check:
                 raise BaseClient.ClientException(f"The {stage} command failed")
-            self.stage_commands_failed.append(stage)
+            with self.stage_commands_lock:
+                self.stage_commands_failed.append(stage)
             return False
         return True
 
@@ -269,8 +430,10 @@ class INLClient(BaseClient.BaseClient):
         Returns:
             None
         """
-        if self.stage_commands_failed:
-            stage_list = f'{", ".join(self.stage_commands_failed)}'
+        with self.stage_commands_lock:
+            failed = list(self.stage_commands_failed)
+        if failed:
+            stage_list = f'{", ".join(failed)}'
             raise BaseClient.ClientException(
                 f"The stage command(s) {stage_list} failed"
             )
@@ -313,6 +476,14 @@ class INLClient(BaseClient.BaseClient):
         # Run the startup command
         self.run_stage_command("startup", check=True)
 
+        if self.num_slots() > 1:
+            try:
+                self.run_slots(exit_if)
+            finally:
+                # Run exit command
+                self.run_stage_command("exit")
+            return
+
         while True:
             if self.get_client_info("manage_build_root") and self.build_root_exists():
                 logger.warning(
@@ -323,6 +494,9 @@ class INLClient(BaseClient.BaseClient):
                 self.remove_build_root()
 
             ran_job = False
+            # If every server held the request open waiting for a job
+            # then there is no need to sleep before checking again
+            all_long_polled = True
             for server in settings.SERVERS:
                 if (
                     self.cancel_signal.triggered
@@ -334,8 +508,10 @@ class INLClient(BaseClient.BaseClient):
                     if self.check_server(server):
                         ran_job = True
                         self.check_stage_commands()
+                    all_long_polled = all_long_polled and self.long_polled
                 except Exception:
                     logger.debug("Error: %s" % traceback.format_exc())
+                    all_long_polled = False
                     break
 
             if self.cancel_signal.triggered or self.graceful_signal.triggered:
@@ -350,7 +526,7 @@ class INLClient(BaseClient.BaseClient):
                     raise BaseClient.ClientException("exit_if must return type bool")
                 if should_exit:
                     break
-            if not ran_job:
+            if not ran_job and not all_long_polled:
                 time.sleep(self.get_client_info("poll"))
 
         if self.get_client_info("manage_build_root") and self.build_root_exists():
@@ -16,6 +16,7 @@ from __future__ import unicode_literals, absolute_import
 import requests
 import json
 import logging
+from client import HttpSession
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
 
 requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
@@ -24,7 +25,12 @@ logger = logging.getLogger("civet_client")
 
 
 class JobGetter(object):
-    def __init__(self, client_info):
+    # Maximum number of seconds each server allows for long polling.
+    # This is filled in from the server responses and shared between getters
+    # since the clients create a new getter every time they poll.
+    long_poll_servers = {}
+
+    def __init__(self, client_info, session=None):
         """
         Input:
           client_info: A dictionary containing the following keys
@@ -35,13 +41,21 @@ class JobGetter(object):
             ssl_verify: Whether to use SSL verification when making a request.
             request_timeout: The timeout when making a request
             build_key: The build_key to be used.
+            workspaces: Optional list of dicts with the "repository" and "sha"
+              of the most recent jobs run, so the server can hand out jobs that
+              are already checked out.
+          session: Optional requests.Session to make the requests with
         """
         super(JobGetter, self).__init__()
         self.client_info = client_info
+        self._http = session if session is not None else requests
         self._headers = {
             b"User-Agent": b"INL-CIVET-Client/1.0 (+https://github.com/idaholab/civet)"
         }
         self._url = f'{self.client_info["server"]}/client/get_job/'
+        self._claim_url = f'{self.client_info["server"]}/client/claim_jobs/'
+        # Whether the last call to get_job() waited on the server for a job
+        self.long_polled = False
 
     def check_response(self, response_json):
         expected_values = {
@@ -70,31 +84,93 @@ class JobGetter(object):
 
         return True
 
-    def get_job(self):
+    def update_long_poll(self, response):
+        """
+        Records whether the server supports long polling from
+        the header in its response.
+        """
         server = self.client_info["server"]
-        logger.info(f"Polling for a job on server {server}")
+        try:
+            max_wait = float(response.headers.get("X-Civet-Long-Poll", 0))
+        except (TypeError, ValueError):
+            max_wait = 0
+        if max_wait > 0:
+            JobGetter.long_poll_servers[server] = max_wait
+        else:
+            JobGetter.long_poll_servers.pop(server, None)
 
-        post_data = {
-            "client_name": self.client_info["client_name"],
-            "build_keys": self.client_info["build_keys"],
-            "build_configs": self.client_info["build_configs"],
-        }
+    def post_claim(self, url, post_data, max_wait):
+        """
+        Posts a request to claim jobs, long polling if the server supports it.
+        Input:
+          url[str]: URL to post to
+          post_data[dict]: Data to post, "wait" is added if long polling
+          max_wait[float]: Maximum number of seconds to wait for a job. If None then
+            client_info["poll"] is used.
+        Return:
+          dict: The JSON response or None if the request failed
+        """
+        server = self.client_info["server"]
+        if max_wait is None:
+            max_wait = self.client_info.get("poll", 0)
+        wait = min(max_wait, JobGetter.long_poll_servers.get(server, 0))
+        self.long_polled = False
+
+        if wait > 0:
+            logger.info(f"Waiting up to {wait} seconds for a job on server {server}")
+            post_data["wait"] = wait
+        else:
+            logger.info(f"Polling for a job on server {server}")
         post_json = json.dumps(post_data, separators=(",", ": "))
 
+        body, headers = HttpSession.encode_body(
+            url,
+            post_json,
+            self._headers,
+            self.client_info.get("gzip_min_size", HttpSession.GZIP_MIN_SIZE),
+        )
+
         try:
-            response = requests.post(
-                self._url,
-                post_json,
-                headers=self._headers,
+            response = self._http.post(
+                url,
+                body,
+                headers=headers,
                 verify=self.client_info["ssl_verify"],
-                timeout=5,
+                timeout=5 + wait,
             )
+            HttpSession.update_gzip(url, response)
             response.raise_for_status()
             response_json = response.json()
         except:
             logger.warning("Failed to get job", exc_info=True)
             return None
 
+        self.long_polled = wait > 0
+        self.update_long_poll(response)
+        return response_json
+
+    def get_job(self, max_wait=None):
+        """
+        Tries to claim a job on the server.
+        If the server supports long polling then the server will hold
+        the request until a job is available, for up to max_wait seconds.
+        Input:
+          max_wait[float]: Maximum number of seconds to wait for a job. If None then
+            client_info["poll"] is used.
+        Return:
+          dict: The claimed job or None if no job was claimed
+        """
+        server = self.client_info["server"]
+        post_data = {
+            "client_name": self.client_info["client_name"],
+            "build_keys": self.client_info["build_keys"],
+            "build_configs": self.client_info["build_configs"],
+            "workspaces": self.client_info.get("workspaces", []),
+        }
+        response_json = self.post_claim(self._url, post_data, max_wait)
+        if response_json is None:
+            return None
+
         # Make sure the values are all as we expect
         if not self.check_response(response_json):
             return None
@@ -107,3 +183,45 @@ class JobGetter(object):
 
         logger.info(f"Claimed job {job_id} on server {server}")
         return response_json
+
+    def claim_jobs(self, slots, max_wait=None, running_jobs=None):
+        """
+        Tries to claim up to slots jobs on the server at once.
+        Input:
+          slots[int]: Maximum number of jobs to claim
+          max_wait[float]: Same as get_job()
+          running_jobs[list[int]]: Jobs the client is still running on the server
+        Return:
+          list[dict]: The claimed jobs, each the same as what get_job() returns
+        """
+        server = self.client_info["server"]
+        post_data = {
+            "client_name": self.client_info["client_name"],
+            "build_keys": self.client_info["build_keys"],
+            "build_configs": self.client_info["build_configs"],
+            "slots": slots,
+            "running_jobs": running_jobs or [],
+            "workspaces": self.client_info.get("workspaces", []),
+        }
+        response_json = self.post_claim(self._claim_url, post_data, max_wait)
+        if response_json is None:
+            return []
+
+        if response_json.get("status") != "OK" or not isinstance(
+            response_json.get("jobs"), list
+        ):
+            logger.warning(f"Bad response from {self._claim_url}")
+            return []
+
+        claimed = []
+        for job in response_json["jobs"]:
+            if not isinstance(job, dict) or not self.check_response(job):
+                continue
+            if job.get("job_id") is None:
+                continue
+            logger.info(f"Claimed job {job['job_id']} on server {server}")
+            claimed.append(job)
+
+        if not claimed:
+            logger.info(f"Jobs not available on server {server}")
+        return claimed
@@ -224,22 +224,27 @@ class JobRunner(object):
             self.client_info["client_name"],
             job_id,
         )
-        self.add_message(final_url, job_msg)
+        self.add_message(final_url, job_msg, "job_finished")
 
         logger.info("Finished Job {}: {}".format(job_id, self.job_data["recipe_name"]))
         return job_msg
 
-    def add_message(self, url, msg):
+    def add_message(self, url, msg, update_type=None, stepresult_id=None):
         """
         Puts a message on the message queue that will be read in by the ServerUpdater.
         Input:
           url: str: URL the ServerUpdater will post to.
           msg: dict: Payload to post to the URL
+          update_type: str: Name of the update, used by the ServerUpdater to batch messages
+          stepresult_id: int: ID of the step result for step updates
         """
         self.message_q.put(
             {
                 "server": self.client_info["server"],
                 "job_id": self.job_data["job_id"],
+                "build_key": self.build_key,
+                "type": update_type,
+                "stepresult_id": stepresult_id,
                 "url": url,
                 "payload": msg.copy(),
             }
@@ -268,7 +273,7 @@ class JobRunner(object):
             self.client_info["client_name"],
             step["stepresult_id"],
         )
-        self.add_message(url, chunk_data)
+        self.add_message(url, chunk_data, keyword, step["stepresult_id"])
 
     def get_output_from_queue(self, q, timeout=1):
         """
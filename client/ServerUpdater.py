@@ -18,6 +18,7 @@ import time
 import json, requests
 import traceback
 import logging
+from client import HttpSession
 
 try:
     from queue import Empty
@@ -31,19 +32,36 @@ requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 logger = logging.getLogger("civet_client")
 
 
+# Default maximum number of messages to send to the server in one batch
+DEFAULT_BATCH_SIZE = 50
+# Returned by post_json() when the server doesn't have the batch URL
+BATCH_NOT_FOUND = {"status": "NOT_FOUND"}
+
+
 class StopException(Exception):
     pass
 
 
 class ServerUpdater(object):
-    def __init__(self, server, client_info, message_q, command_q, control_q):
+    def __init__(
+        self, server, client_info, message_q, command_q, control_q, session=None
+    ):
+        """
+        Input:
+          session: Optional requests.Session to make the requests with
+        """
         self.message_q = message_q
         self.command_q = command_q
         self.control_q = control_q
         self.messages = []
+        # (server, job_id) of jobs that the server is removing output from
+        self.output_trimmed = set()
+        # Servers that don't know about batched updates
+        self.no_batch_servers = set()
         self.client_info = client_info
         self.servers = {}
         self.main_server = server
+        self._http = session if session is not None else requests
 
         self.update_servers()
         self.running = True
@@ -137,17 +155,24 @@ class ServerUpdater(object):
     def send_messages(self):
         """
         Just tries to clear the messages that we haven't sent yet.
+        Consecutive messages for the same job are sent in batches.
         """
         try:
             last_success = 0
-            for idx, msg in enumerate(self.messages):
-                sent = self.post_message(msg)
-                if sent:
-                    last_success = idx + 1
-                    self.message_q.task_done()
+            while last_success < len(self.messages):
+                batch = self.next_batch(last_success)
+                if len(batch) > 1:
+                    sent = self.post_batch(batch)
+                    if sent is None:
+                        # The server doesn't do batches, try again one at a time
+                        continue
                 else:
+                    sent = self.post_message(batch[0])
+                if not sent:
                     break
-            # self.messages = self.messages[last_success:]
+                last_success += len(batch)
+                for msg in batch:
+                    self.message_q.task_done()
             self.messages = self.messages[last_success:]
         except StopException:
             for msg in self.messages[last_success:]:
@@ -155,33 +180,113 @@ class ServerUpdater(object):
             self.messages = []
         self.servers[self.main_server]["last_time"] = time.time()
 
+    def next_batch(self, start):
+        """
+        Gets the messages, starting at an index, that can be sent in one batch.
+        Messages can be batched if they are for the same job on the same server.
+        Input:
+          start: int: Index into self.messages of the first message
+        Returns:
+          list: Messages to send. Always has at least the first message.
+        """
+        first = self.messages[start]
+        if not first.get("type") or first["server"] in self.no_batch_servers:
+            return [first]
+        batch_size = self.client_info.get("server_batch_size", DEFAULT_BATCH_SIZE)
+        batch = [first]
+        for msg in self.messages[start + 1 : start + batch_size]:
+            if (
+                not msg.get("type")
+                or msg["server"] != first["server"]
+                or msg["job_id"] != first["job_id"]
+                or msg.get("build_key") != first.get("build_key")
+            ):
+                break
+            batch.append(msg)
+        return batch
+
+    def post_batch(self, batch):
+        """
+        Sends a list of updates for a job to the server in one request.
+        Input:
+          batch: list: Messages as created by JobRunner.add_message
+        Returns:
+          True if we could talk to the server, False otherwise.
+          None if the server doesn't support batches.
+        """
+        first = batch[0]
+        server = first["server"]
+        url = "{}/client/batch/{}/{}/{}/".format(
+            server, first["build_key"], self.client_info["client_name"], first["job_id"]
+        )
+        updates = []
+        for msg in batch:
+            self.decode_bytes(msg["payload"])
+            updates.append(
+                {
+                    "type": msg["type"],
+                    "stepresult_id": msg.get("stepresult_id"),
+                    "payload": msg["payload"],
+                }
+            )
+        data = {"updates": updates}
+
+        reply = self.post_json(url, data, not_found=BATCH_NOT_FOUND)
+        if reply is BATCH_NOT_FOUND:
+            logger.info("Server {} doesn't support batched updates".format(server))
+            self.no_batch_servers.add(server)
+            return None
+        if reply and server in self.servers:
+            # The server counts a batch as a ping
+            self.servers[server]["last_time"] = time.time()
+        return self.handle_reply(first, url, reply)
+
     def post_message(self, item):
         """
-        Sends a list of updates to the server.
+        Sends an update to the server.
 
         Input:
-          server: the URL of the server
-          job_id: The job id associated with the update.
-          job_data: A list of updates to send to the server
+          item: dict: Message as created by JobRunner.add_message
 
         Returns:
           True if we could talk to the server, False otherwise
         """
         reply = self.post_json(item["url"], item["payload"])
+        return self.handle_reply(item, item["url"], reply)
 
+    def handle_reply(self, item, url, reply):
+        """
+        Checks the reply from the server for an update.
+        Input:
+          item: dict: The message that was sent, or the first message of a batch
+          url: str: The URL that was posted to
+          reply: dict: The reply from post_json()
+        Returns:
+          True if we could talk to the server, False otherwise
+        """
         if not reply:
             # Since all messages here are on the same server, if there is no
             # reply then there isn't any point in trying with others
             return False
 
+        trimmed_key = (item["server"], item["job_id"])
+        if reply.get("output_trimmed") and trimmed_key not in self.output_trimmed:
+            # Only let the user know once per job
+            self.output_trimmed.add(trimmed_key)
+            logger.warning(
+                "Server {} is removing output from job {} since it is over the output limit".format(
+                    item["server"], item["job_id"]
+                )
+            )
+
         if "status" not in reply:
             err_str = "While posting to {}, server gave invalid JSON : {}".format(
-                item["url"], reply
+                url, reply
             )
             logger.error(err_str)
         elif reply["status"] != "OK":
             err_str = "While posting to {}, an error occured on the server: {}".format(
-                item["url"], reply
+                url, reply
             )
             logger.error(err_str)
         elif reply.get("command") == "cancel":
@@ -225,6 +330,19 @@ class ServerUpdater(object):
         # We let this timeout after a second, if we fail to ping... so what. Hopefully it'll work next time!
         return self.post_json(url, data, timeout=1) != None
 
+    @staticmethod
+    def decode_bytes(data):
+        """
+        Get rid of any possible bad characters in the values of a dict.
+        Input:
+          data[dict]: Modified in place
+        """
+        for k in data.keys():
+            # Python 2 and 3 way to see if we are dealing with a byte string.
+            # If so, decode it to unicode while getting rid of bad characters
+            if isinstance(data[k], b"".__class__):
+                data[k] = data[k].decode("utf-8", "replace")
+
     def data_to_json(self, data):
         """
         Convenience function to convert a dict into JSON.
@@ -235,12 +353,7 @@ class ServerUpdater(object):
           tuple(dict/json, bool): The serialized JSON. The bool indicates whether it was successful
         """
         try:
-            # Get rid of any possible bad characters
-            for k in data.keys():
-                # Python 2 and 3 way to see if we are dealing with a byte string.
-                # If so, decode it to unicode while getting rid of bad characters
-                if isinstance(data[k], b"".__class__):
-                    data[k] = data[k].decode("utf-8", "replace")
+            self.decode_bytes(data)
             in_json = json.dumps(data, separators=(",", ": "))
             # We want to make sure the body is not unicode.
             # Prevents the "Error: [('SSL routines', 'ssl3_write_pending', 'bad write retry')]" errors
@@ -253,7 +366,7 @@ class ServerUpdater(object):
             )
             return {"status": "OK", "command": "stop"}, False
 
-    def post_json(self, request_url, data, timeout=None):
+    def post_json(self, request_url, data, timeout=None, not_found=None):
         """
         Post the supplied dict holding JSON data to the url and return a dict
         with the JSON.
@@ -261,6 +374,7 @@ class ServerUpdater(object):
           request_url: The URL to post to.
           data: dict of data to post.
           timeout: The request timeout; defaults to self.client_info['request_timeout']
+          not_found: If not None, returned when the server doesn't have the URL
         Returns:
           A dict of the JSON reply if successful, otherwise None
         """
@@ -275,13 +389,20 @@ class ServerUpdater(object):
             in_json, good = self.data_to_json(data)
             if not good:
                 return in_json
-            response = requests.post(
+            body, headers = HttpSession.encode_body(
                 request_url,
                 in_json,
-                headers=self._headers,
+                self._headers,
+                self.client_info.get("gzip_min_size", HttpSession.GZIP_MIN_SIZE),
+            )
+            response = self._http.post(
+                request_url,
+                body,
+                headers=headers,
                 verify=self.client_info["ssl_verify"],
                 timeout=timeout,
             )
+            HttpSession.update_gzip(request_url, response)
             if response.status_code == 400:
                 # This means that we shouldn't retry this request
                 logger.warning(
@@ -310,6 +431,8 @@ class ServerUpdater(object):
                     % request_url
                 )
                 return {"status": "OK"}
+            if response.status_code == 404 and not_found is not None:
+                return not_found
             response.raise_for_status()
             reply = response.json()
             return reply
@@ -86,6 +86,13 @@ def commandline_client(args):
         default=30,
         help="Number of seconds to wait before polling for more jobs in continuous mode",
     )
+    parser.add_argument(
+        "--slots",
+        dest="slots",
+        type=int,
+        default=1,
+        help="Number of jobs to run at the same time",
+    )
     parser.add_argument(
         "--daemon",
         dest="daemon",
@@ -134,6 +141,7 @@ def commandline_client(args):
         "build_keys": [parsed.build_key],
         "single_shot": parsed.single_shot,
         "poll": parsed.poll,
+        "slots": parsed.slots,
         "daemon_cmd": parsed.daemon,
         "request_timeout": 30,
         "update_step_time": 20,
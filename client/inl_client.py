@@ -71,6 +71,13 @@ def commandline_client(args):
         help="Sets the client polling time in seconds (default: 60s)",
         default=60,
     )
+    parser.add_argument(
+        "--slots",
+        type=int,
+        dest="slots",
+        help="Number of jobs to run at the same time. Each job gets its own directory under the build root (default: 1)",
+        default=1,
+    )
     parser.add_argument(
         "--startup-command",
         type=str,
@@ -128,6 +135,7 @@ def commandline_client(args):
         "build_keys": [],
         "single_shot": False,
         "poll": parsed.poll_time,
+        "slots": parsed.slots,
         "daemon_cmd": parsed.daemon,
         "request_timeout": 120,
         "update_step_time": 30,
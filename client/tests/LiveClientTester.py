@@ -14,15 +14,21 @@
 
 from __future__ import unicode_literals, absolute_import
 from django.contrib.staticfiles.testing import StaticLiveServerTestCase
+from django.core.cache import cache
 from ci.tests import DBTester
 from client.tests import utils
+from client.JobGetter import JobGetter
 
 
 class LiveClientTester(StaticLiveServerTestCase, DBTester.DBCompare):
     def setUp(self):
         super(LiveClientTester, self).setUp()
+        cache.clear()
         self.client_info = utils.default_client_info()
         self.client_info["servers"] = [self.live_server_url]
         self.client_info["server"] = self.live_server_url
         self.client_info["update_step_time"] = 1
         self.client_info["server_update_interval"] = 1
+        # The live server supports long polling, keep the waits short
+        self.client_info["poll"] = 1
+        JobGetter.long_poll_servers.clear()
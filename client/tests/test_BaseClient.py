@@ -95,3 +95,25 @@ class Tests(SimpleTestCase):
         c.set_environment("FOO", "bar")
         self.assertEqual("bar", c.get_environment("FOO"))
         self.assertEqual(c.client_info["environment"], c.get_environment())
+
+    def test_add_workspace(self):
+        c = utils.create_base_client()
+        self.assertEqual(c.client_info["workspaces"], [])
+        c.add_workspace({"environment": {}})
+        self.assertEqual(c.client_info["workspaces"], [])
+
+        for i in range(BaseClient.MAX_WORKSPACES + 1):
+            env = {"CIVET_BASE_REPO": "owner/repo", "CIVET_BASE_SHA": str(i)}
+            c.add_workspace({"environment": env})
+        workspaces = c.client_info["workspaces"]
+        self.assertEqual(len(workspaces), BaseClient.MAX_WORKSPACES)
+        self.assertEqual(workspaces[0], {"repository": "owner/repo", "sha": "5"})
+        self.assertEqual(workspaces[-1], {"repository": "owner/repo", "sha": "1"})
+
+        # Running the same one again moves it to the front
+        env = {"CIVET_BASE_REPO": "owner/repo", "CIVET_BASE_SHA": "3"}
+        c.add_workspace({"environment": env})
+        workspaces = c.client_info["workspaces"]
+        self.assertEqual(len(workspaces), BaseClient.MAX_WORKSPACES)
+        self.assertEqual(workspaces[0], {"repository": "owner/repo", "sha": "3"})
+        self.assertEqual([w["sha"] for w in workspaces], ["3", "5", "4", "2", "1"])
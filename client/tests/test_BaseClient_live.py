@@ -19,7 +19,7 @@ from mock import patch
 import os, subprocess
 import threading
 import time
-from ci import views
+from ci import models, views
 from ci.tests import utils as test_utils
 from client.tests import LiveClientTester, utils
 
@@ -67,6 +67,24 @@ class Tests(LiveClientTester.LiveClientTester):
             utils.check_complete_job(self, job, c)
             self.assertFalse(c.runner_killed)
 
+    def test_run_slots(self):
+        with test_utils.RecipeDir() as recipe_dir:
+            c, job0 = self.create_client_and_job(recipe_dir, "Slot0", sleep=2)
+            job1 = utils.create_client_job(recipe_dir, name="Slot1", sleep=2)
+            c.client_info["slots"] = 2
+            c.run()
+            build_roots = set()
+            for job in [job0, job1]:
+                job.refresh_from_db()
+                self.assertEqual(job.complete, True)
+                self.assertEqual(job.status, models.JobStatus.SUCCESS)
+                self.assertEqual(job.step_results.count(), 3)
+                for result in job.step_results.all():
+                    build_roots.add(result.output.split("/global")[0])
+            # Each job ran in its own build root
+            self.assertEqual(build_roots, {"/foo/bar/slot_0", "/foo/bar/slot_1"})
+            self.assertFalse(c.runner_error)
+
     def test_run_graceful(self):
         with test_utils.RecipeDir() as recipe_dir:
             c, job = self.create_client_and_job(recipe_dir, "Graceful", sleep=2)
@@ -0,0 +1,118 @@
+# Copyright 2016-2025 Battelle Energy Alliance, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals, absolute_import
+from django.test import SimpleTestCase
+from ci.tests import utils as test_utils
+from client import HttpSession, ServerUpdater
+from client.tests import utils
+from mock import patch
+import gzip, json, requests
+
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+
+class Tests(SimpleTestCase):
+    def setUp(self):
+        HttpSession._gzip_servers.clear()
+
+    def tearDown(self):
+        HttpSession._gzip_servers.clear()
+
+    def test_create_session(self):
+        session = HttpSession.create_session(pool_size=3)
+        adapter = session.get_adapter("https://localhost")
+        self.assertEqual(adapter._pool_maxsize, 3)
+        self.assertIs(adapter, session.get_adapter("http://localhost"))
+        self.assertNotIn("User-Agent", session.headers)
+
+    def test_encode_body(self):
+        url = "https://localhost:8000/client/ping/foo/"
+        headers = {b"User-Agent": b"civet"}
+        body = b"x" * 100
+
+        # The server hasn't said it accepts gzip
+        self.assertEqual(
+            HttpSession.encode_body(url, body, headers, 10), (body, headers)
+        )
+
+        response = test_utils.Response(headers={HttpSession.GZIP_HEADER: "1"})
+        HttpSession.update_gzip(url, response)
+        new_body, new_headers = HttpSession.encode_body(url, body, headers, 10)
+        self.assertEqual(gzip.decompress(new_body), body)
+        self.assertEqual(new_headers[b"Content-Encoding"], b"gzip")
+        self.assertEqual(new_headers[b"User-Agent"], b"civet")
+        self.assertNotIn(b"Content-Encoding", headers)
+        # Strings are encoded
+        new_body, new_headers = HttpSession.encode_body(url, "x" * 100, headers, 10)
+        self.assertEqual(gzip.decompress(new_body), body)
+
+        # Other URLs on the same server
+        other_url = "https://localhost:8000/client/claim_jobs/"
+        new_body, new_headers = HttpSession.encode_body(other_url, body, headers, 10)
+        self.assertEqual(gzip.decompress(new_body), body)
+
+        # Too small or turned off
+        self.assertEqual(
+            HttpSession.encode_body(url, body, headers, 101), (body, headers)
+        )
+        self.assertEqual(
+            HttpSession.encode_body(url, body, headers, None), (body, headers)
+        )
+
+        # Not on a different server
+        self.assertEqual(
+            HttpSession.encode_body("https://other/", body, headers, 10),
+            (body, headers),
+        )
+
+        # The server stopped accepting it
+        HttpSession.update_gzip(url, test_utils.Response())
+        self.assertEqual(
+            HttpSession.encode_body(url, body, headers, 10), (body, headers)
+        )
+
+    @patch.object(requests, "post")
+    def test_server_updater(self, mock_post):
+        client_info = utils.default_client_info()
+        client_info["gzip_min_size"] = 10
+        updater = ServerUpdater.ServerUpdater(
+            client_info["server"], client_info, Queue(), Queue(), Queue()
+        )
+        url = "https://server0/client/ping/foo/"
+        mock_post.return_value = test_utils.Response(
+            {"status": "OK"}, headers={HttpSession.GZIP_HEADER: "1"}
+        )
+        data = {"output": "output " * 10}
+        updater.post_json(url, data)
+        args, kwargs = mock_post.call_args
+        self.assertEqual(json.loads(args[1]), data)
+        self.assertNotIn(b"Content-Encoding", kwargs["headers"])
+
+        # Now the server has said it accepts gzip
+        updater.post_json(url, data)
+        args, kwargs = mock_post.call_args
+        self.assertEqual(json.loads(gzip.decompress(args[1])), data)
+        self.assertEqual(kwargs["headers"][b"Content-Encoding"], b"gzip")
+
+    def test_base_client_sessions(self):
+        c = utils.create_base_client()
+        c.client_info["slots"] = 4
+        session = c.get_session("https://server0")
+        self.assertIs(session, c.get_session("https://server0"))
+        self.assertIsNot(session, c.get_session("https://server1"))
+        self.assertEqual(session.get_adapter("https://server0")._pool_maxsize, 5)
@@ -23,7 +23,7 @@ from client.tests import LiveClientTester, utils
 import tempfile
 import threading
 import time
-from ci import views
+from ci import models, views
 from ci.tests import utils as test_utils
 
 
@@ -107,6 +107,49 @@ class Tests(LiveClientTester.LiveClientTester):
                 self.assertFalse(c.runner_killed)
                 self.check_post_completed_commands(tmp, False)
 
+    def test_run_slots(self):
+        with test_utils.RecipeDir() as recipe_dir:
+            with tempfile.TemporaryDirectory() as tmp:
+                c = self.create_client(os.path.join(tmp, "build_root"))
+                c.client_info["slots"] = 3
+                c.client_info["manage_build_root"] = True
+                c.client_info["pre_job_command"] = (
+                    f'printf "$BUILD_ROOT" > {tmp}/pre_job_$CIVET_CLIENT_SLOT'
+                )
+                c.client_info["post_job_command"] = (
+                    f'printf "$CIVET_JOB_COMPLETED" > {tmp}/post_job_$CIVET_CLIENT_SLOT'
+                )
+                jobs = [
+                    self.create_job(c, recipe_dir, "Slot%s" % i, sleep=2)
+                    for i in range(2)
+                ]
+                self.set_counts()
+                # Keeps polling with the jobs running, which shouldn't cancel them
+                c.run(exit_if=lambda client: client.get_client_info("jobs_ran") == 2)
+                self.compare_counts(
+                    num_clients=1,
+                    num_events_completed=1,
+                    num_jobs_completed=2,
+                    active_branches=1,
+                )
+                for job in jobs:
+                    job.refresh_from_db()
+                    self.assertEqual(job.status, models.JobStatus.SUCCESS)
+                    self.assertEqual(job.step_results.count(), 3)
+
+                # Each slot had its own build root and stage commands
+                for slot in range(2):
+                    build_root = os.path.join(tmp, "build_root", "slot_%s" % slot)
+                    with open(os.path.join(tmp, "pre_job_%s" % slot), "r") as f:
+                        self.assertEqual(f.read(), build_root)
+                    with open(os.path.join(tmp, "post_job_%s" % slot), "r") as f:
+                        self.assertEqual(f.read(), "1")
+                    self.assertFalse(os.path.exists(build_root))
+                self.assertFalse(os.path.exists(os.path.join(tmp, "pre_job_2")))
+                self.assertEqual(c.slots, {})
+                # The directory the slot build roots were in is removed on exit
+                self.assertFalse(os.path.exists(os.path.join(tmp, "build_root")))
+
     def test_run_graceful(self):
         with test_utils.RecipeDir() as recipe_dir:
             with tempfile.TemporaryDirectory() as tmp:
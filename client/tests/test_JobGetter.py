@@ -13,7 +13,7 @@
 # limitations under the License.
 
 from __future__ import unicode_literals, absolute_import
-import copy, requests
+import copy, json, requests
 from . import utils
 from django.test import override_settings
 from ci.tests import utils as test_utils
@@ -72,6 +72,19 @@ class Tests(DBTester.DBTester):
         mock_post.return_value = test_utils.Response(good_response)
         response = g.get_job()
         self.assertIsNotNone(response)
+        self.assertEqual(json.loads(mock_post.call_args[0][1])["workspaces"], [])
+
+        # The workspaces are sent along
+        workspaces = [{"repository": "owner/repo", "sha": "1234"}]
+        self.client_info["workspaces"] = workspaces
+        g.get_job()
+        self.assertEqual(
+            json.loads(mock_post.call_args[0][1])["workspaces"], workspaces
+        )
+        g.claim_jobs(2)
+        self.assertEqual(
+            json.loads(mock_post.call_args[0][1])["workspaces"], workspaces
+        )
 
         # threw on post
         mock_post.return_value = test_utils.Response(good_response, do_raise=True)
@@ -88,3 +101,77 @@ class Tests(DBTester.DBTester):
         response["job_id"] = None
         mock_post.return_value = test_utils.Response(response)
         self.assertIsNone(g.get_job())
+
+    @patch.object(requests, "post")
+    def test_get_job_long_poll(self, mock_post):
+        g = self.create_getter()
+        JobGetter.JobGetter.long_poll_servers.clear()
+        self.client_info["poll"] = 30
+        response = copy.deepcopy(good_response)
+        response["job_id"] = None
+
+        # The server doesn't support long polling yet
+        mock_post.return_value = test_utils.Response(response)
+        self.assertIsNone(g.get_job())
+        self.assertFalse(g.long_polled)
+        self.assertNotIn("wait", json.loads(mock_post.call_args[0][1]))
+
+        # Now it advertises it
+        mock_post.return_value = test_utils.Response(
+            response, headers={"X-Civet-Long-Poll": "20"}
+        )
+        self.assertIsNone(g.get_job())
+        self.assertFalse(g.long_polled)
+        self.assertEqual(
+            JobGetter.JobGetter.long_poll_servers, {self.client_info["server"]: 20}
+        )
+
+        # Waits for the smaller of the poll time and the server maximum
+        self.assertIsNone(g.get_job())
+        self.assertTrue(g.long_polled)
+        self.assertEqual(json.loads(mock_post.call_args[0][1])["wait"], 20)
+        self.assertEqual(mock_post.call_args[1]["timeout"], 25)
+        self.assertIsNone(g.get_job(max_wait=10))
+        self.assertEqual(json.loads(mock_post.call_args[0][1])["wait"], 10)
+
+        # The server turned off long polling
+        mock_post.return_value = test_utils.Response(response)
+        self.assertIsNone(g.get_job())
+        self.assertEqual(JobGetter.JobGetter.long_poll_servers, {})
+        self.assertIsNone(g.get_job())
+        self.assertFalse(g.long_polled)
+
+    @patch.object(requests, "post")
+    def test_claim_jobs(self, mock_post):
+        g = self.create_getter()
+        JobGetter.JobGetter.long_poll_servers.clear()
+        other_job = copy.deepcopy(good_response)
+        other_job["job_id"] = 4321
+
+        # good response
+        mock_post.return_value = test_utils.Response(
+            {"status": "OK", "jobs": [good_response, other_job]}
+        )
+        claimed = g.claim_jobs(3)
+        self.assertEqual([j["job_id"] for j in claimed], [1234, 4321])
+        self.assertEqual(json.loads(mock_post.call_args[0][1])["slots"], 3)
+        self.assertTrue(mock_post.call_args[0][0].endswith("/client/claim_jobs/"))
+
+        # Nothing available
+        mock_post.return_value = test_utils.Response({"status": "OK", "jobs": []})
+        self.assertEqual(g.claim_jobs(3), [])
+
+        # threw on post
+        mock_post.return_value = test_utils.Response(good_response, do_raise=True)
+        self.assertEqual(g.claim_jobs(3), [])
+
+        # bad values
+        mock_post.return_value = test_utils.Response(good_response)
+        self.assertEqual(g.claim_jobs(3), [])
+        bad_job = copy.deepcopy(good_response)
+        del bad_job["job_id"]
+        mock_post.return_value = test_utils.Response(
+            {"status": "OK", "jobs": [bad_job, other_job]}
+        )
+        claimed = g.claim_jobs(3)
+        self.assertEqual([j["job_id"] for j in claimed], [4321])
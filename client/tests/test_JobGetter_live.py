@@ -26,6 +26,8 @@ BaseClient.setup_logger()
 
 
 @override_settings(INSTALLED_GITSERVERS=[test_utils.github_config()])
+# Jobs are made ready directly in the DB so always check the ready job index
+@override_settings(GET_JOB_UPDATE_INTERVAL=0)
 class Tests(LiveClientTester.LiveClientTester):
     def setUp(self):
         super(Tests, self).setUp()
@@ -64,7 +64,8 @@ class Tests(SimpleTestCase):
         self.assertEqual(results["client_name"], runner.client_info["client_name"])
         self.assertEqual(self.message_q.qsize(), 1)
         msg = self.message_q.get(block=False)
-        self.assertEqual(len(msg), 4)
+        self.assertEqual(len(msg), 7)
+        self.assertEqual(msg["type"], "job_finished")
         server = runner.client_info["server"]
         self.assertEqual(msg["server"], server)
         self.assertTrue(msg["url"].startswith(server))
@@ -135,7 +136,10 @@ class Tests(SimpleTestCase):
             r.update_step(stage, step, chunk_data)
             self.assertEqual(self.message_q.qsize(), 1)
             msg = self.message_q.get(block=False)
-            self.assertEqual(len(msg), 4)
+            self.assertEqual(len(msg), 7)
+            self.assertEqual(msg["type"], "%s_step_result" % stage)
+            self.assertEqual(msg["stepresult_id"], 1)
+            self.assertEqual(msg["build_key"], r.build_key)
             server = r.client_info["server"]
             self.assertEqual(msg["server"], server)
             self.assertTrue(msg["url"].startswith(server))
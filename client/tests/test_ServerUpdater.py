@@ -16,7 +16,7 @@ from __future__ import unicode_literals, absolute_import
 from django.test import SimpleTestCase
 from django.test import override_settings
 from ci.tests import utils as test_utils
-import requests, time
+import requests, time, json
 from client import ServerUpdater, BaseClient
 from client.tests import utils
 from mock import patch
@@ -214,6 +214,121 @@ class Tests(SimpleTestCase):
         self.assertEqual(u.messages, [])
         self.assertEqual(mock_post.call_count, 3)
 
+    @patch.object(requests, "post")
+    def test_send_messages_output_trimmed(self, mock_post):
+        u = self.create_updater()
+        self.load_messages(u)
+        response_data = {"status": "OK", "command": None, "output_trimmed": True}
+        mock_post.return_value = test_utils.Response(response_data)
+        u.send_messages()
+        self.assertEqual(u.messages, [])
+        self.assertEqual(u.output_trimmed, set((u.main_server, i) for i in range(3)))
+        self.assertEqual(self.read_q(self.command_q), [])
+
+    def load_step_messages(self, u, job_ids):
+        items = []
+        u.messages = []
+        for i, job_id in enumerate(job_ids):
+            item = {
+                "server": u.main_server,
+                "job_id": job_id,
+                "build_key": 123,
+                "type": "update_step_result",
+                "stepresult_id": i,
+                "url": "url",
+                "payload": {"output": ("output %s" % i).encode("utf-8")},
+            }
+            items.append(item)
+            u.message_q.put(item)
+        u.read_queue()
+        return items
+
+    @patch.object(requests, "post")
+    def test_send_messages_batch(self, mock_post):
+        u = self.create_updater()
+        mock_post.return_value = test_utils.Response(
+            {"status": "OK", "command": None, "output_trimmed": False}
+        )
+        # The first 3 are batched together, the last is on its own
+        self.load_step_messages(u, [1, 1, 1, 2])
+        u.send_messages()
+        self.assertEqual(u.messages, [])
+        self.assertEqual(mock_post.call_count, 2)
+        url = mock_post.call_args_list[0][0][0]
+        self.assertEqual(
+            url,
+            "%s/client/batch/123/%s/1/" % (u.main_server, u.client_info["client_name"]),
+        )
+        data = json.loads(mock_post.call_args_list[0][0][1])
+        self.assertEqual([m["stepresult_id"] for m in data["updates"]], [0, 1, 2])
+        self.assertEqual(data["updates"][0]["type"], "update_step_result")
+        self.assertEqual(data["updates"][1]["payload"], {"output": "output 1"})
+        self.assertNotIn("ping", data)
+        self.assertEqual(mock_post.call_args_list[1][0][0], "url")
+
+        # Limit the number of messages in a batch
+        mock_post.reset_mock()
+        u.client_info["server_batch_size"] = 2
+        self.load_step_messages(u, [1, 1, 1])
+        u.send_messages()
+        self.assertEqual(u.messages, [])
+        self.assertEqual(mock_post.call_count, 2)
+
+        # The job got canceled
+        mock_post.reset_mock()
+        mock_post.return_value = test_utils.Response(
+            {"status": "OK", "command": "cancel"}
+        )
+        self.load_step_messages(u, [1, 1])
+        u.send_messages()
+        self.assertEqual(
+            self.read_q(self.command_q),
+            [{"server": u.main_server, "job_id": 1, "command": "cancel"}],
+        )
+
+        # Server not responding, all the messages stay
+        mock_post.reset_mock()
+        mock_post.return_value = test_utils.Response({}, do_raise=True)
+        items = self.load_step_messages(u, [1, 1])
+        u.send_messages()
+        self.assertEqual(u.messages, items)
+        self.assertEqual(mock_post.call_count, 1)
+
+        # Bad request stops the job
+        mock_post.return_value = test_utils.Response({}, status_code=400)
+        u.send_messages()
+        self.assertEqual(u.messages, [])
+        self.assertEqual(
+            self.read_q(self.command_q),
+            [{"server": u.main_server, "job_id": 1, "command": "stop"}],
+        )
+
+    @patch.object(requests, "post")
+    def test_send_messages_batch_not_found(self, mock_post):
+        u = self.create_updater()
+        ok = test_utils.Response({"status": "OK"})
+        mock_post.side_effect = [
+            test_utils.Response({}, status_code=404, do_raise=True),
+            ok,
+            ok,
+        ]
+        self.load_step_messages(u, [1, 1])
+        u.send_messages()
+        self.assertEqual(u.messages, [])
+        self.assertEqual(mock_post.call_count, 3)
+        self.assertEqual(
+            [c[0][0] for c in mock_post.call_args_list[1:]], ["url", "url"]
+        )
+        self.assertEqual(u.no_batch_servers, set([u.main_server]))
+
+        # Don't try batches again
+        mock_post.reset_mock()
+        mock_post.side_effect = None
+        mock_post.return_value = ok
+        self.load_step_messages(u, [1, 1])
+        u.send_messages()
+        self.assertEqual(mock_post.call_count, 2)
+
     @patch.object(requests, "post")
     def test_send_messages_bad_first(self, mock_post):
         u = self.create_updater()